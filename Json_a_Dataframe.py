@@ -1,16 +1,58 @@
-import pandas as pd
+#Json_a_Dataframe.py
+"""
+Agrega los resultados de OCR del pipeline en una tabla (DataFrame, Excel, CSV o Parquet).
+
+El origen puede ser:
+- El archivo JSONL generado con `results.format: "jsonl"`: se lee secuencialmente una sola vez.
+- Un directorio con un JSON por segmento (formato `results.format: "json"`).
+
+Uso:
+    python Json_a_Dataframe.py outputs/results.jsonl --salida salida.xlsx
+    python Json_a_Dataframe.py outputs/results.jsonl --salida resultados.parquet
+    python Json_a_Dataframe.py outputs --salida salida.xlsx
+"""
 import json
+import argparse
+from pathlib import Path
+from scr.pipeline.results_writer import exportar_resultados
+
+def main():
+    parser = argparse.ArgumentParser(description="Convierte los resultados de OCR en una tabla.")
+    parser.add_argument('origen', help="Archivo JSONL de resultados o directorio con un JSON por segmento.")
+    parser.add_argument('--salida', default='salida.xlsx', help="Archivo de salida (.xlsx, .csv o .parquet).")
+    parser.add_argument('--filas-por-bloque', type=int, default=50_000,
+                        help="Filas por bloque en la exportación a CSV/Parquet desde JSONL.")
+    args = parser.parse_args()
+
+    origen, salida = Path(args.origen), Path(args.salida)
+
+    # CSV/Parquet desde JSONL: exportación por bloques, sin cargar todo en memoria
+    if origen.is_file() and salida.suffix.lower() in ('.csv', '.parquet'):
+        total = exportar_resultados(origen, salida, filas_por_bloque=args.filas_por_bloque)
+        print(f"{total} resultados exportados a {salida}")
+        return
 
-# Cargar JSON
-path = "prueba_ocr_textract/image_05_voucher_0.json"
-with open(path, encoding='utf-8') as f:
-    datos = json.load(f)
+    import pandas as pd
+    if origen.is_file():
+        df = pd.read_json(origen, lines=True)
+    else:
+        # Formato original: un JSON por segmento
+        registros = []
+        for path in sorted(origen.glob('*.json')):
+            with open(path, encoding='utf-8') as f:
+                datos = json.load(f)
+            registros.append({'segment_name': path.stem, **datos})
+        df = pd.json_normalize(registros)
 
-# Convertir a DataFrame (asumiendo que es una lista de diccionarios)
-df = pd.json_normalize(datos)  # O pd.DataFrame(datos), dependiendo de la estructura
+    # Mostrar la tabla
+    print(df)
 
-# Mostrar la tabla
-print(df)
+    if salida.suffix.lower() == '.csv':
+        df.to_csv(salida, index=False)
+    elif salida.suffix.lower() == '.parquet':
+        df.to_parquet(salida, index=False)
+    else:
+        df.to_excel(salida, index=False)
 
-# Guardar en Excel
-df.to_excel('salida.xlsx', index=False)
+if __name__ == "__main__":
+    main()
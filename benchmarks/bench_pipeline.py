@@ -0,0 +1,239 @@
+#benchmarks/bench_pipeline.py
+"""
+Micro-benchmark por etapa de `SamSegmenter`, `ClipValidator`, `OCRExtractor` y del
+`VoucherPipeline` completo, sobre escaneos sintéticos reproducibles.
+
+Para cada etapa se reporta latencia (media, p50, p95), throughput y memoria pico:
+- `tracemalloc_pico_mb`: pico de memoria asignada por Python durante la etapa
+  (no incluye los buffers nativos de torch/OpenCV).
+- `rss_pico_mb`: pico del RSS del proceso (`resource.getrusage`) al terminar la etapa;
+  es monótono, así que el aumento respecto a la etapa anterior indica su coste.
+
+La ejecución del pipeline completo incluye además el desglose interno por etapa de
+`PipelineMetrics`. El resultado es un JSON pensado para compararse entre commits.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_pipeline --num 5 --resolucion 150dpi --salida bench.json
+    python -m benchmarks.bench_pipeline --escaneos data/vouchers_a_segmentar --etapas segmentacion
+"""
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import tracemalloc
+from pathlib import Path
+import torch
+from benchmarks.synthetic_scans import generar_dataset, parsear_resolucion
+from scr.pipeline.voucher_pipeline import VoucherPipeline
+from scr.pipeline.results_writer import crear_escritor_resultados, leer_resultados
+from scr.utils.config_loader import load_config
+from scr.utils.metrics import configurar_metricas
+from scr.segmentation.segmenter_factory import SegmenterFactory
+from scr.validation.validator_factory import ValidatorFactory
+from scr.ocr.ocr_extractor_factory import OCRExtractorFactory
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+ETAPAS = ('segmentacion', 'validacion', 'ocr', 'pipeline')
+EXTENSIONES = (".jpg", ".jpeg", ".png")
+
+def _rss_pico_mb() -> float | None:
+    """Pico de RSS del proceso en MiB (ru_maxrss está en KiB en Linux y en bytes en macOS)."""
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def _commit_actual() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+class MedicionEtapa:
+    """Context manager que mide el tiempo total y la memoria pico de una etapa del benchmark."""
+    def __enter__(self):
+        tracemalloc.reset_peak()
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.segundos = time.perf_counter() - self.inicio
+        self.tracemalloc_pico_mb = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+        self.rss_pico_mb = _rss_pico_mb()
+        return False
+
+def _informe(medicion: MedicionEtapa, latencias: list[float], items: int, **extra) -> dict:
+    """Construye el informe JSON de una etapa."""
+    ordenadas = sorted(latencias)
+    return {
+        'llamadas': len(latencias),
+        'items': items,
+        'tiempo_total_s': round(medicion.segundos, 4),
+        'latencia_media_ms': round(statistics.mean(latencias) * 1000, 2) if latencias else None,
+        'latencia_p50_ms': round(statistics.median(latencias) * 1000, 2) if latencias else None,
+        'latencia_p95_ms': round(ordenadas[min(len(ordenadas) - 1, int(0.95 * len(ordenadas)))] * 1000, 2) if latencias else None,
+        'items_por_segundo': round(items / medicion.segundos, 3) if medicion.segundos > 0 else None,
+        'tracemalloc_pico_mb': medicion.tracemalloc_pico_mb,
+        'rss_pico_mb': medicion.rss_pico_mb,
+        **extra,
+    }
+
+def medir_segmentacion(segmenter, rutas: list[Path]) -> tuple[dict, list]:
+    latencias, segmentos = [], []
+    with MedicionEtapa() as medicion:
+        for ruta in rutas:
+            inicio = time.perf_counter()
+            segmentos.extend(segmenter.segment(ruta))
+            latencias.append(time.perf_counter() - inicio)
+    return _informe(medicion, latencias, len(rutas), segmentos=len(segmentos)), segmentos
+
+def medir_validacion(validator, segmentos: list, tamano_lote: int) -> tuple[dict, list]:
+    latencias, validados = [], []
+    with MedicionEtapa() as medicion:
+        for i in range(0, len(segmentos), tamano_lote):
+            lote = segmentos[i:i + tamano_lote]
+            inicio = time.perf_counter()
+            decisiones, _ = validator.predict_batch(lote)
+            latencias.append(time.perf_counter() - inicio)
+            validados.extend(img for img, ok in zip(lote, decisiones) if ok)
+    return _informe(medicion, latencias, len(segmentos), tamano_lote=tamano_lote, validados=len(validados)), validados
+
+def medir_ocr(ocr_extractor, imagenes: list, tamano_lote: int) -> dict:
+    latencias, caracteres = [], 0
+    with MedicionEtapa() as medicion:
+        for i in range(0, len(imagenes), tamano_lote):
+            inicio = time.perf_counter()
+            caracteres += sum(len(t) for t in ocr_extractor.extract_many(imagenes[i:i + tamano_lote]))
+            latencias.append(time.perf_counter() - inicio)
+    return _informe(medicion, latencias, len(imagenes), tamano_lote=tamano_lote, caracteres=caracteres)
+
+def medir_pipeline(segmenter, validator, ocr_extractor, rutas: list[Path], pipeline_config: dict, results_config: dict) -> dict:
+    """Ejecuta el pipeline completo sobre copias de los escaneos en un directorio temporal."""
+    with tempfile.TemporaryDirectory(prefix="bench_pipeline_") as tmp:
+        tmp = Path(tmp)
+        base_dirs = {clave: tmp / clave for clave in ('vouchers_a_segmentar', 'single_voucher', 'no_voucher', 'validated_voucher', 'outputs')}
+        base_dirs['vouchers_a_segmentar'].mkdir(parents=True)
+        for ruta in rutas:
+            shutil.copy(ruta, base_dirs['vouchers_a_segmentar'] / ruta.name)
+        # Sin manifiesto ni cola previa: se mide el trabajo completo
+        config = dict(pipeline_config, manifest_path=None,
+                      job_queue=dict(pipeline_config.get('job_queue') or {}, path=base_dirs['outputs'] / 'jobs.sqlite'))
+        # Mismo formato de resultados que la configuración, pero dentro del directorio temporal
+        results_config = dict(results_config, path=base_dirs['outputs'] / 'results.jsonl')
+        pipeline = VoucherPipeline(segmenter, validator, ocr_extractor, base_dirs, config,
+                                   results_writer=crear_escritor_resultados(results_config, base_dirs['outputs']))
+        metricas = configurar_metricas({'enabled': True})
+        with MedicionEtapa() as medicion:
+            pipeline.process_files(sorted(base_dirs['vouchers_a_segmentar'].iterdir()))
+            pipeline.close()
+        resultados = len(list(base_dirs['outputs'].glob('*.json')))
+        if (base_dirs['outputs'] / 'results.jsonl').exists():
+            resultados += sum(1 for _ in leer_resultados(base_dirs['outputs'] / 'results.jsonl'))
+    return _informe(medicion, [medicion.segundos], len(rutas), modo=pipeline.mode,
+                    resultados_ocr=resultados, desglose=metricas.resumen())
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark por etapa del pipeline de vouchers.")
+    parser.add_argument('--config', default='config/settings.yml', help="Configuración de los componentes.")
+    parser.add_argument('--escaneos', help="Directorio con escaneos reales; si se omite se generan sintéticos.")
+    parser.add_argument('--num', type=int, default=5, help="Escaneos sintéticos a generar.")
+    parser.add_argument('--resolucion', default='150dpi', help="Resolución de los escaneos sintéticos.")
+    parser.add_argument('--semilla', type=int, default=0, help="Semilla de los escaneos sintéticos.")
+    parser.add_argument('--etapas', default=','.join(ETAPAS), help=f"Etapas a medir, separadas por comas ({', '.join(ETAPAS)}).")
+    parser.add_argument('--modo', help="Modo del pipeline para la etapa 'pipeline' (por defecto, el de la configuración).")
+    parser.add_argument('--con-cache', action='store_true', help="Usar la caché de máscaras configurada (por defecto se desactiva).")
+    parser.add_argument('--salida', help="Archivo JSON donde guardar el resultado (por defecto, solo stdout).")
+    args = parser.parse_args()
+
+    etapas = [e.strip() for e in args.etapas.split(',') if e.strip()]
+    desconocidas = set(etapas) - set(ETAPAS)
+    if desconocidas:
+        raise SystemExit(f"Etapas no soportadas: {sorted(desconocidas)}")
+
+    config = load_config(args.config)
+    if not args.con_cache:
+        # Sin caché de máscaras cada segmentación ejecuta SAM, también en la etapa 'pipeline'
+        config['segmentation'] = dict(config['segmentation'], mask_cache={'dir': None, 'max_memory_mb': 0})
+    pipeline_config = dict(config.get('pipeline', {}) or {})
+    if args.modo:
+        pipeline_config['mode'] = args.modo
+
+    with tempfile.TemporaryDirectory(prefix="synthetic_scans_") as tmp_escaneos:
+        if args.escaneos:
+            rutas = sorted(p for p in Path(args.escaneos).iterdir() if p.suffix.lower() in EXTENSIONES)
+            dataset = {'origen': str(args.escaneos)}
+        else:
+            resolucion = parsear_resolucion(args.resolucion)
+            rutas = generar_dataset(tmp_escaneos, args.num, resolucion, args.semilla)
+            dataset = {'origen': 'sintetico', 'resolucion': list(resolucion), 'semilla': args.semilla}
+        if not rutas:
+            raise SystemExit("No hay escaneos que procesar.")
+        dataset['num_escaneos'] = len(rutas)
+
+        tracemalloc.start()
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        carga = {}
+        with MedicionEtapa() as m:
+            segmenter = SegmenterFactory.create_segmenter(config['segmentation'], device)
+        carga['segmenter_s'] = round(m.segundos, 3)
+        with MedicionEtapa() as m:
+            validator = ValidatorFactory.create_validator(config['validation'], device)
+        carga['validator_s'] = round(m.segundos, 3)
+        with MedicionEtapa() as m:
+            ocr_extractor = OCRExtractorFactory.create_ocr_extractor(config['ocr'])
+        carga['ocr_extractor_s'] = round(m.segundos, 3)
+        carga['rss_pico_mb'] = _rss_pico_mb()
+
+        resultados = {}
+        try:
+            segmentos = validados = []
+            if {'segmentacion', 'validacion', 'ocr'} & set(etapas):
+                resultados['segmentacion'], segmentos = medir_segmentacion(segmenter, rutas)
+            if {'validacion', 'ocr'} & set(etapas):
+                resultados['validacion'], validados = medir_validacion(
+                    validator, segmentos, config['validation'].get('batch_size', 8))
+            if 'ocr' in etapas:
+                resultados['ocr'] = medir_ocr(
+                    ocr_extractor, validados or segmentos, pipeline_config.get('ocr_batch_size', 8))
+            if 'pipeline' in etapas:
+                resultados['pipeline'] = medir_pipeline(
+                    segmenter, validator, ocr_extractor, rutas, pipeline_config, config.get('results', {}) or {})
+        finally:
+            ocr_extractor.close()
+            tracemalloc.stop()
+
+    informe = {
+        'commit': _commit_actual(),
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'entorno': {
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'torch': torch.__version__,
+            'device': str(device),
+            'hilos_torch': torch.get_num_threads(),
+        },
+        'componentes': {
+            'segmentation': config['segmentation'].get('model_name'),
+            'validation': config['validation'].get('model_name'),
+            'ocr': config['ocr'].get('method'),
+        },
+        'dataset': dataset,
+        'carga_modelos': carga,
+        'etapas': resultados,
+    }
+    texto = json.dumps(informe, ensure_ascii=False, indent=4)
+    print(texto)
+    if args.salida:
+        Path(args.salida).write_text(texto, encoding='utf-8')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#benchmarks/bench_sam_cpu_fast.py
+"""
+Compara la ruta por defecto de `SamSegmenter` con la ruta rápida de CPU ("cpu_fast").
+
+Carga dos segmentadores con el mismo checkpoint (sin cachés de máscaras ni de
+embeddings) y, para cada escaneo, ejecuta `mask_generator.generate` sobre la misma
+copia reducida con ambos. Se reporta:
+- la latencia de generación (media, p50) de cada ruta y la aceleración,
+- la deriva de las máscaras: cada máscara de la ruta por defecto se empareja con la
+  máscara de "cpu_fast" de mayor IoU; se dan el IoU medio y mínimo de los pares y la
+  fracción de máscaras con IoU >= `--min-iou`,
+- el número de segmentos que superan `filtrar_mascaras` en cada ruta.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_sam_cpu_fast --num 5 --resolucion 150dpi
+    python -m benchmarks.bench_sam_cpu_fast --escaneos data/vouchers_a_segmentar --compilar --hilos 8
+"""
+import json
+import time
+import argparse
+import tempfile
+import statistics
+from pathlib import Path
+import numpy as np
+import torch
+from PIL import Image
+from benchmarks.synthetic_scans import generar_dataset, parsear_resolucion
+from scr.utils.config_loader import load_config
+from scr.segmentation.voucher_segmentation import SamSegmenter
+from scr.segmentation.cpu_fast import contexto_inferencia
+from scr.segmentation.mask_filters import filtrar_mascaras, reducir_imagen
+
+EXTENSIONES = (".jpg", ".jpeg", ".png")
+PASO_EMPAREJAMIENTO = 4 # Submuestreo de las máscaras para el emparejamiento aproximado
+
+def emparejar_mascaras(referencia: list[np.ndarray], candidatas: list[np.ndarray]) -> list[float]:
+    """
+    Empareja cada máscara de `referencia` con la candidata de mayor IoU.
+
+    El emparejamiento se hace sobre máscaras submuestreadas (un producto de matrices);
+    el IoU devuelto es el exacto, a resolución completa, de cada par elegido.
+
+    Returns:
+        list[float]: El IoU de cada máscara de referencia con su pareja (0.0 si no hay candidatas).
+    """
+    if not referencia:
+        return []
+    if not candidatas:
+        return [0.0] * len(referencia)
+    a = np.stack([m[::PASO_EMPAREJAMIENTO, ::PASO_EMPAREJAMIENTO].ravel() for m in referencia]).astype(np.float32)
+    b = np.stack([m[::PASO_EMPAREJAMIENTO, ::PASO_EMPAREJAMIENTO].ravel() for m in candidatas]).astype(np.float32)
+    interseccion = a @ b.T
+    union = a.sum(axis=1)[:, None] + b.sum(axis=1)[None, :] - interseccion
+    parejas = np.argmax(interseccion / np.maximum(union, 1.0), axis=1)
+
+    ious = []
+    for m, j in zip(referencia, parejas):
+        union_exacta = np.count_nonzero(m | candidatas[j])
+        ious.append(float(np.count_nonzero(m & candidatas[j]) / union_exacta) if union_exacta else 1.0)
+    return ious
+
+def generar(segmenter: SamSegmenter, img_np: np.ndarray) -> tuple[list[dict], float]:
+    """Ejecuta el generador automático de máscaras como lo hace `SamSegmenter.segment`."""
+    inicio = time.perf_counter()
+    with contexto_inferencia(segmenter.cpu_fast):
+        masks = segmenter.mask_generator.generate(img_np)
+    return masks, time.perf_counter() - inicio
+
+def _latencias(valores: list[float]) -> dict:
+    return {'media_s': round(statistics.mean(valores), 3), 'p50_s': round(statistics.median(valores), 3)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Aceleración y deriva de máscaras de la ruta cpu_fast de SAM.")
+    parser.add_argument('--config', default='config/settings.yml', help="Configuración (sección 'segmentation').")
+    parser.add_argument('--escaneos', help="Directorio con escaneos reales; si se omite se generan sintéticos.")
+    parser.add_argument('--num', type=int, default=5, help="Escaneos sintéticos a generar.")
+    parser.add_argument('--resolucion', default='150dpi', help="Resolución de los escaneos sintéticos.")
+    parser.add_argument('--semilla', type=int, default=0, help="Semilla de los escaneos sintéticos.")
+    parser.add_argument('--sin-bf16', action='store_true', help="Desactivar el autocast bfloat16 en cpu_fast.")
+    parser.add_argument('--compilar', action='store_true', help="Compilar el encoder con torch.compile en cpu_fast.")
+    parser.add_argument('--hilos', type=int, help="Hilos de torch para ambas rutas (por defecto, los de torch).")
+    parser.add_argument('--min-iou', type=float, default=0.9, help="IoU a partir del cual una máscara se considera estable.")
+    parser.add_argument('--salida', help="Archivo JSON donde guardar el resultado (por defecto, solo stdout).")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    device = torch.device("cpu")
+    if args.hilos:
+        torch.set_num_threads(args.hilos)
+    base = dict(config['segmentation'], mask_cache={'dir': None, 'max_memory_mb': 0},
+                embedding_cache={'dir': None}, cpu_fast={'enabled': False})
+    opciones_rapida = dict(config['segmentation'].get('cpu_fast', {}) or {}, enabled=True, threads=args.hilos)
+    if args.sin_bf16:
+        opciones_rapida['bfloat16'] = False
+    if args.compilar:
+        opciones_rapida['compile'] = True
+
+    inicio = time.perf_counter()
+    por_defecto = SamSegmenter.from_config(base, device)
+    carga_defecto = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    rapida = SamSegmenter.from_config(dict(base, cpu_fast=opciones_rapida), device)
+    carga_rapida = time.perf_counter() - inicio # Incluye la compilación y el calentamiento
+
+    with tempfile.TemporaryDirectory(prefix="synthetic_scans_") as tmp_escaneos:
+        if args.escaneos:
+            rutas = sorted(p for p in Path(args.escaneos).iterdir() if p.suffix.lower() in EXTENSIONES)
+        else:
+            rutas = generar_dataset(tmp_escaneos, args.num, parsear_resolucion(args.resolucion), args.semilla)
+        if not rutas:
+            raise SystemExit("No hay escaneos que procesar.")
+
+        # Una pasada previa por ruta, fuera de la medición (asignadores, caché de oneDNN)
+        img_calentamiento = np.array(reducir_imagen(Image.open(rutas[0]).convert("RGB"), por_defecto.working_max_side)[0])
+        generar(por_defecto, img_calentamiento)
+        generar(rapida, img_calentamiento)
+
+        tiempos_defecto, tiempos_rapida, todos, imagenes = [], [], [], []
+        for ruta in rutas:
+            img = Image.open(ruta).convert("RGB")
+            img_trabajo, escala = reducir_imagen(img, por_defecto.working_max_side)
+            img_np = np.array(img_trabajo)
+            masks_defecto, t_defecto = generar(por_defecto, img_np)
+            masks_rapida, t_rapida = generar(rapida, img_np)
+            tiempos_defecto.append(t_defecto)
+            tiempos_rapida.append(t_rapida)
+
+            ious = emparejar_mascaras([m['segmentation'] for m in masks_defecto],
+                                      [m['segmentation'] for m in masks_rapida])
+            todos.extend(ious)
+            imagenes.append({
+                'imagen': ruta.name,
+                'mascaras_defecto': len(masks_defecto), 'mascaras_cpu_fast': len(masks_rapida),
+                'segmentos_defecto': len(filtrar_mascaras(masks_defecto, img, escala=escala)),
+                'segmentos_cpu_fast': len(filtrar_mascaras(masks_rapida, img, escala=escala)),
+                'iou_medio': round(float(np.mean(ious)), 4) if ious else None,
+                'defecto_s': round(t_defecto, 3), 'cpu_fast_s': round(t_rapida, 3),
+            })
+
+    informe = {
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'torch': torch.__version__,
+        'hilos_torch': torch.get_num_threads(),
+        'cpu_fast': opciones_rapida,
+        'carga_s': {'defecto': round(carga_defecto, 3), 'cpu_fast': round(carga_rapida, 3)},
+        'latencia': {'defecto': _latencias(tiempos_defecto), 'cpu_fast': _latencias(tiempos_rapida)},
+        'aceleracion': round(statistics.mean(tiempos_defecto) / statistics.mean(tiempos_rapida), 3),
+        'deriva': {
+            'iou_medio': round(float(np.mean(todos)), 4) if todos else None,
+            'iou_minimo': round(min(todos), 4) if todos else None,
+            'fraccion_estable': round(float(np.mean(np.array(todos) >= args.min_iou)), 4) if todos else None,
+            'min_iou': args.min_iou,
+        },
+        'imagenes': imagenes,
+    }
+    texto = json.dumps(informe, ensure_ascii=False, indent=4)
+    print(texto)
+    if args.salida:
+        Path(args.salida).write_text(texto, encoding='utf-8')
+
+if __name__ == "__main__":
+    main()
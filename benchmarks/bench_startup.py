@@ -0,0 +1,116 @@
+#benchmarks/bench_startup.py
+"""
+Mide el arranque en frío de una ejecución que solo usa Tesseract, antes y después
+del registro de backends perezoso (`scr/utils/registry.py`).
+
+Cada escenario se ejecuta varias veces en un intérprete nuevo (sin módulos en caché
+de `sys.modules`) y se reporta el tiempo de importación y construcción, el tiempo
+total del proceso, el RSS pico y qué librerías pesadas quedaron cargadas:
+
+- "antes": reproduce las importaciones que se hacían al arrancar antes del registro
+  (todos los módulos de backends y, con ellos, segment_anything, transformers,
+  boto3, pytesseract y cv2).
+- "despues": importa las factories y crea el extractor de OCR con Tesseract; solo se
+  importan las dependencias del backend seleccionado.
+- "main": recorre el arranque real de `main.py` (sus importaciones, settings.yml y
+  `crear_componentes`) con segmentación por contornos, validación heurística con
+  respaldo diferido y Tesseract; torch no debe aparecer entre los módulos cargados.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_startup --repeticiones 5 --salida startup.json
+"""
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+MODULOS_PESADOS = ('torch', 'transformers', 'segment_anything', 'boto3', 'cv2', 'pytesseract', 'tesserocr')
+
+_PREAMBULO = "import time, sys\ninicio = time.perf_counter()\n"
+_EPILOGO = f"""
+segundos = time.perf_counter() - inicio
+try:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+except ImportError:
+    rss = None
+import json
+print(json.dumps({{'segundos': segundos, 'rss_pico_mb': rss,
+                  'modulos_pesados': [m for m in {MODULOS_PESADOS!r} if m in sys.modules]}}))
+"""
+
+ESCENARIOS = {
+    'antes': """
+import importlib
+for modulo in ('boto3', 'pytesseract', 'cv2', 'transformers'):
+    try:
+        importlib.import_module(modulo)
+    except ImportError:
+        pass
+import scr.segmentation.voucher_segmentation
+import scr.validation.voucher_validation
+from scr.ocr.voucher_ocr import OCRExtractor
+extractor = OCRExtractor(method='tesseract', workers=1)
+""",
+    'despues': """
+from scr.segmentation.segmenter_factory import SegmenterFactory
+from scr.validation.validator_factory import ValidatorFactory
+from scr.ocr.ocr_extractor_factory import OCRExtractorFactory
+extractor = OCRExtractorFactory.create_ocr_extractor({'method': 'tesseract', 'workers': 1})
+""",
+    'main': """
+import logging
+import main
+config = main.load_config('config/settings.yml')
+config['segmentation']['type'] = 'contour'
+config['validation']['type'] = 'heuristic'
+config['validation'].setdefault('heuristic', {})['lazy_fallback'] = True
+config['ocr'].update({'method': 'tesseract', 'workers': 1})
+segmenter, validator, extractor = main.crear_componentes(config, logging.getLogger('bench_startup'))
+""",
+}
+
+def medir_escenario(codigo: str, repeticiones: int) -> dict:
+    """Ejecuta `codigo` en `repeticiones` intérpretes nuevos y agrega los resultados."""
+    tiempos, totales, rss, modulos = [], [], [], []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        proceso = subprocess.run(
+            [sys.executable, '-c', _PREAMBULO + codigo + _EPILOGO],
+            capture_output=True, text=True, cwd=Path(__file__).resolve().parent.parent
+        )
+        totales.append(time.perf_counter() - inicio)
+        if proceso.returncode != 0:
+            return {'error': proceso.stderr.strip().splitlines()[-1] if proceso.stderr.strip() else 'error desconocido'}
+        resultado = json.loads(proceso.stdout.strip().splitlines()[-1])
+        tiempos.append(resultado['segundos'])
+        rss.append(resultado['rss_pico_mb'])
+        modulos = resultado['modulos_pesados']
+    return {
+        'importacion_y_construccion_s': round(statistics.median(tiempos), 3),
+        'proceso_total_s': round(statistics.median(totales), 3),
+        'rss_pico_mb': round(statistics.median(rss), 1) if None not in rss else None,
+        'modulos_pesados_cargados': modulos,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Arranque en frío con y sin registro de backends perezoso.")
+    parser.add_argument('--repeticiones', type=int, default=5, help="Intérpretes nuevos por escenario (se reporta la mediana).")
+    parser.add_argument('--salida', help="Archivo JSON donde guardar el resultado (por defecto, solo stdout).")
+    args = parser.parse_args()
+
+    resultados = {nombre: medir_escenario(codigo, args.repeticiones) for nombre, codigo in ESCENARIOS.items()}
+    informe = {'repeticiones': args.repeticiones, 'escenarios': resultados}
+    if 'error' not in resultados['antes'] and 'error' not in resultados['despues']:
+        informe['aceleracion'] = round(
+            resultados['antes']['importacion_y_construccion_s'] / resultados['despues']['importacion_y_construccion_s'], 2)
+    texto = json.dumps(informe, ensure_ascii=False, indent=4)
+    print(texto)
+    if args.salida:
+        Path(args.salida).write_text(texto, encoding='utf-8')
+
+if __name__ == "__main__":
+    main()
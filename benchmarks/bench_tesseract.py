@@ -0,0 +1,105 @@
+#benchmarks/bench_tesseract.py
+"""
+Benchmark de los backends de Tesseract de `OCRExtractor`: "tesseract" (pytesseract,
+un subproceso por imagen) frente a "tesserocr" (motor en proceso de larga duración).
+
+Ambos backends aplican `preprocesar_imagen` y la configuración `--oem 3 --psm 6`.
+Se mide la latencia por imagen (secuencial, con `extract`) y el tiempo total con
+`extract_many`, y se compara el texto devuelto por ambos.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_tesseract --imagenes data/validated_voucher --workers 4
+"""
+import argparse
+import json
+import time
+import statistics
+from difflib import SequenceMatcher
+from pathlib import Path
+from PIL import Image
+from scr.ocr.voucher_ocr import OCRExtractor
+
+EXTENSIONES = (".jpg", ".jpeg", ".png")
+
+def medir_backend(method: str, imagenes: list[Image.Image], workers: int, repeticiones: int) -> dict:
+    """
+    Mide un backend de OCR sobre las imágenes dadas.
+
+    La primera llamada a `extract` (carga del motor) se reporta por separado como
+    calentamiento y no se incluye en las latencias.
+
+    Returns:
+        dict: Métricas del backend y los textos extraídos en la última repetición.
+    """
+    extractor = OCRExtractor(method=method, workers=workers)
+    try:
+        inicio = time.perf_counter()
+        extractor.extract(imagenes[0])
+        calentamiento = time.perf_counter() - inicio
+
+        latencias = []
+        textos = []
+        for _ in range(repeticiones):
+            textos = []
+            for imagen in imagenes:
+                inicio = time.perf_counter()
+                textos.append(extractor.extract(imagen))
+                latencias.append(time.perf_counter() - inicio)
+
+        extractor.extract_many(imagenes) # Arranque del pool
+        tiempos_lote = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            extractor.extract_many(imagenes)
+            tiempos_lote.append(time.perf_counter() - inicio)
+    finally:
+        extractor.close()
+
+    return {
+        'method': method,
+        'calentamiento_s': calentamiento,
+        'latencia_media_ms': statistics.mean(latencias) * 1000,
+        'latencia_mediana_ms': statistics.median(latencias) * 1000,
+        'imagenes_por_segundo_secuencial': len(latencias) / sum(latencias),
+        'imagenes_por_segundo_extract_many': len(imagenes) * len(tiempos_lote) / sum(tiempos_lote),
+        'textos': textos,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara los backends 'tesseract' y 'tesserocr' de OCRExtractor.")
+    parser.add_argument('--imagenes', required=True, help="Directorio con segmentos de voucher a reconocer.")
+    parser.add_argument('--workers', type=int, default=4, help="Workers para extract_many.")
+    parser.add_argument('--repeticiones', type=int, default=3, help="Repeticiones de cada medición.")
+    parser.add_argument('--salida', help="Archivo JSON donde guardar el resultado (por defecto, solo stdout).")
+    args = parser.parse_args()
+
+    rutas = sorted(p for p in Path(args.imagenes).iterdir() if p.suffix.lower() in EXTENSIONES)
+    if not rutas:
+        raise SystemExit(f"No se encontraron imágenes en {args.imagenes}")
+    imagenes = [Image.open(ruta).convert('RGB') for ruta in rutas]
+
+    resultados = {m: medir_backend(m, imagenes, args.workers, args.repeticiones) for m in ('tesseract', 'tesserocr')}
+    similitudes = [
+        SequenceMatcher(None, a, b).ratio()
+        for a, b in zip(resultados['tesseract'].pop('textos'), resultados['tesserocr'].pop('textos'))
+    ]
+    informe = {
+        'num_imagenes': len(imagenes),
+        'workers': args.workers,
+        'repeticiones': args.repeticiones,
+        'backends': resultados,
+        'speedup_secuencial': resultados['tesseract']['latencia_media_ms'] / resultados['tesserocr']['latencia_media_ms'],
+        'speedup_extract_many': (
+            resultados['tesserocr']['imagenes_por_segundo_extract_many']
+            / resultados['tesseract']['imagenes_por_segundo_extract_many']
+        ),
+        'similitud_texto_media': statistics.mean(similitudes),
+        'textos_identicos': sum(1 for s in similitudes if s == 1.0),
+    }
+    texto = json.dumps(informe, ensure_ascii=False, indent=4)
+    print(texto)
+    if args.salida:
+        Path(args.salida).write_text(texto, encoding='utf-8')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+#benchmarks/synthetic_scans.py
+"""
+Generador de escaneos sintéticos con varios vouchers por imagen.
+
+Compone, con PIL, hojas de escáner (fondo claro con ruido y viñeteado) sobre las
+que se colocan varios rectángulos tipo ticket con texto impreso (encabezado,
+fecha, líneas de productos, total), rotados y con ruido. Junto a cada escaneo se
+guarda un JSON con la verdad de terreno (bbox de cada voucher en píxeles del
+escaneo y su texto), de modo que los benchmarks sean reproducibles sin imágenes
+reales: la misma semilla produce siempre el mismo conjunto.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.synthetic_scans --salida data/synthetic --num 10 --resolucion 2480x3508
+"""
+import json
+import random
+import argparse
+from pathlib import Path
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+# Resoluciones habituales de escaneo A4 (ancho x alto en píxeles)
+RESOLUCIONES = {
+    '150dpi': (1240, 1754),
+    '200dpi': (1654, 2339),
+    '300dpi': (2480, 3508),
+}
+
+COMERCIOS = ("BODEGA SAN JUAN", "FARMACIA LA SALUD", "MINIMARKET EL SOL", "GRIFO CENTRAL", "LIBRERIA ALFA")
+PRODUCTOS = ("ARROZ 1KG", "LECHE EVAP", "PAN FRANCES", "ACEITE 1L", "AZUCAR RUB", "CUADERNO A4",
+             "LAPICERO AZ", "GASOLINA 90", "AGUA 625ML", "GALLETAS", "JABON", "PARACETAMOL")
+
+def _fuente(tamano: int) -> ImageFont.ImageFont:
+    """Devuelve una fuente monoespaciada del sistema si existe, o la fuente por defecto de PIL."""
+    for nombre in ("DejaVuSansMono.ttf", "LiberationMono-Regular.ttf", "cour.ttf"):
+        try:
+            return ImageFont.truetype(nombre, tamano)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size=tamano) # Pillow >= 10.1
+    except TypeError:
+        return ImageFont.load_default()
+
+def generar_texto_voucher(rng: random.Random) -> list[str]:
+    """Genera las líneas de texto de un ticket de compra."""
+    lineas = [
+        rng.choice(COMERCIOS),
+        f"RUC {rng.randint(10**10, 10**11 - 1)}",
+        f"FECHA {rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/20{rng.randint(20, 25)} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}",
+        f"BOLETA B{rng.randint(1, 999):03d}-{rng.randint(1, 99999):05d}",
+        "-" * 24,
+    ]
+    total = 0.0
+    for _ in range(rng.randint(3, 9)):
+        precio = round(rng.uniform(0.5, 80.0), 2)
+        total += precio
+        lineas.append(f"{rng.choice(PRODUCTOS):<14}{precio:>10.2f}")
+    lineas += ["-" * 24, f"{'TOTAL S/':<14}{total:>10.2f}", "GRACIAS POR SU COMPRA"]
+    return lineas
+
+def generar_voucher(rng: random.Random, ancho: int, lineas: list[str]) -> Image.Image:
+    """
+    Dibuja un ticket (papel blanco con texto negro) del ancho dado; el alto se ajusta al texto.
+
+    Args:
+        rng (random.Random): Generador aleatorio (para el tono del papel y el desenfoque).
+        ancho (int): Ancho del ticket en píxeles.
+        lineas (list[str]): Líneas de texto a imprimir.
+
+    Returns:
+        Image.Image: El ticket en modo 'RGB'.
+    """
+    tamano_fuente = max(10, ancho // 16)
+    fuente = _fuente(tamano_fuente)
+    interlineado = int(tamano_fuente * 1.4)
+    margen = ancho // 12
+    alto = 2 * margen + interlineado * len(lineas)
+    tono = rng.randint(235, 255)
+    voucher = Image.new('RGB', (ancho, alto), (tono, tono, max(0, tono - rng.randint(0, 15))))
+    draw = ImageDraw.Draw(voucher)
+    for i, linea in enumerate(lineas):
+        draw.text((margen, margen + i * interlineado), linea, fill=(20, 20, 20), font=fuente)
+    if rng.random() < 0.5:
+        voucher = voucher.filter(ImageFilter.GaussianBlur(radius=rng.uniform(0.3, 1.0)))
+    return voucher
+
+def _fondo_escaneo(rng: random.Random, resolucion: tuple[int, int], ruido: float) -> Image.Image:
+    """Fondo de escáner: gris claro con ruido gaussiano y un ligero viñeteado."""
+    ancho, alto = resolucion
+    base = rng.randint(200, 235)
+    fondo = Image.new('L', resolucion, base)
+    if ruido > 0:
+        # Ruido generado a baja resolución y escalado: barato incluso para escaneos de 300 dpi
+        ruido_img = Image.effect_noise((max(1, ancho // 4), max(1, alto // 4)), ruido * 64)
+        fondo = Image.blend(fondo, ruido_img.resize(resolucion), 0.15)
+    vineta = Image.radial_gradient('L').resize(resolucion)
+    fondo = Image.composite(fondo, Image.new('L', resolucion, base - 30), vineta.point(lambda v: 255 - v // 3))
+    return fondo.convert('RGB')
+
+def componer_escaneo(rng: random.Random,
+                     resolucion: tuple[int, int] = RESOLUCIONES['150dpi'],
+                     num_vouchers: tuple[int, int] = (2, 5),
+                     max_rotacion: float = 8.0,
+                     ruido: float = 1.0) -> tuple[Image.Image, list[dict]]:
+    """
+    Compone un escaneo con varios vouchers sin solaparse.
+
+    Args:
+        rng (random.Random): Generador aleatorio con semilla fija para reproducibilidad.
+        resolucion (tuple[int, int], optional): (ancho, alto) del escaneo. Defaults to 150 dpi A4.
+        num_vouchers (tuple[int, int], optional): Rango [mín, máx] de vouchers por escaneo. Defaults to (2, 5).
+        max_rotacion (float, optional): Rotación máxima (grados, en ambos sentidos). Defaults to 8.0.
+        ruido (float, optional): Intensidad del ruido del fondo (0 = sin ruido). Defaults to 1.0.
+
+    Returns:
+        tuple[Image.Image, list[dict]]: El escaneo y, por voucher, su 'bbox' [x, y, ancho, alto]
+            en píxeles del escaneo, su 'rotacion' y su 'texto'.
+    """
+    ancho, alto = resolucion
+    escaneo = _fondo_escaneo(rng, resolucion, ruido)
+    ocupadas: list[tuple[int, int, int, int]] = []
+    vouchers = []
+    for _ in range(rng.randint(*num_vouchers)):
+        lineas = generar_texto_voucher(rng)
+        voucher = generar_voucher(rng, rng.randint(ancho // 5, ancho // 3), lineas)
+        rotacion = rng.uniform(-max_rotacion, max_rotacion)
+        mascara = Image.new('L', voucher.size, 255).rotate(rotacion, expand=True, resample=Image.BICUBIC)
+        voucher = voucher.rotate(rotacion, expand=True, resample=Image.BICUBIC)
+        w, h = voucher.size
+        if w >= ancho or h >= alto:
+            continue
+        for _intento in range(50):
+            x, y = rng.randint(0, ancho - w), rng.randint(0, alto - h)
+            caja = (x, y, x + w, y + h)
+            separacion = ancho // 50
+            if all(caja[2] + separacion < o[0] or o[2] + separacion < caja[0] or
+                   caja[3] + separacion < o[1] or o[3] + separacion < caja[1] for o in ocupadas):
+                break
+        else:
+            continue # No hay sitio libre para este voucher
+        escaneo.paste(voucher, (x, y), mascara)
+        ocupadas.append(caja)
+        vouchers.append({'bbox': [x, y, w, h], 'rotacion': round(rotacion, 3), 'texto': "\n".join(lineas)})
+    return escaneo, vouchers
+
+def generar_dataset(directorio: str | Path,
+                    num_escaneos: int = 10,
+                    resolucion: tuple[int, int] = RESOLUCIONES['150dpi'],
+                    semilla: int = 0,
+                    **kwargs) -> list[Path]:
+    """
+    Genera un conjunto de escaneos sintéticos en `directorio`.
+
+    Cada escaneo se guarda como `scan_XXXX.png` junto a `scan_XXXX.json` con su verdad
+    de terreno. Los argumentos adicionales se pasan a `componer_escaneo`.
+
+    Returns:
+        list[Path]: Rutas de las imágenes generadas.
+    """
+    directorio = Path(directorio)
+    directorio.mkdir(parents=True, exist_ok=True)
+    rutas = []
+    for i in range(num_escaneos):
+        rng = random.Random(f"{semilla}-{i}")
+        escaneo, vouchers = componer_escaneo(rng, resolucion, **kwargs)
+        ruta = directorio / f"scan_{i:04d}.png"
+        escaneo.save(ruta)
+        with open(ruta.with_suffix('.json'), 'w', encoding='utf-8') as f:
+            json.dump({'resolucion': list(resolucion), 'vouchers': vouchers}, f, ensure_ascii=False, indent=4)
+        rutas.append(ruta)
+    return rutas
+
+def parsear_resolucion(valor: str) -> tuple[int, int]:
+    """Convierte '150dpi' o '1240x1754' en una tupla (ancho, alto)."""
+    if valor in RESOLUCIONES:
+        return RESOLUCIONES[valor]
+    ancho, alto = valor.lower().split('x')
+    return int(ancho), int(alto)
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera escaneos sintéticos con varios vouchers por imagen.")
+    parser.add_argument('--salida', required=True, help="Directorio de salida.")
+    parser.add_argument('--num', type=int, default=10, help="Número de escaneos a generar.")
+    parser.add_argument('--resolucion', default='150dpi',
+                        help=f"Resolución: {', '.join(RESOLUCIONES)} o ANCHOxALTO.")
+    parser.add_argument('--semilla', type=int, default=0, help="Semilla del generador.")
+    parser.add_argument('--min-vouchers', type=int, default=2)
+    parser.add_argument('--max-vouchers', type=int, default=5)
+    parser.add_argument('--max-rotacion', type=float, default=8.0, help="Rotación máxima en grados.")
+    parser.add_argument('--ruido', type=float, default=1.0, help="Intensidad del ruido del fondo.")
+    args = parser.parse_args()
+
+    rutas = generar_dataset(
+        args.salida, args.num, parsear_resolucion(args.resolucion), args.semilla,
+        num_vouchers=(args.min_vouchers, args.max_vouchers),
+        max_rotacion=args.max_rotacion,
+        ruido=args.ruido,
+    )
+    print(f"{len(rutas)} escaneos generados en {args.salida}")
+
+if __name__ == "__main__":
+    main()
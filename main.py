@@ -6,16 +6,59 @@ Este script carga la configuración, inicializa los componentes necesarios del p
 (segmentador, validador, extractor de OCR) a través de sus respectivas factory,
 inyecta estas dependencias en el `VoucherPipeline`, y luego ejecuta el pipeline.
 Incluye configuración de logging y manejo de errores a alto nivel.
+
+Con `--watch`, en lugar de procesar el directorio una sola vez, se mantiene en
+ejecución como daemon (`WatchFolderDaemon`) con los modelos cargados, procesando
+las nuevas imágenes a medida que llegan a 'vouchers_a_segmentar'.
 """
-import torch
+import signal
+import argparse
 from scr.pipeline.voucher_pipeline import VoucherPipeline
+from scr.pipeline.watcher import WatchFolderDaemon
+from scr.pipeline.results_writer import crear_escritor_resultados
 from scr.utils.config_loader import load_config
 from scr.segmentation.segmenter_factory import SegmenterFactory
 from scr.validation.validator_factory import ValidatorFactory
 from scr.ocr.ocr_extractor_factory import OCRExtractorFactory
 from scr.utils.logger import setup_logger
+from scr.utils.metrics import configurar_metricas
+
+def crear_componentes(config: dict, logger) -> tuple:
+    """
+    Crea el segmentador, el validador y el extractor de OCR configurados.
+
+    El dispositivo se pasa como texto (clave 'device' de settings.yml, por defecto "auto"):
+    solo los backends basados en torch lo resuelven, así que una configuración sin ellos
+    arranca sin importar torch.
+
+    Args:
+        config (dict): La configuración completa de settings.yml.
+        logger (logging.Logger): Logger de la aplicación.
+
+    Returns:
+        tuple: (segmenter, validator, ocr_extractor).
+    """
+    device = config.get('device', 'auto')
+    logger.debug(f"Dispositivo configurado: {device}")
+
+    logger.info("Inicializando componentes del pipeline...")
+    segmenter = SegmenterFactory.create_segmenter(config['segmentation'], device)
+    logger.debug(f"Instancia de Segmenter creada: {type(segmenter).__name__}")
+
+    validator = ValidatorFactory.create_validator(config['validation'], device)
+    logger.debug(f"Instancia de Validator creada: {type(validator).__name__}")
+
+    ocr_extractor = OCRExtractorFactory.create_ocr_extractor(config['ocr'])
+    logger.debug(f"Instancia de OCRExtractor creada: {type(ocr_extractor).__name__}")
+    logger.info("Componentes del pipeline inicializados correctamente.")
+    return segmenter, validator, ocr_extractor
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Pipeline de procesamiento de vouchers.")
+    parser.add_argument('--watch', action='store_true',
+                        help="Mantener los modelos cargados y procesar las nuevas imágenes de vouchers_a_segmentar a medida que llegan.")
+    args = parser.parse_args()
+
     # Cargar la configuración global de la aplicación.
     config = load_config('config/settings.yml') 
     
@@ -32,14 +75,11 @@ if __name__ == '__main__':
     try:
         # ----- INICIO DE LA LÓGICA PRINCIPAL QUE VA DENTRO DEL TRY -----
         
-        # Determinar el dispositivo (CPU o CUDA si está disponible).
-        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        logger.debug(f"Dispositivo seleccionado: {device}")
-        
         # Loguear información de configuración relevante.
         logger.info(f"Configuración de Segmentación - Modelo: {config.get('segmentation', {}).get('model_name')}")
         logger.info(f"Configuración de Validación - Checkpoint: {config.get('validation', {}).get('checkpoint')}")
         logger.info(f"Configuración de OCR - Método: {config.get('ocr', {}).get('method')}")
+        logger.info(f"Configuración del Pipeline - Modo: {config.get('pipeline', {}).get('mode', 'disk')}")
             
         # Preparar diccionario de directorios base.
         base_dirs = {
@@ -51,29 +91,47 @@ if __name__ == '__main__':
         } 
         logger.debug(f"Directorios base configurados: {base_dirs}")
 
+        # Configurar la instrumentación por etapas (desactivada por defecto).
+        metricas = configurar_metricas(config.get('metrics', {}))
+        logger.info(f"Métricas por etapa: {'activadas' if metricas.enabled else 'desactivadas'}")
+
         # Crear instancias de los componentes usando las factory.
-        logger.info("Inicializando componentes del pipeline...")
-        segmenter = SegmenterFactory.create_segmenter(config['segmentation'], device)
-        logger.debug(f"Instancia de Segmenter creada: {type(segmenter).__name__}")
-            
-        validator = ValidatorFactory.create_validator(config['validation'], device)
-        logger.debug(f"Instancia de Validator creada: {type(validator).__name__}")
+        segmenter, validator, ocr_extractor = crear_componentes(config, logger)
 
-        ocr_extractor = OCRExtractorFactory.create_ocr_extractor(config['ocr'])
-        logger.debug(f"Instancia de OCRExtractor creada: {type(ocr_extractor).__name__}")
-        logger.info("Componentes del pipeline inicializados correctamente.")
+        results_writer = crear_escritor_resultados(config.get('results', {}), base_dirs['outputs'])
+        logger.info(f"Resultados de OCR: {type(results_writer).__name__}")
 
         # Crear e iniciar el pipeline con las dependencias inyectadas.
         pipeline = VoucherPipeline(
             segmenter=segmenter,
             validator=validator,
             ocr_extractor=ocr_extractor,
-            base_dirs=base_dirs
+            base_dirs=base_dirs,
+            pipeline_config=config.get('pipeline', {}),
+            results_writer=results_writer
         )
             
-        logger.info("Iniciando VoucherPipeline.run()...")
-        pipeline.run()
-        logger.info("VoucherPipeline.run() ha finalizado.")
+        try:
+            if args.watch:
+                watch_config = config.get('watch', {}) or {}
+                daemon = WatchFolderDaemon(
+                    pipeline=pipeline,
+                    directorio=base_dirs['vouchers_a_segmentar'],
+                    poll_interval=watch_config.get('poll_interval', 2.0),
+                    settle_seconds=watch_config.get('settle_seconds', 3.0),
+                    process_existing=watch_config.get('process_existing', True),
+                    max_retries=watch_config.get('max_retries', 3)
+                )
+                signal.signal(signal.SIGTERM, lambda signum, frame: daemon.detener())
+                logger.info("Iniciando modo daemon (WatchFolderDaemon)...")
+                daemon.run()
+            else:
+                logger.info("Iniciando VoucherPipeline.run()...")
+                pipeline.run()
+                logger.info("VoucherPipeline.run() ha finalizado.")
+        finally:
+            pipeline.close()
+            ocr_extractor.close()
         # ----- FIN DE LA LÓGICA PRINCIPAL -----
             
     except FileNotFoundError as e:
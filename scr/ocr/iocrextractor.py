@@ -3,6 +3,7 @@
 Define la interfaz abstracta para los componentes de extracción de texto (OCR).
 """
 from abc import ABC, abstractmethod
+from typing import List
 from PIL import Image
 
 class IOCRExtractor(ABC):
@@ -11,8 +12,28 @@ class IOCRExtractor(ABC):
 
     Los extractores de OCR concretos deben implementar el método `extract` para
     procesar una imagen y devolver el texto contenido en ella.
+    Opcionalmente pueden sobrescribir `extract_many` para procesar varias imágenes
+    en paralelo y `close` para liberar los recursos asociados.
+    `OCRExtractorFactory` los construye con `from_config`.
     """
 
+    @classmethod
+    def from_config(cls, ocr_config: dict) -> "IOCRExtractor":
+        """
+        Construye el extractor a partir de la sección `ocr` de settings.yml.
+
+        La implementación por defecto pasa las claves de la configuración (excepto 'type')
+        como argumentos del constructor.
+
+        Args:
+            ocr_config (dict): Configuración del extractor de OCR.
+
+        Returns:
+            IOCRExtractor: La instancia construida.
+        """
+        params = {k: v for k, v in ocr_config.items() if k != 'type'}
+        return cls(**params)
+
     @abstractmethod
     def extract(self, image: Image.Image) -> str: # Usar Image.Image si PIL se importa solo como Image
         """
@@ -32,3 +53,25 @@ class IOCRExtractor(ABC):
             # falla o si la imagen de entrada es inválida.
         """
         pass
+
+    def extract_many(self, images: List[Image.Image]) -> List[str]:
+        """
+        Extrae texto de varias imágenes.
+
+        La implementación por defecto llama a `extract` secuencialmente para cada imagen.
+
+        Args:
+            images (List[Image.Image]): Las imágenes de las cuales extraer texto.
+
+        Returns:
+            List[str]: El texto extraído de cada imagen, en el mismo orden que `images`.
+        """
+        return [self.extract(image) for image in images]
+
+    def close(self) -> None:
+        """
+        Libera los recursos asociados al extractor (pools de procesos, clientes, etc.).
+
+        La implementación por defecto no hace nada.
+        """
+        pass
@@ -4,47 +4,56 @@ Módulo que define la factory para crear instancias de extractores de OCR.
 """
 import logging
 from scr.ocr.iocrextractor import IOCRExtractor
-from scr.ocr.voucher_ocr import OCRExtractor
+from scr.utils.registry import BackendRegistry
+
+# Extractores de OCR disponibles. `OCRExtractor` gestiona internamente varios motores
+# e importa las dependencias de cada uno (pytesseract, tesserocr, transformers, boto3)
+# solo cuando se selecciona.
+EXTRACTORES_OCR = BackendRegistry("extractor de OCR")
+EXTRACTORES_OCR.registrar('ocr_extractor', 'scr.ocr.voucher_ocr:OCRExtractor')
 
 class OCRExtractorFactory:
     """
     Factory encargada de crear instancias de componentes que implementan `IOCRExtractor`.
 
-    Actualmente, crea instancias de la clase `OCRExtractor`, la cual internamente
-    gestiona diferentes motores de OCR (Tesseract, Donut, Textract) basados en la
-    configuración proporcionada.
+    El extractor se elige con la clave 'type' de la configuración (por defecto
+    "ocr_extractor", la clase `OCRExtractor`, que gestiona los motores Tesseract,
+    tesserocr, Donut y Textract según 'method'). También se acepta una ruta
+    "paquete.modulo:Clase" de una implementación externa.
     """
     @staticmethod
     def create_ocr_extractor(ocr_config: dict) -> IOCRExtractor:
         """
         Crea y devuelve una instancia de un extractor de OCR.
 
-        La configuración `ocr_config` debe contener la clave 'method' para determinar
-        la estrategia de OCR que `OCRExtractor` utilizará.
+        Para `OCRExtractor`, la configuración `ocr_config` debe contener la clave 'method'
+        para determinar la estrategia de OCR que utilizará.
 
         Args:
             ocr_config (dict): Un diccionario con la configuración para el extractor de OCR.
                                Debe contener la clave 'method' (ej. "tesseract", "donut", "textract")
                                y, opcionalmente, otras configuraciones específicas del método
-                               (ej. 'donut_model' si `OCRExtractor` no lo carga de settings.yml).
+                               (ej. 'donut_model', 'workers' y 'omp_thread_limit' para el pool de Tesseract).
 
         Returns:
-            IOCRExtractor: Una instancia de `OCRExtractor` configurada con el método especificado.
+            IOCRExtractor: Una instancia del extractor configurado.
 
         Raises:
             KeyError: Si falta la clave 'method' en `ocr_config`.
+            ValueError: Si se especifica un tipo de extractor no soportado.
+            ImportError: Si las dependencias del extractor seleccionado no están instaladas.
             # Otras excepciones pueden surgir de la creación de `OCRExtractor` si la configuración
             # del método o modelo específico es incorrecta (ej. modelo Donut no encontrado).
         """
         logger = logging.getLogger(OCRExtractorFactory.__name__)
-        logger.debug(
-            f"Creando OCRExtractor con configuración: method='{ocr_config.get('method')}'"
-        )
-        
-        instance = OCRExtractor(
-            method=ocr_config['method']
-            # donut_model es manejado internamente por OCRExtractor basado en settings.yml
-            # si no se pasa explícitamente y method es 'donut'.
-        )
-        logger.info(f"Instancia de OCRExtractor creada exitosamente con método: {ocr_config.get('method')}.")
+        extractor_type = ocr_config.get('type', 'ocr_extractor')
+        logger.debug(f"Creando extractor de OCR '{extractor_type}' con configuración: {ocr_config}")
+
+        try:
+            clase = EXTRACTORES_OCR.obtener(extractor_type)
+        except ValueError:
+            logger.error(f"Tipo de extractor de OCR no soportado: {extractor_type}")
+            raise
+        instance = clase.from_config(ocr_config)
+        logger.info(f"Instancia de {type(instance).__name__} creada exitosamente con método: {ocr_config.get('method')}.")
         return instance
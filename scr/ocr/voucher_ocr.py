@@ -1,21 +1,79 @@
 #scr/ocr/voucher_ocr.py
 """
 Implementación de un extractor de texto OCR (`IOCRExtractor`) que puede utilizar
-diferentes motores de OCR como estrategias (Tesseract, Donut, AWS Textract).
+diferentes motores de OCR como estrategias (Tesseract, Tesseract en proceso mediante
+tesserocr, Donut, AWS Textract).
 
 La selección del motor de OCR se realiza durante la instanciación de la clase.
 También incluye utilidades de preprocesamiento de imágenes para OCR.
+
+Las dependencias de cada motor (pytesseract, tesserocr, transformers, boto3) y OpenCV
+se importan de forma perezosa, solo cuando el método seleccionado las necesita, para
+no pagar su tiempo de importación ni su memoria en ejecuciones que no las usan.
 """
 import io
-import cv2
-import boto3
-import pytesseract
+import os
+import time
+import threading
+import importlib
+import multiprocessing
 import numpy as np
 from PIL import Image
-from transformers import DonutProcessor, VisionEncoderDecoderModel
+from typing import List
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import logging
 from scr.utils.config_loader import load_config
 from scr.ocr.iocrextractor import IOCRExtractor
+from scr.utils.metrics import obtener_metricas
+
+TESSERACT_CONFIG = '--oem 3 --psm 6'
+
+def _importar(modulo: str, method: str):
+    """
+    Importa el módulo de un motor de OCR la primera vez que se necesita.
+
+    Raises:
+        ImportError: Si el paquete no está instalado, indicando el método que lo requiere.
+    """
+    try:
+        return importlib.import_module(modulo)
+    except ImportError as e:
+        raise ImportError(f"El método '{method}' requiere el paquete '{modulo}', que no está instalado.") from e
+
+def _inicializar_worker_tesseract(omp_thread_limit: int) -> None:
+    """
+    Inicializa un proceso worker del pool de Tesseract.
+
+    Limita los hilos OpenMP que usa cada subproceso de `tesseract` lanzado desde este
+    worker, para que el total de hilos (workers × hilos) no sobresuscriba los núcleos.
+    """
+    os.environ['OMP_THREAD_LIMIT'] = str(omp_thread_limit)
+
+def _ocr_tesseract(image: Image.Image) -> tuple[str, float, float]:
+    """
+    Preprocesa una imagen con `OCRExtractor.preprocesar_imagen` y le aplica Tesseract.
+
+    Es una función de módulo para poder ejecutarse en los procesos del pool. Devuelve
+    también los tiempos de cada paso, ya que las métricas registradas en un proceso
+    worker no serían visibles desde el proceso principal.
+
+    Returns:
+        tuple[str, float, float]: El texto extraído, los segundos de preprocesamiento
+                                  y los segundos del motor de OCR.
+    """
+    inicio = time.perf_counter()
+    img_proc = OCRExtractor.preprocesar_imagen(image)
+    medio = time.perf_counter()
+    texto = _importar('pytesseract', 'tesseract').image_to_string(img_proc, config=TESSERACT_CONFIG)
+    return texto, medio - inicio, time.perf_counter() - medio
+
+def _registrar_tiempos_ocr(resultado: tuple[str, float, float]) -> str:
+    """Registra en las métricas los tiempos de un resultado de OCR y devuelve su texto."""
+    texto, t_preprocesamiento, t_motor = resultado
+    metricas = obtener_metricas()
+    metricas.observar("ocr_preprocesamiento", t_preprocesamiento)
+    metricas.observar("ocr_motor", t_motor)
+    return texto
 
 class OCRExtractor(IOCRExtractor):
     """
@@ -23,40 +81,93 @@ class OCRExtractor(IOCRExtractor):
     estrategias/motores de OCR.
 
     Al inicializarse, se configura para usar un método de OCR específico
-    (Tesseract, Donut, o AWS Textract). Carga los modelos o clientes necesarios
+    (Tesseract, tesserocr, Donut, o AWS Textract). Carga los modelos o clientes necesarios
     para el método seleccionado.
+
+    El método "tesserocr" usa el binding en proceso de Tesseract: cada hilo mantiene
+    un motor de larga duración con el modelo ya cargado, evitando lanzar un subproceso
+    `tesseract` (y recargar los traineddata) por cada segmento.
     """
-    def __init__(self, method: str = 'tesseract', donut_model: str | None = None): # Python 3.10+ type hint
+    def __init__(self, method: str = 'tesseract', donut_model: str | None = None,
+                 workers: int | None = None, omp_thread_limit: int | None = None): # Python 3.10+ type hint
         """
         Inicializa el OCRExtractor con el método de OCR especificado.
 
         Args:
             method (str, optional): El método de OCR a utilizar.
-                Opciones válidas: "tesseract", "donut", "textract".
+                Opciones válidas: "tesseract", "tesserocr", "donut", "textract".
                 Defaults to 'tesseract'.
             donut_model (str | None, optional): Nombre o ruta del modelo Donut a utilizar si `method` es "donut".
                 Si es `None` y `method` es "donut", se intentará cargar desde la configuración
                 en `config/settings.yaml` bajo `ocr.donut_model`.
                 Defaults to None.
+            workers (int | None, optional): Número de procesos (método "tesseract") o hilos
+                (método "tesserocr") usados por `extract_many`. Si es None, se usa el número
+                de núcleos disponibles. Con 1, `extract_many` se ejecuta de forma secuencial.
+                Defaults to None.
+            omp_thread_limit (int | None, optional): Valor de `OMP_THREAD_LIMIT` para los
+                motores de Tesseract (subprocesos del pool o motores en proceso). Si es None,
+                se reparte el número de núcleos entre los workers (mínimo 1 hilo por worker).
+                Defaults to None.
         """
         self.method = method
         self.logger = logging.getLogger(self.__class__.__name__)
         
         self.logger.info(f"OCRExtractor inicializado con método: {self.method}")
+
+        num_cpus = os.cpu_count() or 1
+        self.workers = max(1, workers or num_cpus)
+        self.omp_thread_limit = max(1, omp_thread_limit or num_cpus // self.workers)
+        self._pool: ProcessPoolExecutor | ThreadPoolExecutor | None = None # Se crea de forma perezosa en `extract_many`
         
         self.loaded_donut_model_name: str | None = None # Para almacenar el nombre del modelo Donut si se carga
 
         if method == 'donut':
             cfg = load_config('config/settings.yaml')
             self.loaded_donut_model_name = donut_model or cfg['ocr']['donut_model'] 
-            self.processor = DonutProcessor.from_pretrained(self.loaded_donut_model_name)
-            self.model = VisionEncoderDecoderModel.from_pretrained(self.loaded_donut_model_name)
+            transformers = _importar('transformers', 'donut')
+            self.processor = transformers.DonutProcessor.from_pretrained(self.loaded_donut_model_name)
+            self.model = transformers.VisionEncoderDecoderModel.from_pretrained(self.loaded_donut_model_name)
             self.logger.info(f"Usando modelo Donut: {self.loaded_donut_model_name}")
         elif method == 'textract':
-            self.textract = boto3.client('textract')
+            self.textract = _importar('boto3', 'textract').client('textract')
             self.logger.info("Cliente AWS Textract inicializado.")
         elif self.method == 'tesseract':
+            _importar('pytesseract', 'tesseract') # Falla al construir, no en el primer segmento
             self.logger.info("Usando Tesseract OCR.")
+            self.logger.debug(f"Pool de Tesseract: {self.workers} workers, OMP_THREAD_LIMIT={self.omp_thread_limit}")
+        elif self.method == 'tesserocr':
+            # OpenMP lee OMP_THREAD_LIMIT al inicializarse la librería, por lo que debe
+            # fijarse antes de importar tesserocr. Se respeta un valor ya definido.
+            os.environ.setdefault('OMP_THREAD_LIMIT', str(self.omp_thread_limit))
+            try:
+                self._tesserocr = _importar('tesserocr', 'tesserocr')
+            except ImportError:
+                self.logger.error("El método 'tesserocr' requiere el paquete 'tesserocr' (pip install tesserocr).")
+                raise
+            self._motores_locales = threading.local()
+            self._motores: list = [] # Todos los motores creados, para liberarlos en `close`
+            self._motores_lock = threading.Lock()
+            self.logger.info("Usando Tesseract en proceso (tesserocr).")
+
+    @classmethod
+    def from_config(cls, ocr_config: dict) -> "OCRExtractor":
+        """
+        Construye el extractor a partir de la sección `ocr` de settings.yml.
+
+        Args:
+            ocr_config (dict): Clave 'method' y opcionalmente 'donut_model', 'workers'
+                y 'omp_thread_limit'.
+
+        Raises:
+            KeyError: Si falta la clave 'method'.
+        """
+        return cls(
+            method=ocr_config['method'],
+            donut_model=ocr_config.get('donut_model'),
+            workers=ocr_config.get('workers'),
+            omp_thread_limit=ocr_config.get('omp_thread_limit')
+        )
 
     @staticmethod
     def preprocesar_imagen(image: Image.Image) -> Image.Image:
@@ -73,6 +184,7 @@ class OCRExtractor(IOCRExtractor):
         Returns:
             Image.Image: La imagen preprocesada (en formato PIL y binarizada).
         """
+        cv2 = _importar('cv2', 'tesseract')
         arr = np.array(image.convert('RGB'))
         gris = cv2.cvtColor(arr, cv2.COLOR_RGB2GRAY)
         _, binaria = cv2.threshold(gris, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
@@ -100,11 +212,16 @@ class OCRExtractor(IOCRExtractor):
         
         if self.method == 'tesseract':
             self.logger.debug("Procesando con Tesseract...")
-            img_proc = OCRExtractor.preprocesar_imagen(image)
-            texto_extraido = pytesseract.image_to_string(img_proc, config = '--oem 3 --psm 6')
+            texto_extraido = _registrar_tiempos_ocr(_ocr_tesseract(image))
             self.logger.info(f"Tesseract OCR completado. Texto extraído (primeros 50 caracteres): '{texto_extraido[:50]}...'")
             return texto_extraido
         
+        elif self.method == 'tesserocr':
+            self.logger.debug("Procesando con Tesseract en proceso (tesserocr)...")
+            texto_extraido = _registrar_tiempos_ocr(self._ocr_tesserocr(image))
+            self.logger.info(f"Tesseract OCR completado. Texto extraído (primeros 50 caracteres): '{texto_extraido[:50]}...'")
+            return texto_extraido
+
         elif self.method == 'donut':
             self.logger.debug("Procesando con Donut...")
             prompt  = "<s_cord-v2>" #tablas de voucher
@@ -115,6 +232,7 @@ class OCRExtractor(IOCRExtractor):
                                 ).input_ids.to(self.model.device)
             inputs = self.processor(image, return_tensors="pt")
             pixel_values = inputs.pixel_values.to(self.model.device)
+            inicio = time.perf_counter()
             
             # Usar max_length del modelo si está disponible, de lo contrario un valor por defecto razonable
             # El uso de decoder_start_token_id como max_length es inusual y podría ser un error.
@@ -132,6 +250,7 @@ class OCRExtractor(IOCRExtractor):
                         eos_token_id=self.processor.tokenizer.eos_token_id
                         )
             sequence = self.processor.batch_decode(outputs, skip_special_tokens=True)[0]
+            obtener_metricas().observar("ocr_motor", time.perf_counter() - inicio)
             self.logger.info(f"Donut OCR completado. Texto extraído (primeros 50 caracteres): '{sequence[:50]}...'")
             return sequence
         
@@ -140,9 +259,10 @@ class OCRExtractor(IOCRExtractor):
             buf = io.BytesIO()
             image.convert('RGB').save(buf, format='JPEG')
             buf.seek(0)
-            response = self.textract.detect_document_text(
-                Document={'Bytes': buf.read()}
-            )
+            with obtener_metricas().medir("ocr_motor"):
+                response = self.textract.detect_document_text(
+                    Document={'Bytes': buf.read()}
+                )
             lines = [item['Text'] for item in response.get('Blocks', []) if item['BlockType'] == 'LINE']
             texto_final = ' '.join(lines)
             self.logger.info(f"AWS Textract OCR completado. Texto extraído (primeros 50 caracteres): '{texto_final[:50]}...'")
@@ -150,3 +270,104 @@ class OCRExtractor(IOCRExtractor):
         else:
             self.logger.error(f"Método OCR no soportado intentado: {self.method}")
             raise ValueError(f"Método OCR no soportado: {self.method}")
+
+    def _obtener_motor_tesserocr(self):
+        """
+        Devuelve el motor tesserocr del hilo actual, creándolo en el primer uso.
+
+        El motor se configura con la misma semántica que `TESSERACT_CONFIG`
+        (`--oem 3 --psm 6`): OEM por defecto y página como un único bloque de texto.
+        """
+        motor = getattr(self._motores_locales, 'motor', None)
+        if motor is None:
+            motor = self._tesserocr.PyTessBaseAPI(
+                psm=self._tesserocr.PSM.SINGLE_BLOCK, # --psm 6
+                oem=self._tesserocr.OEM.DEFAULT       # --oem 3
+            )
+            self._motores_locales.motor = motor
+            with self._motores_lock:
+                self._motores.append(motor)
+            self.logger.debug(f"Motor tesserocr creado para el hilo {threading.current_thread().name}.")
+        return motor
+
+    def _ocr_tesserocr(self, image: Image.Image) -> tuple[str, float, float]:
+        """
+        Preprocesa una imagen con `preprocesar_imagen` y la reconoce con el motor tesserocr del hilo actual.
+
+        Returns:
+            tuple[str, float, float]: Igual que `_ocr_tesseract`: texto y tiempos de cada paso.
+        """
+        motor = self._obtener_motor_tesserocr()
+        inicio = time.perf_counter()
+        img_proc = OCRExtractor.preprocesar_imagen(image)
+        medio = time.perf_counter()
+        motor.SetImage(img_proc)
+        texto = motor.GetUTF8Text()
+        return texto, medio - inicio, time.perf_counter() - medio
+
+    def _obtener_pool(self) -> ProcessPoolExecutor | ThreadPoolExecutor:
+        """
+        Devuelve el pool de workers de Tesseract, creándolo en el primer uso.
+
+        Para "tesseract" es un pool de procesos con contexto 'spawn', para que los
+        workers no hereden el estado (hilos, modelos cargados) del proceso principal.
+        Para "tesserocr" es un pool de hilos, cada uno con su propio motor en proceso
+        (tesserocr libera el GIL durante el reconocimiento).
+        """
+        if self._pool is None and self.method == 'tesserocr':
+            self.logger.info(f"Iniciando pool de tesserocr con {self.workers} hilos.")
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="tesserocr")
+        elif self._pool is None:
+            self.logger.info(
+                f"Iniciando pool de Tesseract con {self.workers} procesos (OMP_THREAD_LIMIT={self.omp_thread_limit})."
+            )
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_inicializar_worker_tesseract,
+                initargs=(self.omp_thread_limit,)
+            )
+        return self._pool
+
+    def extract_many(self, images: List[Image.Image]) -> List[str]:
+        """
+        Extrae texto de varias imágenes.
+
+        Con Tesseract y más de un worker, el preprocesamiento (`preprocesar_imagen`) y el
+        OCR de cada imagen se ejecutan en paralelo en un pool de procesos ("tesseract")
+        o de hilos con motores en proceso ("tesserocr"). Para el resto de métodos, o con
+        un único worker, se procesa secuencialmente con `extract`.
+
+        Args:
+            images (List[Image.Image]): Las imágenes (en formato PIL) de las cuales extraer texto.
+
+        Returns:
+            List[str]: El texto extraído de cada imagen, en el mismo orden que `images`.
+
+        Raises:
+            ValueError: Si el `method` de OCR configurado no es soportado.
+            # Otras excepciones pueden ser propagadas por los motores de OCR subyacentes.
+        """
+        if self.method not in ('tesseract', 'tesserocr') or self.workers == 1 or len(images) <= 1:
+            return [self.extract(image) for image in images]
+
+        self.logger.debug(f"Procesando {len(images)} imágenes con el pool de Tesseract...")
+        funcion_ocr = self._ocr_tesserocr if self.method == 'tesserocr' else _ocr_tesseract
+        textos = [_registrar_tiempos_ocr(resultado) for resultado in self._obtener_pool().map(funcion_ocr, images)]
+        self.logger.info(f"Tesseract OCR en paralelo completado para {len(textos)} imágenes.")
+        return textos
+
+    def close(self) -> None:
+        """
+        Cierra el pool de workers de Tesseract si fue creado y libera los motores tesserocr.
+        """
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+            self.logger.debug("Pool de Tesseract cerrado.")
+        if self.method == 'tesserocr':
+            with self._motores_lock:
+                for motor in self._motores:
+                    motor.End()
+                self._motores.clear()
+            self._motores_locales = threading.local()
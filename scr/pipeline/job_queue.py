@@ -0,0 +1,317 @@
+#scr/pipeline/job_queue.py
+"""
+Módulo que define una cola de trabajos persistente respaldada por SQLite.
+
+Cada imagen de entrada y cada uno de sus segmentos recorren las etapas
+segmentación → validación → OCR como trabajos independientes. Los trabajos se
+reclaman con un lease (arrendamiento) de duración limitada: si un worker muere,
+su lease expira y otro worker lo retoma; cada reclamación cuenta como un intento
+y, al agotar `max_intentos`, el trabajo queda como fallido.
+
+Varios procesos locales (o máquinas que comparten el sistema de archivos) pueden
+trabajar sobre la misma base de datos: la reclamación se hace en una transacción
+`BEGIN IMMEDIATE`, que serializa a los escritores.
+"""
+import os
+import json
+import time
+import socket
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from typing import NamedTuple, Union
+
+ETAPAS = ('segmentacion', 'validacion', 'ocr')
+# Orden en que se reclama el trabajo: primero las etapas finales, para vaciar el
+# pipeline y limitar los segmentos intermedios pendientes en disco.
+PRIORIDAD_ETAPAS = ('ocr', 'validacion', 'segmentacion')
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS trabajos (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    etapa       TEXT NOT NULL,
+    huella      TEXT NOT NULL,
+    indice      INTEGER NOT NULL DEFAULT -1,
+    estado      TEXT NOT NULL DEFAULT 'pendiente',
+    datos       TEXT NOT NULL DEFAULT '{}',
+    intentos    INTEGER NOT NULL DEFAULT 0,
+    lease_hasta REAL,
+    worker      TEXT,
+    error       TEXT,
+    actualizado REAL NOT NULL,
+    UNIQUE (etapa, huella, indice)
+);
+CREATE INDEX IF NOT EXISTS idx_trabajos_estado ON trabajos (estado, etapa, lease_hasta);
+"""
+
+class Trabajo(NamedTuple):
+    """Un trabajo reclamado por un worker."""
+    id: int
+    etapa: str        # 'segmentacion', 'validacion' u 'ocr'
+    huella: str       # Huella del contenido de la imagen de entrada
+    indice: int       # Índice del segmento (-1 para la segmentación de la imagen completa)
+    datos: dict       # Datos de la etapa (rutas, nombres, probabilidad, ...)
+    intentos: int
+
+class SQLiteJobQueue:
+    """
+    Cola de trabajos en SQLite con leases y reintentos, segura entre procesos.
+
+    Cada proceso abre su propia conexión en el primer uso (las conexiones de SQLite
+    no deben compartirse a través de un fork), de modo que una instancia creada antes
+    de lanzar los workers puede usarse directamente en cada uno de ellos.
+    """
+    def __init__(self, ruta: Union[str, Path], lease_seconds: float = 600.0,
+                 max_intentos: int = 3, journal_mode: str = 'wal'):
+        """
+        Inicializa la cola y crea el esquema si no existe.
+
+        Args:
+            ruta (Union[str, Path]): Ruta del archivo de la base de datos.
+            lease_seconds (float, optional): Duración del lease de un trabajo reclamado. Con
+                `mantener_leases` se renueva mientras el worker procesa el lote, así que solo
+                determina cuánto tarda en retomarse el trabajo de un worker muerto. Defaults to 600.0.
+            max_intentos (int, optional): Reclamaciones máximas de un trabajo antes de
+                marcarlo como fallido. Defaults to 3.
+            journal_mode (str, optional): Modo de journal de SQLite. "wal" permite lectores
+                concurrentes con un escritor, pero requiere memoria compartida y no funciona
+                sobre sistemas de archivos de red; para máquinas que comparten la base de
+                datos por NFS/SMB debe usarse "delete". Defaults to 'wal'.
+        """
+        self.ruta = Path(ruta)
+        self.lease_seconds = lease_seconds
+        self.max_intentos = max(1, max_intentos)
+        self.journal_mode = journal_mode
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._conexion: sqlite3.Connection | None = None
+        self._pid: int | None = None
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+        self._conectar().executescript(_ESQUEMA)
+        self.logger.info(f"Cola de trabajos SQLite en {self.ruta} (journal_mode={journal_mode}, lease={lease_seconds}s).")
+
+    def _nueva_conexion(self) -> sqlite3.Connection:
+        """Abre una conexión nueva a la base de datos."""
+        # isolation_level=None: las transacciones se controlan explícitamente
+        conexion = sqlite3.connect(self.ruta, timeout=60.0, isolation_level=None, check_same_thread=False)
+        conexion.execute(f"PRAGMA journal_mode={self.journal_mode}")
+        conexion.execute("PRAGMA synchronous=NORMAL")
+        conexion.execute("PRAGMA busy_timeout=60000")
+        return conexion
+
+    def _conectar(self) -> sqlite3.Connection:
+        """Devuelve la conexión del proceso actual, abriéndola si es necesario."""
+        if self._conexion is None or self._pid != os.getpid():
+            self._conexion, self._pid = self._nueva_conexion(), os.getpid()
+        return self._conexion
+
+    @staticmethod
+    def id_worker() -> str:
+        """Identificador del worker actual: '<host>:<pid>'."""
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def encolar_imagenes(self, imagenes: dict[str, Union[str, Path]]) -> int:
+        """
+        Encola la segmentación de imágenes de entrada.
+
+        Las imágenes se identifican por la huella de su contenido, de modo que una imagen
+        ya encolada (aunque se haya renombrado) no se vuelve a procesar.
+
+        Args:
+            imagenes (dict[str, Union[str, Path]]): Huella del contenido -> ruta de la imagen.
+
+        Returns:
+            int: Número de imágenes nuevas encoladas.
+        """
+        ahora = time.time()
+        conexion = self._conectar()
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            antes = conexion.total_changes
+            conexion.executemany(
+                "INSERT OR IGNORE INTO trabajos (etapa, huella, indice, datos, actualizado) VALUES ('segmentacion', ?, -1, ?, ?)",
+                [(huella, json.dumps({'imagen': str(ruta)}), ahora) for huella, ruta in imagenes.items()]
+            )
+            nuevas = conexion.total_changes - antes
+            conexion.execute("COMMIT")
+        except BaseException:
+            conexion.execute("ROLLBACK")
+            raise
+        return nuevas
+
+    def reclamar(self, worker: str, limites: dict[str, int]) -> list[Trabajo]:
+        """
+        Reclama un lote de trabajos disponibles de una misma etapa.
+
+        Un trabajo está disponible si está pendiente o si su lease expiró. Se elige la
+        primera etapa con trabajo según `PRIORIDAD_ETAPAS`. Los trabajos con lease
+        expirado que ya agotaron sus intentos se marcan como fallidos.
+
+        Args:
+            worker (str): Identificador del worker que reclama.
+            limites (dict[str, int]): Tamaño máximo del lote por etapa.
+
+        Returns:
+            list[Trabajo]: Los trabajos reclamados (vacía si no hay trabajo disponible).
+        """
+        ahora = time.time()
+        conexion = self._conectar()
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            conexion.execute(
+                "UPDATE trabajos SET estado = 'fallido', error = COALESCE(error, 'lease expirado'), actualizado = ? "
+                "WHERE estado = 'en_curso' AND lease_hasta < ? AND intentos >= ?",
+                (ahora, ahora, self.max_intentos)
+            )
+            filas = []
+            for etapa in PRIORIDAD_ETAPAS:
+                filas = conexion.execute(
+                    "SELECT id, etapa, huella, indice, datos, intentos FROM trabajos "
+                    "WHERE etapa = ? AND (estado = 'pendiente' OR (estado = 'en_curso' AND lease_hasta < ?)) "
+                    "ORDER BY id LIMIT ?",
+                    (etapa, ahora, max(1, limites.get(etapa, 1)))
+                ).fetchall()
+                if filas:
+                    break
+            conexion.executemany(
+                "UPDATE trabajos SET estado = 'en_curso', worker = ?, lease_hasta = ?, intentos = intentos + 1, actualizado = ? WHERE id = ?",
+                [(worker, ahora + self.lease_seconds, ahora, fila[0]) for fila in filas]
+            )
+            conexion.execute("COMMIT")
+        except BaseException:
+            conexion.execute("ROLLBACK")
+            raise
+        return [Trabajo(id_, etapa, huella, indice, json.loads(datos), intentos + 1)
+                for id_, etapa, huella, indice, datos, intentos in filas]
+
+    def completar(self, trabajo: Trabajo, worker: str, siguientes: list[tuple[str, int, dict]] = ()) -> bool:
+        """
+        Marca un trabajo como completado y encola, en la misma transacción, los de la etapa siguiente.
+
+        Si el lease del trabajo pasó a otro worker (expiró y fue reclamado de nuevo), el
+        resultado se descarta para no duplicar los trabajos siguientes.
+
+        Args:
+            trabajo (Trabajo): El trabajo completado.
+            worker (str): Identificador del worker que lo reclamó.
+            siguientes (list[tuple[str, int, dict]], optional): Trabajos a encolar como
+                (etapa, indice, datos), con la misma huella. Defaults to ().
+
+        Returns:
+            bool: False si el trabajo ya no pertenecía a `worker`.
+        """
+        ahora = time.time()
+        conexion = self._conectar()
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conexion.execute(
+                "UPDATE trabajos SET estado = 'completado', lease_hasta = NULL, error = NULL, actualizado = ? "
+                "WHERE id = ? AND worker = ? AND estado = 'en_curso'",
+                (ahora, trabajo.id, worker)
+            )
+            if cursor.rowcount == 0:
+                conexion.execute("ROLLBACK")
+                self.logger.warning(f"El trabajo {trabajo.id} ({trabajo.etapa}) ya no pertenece a {worker}; se descarta su resultado.")
+                return False
+            conexion.executemany(
+                "INSERT OR IGNORE INTO trabajos (etapa, huella, indice, datos, actualizado) VALUES (?, ?, ?, ?, ?)",
+                [(etapa, trabajo.huella, indice, json.dumps(datos), ahora) for etapa, indice, datos in siguientes]
+            )
+            conexion.execute("COMMIT")
+        except BaseException:
+            conexion.execute("ROLLBACK")
+            raise
+        return True
+
+    def fallar(self, trabajo: Trabajo, worker: str, error: str) -> None:
+        """
+        Libera un trabajo tras un error: vuelve a quedar pendiente o, si agotó sus intentos, fallido.
+        """
+        estado = 'fallido' if trabajo.intentos >= self.max_intentos else 'pendiente'
+        conexion = self._conectar()
+        conexion.execute(
+            "UPDATE trabajos SET estado = ?, lease_hasta = NULL, error = ?, actualizado = ? "
+            "WHERE id = ? AND worker = ? AND estado = 'en_curso'",
+            (estado, error[:1000], time.time(), trabajo.id, worker)
+        )
+        self.logger.log(
+            logging.ERROR if estado == 'fallido' else logging.WARNING,
+            f"Trabajo {trabajo.id} ({trabajo.etapa}) falló en el intento {trabajo.intentos}/{self.max_intentos}: {error}"
+        )
+
+    def renovar(self, trabajos: list[Trabajo], worker: str, conexion: sqlite3.Connection | None = None) -> None:
+        """
+        Extiende el lease de trabajos en curso (para lotes que tardan más de lo previsto).
+
+        Args:
+            trabajos (list[Trabajo]): Trabajos reclamados por `worker`.
+            worker (str): Identificador del worker; no se renuevan los leases de otro worker.
+            conexion (sqlite3.Connection | None, optional): Conexión a usar. Si es None, se usa
+                la del proceso actual. Defaults to None.
+        """
+        ahora = time.time()
+        (conexion or self._conectar()).executemany(
+            "UPDATE trabajos SET lease_hasta = ?, actualizado = ? WHERE id = ? AND worker = ? AND estado = 'en_curso'",
+            [(ahora + self.lease_seconds, ahora, t.id, worker) for t in trabajos]
+        )
+
+    @contextmanager
+    def mantener_leases(self, trabajos: list[Trabajo], worker: str):
+        """
+        Renueva el lease de `trabajos` desde un hilo mientras dura el bloque `with`.
+
+        El hilo renueva cada tercio de `lease_seconds` con su propia conexión (la del proceso
+        puede estar dentro de una transacción), de modo que un lote más lento que el lease no
+        se reclama de nuevo mientras su worker sigue vivo. Si el proceso muere, el hilo muere
+        con él y el lease expira como siempre.
+
+        Args:
+            trabajos (list[Trabajo]): Trabajos reclamados por `worker`.
+            worker (str): Identificador del worker.
+        """
+        detener = threading.Event()
+
+        def latido():
+            conexion = None
+            try:
+                while not detener.wait(self.lease_seconds / 3):
+                    try:
+                        if conexion is None:
+                            conexion = self._nueva_conexion()
+                        self.renovar(trabajos, worker, conexion)
+                    except sqlite3.Error as e:
+                        self.logger.warning(f"No se pudo renovar el lease de {len(trabajos)} trabajos: {e}")
+            finally:
+                if conexion is not None:
+                    conexion.close()
+
+        hilo = threading.Thread(target=latido, name="renovar-leases", daemon=True)
+        hilo.start()
+        try:
+            yield
+        finally:
+            detener.set()
+            hilo.join()
+
+    def hay_trabajo_activo(self) -> bool:
+        """True si quedan trabajos pendientes o en curso (de cualquier worker)."""
+        fila = self._conectar().execute(
+            "SELECT 1 FROM trabajos WHERE estado IN ('pendiente', 'en_curso') LIMIT 1"
+        ).fetchone()
+        return fila is not None
+
+    def resumen(self) -> dict[str, dict[str, int]]:
+        """Número de trabajos por etapa y estado."""
+        resumen: dict[str, dict[str, int]] = {etapa: {} for etapa in ETAPAS}
+        for etapa, estado, n in self._conectar().execute(
+            "SELECT etapa, estado, COUNT(*) FROM trabajos GROUP BY etapa, estado"
+        ):
+            resumen.setdefault(etapa, {})[estado] = n
+        return resumen
+
+    def close(self) -> None:
+        """Cierra la conexión del proceso actual."""
+        if self._conexion is not None and self._pid == os.getpid():
+            self._conexion.close()
+        self._conexion = None
@@ -0,0 +1,252 @@
+#scr/pipeline/manifest.py
+"""
+Módulo que define el manifiesto de entradas procesadas por el pipeline.
+
+El manifiesto registra, para cada imagen de entrada identificada por la huella de
+su contenido, qué etapas (segmentación, validación, OCR) se completaron y dónde
+están sus salidas. Permite que ejecuciones posteriores omitan las entradas sin
+cambios y calculen solo las etapas que faltan, reutilizando las imágenes de los
+segmentos guardadas en lugar de volver a segmentar.
+"""
+import json
+import os
+import time
+import logging
+import threading
+from pathlib import Path
+from typing import Union
+
+class ProcessingManifest:
+    """
+    Manifiesto persistente (JSON) de entradas procesadas, indexado por huella de contenido.
+
+    Estructura de cada entrada:
+
+        {
+            "archivo": "<nombre del archivo de entrada>",
+            "num_segmentos": <int, o null si la segmentación no terminó>,
+            "segmentos": {
+                "<idx>": {"nombre": ..., "validado": bool, "probabilidad": float | null,
+                          "imagen": ruta | null, "bbox": [x, y, ancho, alto] | null,
+                          "ocr": ruta | null}
+            }
+        }
+
+    El OCR de un segmento se da por hecho si su resultado existe: el archivo JSON propio
+    del segmento o, si los resultados van a un archivo JSONL compartido, un registro con
+    su huella e índice en ese archivo.
+
+    Los métodos son seguros para usarse desde varios hilos. Las modificaciones se
+    mantienen en memoria y se escriben a disco con `guardar`, de forma atómica.
+    """
+    VERSION = 1
+
+    def __init__(self, ruta: Union[str, Path], intervalo_guardado: float = 5.0):
+        """
+        Inicializa el manifiesto, cargándolo desde disco si ya existe.
+
+        Args:
+            ruta (Union[str, Path]): Ruta del archivo JSON del manifiesto.
+            intervalo_guardado (float, optional): Segundos mínimos entre dos escrituras
+                a disco no forzadas (ver `guardar`). Defaults to 5.0.
+        """
+        self.ruta = Path(ruta)
+        self.intervalo_guardado = intervalo_guardado
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._lock = threading.RLock()
+        self._ultimo_guardado = 0.0
+        self._pendiente = False
+        self._resultados_jsonl: dict[str, tuple[int, set]] = {} # Ruta -> (bytes leídos, {(huella, índice)})
+        self.entradas: dict = self._cargar()
+        self.logger.info(f"Manifiesto cargado desde {self.ruta} con {len(self.entradas)} entradas.")
+
+    def _cargar(self) -> dict:
+        """Lee el manifiesto desde disco; devuelve un diccionario vacío si no existe o es inválido."""
+        if not self.ruta.exists():
+            return {}
+        try:
+            with open(self.ruta, 'r', encoding='utf-8') as f:
+                datos = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            self.logger.warning(f"No se pudo leer el manifiesto {self.ruta}: {e}. Se comienza con un manifiesto vacío.")
+            return {}
+        if datos.get('version') != self.VERSION:
+            self.logger.warning(f"Versión de manifiesto no soportada en {self.ruta}. Se comienza con un manifiesto vacío.")
+            return {}
+        return datos.get('entradas', {})
+
+    def guardar(self, forzar: bool = True) -> None:
+        """
+        Escribe el manifiesto a disco de forma atómica (archivo temporal + reemplazo).
+
+        Args:
+            forzar (bool, optional): Si es False, solo se escribe si hay cambios pendientes
+                y han pasado al menos `intervalo_guardado` segundos desde la última escritura.
+                Defaults to True.
+        """
+        with self._lock:
+            if not self._pendiente:
+                return
+            if not forzar and time.monotonic() - self._ultimo_guardado < self.intervalo_guardado:
+                return
+            self.ruta.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.ruta.with_suffix(self.ruta.suffix + '.tmp')
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'version': self.VERSION, 'entradas': self.entradas}, f, ensure_ascii=False)
+            os.replace(tmp, self.ruta)
+            self._ultimo_guardado = time.monotonic()
+            self._pendiente = False
+            self.logger.debug(f"Manifiesto guardado en {self.ruta} ({len(self.entradas)} entradas).")
+
+    def esta_completa(self, huella: str) -> bool:
+        """
+        Indica si todas las etapas de una entrada están completas y sus salidas de OCR existen.
+
+        Args:
+            huella (str): Huella del contenido de la imagen de entrada.
+
+        Returns:
+            bool: True si la entrada no requiere ningún procesamiento adicional.
+        """
+        with self._lock:
+            entrada = self.entradas.get(huella)
+            if entrada is None or entrada.get('num_segmentos') is None:
+                return False
+            segmentos = entrada['segmentos']
+            return all(
+                self._segmento_completo(huella, idx, segmentos.get(str(idx)))
+                for idx in range(entrada['num_segmentos'])
+            )
+
+    def _segmento_completo(self, huella: str, idx: int, estado: dict | None) -> bool:
+        """Un segmento está completo si se rechazó, o si se validó y su resultado de OCR existe."""
+        if estado is None or 'validado' not in estado:
+            return False
+        if not estado['validado']:
+            return True
+        if estado.get('ocr') is None:
+            return False
+        ruta = Path(estado['ocr'])
+        if ruta.suffix == '.jsonl':
+            # Archivo compartido por todos los segmentos: su existencia no dice nada de este segmento
+            return (huella, idx) in self._segmentos_en_resultados(ruta)
+        return ruta.exists()
+
+    def _segmentos_en_resultados(self, ruta: Path) -> set:
+        """
+        Devuelve los pares (huella, índice) con registro en un archivo JSONL de resultados.
+
+        El archivo se lee de forma incremental: solo las líneas completas añadidas desde
+        la lectura anterior. Si el archivo se truncó o reemplazó, se vuelve a leer entero.
+        Debe llamarse con `_lock` adquirido.
+        """
+        clave = str(ruta)
+        leidos, segmentos = self._resultados_jsonl.get(clave, (0, set()))
+        try:
+            tamano = ruta.stat().st_size
+        except OSError:
+            self._resultados_jsonl.pop(clave, None)
+            return set()
+        if tamano < leidos:
+            leidos, segmentos = 0, set()
+        if tamano > leidos:
+            with open(ruta, 'rb') as f:
+                f.seek(leidos)
+                datos = f.read(tamano - leidos)
+            completos = datos[:datos.rfind(b'\n') + 1] # Una última línea sin terminar se lee en la próxima llamada
+            for linea in completos.splitlines():
+                try:
+                    registro = json.loads(linea)
+                except json.JSONDecodeError:
+                    continue
+                if registro.get('input_hash') is not None:
+                    segmentos.add((registro['input_hash'], registro.get('segment_index')))
+            leidos += len(completos)
+        self._resultados_jsonl[clave] = (leidos, segmentos)
+        return segmentos
+
+    def estado_segmento(self, huella: str, idx: int) -> str:
+        """
+        Devuelve la siguiente etapa pendiente de un segmento.
+
+        Returns:
+            str: "completo" si no falta nada, "ocr" si ya fue validado como voucher pero
+                 falta su OCR, o "validacion" si aún no fue validado.
+        """
+        with self._lock:
+            estado = self.entradas.get(huella, {}).get('segmentos', {}).get(str(idx))
+            if self._segmento_completo(huella, idx, estado):
+                return "completo"
+            if estado is not None and estado.get('validado'):
+                return "ocr"
+            return "validacion"
+
+    def pendientes_sin_segmentar(self, huella: str) -> list[tuple[int, dict]] | None:
+        """
+        Indica si una entrada puede terminarse sin volver a segmentarla.
+
+        Es posible si la segmentación terminó, todos sus segmentos están validados y los que
+        faltan por OCR tienen su imagen guardada en disco.
+
+        Args:
+            huella (str): Huella del contenido de la imagen de entrada.
+
+        Returns:
+            list[tuple[int, dict]] | None: Los pares (índice, estado) de los segmentos pendientes
+                solo de OCR, o None si hay que segmentar la entrada.
+        """
+        with self._lock:
+            entrada = self.entradas.get(huella)
+            if entrada is None or entrada.get('num_segmentos') is None:
+                return None
+            pendientes = []
+            for idx in range(entrada['num_segmentos']):
+                estado = entrada['segmentos'].get(str(idx))
+                if self._segmento_completo(huella, idx, estado):
+                    continue
+                if not estado or not estado.get('validado') or not estado.get('imagen') or not Path(estado['imagen']).exists():
+                    return None
+                pendientes.append((idx, dict(estado)))
+            return pendientes
+
+    def probabilidad_segmento(self, huella: str, idx: int) -> float | None:
+        """Devuelve la probabilidad de validación registrada para un segmento (None si no existe)."""
+        with self._lock:
+            return self.entradas.get(huella, {}).get('segmentos', {}).get(str(idx), {}).get('probabilidad')
+
+    def registrar_segmentacion(self, huella: str, archivo: str, num_segmentos: int) -> None:
+        """
+        Registra que la segmentación de una entrada finalizó.
+
+        Si el número de segmentos difiere del registrado previamente, se descartan los
+        estados de sus segmentos, ya que los índices dejan de ser comparables.
+        """
+        with self._lock:
+            entrada = self.entradas.setdefault(huella, {'archivo': archivo, 'num_segmentos': None, 'segmentos': {}})
+            if entrada['num_segmentos'] != num_segmentos:
+                entrada['segmentos'] = {}
+            entrada['archivo'] = archivo
+            entrada['num_segmentos'] = num_segmentos
+            self._pendiente = True
+
+    def registrar_validacion(self, huella: str, idx: int, nombre: str, validado: bool,
+                             probabilidad: float | None, imagen: Union[str, Path, None],
+                             bbox: tuple[int, int, int, int] | None = None) -> None:
+        """Registra el resultado de validación de un segmento, la ruta de su imagen (si se guardó) y su bbox."""
+        with self._lock:
+            segmentos = self.entradas[huella]['segmentos']
+            segmentos[str(idx)] = {
+                'nombre': nombre,
+                'validado': validado,
+                'probabilidad': probabilidad,
+                'imagen': str(imagen) if imagen is not None else None,
+                'bbox': [int(v) for v in bbox] if bbox is not None else None,
+                'ocr': None,
+            }
+            self._pendiente = True
+
+    def registrar_ocr(self, huella: str, idx: int, json_path: Union[str, Path]) -> None:
+        """Registra la ruta del JSON con el resultado del OCR de un segmento."""
+        with self._lock:
+            self.entradas[huella]['segmentos'][str(idx)]['ocr'] = str(json_path)
+            self._pendiente = True
@@ -0,0 +1,321 @@
+#scr/pipeline/results_writer.py
+"""
+Módulo que define los escritores de resultados del pipeline.
+
+Cada segmento procesado por OCR produce un registro con su imagen de origen, su
+índice dentro de ella, su bbox, la probabilidad de la validación y el texto extraído.
+Los escritores (`IResultsWriter`) deciden cómo se persisten esos registros:
+
+- `JsonPerSegmentWriter`: un archivo JSON por segmento en 'outputs' (formato original).
+- `JsonlResultsWriter`: un único archivo JSONL de solo adición, con escrituras agrupadas
+  en un buffer. Evita millones de archivos pequeños y permite agregar los resultados
+  con una única lectura secuencial.
+
+`exportar_resultados` convierte un archivo JSONL en Parquet o CSV procesándolo por
+bloques, sin cargarlo completo en memoria.
+"""
+import os
+import csv
+import json
+import logging
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Iterator, Union
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+
+# Columnas de cada registro de resultado, en el orden en que se exportan
+CAMPOS_RESULTADO = ('source_image', 'input_hash', 'segment_index', 'segment_name', 'bbox', 'validation_score', 'raw_text')
+
+def crear_registro(segment_name: str, raw_text: str, source_image: str | None = None,
+                   segment_index: int | None = None, bbox: list[int] | None = None,
+                   validation_score: float | None = None, input_hash: str | None = None) -> dict:
+    """
+    Construye un registro de resultado con las columnas de `CAMPOS_RESULTADO`.
+
+    Args:
+        segment_name (str): Nombre del segmento validado (ej. 'scan_01_voucher_2_v').
+        raw_text (str): Texto crudo devuelto por el extractor de OCR.
+        source_image (str | None, optional): Nombre del archivo de entrada. Defaults to None.
+        segment_index (int | None, optional): Índice del segmento dentro de su imagen. Defaults to None.
+        bbox (list[int] | None, optional): [x, y, ancho, alto] del segmento en la imagen de entrada.
+            Defaults to None.
+        validation_score (float | None, optional): Probabilidad de "voucher" del validador. Defaults to None.
+        input_hash (str | None, optional): Huella del contenido de la imagen de entrada. Defaults to None.
+
+    Returns:
+        dict: El registro.
+    """
+    return {
+        'source_image': source_image,
+        'input_hash': input_hash,
+        'segment_index': segment_index,
+        'segment_name': segment_name,
+        'bbox': [int(v) for v in bbox] if bbox is not None else None,
+        'validation_score': float(validation_score) if validation_score is not None else None,
+        'raw_text': raw_text,
+    }
+
+class IResultsWriter(ABC):
+    """
+    Interfaz abstracta para un destino de resultados de OCR.
+
+    Las implementaciones deben ser seguras para uso desde varios hilos, ya que en el
+    modo "concurrent" varios workers de OCR escriben a la vez.
+    """
+
+    @abstractmethod
+    def write(self, registro: dict) -> Path:
+        """
+        Persiste (o encola para persistir) un registro de resultado.
+
+        Args:
+            registro (dict): Registro construido con `crear_registro`.
+
+        Returns:
+            Path: El archivo donde queda (o quedará tras `flush`) el registro.
+        """
+        pass
+
+    def flush(self) -> None:
+        """
+        Escribe a disco los registros pendientes. La implementación por defecto no hace nada.
+        """
+        pass
+
+    def close(self) -> None:
+        """
+        Escribe los registros pendientes y libera los recursos. Por defecto, llama a `flush`.
+        """
+        self.flush()
+
+class JsonPerSegmentWriter(IResultsWriter):
+    """
+    Escribe un archivo JSON (con indentación) por segmento: `<directorio>/<segment_name>.json`.
+
+    Es el formato original del pipeline; el texto se conserva en la clave 'raw_text'.
+    """
+    def __init__(self, directorio: Union[str, Path]):
+        """
+        Args:
+            directorio (Union[str, Path]): Directorio de salida (normalmente 'outputs').
+        """
+        self.directorio = Path(directorio)
+        self.directorio.mkdir(parents=True, exist_ok=True)
+
+    def write(self, registro: dict) -> Path:
+        json_path = self.directorio / f"{registro['segment_name']}.json"
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(registro, f, ensure_ascii=False, indent=4)
+        return json_path
+
+class JsonlResultsWriter(IResultsWriter):
+    """
+    Añade cada registro como una línea JSON a un único archivo.
+
+    Los registros se acumulan en un buffer en memoria y se escriben en bloque cuando
+    se alcanzan `buffer_size` registros o al llamar a `flush`/`close`. El archivo se
+    abre en modo adición, de modo que ejecuciones sucesivas (o el modo daemon)
+    acumulan sus resultados en el mismo archivo.
+
+    Es seguro entre procesos: cada bloque se añade con una única escritura `O_APPEND`
+    bajo un bloqueo `flock` del archivo (en sistemas POSIX), y tras un fork el proceso
+    hijo abre su propio descriptor, de modo que varios workers pueden compartir el archivo.
+    """
+    def __init__(self, ruta: Union[str, Path], buffer_size: int = 256):
+        """
+        Args:
+            ruta (Union[str, Path]): Ruta del archivo JSONL.
+            buffer_size (int, optional): Registros acumulados antes de escribir a disco. Defaults to 256.
+        """
+        self.ruta = Path(ruta)
+        self.buffer_size = max(1, buffer_size)
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+        self._buffer: list[str] = []
+        self._lock = threading.Lock()
+        self._fd: int | None = None
+        self._pid: int | None = None
+        self._cerrado = False
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.debug(f"Escribiendo resultados en {self.ruta} (buffer de {self.buffer_size} registros).")
+
+    def _descriptor(self) -> int:
+        """Devuelve el descriptor del proceso actual, abriéndolo si es necesario (p. ej. tras un fork)."""
+        if self._fd is None or self._pid != os.getpid():
+            if self._pid != os.getpid():
+                self._buffer.clear() # El buffer heredado pertenece al proceso padre
+            self._fd = os.open(self.ruta, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+            self._pid = os.getpid()
+        return self._fd
+
+    def write(self, registro: dict) -> Path:
+        linea = json.dumps(registro, ensure_ascii=False, separators=(',', ':'))
+        with self._lock:
+            self._descriptor()
+            self._buffer.append(linea)
+            if len(self._buffer) >= self.buffer_size:
+                self._vaciar_buffer()
+        return self.ruta
+
+    def _vaciar_buffer(self) -> None:
+        """Escribe el buffer en el archivo. Debe llamarse con `_lock` adquirido."""
+        if not self._buffer:
+            return
+        fd = self._descriptor()
+        datos = ('\n'.join(self._buffer) + '\n').encode('utf-8')
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            tamano = os.fstat(fd).st_size
+            if tamano > 0 and hasattr(os, 'pread') and os.pread(fd, 1, tamano - 1) != b'\n':
+                # Una ejecución anterior se interrumpió a mitad de línea: no concatenar con ella
+                datos = b'\n' + datos
+            while datos:
+                escritos = os.write(fd, datos)
+                datos = datos[escritos:]
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        self._buffer.clear()
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._cerrado:
+                self._vaciar_buffer()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._cerrado:
+                return
+            self._vaciar_buffer()
+            if self._fd is not None and self._pid == os.getpid():
+                os.close(self._fd)
+            self._fd = None
+            self._cerrado = True
+
+def crear_escritor_resultados(results_config: dict | None, directorio_salida: Union[str, Path]) -> IResultsWriter:
+    """
+    Crea el escritor de resultados a partir de la sección `results` de settings.yml.
+
+    Args:
+        results_config (dict | None): Claves 'format' ("json" o "jsonl"; por defecto "json"),
+            'path' (ruta del archivo JSONL; por defecto '<directorio_salida>/results.jsonl')
+            y 'buffer_size'.
+        directorio_salida (Union[str, Path]): Directorio 'outputs' del pipeline.
+
+    Returns:
+        IResultsWriter: El escritor configurado.
+
+    Raises:
+        ValueError: Si el formato no es soportado.
+    """
+    results_config = results_config or {}
+    formato = results_config.get('format', 'json')
+    if formato == 'json':
+        return JsonPerSegmentWriter(directorio_salida)
+    if formato == 'jsonl':
+        return JsonlResultsWriter(
+            results_config.get('path') or Path(directorio_salida) / 'results.jsonl',
+            buffer_size=results_config.get('buffer_size', 256)
+        )
+    raise ValueError(f"Formato de resultados no soportado: {formato}")
+
+def leer_resultados(ruta: Union[str, Path]) -> Iterator[dict]:
+    """
+    Lee secuencialmente los registros de un archivo JSONL.
+
+    Una última línea incompleta (ej. si el proceso se interrumpió durante una escritura)
+    se ignora con un aviso.
+
+    Args:
+        ruta (Union[str, Path]): Ruta del archivo JSONL.
+
+    Yields:
+        dict: Cada registro, en orden de escritura.
+    """
+    logger = logging.getLogger(__name__)
+    with open(ruta, 'r', encoding='utf-8') as f:
+        for num_linea, linea in enumerate(f, start=1):
+            if not linea.strip():
+                continue
+            try:
+                yield json.loads(linea)
+            except json.JSONDecodeError:
+                logger.warning(f"Línea {num_linea} de {ruta} inválida o incompleta; se ignora.")
+
+def _bloques(registros: Iterator[dict], filas_por_bloque: int) -> Iterator[list[dict]]:
+    bloque = []
+    for registro in registros:
+        bloque.append(registro)
+        if len(bloque) >= filas_por_bloque:
+            yield bloque
+            bloque = []
+    if bloque:
+        yield bloque
+
+def exportar_resultados(origen: Union[str, Path], destino: Union[str, Path],
+                        formato: str | None = None, filas_por_bloque: int = 50_000) -> int:
+    """
+    Exporta un archivo JSONL de resultados a Parquet o CSV, por bloques de filas.
+
+    Parquet requiere `pyarrow`, que se importa solo al usar este formato. En CSV la
+    columna 'bbox' se serializa como texto JSON.
+
+    Args:
+        origen (Union[str, Path]): Archivo JSONL generado por `JsonlResultsWriter`.
+        destino (Union[str, Path]): Archivo de salida.
+        formato (str | None, optional): "parquet" o "csv". Si es None, se deduce de la
+            extensión de `destino`. Defaults to None.
+        filas_por_bloque (int, optional): Filas por bloque (grupo de filas en Parquet). Defaults to 50000.
+
+    Returns:
+        int: Número de registros exportados.
+
+    Raises:
+        ValueError: Si el formato no es soportado.
+        ImportError: Si se pide Parquet y `pyarrow` no está instalado.
+    """
+    destino = Path(destino)
+    formato = (formato or destino.suffix.lstrip('.')).lower()
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    total = 0
+    bloques = _bloques(leer_resultados(origen), filas_por_bloque)
+
+    if formato == 'csv':
+        with open(destino, 'w', encoding='utf-8', newline='') as f:
+            escritor = csv.DictWriter(f, fieldnames=CAMPOS_RESULTADO, extrasaction='ignore')
+            escritor.writeheader()
+            for bloque in bloques:
+                for registro in bloque:
+                    fila = dict(registro)
+                    if fila.get('bbox') is not None:
+                        fila['bbox'] = json.dumps(fila['bbox'])
+                    escritor.writerow(fila)
+                total += len(bloque)
+    elif formato == 'parquet':
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("La exportación a Parquet requiere el paquete 'pyarrow'.") from e
+        esquema = pa.schema([
+            ('source_image', pa.string()),
+            ('input_hash', pa.string()),
+            ('segment_index', pa.int32()),
+            ('segment_name', pa.string()),
+            ('bbox', pa.list_(pa.int32())),
+            ('validation_score', pa.float32()),
+            ('raw_text', pa.string()),
+        ])
+        with pq.ParquetWriter(destino, esquema) as escritor:
+            for bloque in bloques:
+                columnas = {campo: [registro.get(campo) for registro in bloque] for campo in CAMPOS_RESULTADO}
+                escritor.write_table(pa.table(columnas, schema=esquema))
+                total += len(bloque)
+    else:
+        raise ValueError(f"Formato de exportación no soportado: {formato}")
+    return total
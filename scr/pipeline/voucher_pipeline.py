@@ -5,17 +5,50 @@ Módulo que define el pipeline principal para el procesamiento de vouchers.
 La clase `VoucherPipeline` orquesta las etapas de segmentación, validación
 y extracción de texto (OCR) de los vouchers.
 """
-import json
-import torch
+import os
+import time
+import queue
 import shutil
+import threading
 from PIL import Image
 from pathlib import Path
 import logging
-from scr.segmentation.isegmenter import ISegmenter
+from typing import NamedTuple
+from scr.segmentation.isegmenter import ISegmenter, SegmentoDetectado
 from scr.validation.ivalidator import IValidator
 from scr.ocr.iocrextractor import IOCRExtractor
+from scr.utils.async_writer import AsyncImageWriter
+from scr.utils.hashing import hash_archivo
+from scr.utils.metrics import obtener_metricas
+from scr.pipeline.manifest import ProcessingManifest
+from scr.pipeline.job_queue import SQLiteJobQueue, Trabajo
+from scr.pipeline.worker_pool import ejecutar_en_procesos
+from scr.pipeline.results_writer import IResultsWriter, JsonPerSegmentWriter, crear_registro
 #from scr.utils.text_processing import remover_espacios_extra, convertir_a_minusculas
 
+class SegmentoEnProceso(NamedTuple):
+    """
+    Segmento en memoria que circula entre las etapas de los modos "streaming" y "concurrent".
+    """
+    nombre_base: str     # '<imagen>_voucher_<idx>'
+    imagen: Image.Image
+    huella: str | None   # Huella del contenido de la imagen de entrada (None sin manifiesto)
+    indice: int          # Posición del segmento dentro de su imagen de entrada
+    origen: str | None = None                  # Nombre del archivo de entrada
+    bbox: tuple[int, int, int, int] | None = None  # (x, y, ancho, alto) en la imagen de entrada, si se conoce
+    probabilidad: float | None = None          # Probabilidad de "voucher" asignada en la validación
+    predicted_iou: float | None = None         # Puntuaciones de la máscara de SAM, si el segmentador las conoce
+    stability_score: float | None = None
+    area: int | None = None                    # Píxeles de la máscara en la imagen de entrada
+
+    def como_segmento(self) -> SegmentoDetectado:
+        """Devuelve el registro del segmentador que recibe `IValidator.predict_segments`."""
+        return SegmentoDetectado(self.imagen, self.bbox, self.predicted_iou, self.stability_score, self.area, self.origen)
+
+def _bbox_de_datos(datos: dict) -> tuple[int, int, int, int] | None:
+    """Recupera el bbox guardado (como lista JSON) en los datos de un trabajo de la cola."""
+    return tuple(datos['bbox']) if datos.get('bbox') is not None else None
+
 class VoucherPipeline:
     """
     Orquesta el pipeline completo para el procesamiento de imágenes de vouchers.
@@ -24,11 +57,16 @@ class VoucherPipeline:
     a través de inyección de dependencias en su constructor. El método `run` ejecuta
     la secuencia de procesamiento.
     """
+    MODOS_SOPORTADOS = ('disk', 'streaming', 'concurrent', 'queue')
+    _FIN_DE_COLA = object() # Centinela que indica a un worker que no llegarán más elementos
+
     def __init__(self,
                  segmenter: ISegmenter,
                  validator: IValidator,
                  ocr_extractor: IOCRExtractor,
-                 base_dirs: dict):
+                 base_dirs: dict,
+                 pipeline_config: dict | None = None,
+                 results_writer: IResultsWriter | None = None):
         """
         Inicializa el VoucherPipeline con sus dependencias y configuración de directorios.
 
@@ -40,17 +78,85 @@ class VoucherPipeline:
                               de entrada y salida (ej. 'vouchers_a_segmentar', 
                               'single_voucher', 'validated_voucher_dir', 
                               'output_no_voucher_dir', 'outputs_json_dir').
+            pipeline_config (dict | None, optional): Configuración de ejecución del pipeline
+                (sección `pipeline` de settings.yml). Claves soportadas:
+                - 'mode': "disk" (por defecto, guarda cada segmento en 'single_voucher' antes
+                  de validarlo), "streaming" (los segmentos pasan en memoria a validación y OCR)
+                  "concurrent" (como "streaming", pero cada etapa se ejecuta en sus propios
+                  workers conectados por colas acotadas) o "queue" (cada etapa de cada imagen y
+                  segmento es un trabajo de una cola SQLite persistente que vacían uno o más
+                  procesos worker; ver `_run_queue`).
+                - 'save_segments': Si es False, en los modos en memoria no se guardan los segmentos
+                  en 'validated_voucher'/'no_voucher'. Defaults to True.
+                - 'async_writes': Si es True, en los modos en memoria las imágenes se guardan en un
+                  hilo en segundo plano. Defaults to True.
+                - 'workers': Diccionario con el número de workers por etapa para el modo
+                  "concurrent" ('segmentation', 'validation', 'ocr'). Defaults to 1 por etapa.
+                - 'queue_size': Capacidad máxima de cada cola entre etapas en el modo
+                  "concurrent". Defaults to 16.
+                - 'validation_batch_size': Máximo de segmentos que se validan en un lote en los
+                  modos "disk", "concurrent" y "queue". Defaults to 8.
+                - 'ocr_batch_size': Máximo de segmentos que un worker de OCR agrupa en una
+                  llamada a `extract_many` en los modos "concurrent" y "queue". Defaults to 8.
+                - 'job_queue': Configuración del modo "queue" ('path' de la base de datos SQLite,
+                  'lease_seconds', 'max_attempts', 'journal_mode', 'processes' y 'poll_interval').
+                - 'manifest_path': Ruta del manifiesto de entradas procesadas (ver
+                  `ProcessingManifest`). Si se define, se omiten las entradas sin cambios ya
+                  procesadas y solo se calculan las etapas que falten. No se admite en el modo
+                  "queue", cuya cola ya registra el progreso. Defaults to None (sin manifiesto).
+            results_writer (IResultsWriter | None, optional): Destino de los resultados de OCR
+                (ver `results_writer.py`). Defaults to None (un JSON por segmento en 'outputs').
         
         Raises:
             OSError: Si hay un problema de permisos o de otro tipo al crear los directorios base.
+            ValueError: Si el modo de ejecución configurado no es soportado, o si se define
+                'manifest_path' en el modo "queue".
         """
         self.segmenter = segmenter
         self.validator = validator
         self.ocr_extractor = ocr_extractor
         self.dirs = {k: Path(v) for k, v in base_dirs.items()}
+        self.results_writer = results_writer or JsonPerSegmentWriter(self.dirs['outputs'])
         
         self.logger = logging.getLogger(self.__class__.__name__)
 
+        pipeline_config = pipeline_config or {}
+        self.mode = pipeline_config.get('mode', 'disk')
+        self.save_segments = pipeline_config.get('save_segments', True)
+        self.async_writes = pipeline_config.get('async_writes', True)
+        workers_config = pipeline_config.get('workers', {}) or {}
+        self.workers = {
+            etapa: max(1, int(workers_config.get(etapa, 1)))
+            for etapa in ('segmentation', 'validation', 'ocr')
+        }
+        self.queue_size = max(1, int(pipeline_config.get('queue_size', 16)))
+        self.validation_batch_size = max(1, int(pipeline_config.get('validation_batch_size', 8)))
+        self.ocr_batch_size = max(1, int(pipeline_config.get('ocr_batch_size', 8)))
+        if self.mode not in self.MODOS_SOPORTADOS:
+            self.logger.error(f"Modo de pipeline no soportado: {self.mode}")
+            raise ValueError(f"Modo de pipeline no soportado: {self.mode}")
+
+        manifest_path = pipeline_config.get('manifest_path')
+        self.manifest: ProcessingManifest | None = None
+        if manifest_path and self.mode == 'queue':
+            # La cola ya encola cada imagen una sola vez por huella y retoma cada trabajo desde su etapa
+            self.logger.error("El modo 'queue' no admite 'manifest_path': la cola de trabajos ya registra el progreso por huella.")
+            raise ValueError("El modo 'queue' no admite 'manifest_path'; defina pipeline.manifest_path como null.")
+        if manifest_path:
+            self.manifest = ProcessingManifest(manifest_path)
+
+        cola_config = pipeline_config.get('job_queue', {}) or {}
+        self.procesos = max(1, int(cola_config.get('processes', 1)))
+        self.poll_interval = float(cola_config.get('poll_interval', 1.0))
+        self.job_queue: SQLiteJobQueue | None = None
+        if self.mode == 'queue':
+            self.job_queue = SQLiteJobQueue(
+                cola_config.get('path', self.dirs['outputs'] / 'jobs.sqlite'),
+                lease_seconds=float(cola_config.get('lease_seconds', 600)),
+                max_intentos=int(cola_config.get('max_attempts', 3)),
+                journal_mode=cola_config.get('journal_mode', 'wal'),
+            )
+
         # Crear directorios si no existen
         for dir_key, dir_path in self.dirs.items():
             try:
@@ -60,84 +166,708 @@ class VoucherPipeline:
                 self.logger.error(f"No se pudo crear el directorio {dir_path} para '{dir_key}': {e}")
                 raise # Relanzar si falla la creación de un directorio base.
         
-        self.logger.info("VoucherPipeline inicializado con sus componentes y directorios configurados.")
+        self.logger.info(f"VoucherPipeline inicializado en modo '{self.mode}' con sus componentes y directorios configurados.")
 
     def run(self):
         """
-        Ejecuta el pipeline completo de procesamiento de vouchers.
+        Ejecuta el pipeline completo de procesamiento de vouchers sobre todas las imágenes
+        de 'vouchers_a_segmentar', según el modo configurado (ver `process_files`).
 
-        El proceso general es:
-        1. Lee imágenes del directorio 'vouchers_a_segmentar'.
-        2. Para cada imagen, segmenta posibles vouchers y los guarda en 'single_voucher'.
-           Maneja errores por archivo durante la segmentación.
-        3. Lee cada segmento guardado de 'single_voucher'.
-        4. Valida si el segmento es un voucher.
-        5. Si es válido:
-            a. Lo mueve a 'validated_voucher_dir'.
-            b. Extrae texto usando OCR.
-            c. Limpia el texto extraído.
-            d. Guarda el texto crudo y limpio en un archivo JSON en 'outputs_json_dir'.
-        6. Si no es válido, lo mueve a 'output_no_voucher_dir'.
-           Maneja errores por archivo durante la validación y OCR.
+        Al finalizar, publica las métricas de la ejecución (si están activadas).
         """
         self.logger.info("Iniciando el procesamiento del pipeline de vouchers...")
-        
-        # Fase de Segmentación
-        self.logger.info("--- Iniciando Fase de Segmentación ---")
-        for img_file in self.dirs['vouchers_a_segmentar'].iterdir():
+        self.process_files(list(self.dirs['vouchers_a_segmentar'].iterdir()))
+        self.logger.info("Procesamiento del pipeline de vouchers finalizado.")
+        obtener_metricas().publicar()
+
+    def process_files(self, img_files: list[Path]):
+        """
+        Procesa un conjunto concreto de imágenes de entrada según el modo configurado.
+
+        Permite reutilizar el pipeline (y los modelos ya cargados en sus componentes)
+        para lotes sucesivos de imágenes, por ejemplo desde `WatchFolderDaemon`.
+
+        - "disk": ver `_run_disk`.
+        - "streaming": ver `_run_streaming`.
+        - "concurrent": ver `_run_concurrent`.
+        - "queue": ver `_run_queue`.
+
+        Args:
+            img_files (list[Path]): Rutas de las imágenes de entrada a procesar.
+        """
+        try:
+            if self.mode == 'streaming':
+                self._run_streaming(img_files)
+            elif self.mode == 'concurrent':
+                self._run_concurrent(img_files)
+            elif self.mode == 'queue':
+                self._run_queue(img_files)
+            else:
+                self._run_disk(img_files)
+        finally:
+            self.results_writer.flush()
+
+    def close(self) -> None:
+        """
+        Escribe los resultados pendientes y cierra el escritor de resultados (y la cola de trabajos, si existe).
+        """
+        self.results_writer.close()
+        if self.job_queue is not None:
+            self.job_queue.close()
+
+    def _guardar_resultado_ocr(self, nombre_base: str, raw_text: str, item: SegmentoEnProceso | None = None) -> Path:
+        """
+        Registra el texto extraído por OCR de un segmento en el escritor de resultados.
+
+        Args:
+            nombre_base (str): Nombre (sin extensión) del segmento validado.
+            raw_text (str): Texto crudo devuelto por el extractor de OCR.
+            item (SegmentoEnProceso | None, optional): Segmento de origen, del que se toman la imagen
+                de entrada, el índice, el bbox y la probabilidad. Defaults to None.
+
+        Returns:
+            Path: Archivo donde queda el resultado.
+        """
+        # Aplicar funciones de limpieza
+        #text_cleaned_spaces = remover_espacios_extra(raw_text)
+        #cleaned_text = convertir_a_minusculas(text_cleaned_spaces)
+        # (Si se añaden más funciones de limpieza, se aplicarían secuencialmente aquí)
+        #self.logger.debug(f"Texto limpio para {nombre_base}: '{cleaned_text[:100]}...'")
+
+        if item is not None:
+            registro = crear_registro(
+                nombre_base, raw_text, source_image=item.origen, segment_index=item.indice,
+                bbox=item.bbox, validation_score=item.probabilidad, input_hash=item.huella
+            )
+        else:
+            registro = crear_registro(nombre_base, raw_text)
+        with obtener_metricas().medir("escritura_resultados"):
+            return self.results_writer.write(registro)
+
+    def _segmentar_entrada(self, img_file: Path) -> tuple[list[SegmentoEnProceso], list[SegmentoEnProceso]]:
+        """
+        Segmenta una imagen de entrada y decide qué etapas faltan para cada segmento.
+
+        Si el manifiesto está activo, las entradas ya completas se omiten sin segmentar
+        y, para las parcialmente procesadas, solo se devuelven los segmentos a los que
+        les falta la validación o el OCR. Si solo falta el OCR y las imágenes de esos
+        segmentos están guardadas, se reutilizan sin volver a segmentar.
+
+        Args:
+            img_file (Path): La imagen de entrada.
+
+        Returns:
+            tuple[list[SegmentoEnProceso], list[SegmentoEnProceso]]: Los segmentos pendientes
+                de validación y los segmentos ya validados pendientes solo de OCR.
+
+        Raises:
+            Exception: Propaga los errores del segmentador o de la lectura del archivo.
+        """
+        metricas = obtener_metricas()
+        metricas.incrementar("imagenes_entrada")
+        huella = None
+        if self.manifest is not None:
+            huella = hash_archivo(img_file)
+            if self.manifest.esta_completa(huella):
+                self.logger.info(f"Omitiendo {img_file.name}: sin cambios y ya procesado según el manifiesto.")
+                metricas.incrementar("imagenes_omitidas")
+                return [], []
+            pendientes = self.manifest.pendientes_sin_segmentar(huella)
+            if pendientes is not None:
+                self.logger.info(f"{img_file.name}: {len(pendientes)} segmentos pendientes solo de OCR; se reutilizan sus imágenes guardadas.")
+                metricas.incrementar("imagenes_sin_resegmentar")
+                return [], [self._segmento_guardado(img_file, huella, idx, estado) for idx, estado in pendientes]
+
+        self.logger.info(f"Procesando archivo de imagen principal: {img_file.name}")
+        segments = self.segmenter.segment_records(img_file)
+        self.logger.info(f"Encontrados {len(segments)} segmentos en {img_file.name}.")
+        metricas.incrementar("segmentos", len(segments))
+
+        items = [
+            SegmentoEnProceso(f"{img_file.stem}_voucher_{idx}", seg.imagen, huella, idx, origen=img_file.name,
+                              bbox=seg.bbox, predicted_iou=seg.predicted_iou,
+                              stability_score=seg.stability_score, area=seg.area)
+            for idx, seg in enumerate(segments)
+        ]
+        if self.manifest is None:
+            return items, []
+
+        self.manifest.registrar_segmentacion(huella, img_file.name, len(segments))
+        pendientes_validacion, pendientes_ocr = [], []
+        for item in items:
+            estado = self.manifest.estado_segmento(huella, item.indice)
+            if estado == "validacion":
+                pendientes_validacion.append(item)
+            elif estado == "ocr":
+                pendientes_ocr.append(item._replace(probabilidad=self.manifest.probabilidad_segmento(huella, item.indice)))
+        if len(pendientes_validacion) + len(pendientes_ocr) < len(items):
+            self.logger.info(
+                f"{img_file.name}: {len(pendientes_validacion)} segmentos pendientes de validación y "
+                f"{len(pendientes_ocr)} pendientes solo de OCR según el manifiesto."
+            )
+        return pendientes_validacion, pendientes_ocr
+
+    @staticmethod
+    def _segmento_guardado(img_file: Path, huella: str, idx: int, estado: dict) -> SegmentoEnProceso:
+        """Reconstruye, desde su estado en el manifiesto, un segmento validado cuya imagen está en disco."""
+        with Image.open(estado['imagen']) as img:
+            imagen = img.convert('RGB')
+        return SegmentoEnProceso(
+            estado['nombre'], imagen, huella, idx, origen=img_file.name,
+            bbox=tuple(estado['bbox']) if estado.get('bbox') is not None else None,
+            probabilidad=estado.get('probabilidad'),
+        )
+
+    def _run_streaming(self, img_files: list[Path]):
+        """
+        Ejecuta el pipeline sin pasar los segmentos por disco.
+
+        Para cada imagen de `img_files`, los segmentos devueltos por el
+        segmentador se validan (en un único lote si el validador lo soporta) y los
+        validados se procesan con OCR (`extract_many`) directamente en memoria.
+        Opcionalmente (`save_segments`), cada segmento se guarda en 'validated_voucher'
+        o 'no_voucher' con los mismos nombres que en el modo "disk"; si `async_writes`
+        está activo, esas escrituras se realizan en segundo plano.
+        Los errores se manejan por imagen y por segmento.
+        """
+        escritor = AsyncImageWriter() if (self.save_segments and self.async_writes) else None
+        try:
+            for img_file in img_files:
+                try:
+                    pendientes_validacion, pendientes_ocr = self._segmentar_entrada(img_file)
+                except Exception as e:
+                    self.logger.error(f"Error procesando el archivo principal {img_file.name} durante la segmentación: {e}")
+                    self.logger.exception("Detalles del error de segmentación:")
+                    continue
+
+                validados = self._validar_segmentos(pendientes_validacion, escritor)
+                self._extraer_ocr_segmentos(pendientes_ocr + validados)
+                self._guardar_manifiesto(forzar=False)
+        finally:
+            if escritor is not None:
+                self.logger.debug("Esperando a que finalicen las escrituras asíncronas de segmentos...")
+                escritor.close()
+            self._guardar_manifiesto()
+
+    def _guardar_manifiesto(self, forzar: bool = True) -> None:
+        """
+        Guarda el manifiesto (si está activo), escribiendo antes los resultados pendientes
+        para que el manifiesto nunca haga referencia a resultados que aún no están en disco.
+        """
+        if self.manifest is None:
+            return
+        self.results_writer.flush()
+        self.manifest.guardar(forzar=forzar)
+
+    def _guardar_segmento(self, image: Image.Image, dest: Path, escritor: AsyncImageWriter | None) -> Path | None:
+        """
+        Guarda un segmento en disco si `save_segments` está activo, de forma síncrona o asíncrona.
+
+        Returns:
+            Path | None: La ruta de destino, o None si el segmento no se guarda.
+        """
+        if not self.save_segments:
+            return None
+        self.logger.debug(f"Guardando segmento en: {dest}")
+        if escritor is not None:
+            escritor.submit(image, dest)
+        else:
+            image.save(dest)
+        return dest
+
+    def _decidir_lote(self, segmentos: list[SegmentoDetectado]) -> tuple[list[bool], list[float | None]]:
+        """
+        Obtiene las decisiones del validador para un lote de segmentos.
+
+        Usa `predict_segments` (que recibe también el bbox y las puntuaciones del segmentador)
+        si el validador soporta validación por lotes; en caso contrario, llama a `is_voucher`
+        para cada imagen.
+        """
+        if self.validator.supports_batch:
+            return self.validator.predict_segments(segmentos)
+        return [self.validator.is_voucher(segmento.imagen) for segmento in segmentos], [None] * len(segmentos)
+
+    def _validar_segmentos(self, items: list[SegmentoEnProceso], escritor: AsyncImageWriter | None) -> list[SegmentoEnProceso]:
+        """
+        Valida un lote de segmentos en memoria y guarda cada uno en el directorio correspondiente.
+
+        Si la validación del lote completo falla, se reintenta segmento por segmento para
+        que un único segmento problemático no descarte el resto; los segmentos cuya
+        validación falla se consideran no válidos para el OCR (y no se registran en el
+        manifiesto, de modo que se reintentan en la siguiente ejecución).
+
+        Args:
+            items (list[SegmentoEnProceso]): Los segmentos a validar.
+            escritor (AsyncImageWriter | None): Escritor asíncrono, o None para guardar de forma síncrona.
+
+        Returns:
+            list[SegmentoEnProceso]: Los segmentos validados como voucher, en el orden de `items`
+                y con su probabilidad de validación.
+        """
+        if not items:
+            return []
+        try:
+            decisiones, probabilidades = self._decidir_lote([item.como_segmento() for item in items])
+        except Exception as e:
+            if len(items) == 1:
+                self.logger.error(f"Error procesando el segmento {items[0].nombre_base} durante la validación: {e}")
+                self.logger.exception("Detalles del error de validación:")
+                return []
+            self.logger.error(f"Error validando un lote de {len(items)} segmentos: {e}. Reintentando de forma individual.")
+            return [resultado for item in items for resultado in self._validar_segmentos([item], escritor)]
+
+        metricas = obtener_metricas()
+        metricas.incrementar("segmentos_validados", sum(decisiones))
+        metricas.incrementar("segmentos_rechazados", len(decisiones) - sum(decisiones))
+        validados = []
+        for item, es_voucher, prob in zip(items, decisiones, probabilidades):
+            detalle_prob = f" (probabilidad: {prob:.3f})" if prob is not None else ""
+            if es_voucher:
+                self.logger.info(f"Segmento {item.nombre_base} VALIDADO como voucher{detalle_prob}.")
+                dest = self._guardar_segmento(item.imagen, self.dirs['validated_voucher'] / f"{item.nombre_base}_v.png", escritor)
+                validados.append(item._replace(probabilidad=prob))
+            else:
+                self.logger.info(f"Segmento {item.nombre_base} NO VALIDADO como voucher{detalle_prob}.")
+                dest = self._guardar_segmento(item.imagen, self.dirs['no_voucher'] / f"{item.nombre_base}.png", escritor)
+            if self.manifest is not None:
+                self.manifest.registrar_validacion(item.huella, item.indice, item.nombre_base, es_voucher, prob, dest, item.bbox)
+        return validados
+
+    def _validar_archivos(self, lote: list[tuple[Path, SegmentoEnProceso]]) -> list[SegmentoEnProceso]:
+        """
+        Valida un lote de segmentos guardados en 'single_voucher' y mueve cada archivo a
+        'validated_voucher' o 'no_voucher' (modo "disk").
+
+        Igual que `_validar_segmentos`, si la validación del lote completo falla se reintenta
+        segmento por segmento; los segmentos cuya validación falla se quedan en 'single_voucher'.
+
+        Args:
+            lote (list[tuple[Path, SegmentoEnProceso]]): Cada archivo con su segmento (sin imagen),
+                que aporta el origen y los metadatos del segmentador.
+
+        Returns:
+            list[SegmentoEnProceso]: Los segmentos validados como voucher, con su imagen y su
+                probabilidad de validación.
+        """
+        legibles, items = [], []
+        for seg_path, item in lote:
+            self.logger.info(f"Procesando segmento individual: {seg_path.name}")
             try:
-                self.logger.info(f"Procesando archivo de imagen principal: {img_file.name}")
-                segments = self.segmenter.segment(img_file)
-                self.logger.info(f"Encontrados {len(segments)} segmentos en {img_file.name}.")
-                for idx, seg in enumerate(segments):
-                    seg_path = self.dirs['single_voucher'] / f"{img_file.stem}_voucher_{idx}.png"
-                    self.logger.debug(f"Guardando segmento {idx} de {img_file.name} en: {seg_path}")
-                    seg.save(seg_path)
+                with Image.open(seg_path) as img:
+                    items.append(item._replace(imagen=img.convert('RGB')))
+                legibles.append((seg_path, item))
             except Exception as e:
-                self.logger.error(f"Error procesando el archivo principal {img_file.name} durante la segmentación: {e}")
-                self.logger.exception("Detalles del error de segmentación:")
-        self.logger.info("--- Fase de Segmentación Finalizada ---")
+                self.logger.error(f"Error leyendo el segmento {seg_path.name} durante la validación: {e}")
+        lote = legibles
+        if not lote:
+            return []
+        try:
+            decisiones, probabilidades = self._decidir_lote([item.como_segmento() for item in items])
+        except Exception as e:
+            if len(lote) == 1:
+                self.logger.error(f"Error procesando el segmento {lote[0][0].name} durante la validación: {e}")
+                self.logger.exception("Detalles del error de validación:")
+                return []
+            self.logger.error(f"Error validando un lote de {len(lote)} segmentos: {e}. Reintentando de forma individual.")
+            return [resultado for par in lote for resultado in self._validar_archivos([par])]
+
+        metricas = obtener_metricas()
+        metricas.incrementar("segmentos_validados", sum(decisiones))
+        metricas.incrementar("segmentos_rechazados", len(decisiones) - sum(decisiones))
+        validados = []
+        for (seg_path, _), item, es_voucher, prob in zip(lote, items, decisiones, probabilidades):
+            detalle_prob = f" (probabilidad: {prob:.3f})" if prob is not None else ""
+            if es_voucher:
+                self.logger.info(f"Segmento {seg_path.name} VALIDADO como voucher{detalle_prob}.")
+                dest = self.dirs['validated_voucher'] / f"{seg_path.stem}_v{seg_path.suffix}"
+                validados.append(item._replace(probabilidad=prob))
+            else:
+                self.logger.info(f"Segmento {seg_path.name} NO VALIDADO como voucher{detalle_prob}.")
+                dest = self.dirs['no_voucher'] / seg_path.name
+            self.logger.info(f"Moviendo {seg_path.name} a {dest}")
+            shutil.move(str(seg_path), dest)
+            if self.manifest is not None and item.huella is not None:
+                self.manifest.registrar_validacion(item.huella, item.indice, item.nombre_base, es_voucher, prob, dest, item.bbox)
+        return validados
+
+    def _extraer_ocr_segmentos(self, items: list[SegmentoEnProceso]):
+        """
+        Extrae el texto de un lote de segmentos validados y registra cada resultado en el escritor de resultados.
+
+        Usa `extract_many` del extractor (que puede paralelizar el OCR). Si el lote
+        completo falla, se reintenta segmento por segmento para aislar el error.
+
+        Args:
+            items (list[SegmentoEnProceso]): Segmentos validados como voucher.
+        """
+        if not items:
+            return
+        nombres_validados = [f"{item.nombre_base}_v" for item in items]
+        self.logger.info(f"Extrayendo OCR de {len(items)} segmentos: {', '.join(nombres_validados)}")
+        try:
+            textos = self.ocr_extractor.extract_many([item.imagen for item in items])
+        except Exception as e:
+            if len(items) == 1:
+                self.logger.error(f"Error procesando el segmento {items[0].nombre_base} durante el OCR: {e}")
+                self.logger.exception("Detalles del error de OCR:")
+                return
+            self.logger.error(f"Error en el OCR de un lote de {len(items)} segmentos: {e}. Reintentando de forma individual.")
+            for item in items:
+                self._extraer_ocr_segmentos([item])
+            return
+
+        obtener_metricas().incrementar("resultados_ocr", len(textos))
+        for item, nombre_validado, raw_text in zip(items, nombres_validados, textos):
+            self.logger.debug(f"Texto crudo extraído de {nombre_validado}: '{raw_text[:100]}...'")
+            json_path = self._guardar_resultado_ocr(nombre_validado, raw_text, item)
+            self.logger.info(f"Resultado OCR para {nombre_validado} guardado en {json_path}")
+            if self.manifest is not None and item.huella is not None: # Sin huella: segmento de origen desconocido (modo "disk")
+                self.manifest.registrar_ocr(item.huella, item.indice, json_path)
+
+    def _drenar_lote(self, cola: queue.Queue, max_items: int) -> tuple[list, bool]:
+        """
+        Bloquea hasta recibir un elemento de `cola` y agrupa los que ya estén disponibles.
+
+        Args:
+            cola (queue.Queue): Cola de entrada de la etapa.
+            max_items (int): Tamaño máximo del lote.
+
+        Returns:
+            tuple[list, bool]: El lote obtenido (puede estar vacío) y `True` si se recibió
+                el centinela de fin de cola.
+        """
+        lote = []
+        item = cola.get()
+        while item is not self._FIN_DE_COLA:
+            lote.append(item)
+            if len(lote) >= max_items:
+                break
+            try:
+                item = cola.get_nowait()
+            except queue.Empty:
+                break
+        return lote, item is self._FIN_DE_COLA
+
+    def _run_concurrent(self, img_files: list[Path]):
+        """
+        Ejecuta el pipeline como una cadena productor/consumidor.
+
+        La segmentación, la validación y el OCR se ejecutan en hilos independientes
+        (`workers` por etapa) unidos por colas acotadas (`queue_size`), de modo que las
+        etapas se solapan y la memoria ocupada por segmentos pendientes queda limitada
+        por la capacidad de las colas. Los segmentos se procesan en memoria como en el
+        modo "streaming"; los workers de validación y de OCR agrupan los segmentos
+        disponibles en lotes de hasta `validation_batch_size` y `ocr_batch_size`
+        elementos respectivamente. Los errores se manejan por imagen y por segmento.
+        """
+        escritor = AsyncImageWriter() if (self.save_segments and self.async_writes) else None
+        cola_imagenes: queue.Queue = queue.Queue()
+        cola_validacion: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        cola_ocr: queue.Queue = queue.Queue(maxsize=self.queue_size)
+
+        for img_file in img_files:
+            cola_imagenes.put(img_file)
+        for _ in range(self.workers['segmentation']):
+            cola_imagenes.put(self._FIN_DE_COLA)
+
+        def worker_segmentacion():
+            while (img_file := cola_imagenes.get()) is not self._FIN_DE_COLA:
+                try:
+                    pendientes_validacion, pendientes_ocr = self._segmentar_entrada(img_file)
+                except Exception as e:
+                    self.logger.error(f"Error procesando el archivo principal {img_file.name} durante la segmentación: {e}")
+                    self.logger.exception("Detalles del error de segmentación:")
+                    continue
+                for item in pendientes_validacion:
+                    cola_validacion.put(item)
+                for item in pendientes_ocr:
+                    cola_ocr.put(item)
+
+        def worker_validacion():
+            fin = False
+            while not fin:
+                lote, fin = self._drenar_lote(cola_validacion, self.validation_batch_size)
+                for item_validado in self._validar_segmentos(lote, escritor):
+                    cola_ocr.put(item_validado)
+
+        def worker_ocr():
+            fin = False
+            while not fin:
+                lote, fin = self._drenar_lote(cola_ocr, self.ocr_batch_size)
+                self._extraer_ocr_segmentos(lote)
+                self._guardar_manifiesto(forzar=False)
+
+        def iniciar(nombre: str, destino, cantidad: int) -> list[threading.Thread]:
+            hilos = [
+                threading.Thread(target=destino, name=f"{nombre}_{i}", daemon=True)
+                for i in range(cantidad)
+            ]
+            for hilo in hilos:
+                hilo.start()
+            return hilos
+
+        self.logger.info(
+            f"--- Iniciando ejecución concurrente (workers: {self.workers}, capacidad de colas: {self.queue_size}) ---"
+        )
+        hilos_seg = iniciar('segmentacion', worker_segmentacion, self.workers['segmentation'])
+        hilos_val = iniciar('validacion', worker_validacion, self.workers['validation'])
+        hilos_ocr = iniciar('ocr', worker_ocr, self.workers['ocr'])
+        try:
+            # Cerrar cada etapa en orden: cuando todos los productores terminan,
+            # se envía un centinela por cada consumidor de la siguiente etapa.
+            for hilo in hilos_seg:
+                hilo.join()
+            for _ in hilos_val:
+                cola_validacion.put(self._FIN_DE_COLA)
+            for hilo in hilos_val:
+                hilo.join()
+            for _ in hilos_ocr:
+                cola_ocr.put(self._FIN_DE_COLA)
+            for hilo in hilos_ocr:
+                hilo.join()
+        finally:
+            if escritor is not None:
+                self.logger.debug("Esperando a que finalicen las escrituras asíncronas de segmentos...")
+                escritor.close()
+            self._guardar_manifiesto()
+        self.logger.info("--- Ejecución concurrente finalizada ---")
+
+    def _run_queue(self, img_files: list[Path]):
+        """
+        Ejecuta el pipeline sobre la cola de trabajos persistente (`SQLiteJobQueue`).
+
+        Cada imagen de `img_files` se encola por la huella de su contenido (las ya encoladas
+        en ejecuciones anteriores se omiten) y su segmentación, la validación de cada segmento
+        y su OCR se procesan como trabajos independientes, de modo que un fallo en un segmento
+        no descarta el resto de la imagen. Con `job_queue.processes` > 1, los workers se crean
+        mediante `fork` después de cargar los modelos, que quedan compartidos entre procesos.
+        Los segmentos pasan entre etapas por disco ('single_voucher'), por lo que un trabajo
+        interrumpido se retoma desde su última etapa completada. También pueden lanzarse
+        workers en otras máquinas que compartan la base de datos y los directorios.
+        """
+        imagenes = {}
+        for img_file in img_files:
+            try:
+                imagenes[hash_archivo(img_file)] = img_file.resolve()
+            except OSError as e:
+                self.logger.error(f"No se pudo leer {img_file.name} para encolarlo: {e}")
+        nuevas = self.job_queue.encolar_imagenes(imagenes)
+        obtener_metricas().incrementar("imagenes_omitidas", len(imagenes) - nuevas)
+        self.logger.info(f"--- Cola de trabajos: {nuevas} imágenes nuevas encoladas ({len(imagenes) - nuevas} ya encoladas) ---")
 
-        # Fase de Validación y OCR
-        self.logger.info("--- Iniciando Fase de Validación y OCR ---")
-        for img_file in list(self.dirs['single_voucher'].iterdir()): # Convertir a lista para evitar problemas si se mueven archivos
+        def antes_de_fork():
+            # Los hijos no deben heredar resultados en buffer, la conexión a SQLite ni el pool de
+            # OCR (sus hilos de gestión no existen tras el fork); el pool se recrea al usarlo
+            self.results_writer.flush()
+            self.job_queue.close()
+            self.ocr_extractor.close()
+
+        ejecutar_en_procesos(self.trabajar_cola, self.procesos, antes_de_fork)
+        self.logger.info(f"--- Cola de trabajos vaciada. Estado: {self.job_queue.resumen()} ---")
+
+    def trabajar_cola(self) -> int:
+        """
+        Reclama y procesa trabajos de la cola hasta que no quede trabajo pendiente ni en curso.
+
+        Mientras otros workers tengan trabajos en curso, espera `poll_interval` segundos entre
+        intentos, ya que al completarse pueden encolar trabajos de la etapa siguiente. El lease
+        de cada lote se renueva mientras se procesa (`SQLiteJobQueue.mantener_leases`).
+
+        Returns:
+            int: Número de trabajos procesados por este worker.
+        """
+        worker = SQLiteJobQueue.id_worker()
+        limites = {'segmentacion': 1, 'validacion': self.validation_batch_size, 'ocr': self.ocr_batch_size}
+        procesados = 0
+        while True:
+            trabajos = self.job_queue.reclamar(worker, limites)
+            if not trabajos:
+                if not self.job_queue.hay_trabajo_activo():
+                    break
+                time.sleep(self.poll_interval)
+                continue
+            etapa = trabajos[0].etapa
             try:
-                self.logger.info(f"Procesando segmento individual: {img_file.name}")
-                img = Image.open(img_file)
-                
-                if self.validator.is_voucher(img):
-                    self.logger.info(f"Segmento {img_file.name} VALIDADO como voucher.")
-                    dest = self.dirs['validated_voucher'] / f"{img_file.stem}_v{img_file.suffix}"
-                    self.logger.info(f"Moviendo {img_file.name} a {dest}")
-                    shutil.move(str(img_file), dest)
-                    
-                    self.logger.info(f"Extrayendo OCR de {dest.name}...")
-                    raw_text = self.ocr_extractor.extract(Image.open(dest)) 
-                    self.logger.debug(f"Texto crudo extraído de {dest.name}: '{raw_text[:100]}...'")
-                    
-                    # Aplicar funciones de limpieza
-                    #text_cleaned_spaces = remover_espacios_extra(raw_text)
-                    #cleaned_text = convertir_a_minusculas(text_cleaned_spaces)
-                    # (Si se añaden más funciones de limpieza, se aplicarían secuencialmente aquí)
-                    #self.logger.debug(f"Texto limpio para {dest.name}: '{cleaned_text[:100]}...'")
-                    
-                    json_path = self.dirs['outputs'] / f"{dest.stem}.json"
-                    output_data = {
-                        'raw_text': raw_text,
-                        #'cleaned_text': cleaned_text 
-                        # Podrías añadir más campos si fuera necesario, como 'timestamp', etc.
-                    }
-                    with open(json_path, 'w', encoding='utf-8') as f:
-                        json.dump(output_data, f, ensure_ascii=False, indent=4)
-                    self.logger.info(f"Resultado OCR para {dest.name} guardado en {json_path}")
-                else:
-                    self.logger.info(f"Segmento {img_file.name} NO VALIDADO como voucher.")
-                    dest = self.dirs['no_voucher'] / img_file.name
-                    self.logger.info(f"Moviendo {img_file.name} a {dest}")
-                    shutil.move(str(img_file), dest)
+                with self.job_queue.mantener_leases(trabajos, worker):
+                    if etapa == 'segmentacion':
+                        self._trabajo_segmentacion(trabajos[0], worker)
+                    elif etapa == 'validacion':
+                        self._trabajos_validacion(trabajos, worker)
+                    else:
+                        self._trabajos_ocr(trabajos, worker)
             except Exception as e:
-                self.logger.error(f"Error procesando el segmento {img_file.name} durante la validación/OCR: {e}")
-                self.logger.exception("Detalles del error de validación/OCR:")
-        self.logger.info("--- Fase de Validación y OCR Finalizada ---")
-        
-        self.logger.info("Procesamiento del pipeline de vouchers finalizado.")
+                self.logger.error(f"Error procesando {len(trabajos)} trabajos de {etapa}: {e}")
+                self.logger.exception(f"Detalles del error de {etapa}:")
+                for trabajo in trabajos:
+                    self.job_queue.fallar(trabajo, worker, str(e))
+            procesados += len(trabajos)
+        self.results_writer.flush()
+        self.logger.info(f"Worker {worker} finalizado: {procesados} trabajos procesados.")
+        return procesados
+
+    def _ruta_segmento_en_cola(self, trabajo: Trabajo) -> Path:
+        """
+        Ubica el archivo del segmento de un trabajo.
+
+        Si un intento anterior lo movió a 'validated_voucher'/'no_voucher' y se interrumpió
+        antes de completar el trabajo, se usa el archivo ya movido.
+        """
+        nombre = trabajo.datos['nombre']
+        for candidato in (Path(trabajo.datos['segmento']),
+                          self.dirs['validated_voucher'] / f"{nombre}_v.png",
+                          self.dirs['no_voucher'] / f"{nombre}.png"):
+            if candidato.exists():
+                return candidato
+        raise FileNotFoundError(f"No se encontró el archivo del segmento {nombre}")
+
+    def _abrir_segmentos_en_cola(self, trabajos: list[Trabajo]) -> tuple[list[Path], list[Image.Image]]:
+        rutas = [self._ruta_segmento_en_cola(trabajo) for trabajo in trabajos]
+        imagenes = []
+        for ruta in rutas:
+            with Image.open(ruta) as img:
+                imagenes.append(img.convert('RGB'))
+        return rutas, imagenes
+
+    def _trabajo_segmentacion(self, trabajo: Trabajo, worker: str):
+        """
+        Segmenta una imagen de entrada, guarda sus segmentos en 'single_voucher' y encola su validación.
+
+        El nombre de cada segmento lleva como sufijo el prefijo de la huella de la imagen, y
+        lo conserva en 'validated_voucher', 'no_voucher' y en su resultado de OCR, para que
+        entradas distintas con el mismo nombre no se sobrescriban.
+        """
+        metricas = obtener_metricas()
+        img_file = Path(trabajo.datos['imagen'])
+        metricas.incrementar("imagenes_entrada")
+        self.logger.info(f"Procesando archivo de imagen principal: {img_file.name}")
+        segments = self.segmenter.segment_records(img_file)
+        self.logger.info(f"Encontrados {len(segments)} segmentos en {img_file.name}.")
+        metricas.incrementar("segmentos", len(segments))
+
+        siguientes = []
+        for idx, registro in enumerate(segments):
+            seg = registro.imagen
+            nombre = f"{img_file.stem}_voucher_{idx}_{trabajo.huella[:8]}"
+            seg_path = self.dirs['single_voucher'] / f"{nombre}.png"
+            # Escritura atómica: otro worker nunca ve un segmento a medio escribir
+            tmp_path = seg_path.with_name(seg_path.name + '.tmp')
+            seg.save(tmp_path, format='PNG')
+            os.replace(tmp_path, seg_path)
+            datos = {'segmento': str(seg_path), 'nombre': nombre, 'origen': img_file.name,
+                     'bbox': list(registro.bbox) if registro.bbox is not None else None,
+                     'predicted_iou': registro.predicted_iou, 'stability_score': registro.stability_score,
+                     'area': registro.area}
+            siguientes.append(('validacion', idx, datos))
+        self.job_queue.completar(trabajo, worker, siguientes)
+
+    def _trabajos_validacion(self, trabajos: list[Trabajo], worker: str):
+        """
+        Valida un lote de segmentos, los mueve a 'validated_voucher' o 'no_voucher' y encola el OCR de los validados.
+        """
+        rutas, imagenes = self._abrir_segmentos_en_cola(trabajos)
+        decisiones, probabilidades = self._decidir_lote([
+            SegmentoDetectado(imagen, _bbox_de_datos(trabajo.datos), trabajo.datos.get('predicted_iou'),
+                              trabajo.datos.get('stability_score'), trabajo.datos.get('area'), trabajo.datos.get('origen'))
+            for trabajo, imagen in zip(trabajos, imagenes)
+        ])
+        metricas = obtener_metricas()
+        metricas.incrementar("segmentos_validados", sum(decisiones))
+        metricas.incrementar("segmentos_rechazados", len(decisiones) - sum(decisiones))
+        for trabajo, ruta, es_voucher, prob in zip(trabajos, rutas, decisiones, probabilidades):
+            nombre = trabajo.datos['nombre']
+            prob = float(prob) if prob is not None else None
+            detalle_prob = f" (probabilidad: {prob:.3f})" if prob is not None else ""
+            if es_voucher:
+                self.logger.info(f"Segmento {nombre} VALIDADO como voucher{detalle_prob}.")
+                dest = self.dirs['validated_voucher'] / f"{nombre}_v.png"
+                siguientes = [('ocr', trabajo.indice, dict(trabajo.datos, segmento=str(dest), probabilidad=prob))]
+            else:
+                self.logger.info(f"Segmento {nombre} NO VALIDADO como voucher{detalle_prob}.")
+                dest = self.dirs['no_voucher'] / f"{nombre}.png"
+                siguientes = []
+            if ruta != dest:
+                os.replace(ruta, dest)
+            if self.job_queue.completar(trabajo, worker, siguientes) and not es_voucher and not self.save_segments:
+                dest.unlink(missing_ok=True)
+
+    def _trabajos_ocr(self, trabajos: list[Trabajo], worker: str):
+        """
+        Extrae el texto de un lote de segmentos validados y registra los resultados.
+
+        Los resultados se escriben a disco antes de completar los trabajos, de modo que un
+        trabajo completado nunca corresponde a un resultado perdido en el buffer.
+        """
+        rutas, imagenes = self._abrir_segmentos_en_cola(trabajos)
+        self.logger.info(f"Extrayendo OCR de {len(trabajos)} segmentos: {', '.join(ruta.stem for ruta in rutas)}")
+        textos = self.ocr_extractor.extract_many(imagenes)
+        obtener_metricas().incrementar("resultados_ocr", len(textos))
+        for trabajo, raw_text in zip(trabajos, textos):
+            nombre = trabajo.datos['nombre']
+            item = SegmentoEnProceso(nombre, None, trabajo.huella, trabajo.indice, origen=trabajo.datos.get('origen'),
+                                     bbox=_bbox_de_datos(trabajo.datos), probabilidad=trabajo.datos.get('probabilidad'))
+            json_path = self._guardar_resultado_ocr(f"{nombre}_v", raw_text, item)
+            self.logger.info(f"Resultado OCR para {nombre}_v guardado en {json_path}")
+        self.results_writer.flush()
+        for trabajo, ruta in zip(trabajos, rutas):
+            if self.job_queue.completar(trabajo, worker) and not self.save_segments:
+                ruta.unlink(missing_ok=True)
+
+    def _run_disk(self, img_files: list[Path]):
+        """
+        Ejecuta el pipeline en dos fases pasando los segmentos por disco.
+
+        El proceso general es:
+        1. Lee las imágenes de `img_files` (por defecto, las de 'vouchers_a_segmentar').
+        2. Para cada imagen, segmenta posibles vouchers y los guarda en 'single_voucher'.
+           Maneja errores por archivo durante la segmentación.
+        3. Lee los segmentos guardados en 'single_voucher', agrupados por imagen de entrada.
+        4. Valida cada grupo en lotes de hasta `validation_batch_size`, con los metadatos del
+           segmentador (`IValidator.predict_segments`).
+        5. Mueve los válidos a 'validated_voucher_dir', extrae su texto con OCR (`extract_many`)
+           y lo registra en el escritor de resultados (por defecto, un JSON en 'outputs_json_dir').
+        6. Mueve los no válidos a 'output_no_voucher_dir'.
+           Maneja errores por lote y por segmento durante la validación y OCR.
+
+        Si el manifiesto está activo, las entradas ya completas se omiten, solo se guardan en
+        'single_voucher' los segmentos pendientes de validación y los segmentos ya validados
+        a los que les falta el OCR se procesan al final (ver `_segmentar_entrada`).
+        """
+        try:
+            # Fase de Segmentación
+            self.logger.info("--- Iniciando Fase de Segmentación ---")
+            origenes: dict[str, SegmentoEnProceso] = {} # Nombre del segmento -> su origen (sin imagen)
+            pendientes_ocr: list[SegmentoEnProceso] = [] # Validados en ejecuciones anteriores, sin OCR
+            for img_file in img_files:
+                try:
+                    pendientes_validacion, solo_ocr = self._segmentar_entrada(img_file)
+                    pendientes_ocr.extend(solo_ocr)
+                    for item in pendientes_validacion:
+                        seg_path = self.dirs['single_voucher'] / f"{item.nombre_base}.png"
+                        self.logger.debug(f"Guardando segmento {item.indice} de {img_file.name} en: {seg_path}")
+                        item.imagen.save(seg_path)
+                        origenes[seg_path.stem] = item._replace(imagen=None)
+                except Exception as e:
+                    self.logger.error(f"Error procesando el archivo principal {img_file.name} durante la segmentación: {e}")
+                    self.logger.exception("Detalles del error de segmentación:")
+            self.logger.info("--- Fase de Segmentación Finalizada ---")
+
+            # Fase de Validación y OCR: los segmentos de cada entrada se validan en lote y con los
+            # metadatos del segmentador, como en el modo "streaming"
+            self.logger.info("--- Iniciando Fase de Validación y OCR ---")
+            lotes: dict[str | None, list[tuple[Path, SegmentoEnProceso]]] = {}
+            for seg_path in sorted(self.dirs['single_voucher'].iterdir()):
+                # Segmentos que quedaron en 'single_voucher' de ejecuciones anteriores no tienen origen conocido
+                item = origenes.get(seg_path.stem, SegmentoEnProceso(seg_path.stem, None, None, None))
+                lotes.setdefault(item.origen, []).append((seg_path, item))
+            for lote in lotes.values():
+                for inicio in range(0, len(lote), self.validation_batch_size):
+                    validados = self._validar_archivos(lote[inicio:inicio + self.validation_batch_size])
+                    self._extraer_ocr_segmentos(validados)
+                    self._guardar_manifiesto(forzar=False)
+
+            if pendientes_ocr:
+                self.logger.info(f"Extrayendo OCR de {len(pendientes_ocr)} segmentos validados en ejecuciones anteriores...")
+                self._extraer_ocr_segmentos(pendientes_ocr)
+            self.logger.info("--- Fase de Validación y OCR Finalizada ---")
+        finally:
+            self._guardar_manifiesto()
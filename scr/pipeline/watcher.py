@@ -0,0 +1,167 @@
+#scr/pipeline/watcher.py
+"""
+Módulo que define el modo daemon del pipeline: vigilancia de una carpeta de entrada.
+
+La clase `WatchFolderDaemon` mantiene un `VoucherPipeline` (y por tanto los modelos
+de sus componentes) residente en memoria y procesa las nuevas imágenes a medida que
+aparecen en la carpeta vigilada, de modo que la latencia por imagen se reduce al
+coste de inferencia.
+"""
+import time
+import logging
+import threading
+from pathlib import Path
+from typing import Union
+from scr.pipeline.voucher_pipeline import VoucherPipeline
+from scr.utils.metrics import obtener_metricas
+
+EXTENSIONES_IMAGEN = ('.jpg', '.jpeg', '.png', '.tif', '.tiff', '.bmp', '.webp')
+
+class WatchFolderDaemon:
+    """
+    Vigila una carpeta por sondeo y envía al pipeline las imágenes nuevas o modificadas.
+
+    Para no procesar archivos que todavía se están escribiendo, una imagen solo se
+    considera lista cuando su tamaño y su fecha de modificación no cambian durante
+    `settle_seconds` (debounce). Los archivos ocultos y con extensiones que no son de
+    imagen (ej. temporales de descarga) se ignoran. Si el procesamiento de un lote falla,
+    sus imágenes se reintentan en los siguientes sondeos, hasta `max_retries` veces.
+    """
+    def __init__(self,
+                 pipeline: VoucherPipeline,
+                 directorio: Union[str, Path],
+                 poll_interval: float = 2.0,
+                 settle_seconds: float = 3.0,
+                 process_existing: bool = True,
+                 max_retries: int = 3):
+        """
+        Inicializa el daemon.
+
+        Args:
+            pipeline (VoucherPipeline): Pipeline ya construido, con sus componentes cargados.
+            directorio (Union[str, Path]): Carpeta a vigilar (normalmente 'vouchers_a_segmentar').
+            poll_interval (float, optional): Segundos entre dos sondeos de la carpeta. Defaults to 2.0.
+            settle_seconds (float, optional): Segundos que un archivo debe permanecer sin cambios
+                antes de procesarse. Defaults to 3.0.
+            process_existing (bool, optional): Si es True, las imágenes presentes al iniciar
+                también se procesan; si es False, solo las que lleguen después. Defaults to True.
+            max_retries (int, optional): Reintentos de una imagen cuyo lote falló antes de darla
+                por procesada (hasta que se modifique). Defaults to 3.
+        """
+        self.pipeline = pipeline
+        self.directorio = Path(directorio)
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        self.process_existing = process_existing
+        self.max_retries = max(0, max_retries)
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self._detener = threading.Event()
+        # Firma (tamaño, mtime) de los archivos ya enviados al pipeline
+        self._procesados: dict[Path, tuple[int, int]] = {}
+        # Candidatos en espera de estabilizarse: ruta -> (firma, instante en que se observó esa firma)
+        self._candidatos: dict[Path, tuple[tuple[int, int], float]] = {}
+        # Intentos fallidos de cada imagen con su firma actual: ruta -> (firma, intentos)
+        self._fallos: dict[Path, tuple[tuple[int, int], int]] = {}
+
+    def detener(self) -> None:
+        """Solicita la finalización del bucle de vigilancia (p. ej. desde un manejador de señales)."""
+        self._detener.set()
+
+    def _escanear(self) -> dict[Path, tuple[int, int]]:
+        """Devuelve la firma (tamaño, mtime en ns) de cada imagen visible en la carpeta."""
+        firmas = {}
+        for ruta in self.directorio.iterdir():
+            if ruta.name.startswith('.') or ruta.suffix.lower() not in EXTENSIONES_IMAGEN:
+                continue
+            try:
+                stat = ruta.stat()
+            except FileNotFoundError:
+                continue # El archivo desapareció entre el listado y el stat
+            if ruta.is_file():
+                firmas[ruta] = (stat.st_size, stat.st_mtime_ns)
+        return firmas
+
+    def _archivos_listos(self) -> list[Path]:
+        """
+        Sondea la carpeta y devuelve las imágenes nuevas o modificadas que ya se estabilizaron.
+        """
+        ahora = time.monotonic()
+        firmas = self._escanear()
+        listos = []
+        for ruta, firma in firmas.items():
+            if self._procesados.get(ruta) == firma:
+                continue
+            anterior = self._candidatos.get(ruta)
+            if anterior is None or anterior[0] != firma:
+                self._candidatos[ruta] = (firma, ahora)
+            elif ahora - anterior[1] >= self.settle_seconds and firma[0] > 0:
+                listos.append(ruta)
+        # Olvidar los archivos que ya no están en la carpeta
+        for ruta in set(self._candidatos) - set(firmas):
+            del self._candidatos[ruta]
+        for ruta in set(self._procesados) - set(firmas):
+            del self._procesados[ruta]
+        for ruta in set(self._fallos) - set(firmas):
+            del self._fallos[ruta]
+        return sorted(listos)
+
+    def _registrar_lote(self, listos: list[Path], exito: bool) -> None:
+        """
+        Marca como procesadas las imágenes de un lote, o, si el lote falló, las deja como
+        candidatas para reintentarlas en el siguiente sondeo (salvo las que agotaron los reintentos).
+        """
+        for ruta in listos:
+            candidato = self._candidatos.get(ruta)
+            if candidato is None:
+                continue
+            firma = candidato[0]
+            if not exito:
+                firma_fallo, intentos = self._fallos.get(ruta, (firma, 0))
+                intentos = intentos + 1 if firma_fallo == firma else 1
+                if intentos <= self.max_retries:
+                    self._fallos[ruta] = (firma, intentos)
+                    self.logger.warning(f"{ruta.name} se reintentará ({intentos}/{self.max_retries}).")
+                    continue
+                self.logger.error(f"{ruta.name} falló {intentos} veces; no se reintentará hasta que se modifique.")
+            self._fallos.pop(ruta, None)
+            del self._candidatos[ruta]
+            self._procesados[ruta] = firma
+
+    def run(self) -> None:
+        """
+        Ejecuta el bucle de vigilancia hasta que se llame a `detener` o se interrumpa con Ctrl+C.
+
+        Las imágenes listas en cada sondeo se procesan juntas con `VoucherPipeline.process_files`.
+        Un error en un lote se registra y no detiene el daemon; sus imágenes solo se marcan
+        como procesadas si el lote termina sin errores (ver `_registrar_lote`).
+        """
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        if not self.process_existing:
+            self._procesados.update(self._escanear())
+            self.logger.info(f"Se ignoran {len(self._procesados)} imágenes ya presentes en {self.directorio}.")
+
+        self.logger.info(
+            f"Vigilando {self.directorio} (sondeo cada {self.poll_interval}s, estabilización {self.settle_seconds}s). "
+            "Pulsa Ctrl+C para detener."
+        )
+        try:
+            while not self._detener.is_set():
+                listos = self._archivos_listos()
+                if listos:
+                    self.logger.info(f"{len(listos)} nuevas imágenes listas para procesar: {[r.name for r in listos]}")
+                    inicio = time.perf_counter()
+                    exito = True
+                    try:
+                        self.pipeline.process_files(listos)
+                    except Exception as e:
+                        exito = False
+                        self.logger.error(f"Error procesando un lote de imágenes en modo daemon: {e}")
+                        self.logger.exception("Detalles del error del daemon:")
+                    self._registrar_lote(listos, exito)
+                    self.logger.info(f"Lote de {len(listos)} imágenes procesado en {time.perf_counter() - inicio:.2f}s.")
+                    obtener_metricas().publicar() # Métricas acumuladas desde el inicio del daemon
+                self._detener.wait(self.poll_interval)
+        except KeyboardInterrupt:
+            self.logger.info("Interrupción recibida. Deteniendo el daemon...")
+        self.logger.info("Daemon de vigilancia detenido.")
@@ -0,0 +1,83 @@
+#scr/pipeline/worker_pool.py
+"""
+Módulo con la ejecución multiproceso de los workers de la cola de trabajos.
+
+Los procesos hijos se crean con `fork` después de cargar los modelos en el proceso
+principal, de modo que los pesos (SAM, CLIP, Donut) se comparten entre todos los
+workers mediante copy-on-write en lugar de cargarse una vez por proceso.
+"""
+import gc
+import os
+import sys
+import logging
+import multiprocessing
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+def _limitar_hilos(hilos: int | None) -> int | None:
+    """
+    Reparte los núcleos entre los workers para no sobresuscribir la CPU con los hilos de torch.
+
+    Returns:
+        int | None: El número de hilos anterior, o None si torch no está cargado.
+    """
+    torch = sys.modules.get('torch') # Solo si algún backend cargado lo importó
+    if torch is None or hilos is None:
+        return None
+    anteriores = torch.get_num_threads()
+    torch.set_num_threads(hilos)
+    return anteriores
+
+def _ejecutar_hijo(objetivo: Callable[[], object], hilos: int) -> None:
+    _limitar_hilos(hilos)
+    objetivo()
+
+def ejecutar_en_procesos(objetivo: Callable[[], object], num_procesos: int,
+                         antes_de_fork: Callable[[], None] | None = None) -> None:
+    """
+    Ejecuta `objetivo` en `num_procesos` procesos: el actual y `num_procesos - 1` hijos.
+
+    Los hijos heredan por `fork` el estado del proceso actual (modelos ya cargados).
+    Si el sistema no soporta `fork` (ej. Windows), `objetivo` se ejecuta solo en el
+    proceso actual. Un hijo que termina con error no interrumpe al resto.
+
+    Args:
+        objetivo (Callable[[], object]): Función que ejecuta cada worker (ej. vaciar la cola).
+        num_procesos (int): Número total de procesos worker.
+        antes_de_fork (Callable[[], None] | None, optional): Se llama en el proceso actual antes
+            de crear los hijos, para liberar recursos que no deben heredarse (conexiones a
+            la base de datos, buffers de escritura). Defaults to None.
+    """
+    if num_procesos <= 1:
+        objetivo()
+        return
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        logger.warning("El sistema no soporta 'fork'; se ejecuta un único worker en el proceso actual.")
+        objetivo()
+        return
+
+    hilos = max(1, (os.cpu_count() or 1) // num_procesos)
+    if antes_de_fork is not None:
+        antes_de_fork()
+    # Mover los objetos existentes a la generación permanente evita que el recolector
+    # los recorra (y escriba en sus páginas) en los hijos, preservando el copy-on-write.
+    gc.freeze()
+    contexto = multiprocessing.get_context('fork')
+    hijos = [
+        contexto.Process(target=_ejecutar_hijo, args=(objetivo, hilos), name=f"voucher_worker_{i}")
+        for i in range(1, num_procesos)
+    ]
+    for hijo in hijos:
+        hijo.start()
+    logger.info(f"{len(hijos)} procesos worker iniciados (más el proceso principal), {hilos} hilos de torch por proceso.")
+    hilos_anteriores = _limitar_hilos(hilos)
+    try:
+        objetivo()
+    finally:
+        for hijo in hijos:
+            hijo.join()
+            if hijo.exitcode != 0:
+                logger.error(f"El proceso worker {hijo.name} terminó con código {hijo.exitcode}.")
+        gc.unfreeze()
+        _limitar_hilos(hilos_anteriores) # El modo "--watch" y los modos siguientes usan todos los núcleos
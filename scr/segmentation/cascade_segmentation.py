@@ -0,0 +1,131 @@
+#scr/segmentation/cascade_segmentation.py
+"""
+Segmentador en cascada: una vía rápida (`ContourSegmenter`) con un segmentador de
+respaldo (por defecto `SamSegmenter`) para las imágenes en las que la vía rápida no
+encuentra vouchers plausibles o no tiene suficiente confianza.
+"""
+from pathlib import Path
+from typing import List
+import logging
+import threading
+from PIL import Image
+from scr.segmentation.isegmenter import ISegmenter, SegmentoDetectado
+from scr.segmentation.contour_segmentation import ContourSegmenter
+from scr.utils.metrics import obtener_metricas
+
+class CascadeSegmenter(ISegmenter):
+    """
+    Implementación de `ISegmenter` que prueba primero la segmentación por contornos y
+    recurre al segmentador de respaldo solo cuando hace falta.
+    """
+    def __init__(self, fast: ContourSegmenter, fallback: ISegmenter | None = None,
+                 min_confidence: float = 0.9, fallback_factory=None):
+        """
+        Inicializa el segmentador en cascada.
+
+        Args:
+            fast (ContourSegmenter): Segmentador de la vía rápida.
+            fallback (ISegmenter | None, optional): Segmentador de respaldo. Si es None, se
+                construye con `fallback_factory` la primera vez que se necesita. Defaults to None.
+            min_confidence (float, optional): Confianza mínima de la vía rápida para aceptar
+                su resultado. Defaults to 0.9.
+            fallback_factory (Callable[[], ISegmenter] | None, optional): Construye el segmentador
+                de respaldo de forma diferida (ej. para no cargar SAM si todas las imágenes
+                son escaneos limpios). Defaults to None.
+
+        Raises:
+            ValueError: Si no se proporciona ni `fallback` ni `fallback_factory`.
+        """
+        if fallback is None and fallback_factory is None:
+            raise ValueError("CascadeSegmenter requiere un segmentador de respaldo o una función que lo construya.")
+        self.fast = fast
+        self._fallback = fallback
+        self._fallback_factory = fallback_factory
+        self._lock_fallback = threading.Lock() # Los workers del modo "concurrent" comparten la instancia
+        self.min_confidence = min_confidence
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.info(
+            f"CascadeSegmenter inicializado (confianza mínima: {min_confidence}, "
+            f"respaldo {'cargado' if fallback is not None else 'diferido'})."
+        )
+
+    @classmethod
+    def from_config(cls, segmentation_config: dict, device) -> "CascadeSegmenter":
+        """
+        Construye el segmentador a partir de la sección `segmentation` de settings.yml.
+
+        Args:
+            segmentation_config (dict): La subsección 'contour' configura la vía rápida y la
+                subsección 'cascade' la cascada: 'min_confidence', 'fallback' (tipo registrado en
+                `SEGMENTADORES`, por defecto "sam", que se construye con el resto de la sección)
+                y 'lazy_fallback' (cargar el respaldo solo cuando se necesite; conviene
+                desactivarlo si los workers se crean con `fork`, para que compartan el modelo).
+            device (torch.device): Dispositivo donde cargar el modelo de respaldo.
+        """
+        from scr.segmentation.segmenter_factory import SEGMENTADORES # Evita el import circular
+
+        cascade_config = segmentation_config.get('cascade', {}) or {}
+        tipo_respaldo = cascade_config.get('fallback', 'sam')
+        if tipo_respaldo == 'cascade':
+            raise ValueError("El segmentador de respaldo de 'cascade' no puede ser 'cascade'.")
+        def crear_respaldo() -> ISegmenter:
+            # El módulo del respaldo (y torch) se importa al construirlo, no antes: con lazy_fallback, al primer uso
+            return SEGMENTADORES.obtener(tipo_respaldo).from_config(segmentation_config, device)
+
+        lazy = cascade_config.get('lazy_fallback', False)
+        return cls(
+            fast=ContourSegmenter.from_config(segmentation_config, device),
+            fallback=None if lazy else crear_respaldo(),
+            min_confidence=cascade_config.get('min_confidence', 0.9),
+            fallback_factory=crear_respaldo,
+        )
+
+    @property
+    def fallback(self) -> ISegmenter:
+        """El segmentador de respaldo, construyéndolo si aún no existe."""
+        if self._fallback is None:
+            with self._lock_fallback:
+                if self._fallback is None:
+                    self.logger.info("Cargando el segmentador de respaldo...")
+                    self._fallback = self._fallback_factory()
+        return self._fallback
+
+    def segment(self, image_path: Path) -> List[Image.Image]:
+        """
+        Segmenta la imagen con la vía rápida o con el segmentador de respaldo.
+
+        Args:
+            image_path (Path): La ruta a la imagen a segmentar.
+
+        Returns:
+            List[Image.Image]: Los segmentos válidos (ver `segment_records`).
+        """
+        return [segmento.imagen for segmento in self.segment_records(image_path)]
+
+    def segment_records(self, image_path: Path) -> List[SegmentoDetectado]:
+        """
+        Segmenta la imagen con la vía rápida y, si no encuentra vouchers plausibles o su
+        confianza es menor que `min_confidence`, con el segmentador de respaldo.
+
+        Args:
+            image_path (Path): La ruta a la imagen a segmentar.
+
+        Returns:
+            List[SegmentoDetectado]: Los segmentos válidos, ordenados de arriba hacia abajo, con
+                los metadatos del segmentador que los produjo.
+
+        Raises:
+            FileNotFoundError: Si `image_path` no existe.
+            PIL.UnidentifiedImageError: Si `image_path` no es un archivo de imagen válido.
+        """
+        metricas = obtener_metricas()
+        segmentos, confianza = self.fast.segment_records_with_confidence(image_path)
+        if segmentos and confianza >= self.min_confidence:
+            metricas.incrementar("segmentacion_via_rapida")
+            return segmentos
+        self.logger.info(
+            f"Vía rápida insuficiente para {image_path.name} ({len(segmentos)} segmentos, "
+            f"confianza {confianza:.3f}). Usando el segmentador de respaldo."
+        )
+        metricas.incrementar("segmentacion_respaldo")
+        return self.fallback.segment_records(image_path)
@@ -0,0 +1,206 @@
+#scr/segmentation/contour_segmentation.py
+"""
+Segmentación rápida de vouchers con visión por computador clásica (OpenCV).
+
+Pensada para escaneos limpios de escáner plano, en los que los vouchers son
+rectángulos de alto contraste sobre fondo blanco: un umbral adaptativo, un cierre
+morfológico y la búsqueda de contornos externos bastan para localizarlos, sin
+cargar ni ejecutar SAM. `CascadeSegmenter` la combina con SAM como respaldo.
+"""
+from pathlib import Path
+from typing import List
+import logging
+import cv2
+import numpy as np
+from PIL import Image
+from scr.segmentation.isegmenter import ISegmenter, SegmentoDetectado
+from scr.segmentation.mask_filters import AR_RANGE, AREA_RANGE, filtrar_cajas, tamano_kernel
+from scr.utils.metrics import obtener_metricas
+
+class ContourSegmenter(ISegmenter):
+    """
+    Implementación de `ISegmenter` basada en contornos de OpenCV y umbral adaptativo.
+
+    Aplica los mismos filtros de área y relación de aspecto que `SamSegmenter` y, además,
+    mide la rectangularidad de cada contorno candidato (área del contorno / área de su
+    rectángulo mínimo). La rectangularidad del peor candidato de área y proporciones
+    plausibles, incluidos los descartados por `min_rectangularity` (vouchers fusionados,
+    parciales o irregulares), es la confianza de la segmentación, que `CascadeSegmenter`
+    usa para decidir si recurrir a SAM.
+    """
+    def __init__(self, device=None, working_max_side: int | None = 1024, block_size: int = 51,
+                 c: float = 10.0, min_rectangularity: float = 0.8,
+                 ar_range: tuple[float, float] = AR_RANGE, area_range: tuple[int, int] = AREA_RANGE):
+        """
+        Inicializa el segmentador por contornos.
+
+        Args:
+            device (torch.device | None, optional): No se usa (no hay modelo); se acepta por
+                compatibilidad con `SegmenterFactory`. Defaults to None.
+            working_max_side (int | None, optional): Lado mayor de la copia reducida sobre la que se
+                buscan los contornos (None = resolución completa). Los recortes se hacen sobre la
+                imagen original. Defaults to 1024.
+            block_size (int, optional): Tamaño (impar) del vecindario del umbral adaptativo, en
+                píxeles de la resolución de trabajo. Defaults to 51.
+            c (float, optional): Constante restada a la media local en el umbral adaptativo.
+                Defaults to 10.0.
+            min_rectangularity (float, optional): Rectangularidad mínima de un contorno para
+                considerarlo un voucher. Defaults to 0.8.
+            ar_range (tuple[float, float], optional): Rango de relación de aspecto. Defaults to AR_RANGE.
+            area_range (tuple[int, int], optional): Rango de área en píxeles originales. Defaults to AREA_RANGE.
+        """
+        self.working_max_side = working_max_side
+        self.block_size = max(3, int(block_size) | 1) # adaptiveThreshold requiere un tamaño impar
+        self.c = c
+        self.min_rectangularity = min_rectangularity
+        self.ar_range = tuple(ar_range)
+        self.area_range = tuple(area_range)
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.info(
+            f"ContourSegmenter inicializado (resolución de trabajo: {working_max_side or 'completa'}, "
+            f"block_size: {self.block_size}, c: {c}, rectangularidad mínima: {min_rectangularity})"
+        )
+
+    @classmethod
+    def from_config(cls, segmentation_config: dict, device=None) -> "ContourSegmenter":
+        """
+        Construye el segmentador a partir de la sección `segmentation` de settings.yml.
+
+        Args:
+            segmentation_config (dict): Sus parámetros se leen de la subsección 'contour'
+                ('working_max_side', 'block_size', 'c', 'min_rectangularity').
+            device (torch.device | None, optional): No se usa. Defaults to None.
+        """
+        contour_config = segmentation_config.get('contour', {}) or {}
+        return cls(device=device, **contour_config)
+
+    def segment(self, image_path: Path) -> List[Image.Image]:
+        """
+        Segmenta la imagen especificada buscando contornos rectangulares.
+
+        Args:
+            image_path (Path): La ruta a la imagen a segmentar.
+
+        Returns:
+            List[Image.Image]: Los segmentos válidos, ordenados de arriba hacia abajo.
+
+        Raises:
+            FileNotFoundError: Si `image_path` no existe.
+            PIL.UnidentifiedImageError: Si `image_path` no es un archivo de imagen válido.
+        """
+        return [segmento.imagen for segmento in self.segment_records_with_confidence(image_path)[0]]
+
+    def segment_records(self, image_path: Path) -> List[SegmentoDetectado]:
+        """
+        Segmenta la imagen y devuelve cada segmento con su bbox (sin puntuaciones de SAM).
+
+        Args:
+            image_path (Path): La ruta a la imagen a segmentar.
+
+        Returns:
+            List[SegmentoDetectado]: Los segmentos válidos, ordenados de arriba hacia abajo.
+        """
+        return self.segment_records_with_confidence(image_path)[0]
+
+    def segment_records_with_confidence(self, image_path: Path) -> tuple[List[SegmentoDetectado], float]:
+        """
+        Segmenta la imagen y devuelve los segmentos con su bbox y la confianza de la segmentación.
+
+        Args:
+            image_path (Path): La ruta a la imagen a segmentar.
+
+        Returns:
+            tuple[List[SegmentoDetectado], float]: Los segmentos válidos (de arriba hacia abajo)
+                y la rectangularidad del peor candidato plausible, aceptado o no (0.0 si no se
+                encontró ningún segmento válido).
+
+        Raises:
+            FileNotFoundError: Si `image_path` no existe.
+            PIL.UnidentifiedImageError: Si `image_path` no es un archivo de imagen válido.
+        """
+        metricas = obtener_metricas()
+        with metricas.medir("decodificacion_imagen"):
+            img_pil_original = Image.open(image_path).convert("RGB")
+
+        cajas, rectangularidades = self.detectar_cajas(img_pil_original)
+        confiables = rectangularidades >= self.min_rectangularity
+        # Un candidato descartado también baja la confianza: puede ser un voucher mal separado
+        confianza = float(rectangularidades.min()) if confiables.any() else 0.0
+        cajas = cajas[confiables]
+        if not confiables.all():
+            self.logger.debug(f"{int(np.count_nonzero(~confiables))} candidatos de {image_path.name} con rectangularidad < {self.min_rectangularity}.")
+        orden = np.argsort(cajas[:, 1], kind='stable') # De arriba hacia abajo
+        segmentos = [
+            SegmentoDetectado(
+                imagen=img_pil_original.crop((int(x0), int(y0), int(x1), int(y1))),
+                bbox=(int(x0), int(y0), int(x1 - x0), int(y1 - y0)),
+                origen=image_path.name,
+            )
+            for x0, y0, x1, y1 in cajas[orden]
+        ]
+        self.logger.info(
+            f"Segmentación por contornos finalizada para {image_path.name}. "
+            f"Encontrados {len(segmentos)} segmentos válidos (confianza: {confianza:.3f})."
+        )
+        return segmentos, confianza
+
+    def detectar_cajas(self, img_pil_original: Image.Image,
+                       area_range: tuple[int, int] | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Detecta las regiones candidatas de una imagen que cumplen los filtros geométricos.
+
+        También la usan otros segmentadores como paso barato de propuesta de regiones
+        (ver `SamBoxSegmenter`).
+
+        Args:
+            img_pil_original (Image.Image): La imagen original completa.
+            area_range (tuple[int, int] | None, optional): Rango de área a aplicar en lugar
+                del configurado. Defaults to None.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Las cajas (x0, y0, x1, y1) en píxeles originales
+                y la rectangularidad de cada una.
+        """
+        with obtener_metricas().medir("segmentacion_contornos"):
+            gris = img_pil_original.convert("L")
+            escala = 1.0
+            lado_mayor = max(gris.width, gris.height)
+            if self.working_max_side and lado_mayor > self.working_max_side:
+                escala = self.working_max_side / lado_mayor
+                tamano = (max(1, round(gris.width * escala)), max(1, round(gris.height * escala)))
+                gris = gris.resize(tamano, Image.BILINEAR, reducing_gap=2.0)
+                escala = tamano[0] / img_pil_original.width
+            cajas, rectangularidades = self._detectar_rectangulos(np.asarray(gris))
+            originales, validas = filtrar_cajas(
+                cajas, img_pil_original.size, self.ar_range, area_range or self.area_range, escala
+            )
+        return originales[validas], rectangularidades[validas]
+
+    def _detectar_rectangulos(self, gris: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Busca las regiones de primer plano de una imagen en escala de grises.
+
+        El umbral adaptativo marca los bordes y el texto de los vouchers frente al fondo
+        blanco; el cierre morfológico (con el mismo kernel adaptativo que la limpieza de
+        las máscaras de SAM) los une en una región por voucher.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Los bounding boxes (N, 4) como (x, y, ancho, alto)
+                y la rectangularidad de cada contorno.
+        """
+        suavizada = cv2.GaussianBlur(gris, (5, 5), 0)
+        binaria = cv2.adaptiveThreshold(
+            suavizada, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, self.block_size, self.c
+        )
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, tamano_kernel(gris.shape[:2]))
+        cerrada = cv2.morphologyEx(binaria, cv2.MORPH_CLOSE, kernel)
+        contornos, _ = cv2.findContours(cerrada, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        cajas = np.zeros((len(contornos), 4), dtype=np.float64)
+        rectangularidades = np.zeros(len(contornos), dtype=np.float64)
+        for i, contorno in enumerate(contornos):
+            cajas[i] = cv2.boundingRect(contorno)
+            (_, _), (ancho, alto), _ = cv2.minAreaRect(contorno)
+            if ancho * alto > 0:
+                rectangularidades[i] = cv2.contourArea(contorno) / (ancho * alto)
+        return cajas, rectangularidades
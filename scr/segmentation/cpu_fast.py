@@ -0,0 +1,100 @@
+#scr/segmentation/cpu_fast.py
+"""
+Ruta rápida de inferencia de SAM en CPU ("cpu_fast").
+
+El encoder ViT concentra casi todo el coste de SAM por escaneo. En CPU, esta ruta:
+- ejecuta el modelo bajo `torch.inference_mode` (sin seguimiento de versiones ni autograd),
+- ejecuta el encoder con autocast bfloat16 (en CPUs con AVX512-BF16/AMX duplica el
+  rendimiento de las multiplicaciones de matrices; en las demás puede ser más lento),
+  devolviendo el embedding en float32 para que el decoder y el post-procesado de
+  `segment_anything` no cambien,
+- usa el formato de memoria channels-last en la convolución de entrada del encoder,
+- compila opcionalmente el encoder con `torch.compile`, con una pasada de calentamiento
+  al construir el segmentador para que la compilación no recaiga en el primer escaneo,
+- fija explícitamente el número de hilos de torch.
+
+bfloat16 altera ligeramente las máscaras; `benchmarks/bench_sam_cpu_fast.py` mide la
+aceleración y la deriva (IoU) respecto a la ruta por defecto.
+"""
+import time
+import logging
+from contextlib import nullcontext
+import torch
+
+logger = logging.getLogger(__name__)
+
+class EncoderRapido(torch.nn.Module):
+    """
+    Envoltorio del encoder de imagen de SAM para la ruta "cpu_fast".
+
+    Expone `img_size`, que `SamPredictor` y `Sam.preprocess` leen del encoder.
+    """
+    def __init__(self, encoder: torch.nn.Module, bfloat16: bool = True, channels_last: bool = True,
+                 compilar: bool = False):
+        super().__init__()
+        self.img_size = encoder.img_size
+        self.bfloat16 = bfloat16
+        self.channels_last = channels_last
+        if channels_last:
+            encoder = encoder.to(memory_format=torch.channels_last)
+        self.encoder = torch.compile(encoder) if compilar else encoder
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        if self.channels_last:
+            x = x.contiguous(memory_format=torch.channels_last)
+        if not self.bfloat16:
+            return self.encoder(x)
+        with torch.autocast('cpu', dtype=torch.bfloat16):
+            embedding = self.encoder(x)
+        return embedding.float()
+
+def aplicar_cpu_fast(sam: torch.nn.Module, device: torch.device, opciones: dict | None) -> tuple[bool, str]:
+    """
+    Prepara un modelo SAM ya cargado para la ruta "cpu_fast", si está activada.
+
+    Sustituye `sam.image_encoder` por un `EncoderRapido`; debe llamarse antes de que
+    el modelo se use (los `SamPredictor` creados antes siguen siendo válidos, ya que
+    acceden al encoder a través del modelo).
+
+    Args:
+        sam (torch.nn.Module): El modelo SAM.
+        device (torch.device): Dispositivo del modelo; la ruta solo se aplica en CPU.
+        opciones (dict | None): Subsección 'cpu_fast' de la configuración ('enabled',
+            'bfloat16', 'channels_last', 'compile', 'warmup', 'threads').
+
+    Returns:
+        tuple[bool, str]: Si la ruta quedó activada y el sufijo para la variante de las claves
+            de caché ("" si las máscaras no cambian respecto a la ruta por defecto, "_bf16" con
+            autocast bfloat16).
+    """
+    opciones = opciones or {}
+    if not opciones.get('enabled', False):
+        return False, ""
+    if device.type != 'cpu':
+        logger.warning(f"cpu_fast solo se aplica en CPU; se ignora en el dispositivo {device}.")
+        return False, ""
+
+    if opciones.get('threads'):
+        torch.set_num_threads(int(opciones['threads']))
+    bfloat16 = opciones.get('bfloat16', True)
+    sam.eval()
+    sam.image_encoder = EncoderRapido(
+        sam.image_encoder, bfloat16=bfloat16,
+        channels_last=opciones.get('channels_last', True), compilar=opciones.get('compile', False)
+    )
+    logger.info(
+        f"Ruta cpu_fast activada (bfloat16: {bfloat16}, channels_last: {opciones.get('channels_last', True)}, "
+        f"compile: {opciones.get('compile', False)}, hilos: {torch.get_num_threads()})"
+    )
+
+    if opciones.get('warmup', True):
+        inicio = time.perf_counter()
+        tamano = sam.image_encoder.img_size
+        with torch.inference_mode():
+            sam.image_encoder(torch.zeros(1, 3, tamano, tamano, device=device))
+        logger.info(f"Calentamiento del encoder completado en {time.perf_counter() - inicio:.2f}s.")
+    return True, "_bf16" if bfloat16 else ""
+
+def contexto_inferencia(cpu_fast: bool):
+    """Devuelve `torch.inference_mode()` en la ruta "cpu_fast" y un contexto nulo en la ruta por defecto."""
+    return torch.inference_mode() if cpu_fast else nullcontext()
@@ -0,0 +1,166 @@
+#scr/segmentation/embedding_cache.py
+"""
+Caché persistente de los embeddings del encoder de imagen de SAM.
+
+El encoder ViT es, con diferencia, la operación más costosa por escaneo. Al reajustar
+los umbrales de filtrado o re-ejecutar tras una caída se recalculan embeddings
+idénticos; esta caché los guarda en disco en float16 (un archivo `.npy` por imagen,
+leído con memoria mapeada) con un presupuesto de tamaño total: al superarlo se
+eliminan las entradas usadas hace más tiempo.
+
+`envolver_predictor` instala la caché en un `SamPredictor` (el que usa internamente
+`SamAutomaticMaskGenerator` o el de `SamBoxSegmenter`): en un acierto, `set_image` no
+ejecuta el encoder y solo se repite la decodificación de máscaras.
+"""
+import os
+import time
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Union
+import numpy as np
+from scr.utils.metrics import obtener_metricas
+
+class EmbeddingCache:
+    """
+    Almacén en disco de embeddings de SAM con expulsión por antigüedad de uso.
+
+    Las claves combinan la huella del contenido de la imagen que recibe el encoder y la
+    variante del modelo (tipo y checkpoint). Las escrituras son atómicas, de modo que
+    varios procesos pueden compartir el directorio.
+    """
+    def __init__(self, directorio: Union[str, Path], max_bytes: int = 2048 * 1024 * 1024):
+        """
+        Inicializa la caché.
+
+        Args:
+            directorio (Union[str, Path]): Directorio del almacén.
+            max_bytes (int, optional): Tamaño máximo total de las entradas en disco. Defaults to 2 GiB.
+        """
+        self.directorio = Path(directorio)
+        self.max_bytes = max_bytes
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.debug(f"EmbeddingCache inicializada (directorio: {self.directorio}, presupuesto: {max_bytes} bytes).")
+
+    @staticmethod
+    def clave(imagen: np.ndarray, variante: str) -> str:
+        """
+        Calcula la clave de una imagen: huella de su contenido y dimensiones más la variante del modelo.
+
+        Args:
+            imagen (np.ndarray): La imagen (HWC, uint8) que se pasará al encoder.
+            variante (str): Identificador del modelo (ej. "vit_b_sam_vit_b_01ec64").
+        """
+        huella = hashlib.blake2b(np.ascontiguousarray(imagen).data, digest_size=16).hexdigest()
+        alto, ancho = imagen.shape[:2]
+        return f"{huella}_{ancho}x{alto}_{variante}"
+
+    def _ruta(self, clave: str) -> Path:
+        return self.directorio / f"{clave}.npy"
+
+    def get(self, clave: str) -> np.ndarray | None:
+        """
+        Devuelve el embedding asociado a una clave como un array de solo lectura en memoria mapeada.
+
+        Returns:
+            np.ndarray | None: El embedding (float16), o None si no está en caché.
+        """
+        ruta = self._ruta(clave)
+        try:
+            embedding = np.load(ruta, mmap_mode='r')
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"No se pudo leer la entrada de caché {ruta}: {e}")
+            return None
+        try:
+            os.utime(ruta) # Marca el uso para la política de expulsión
+        except OSError:
+            pass
+        return embedding
+
+    def put(self, clave: str, embedding: np.ndarray) -> None:
+        """
+        Guarda un embedding en float16 y expulsa las entradas más antiguas si se supera el presupuesto.
+        """
+        ruta = self._ruta(clave)
+        tmp = ruta.with_name(f"{ruta.stem}.{os.getpid()}.tmp")
+        try:
+            with open(tmp, 'wb') as f:
+                np.save(f, np.asarray(embedding, dtype=np.float16))
+            os.replace(tmp, ruta)
+        except OSError as e:
+            self.logger.warning(f"No se pudo guardar la entrada de caché {ruta}: {e}")
+            tmp.unlink(missing_ok=True)
+            return
+        self._expulsar()
+
+    def _expulsar(self) -> None:
+        """Elimina las entradas usadas hace más tiempo hasta respetar `max_bytes`."""
+        with self._lock:
+            entradas = []
+            for entrada in os.scandir(self.directorio):
+                if entrada.name.endswith('.npy'):
+                    try:
+                        info = entrada.stat()
+                    except FileNotFoundError: # Eliminada por otro proceso
+                        continue
+                    entradas.append((info.st_mtime, info.st_size, entrada.path))
+            total = sum(tamano for _, tamano, _ in entradas)
+            if total <= self.max_bytes:
+                return
+            entradas.sort()
+            eliminadas = 0
+            for _, tamano, ruta in entradas:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(ruta)
+                except FileNotFoundError:
+                    pass
+                total -= tamano
+                eliminadas += 1
+            self.logger.debug(f"{eliminadas} embeddings expulsados de la caché (tamaño actual: {total} bytes).")
+
+def envolver_predictor(predictor, cache: EmbeddingCache, variante: str) -> None:
+    """
+    Instala la caché de embeddings en el método `set_image` de un `SamPredictor`.
+
+    En un acierto se restaura el estado que dejaría `set_image` (embedding, tamaño original
+    y tamaño de entrada al encoder) sin ejecutar el encoder; en un fallo se ejecuta el
+    `set_image` original y se guarda el embedding resultante.
+
+    Args:
+        predictor (SamPredictor): El predictor a envolver.
+        cache (EmbeddingCache): La caché de embeddings.
+        variante (str): Identificador del modelo, que forma parte de la clave.
+    """
+    import torch # El módulo solo se usa con segmentadores SAM, que ya importan torch
+
+    set_image_original = predictor.set_image
+    logger = logging.getLogger(EmbeddingCache.__name__)
+
+    def set_image(image: np.ndarray, image_format: str = "RGB") -> None:
+        metricas = obtener_metricas()
+        clave = cache.clave(image, f"{variante}_{image_format}")
+        embedding = cache.get(clave)
+        if embedding is None:
+            metricas.incrementar("embeddings_cache_fallos")
+            set_image_original(image, image_format)
+            inicio = time.perf_counter()
+            cache.put(clave, predictor.features.detach().cpu().numpy())
+            logger.debug(f"Embedding guardado en caché ({clave}) en {time.perf_counter() - inicio:.3f}s.")
+            return
+        metricas.incrementar("embeddings_cache_aciertos")
+        predictor.reset_image()
+        predictor.original_size = image.shape[:2]
+        predictor.input_size = predictor.transform.get_preprocess_shape(
+            image.shape[0], image.shape[1], predictor.model.image_encoder.img_size
+        )
+        predictor.features = torch.from_numpy(np.array(embedding, dtype=np.float32)).to(predictor.device)
+        predictor.is_image_set = True
+
+    predictor.set_image = set_image
@@ -4,17 +4,52 @@ Define la interfaz abstracta para los componentes de segmentación de imágenes.
 """
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import List
+from typing import List, NamedTuple
 from PIL import Image
 
+class SegmentoDetectado(NamedTuple):
+    """
+    Un segmento extraído por un segmentador, con los metadatos que este conoce.
+
+    Los segmentadores basados en SAM rellenan las puntuaciones de calidad de la máscara;
+    los demás dejan en None lo que no calculan.
+    """
+    imagen: Image.Image
+    bbox: tuple[int, int, int, int] | None = None  # (x, y, ancho, alto) en la imagen de entrada
+    predicted_iou: float | None = None             # IoU de la máscara predicho por SAM
+    stability_score: float | None = None           # Estabilidad de la máscara frente al umbral (SAM automático)
+    area: int | None = None                        # Píxeles de la máscara, en resolución de la imagen de entrada
+    origen: str | None = None                      # Nombre del archivo de entrada
+
 class ISegmenter(ABC):
     """
     Interfaz abstracta para un segmentador de imágenes.
 
     Los segmentadores concretos deben implementar el método `segment` para
     identificar y extraer regiones de interés (segmentos) de una imagen dada.
+    Los que conocen el bbox o la calidad de cada segmento sobrescriben además
+    `segment_records`. `SegmenterFactory` los construye con `from_config`.
     """
 
+    @classmethod
+    def from_config(cls, segmentation_config: dict, device) -> "ISegmenter":
+        """
+        Construye el segmentador a partir de la sección `segmentation` de settings.yml.
+
+        La implementación por defecto pasa las claves de la configuración (excepto 'type')
+        como argumentos del constructor, junto con `device`. Las implementaciones cuya
+        configuración no se corresponde con su constructor deben sobrescribirlo.
+
+        Args:
+            segmentation_config (dict): Configuración del segmentador.
+            device (torch.device): Dispositivo donde cargar el modelo.
+
+        Returns:
+            ISegmenter: La instancia construida.
+        """
+        params = {k: v for k, v in segmentation_config.items() if k != 'type'}
+        return cls(device=device, **params)
+
     @abstractmethod
     def segment(self, image_path: Path) -> List[Image.Image]:
         """
@@ -35,3 +70,18 @@ class ISegmenter(ABC):
             # Por ejemplo: FileNotFoundError, Exception
         """
         pass
+
+    def segment_records(self, image_path: Path) -> List[SegmentoDetectado]:
+        """
+        Segmenta una imagen y devuelve cada segmento junto con sus metadatos.
+
+        La implementación por defecto envuelve el resultado de `segment`, sin bbox ni
+        puntuaciones.
+
+        Args:
+            image_path (Path): La ruta al archivo de imagen a segmentar.
+
+        Returns:
+            List[SegmentoDetectado]: Los segmentos, en el mismo orden que `segment`.
+        """
+        return [SegmentoDetectado(imagen, origen=image_path.name) for imagen in self.segment(image_path)]
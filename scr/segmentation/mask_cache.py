@@ -0,0 +1,194 @@
+#scr/segmentation/mask_cache.py
+"""
+Caché de máscaras generadas por SAM, indexada por la huella del contenido de la imagen.
+
+Las máscaras se almacenan de forma compacta, codificadas en RLE (run-length encoding)
+junto con sus metadatos (bbox, área, puntuaciones). La caché combina un nivel en
+memoria con política LRU y un presupuesto en bytes, y un nivel persistente en disco
+(un archivo `.npz` por imagen) que sobrevive entre ejecuciones.
+"""
+import os
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Union
+import numpy as np
+
+# Metadatos numéricos de SAM que se conservan junto a cada máscara
+CAMPOS_METADATOS = ('bbox', 'area', 'predicted_iou', 'stability_score', 'crop_box')
+
+def codificar_rle(mask: np.ndarray) -> np.ndarray:
+    """
+    Codifica una máscara binaria en RLE.
+
+    Los conteos alternan tramos de ceros y unos sobre la máscara aplanada (orden C),
+    comenzando siempre por un tramo de ceros (que puede tener longitud 0).
+
+    Args:
+        mask (np.ndarray): Máscara binaria 2D.
+
+    Returns:
+        np.ndarray: Conteos de cada tramo (uint32).
+    """
+    plano = mask.ravel().astype(bool)
+    if plano.size == 0:
+        return np.zeros(0, dtype=np.uint32)
+    cambios = np.flatnonzero(plano[1:] != plano[:-1]) + 1
+    counts = np.diff(np.concatenate(([0], cambios, [plano.size])))
+    if plano[0]:
+        counts = np.concatenate(([0], counts))
+    return counts.astype(np.uint32)
+
+def decodificar_rle(counts: np.ndarray, shape: tuple) -> np.ndarray:
+    """
+    Decodifica una máscara codificada con `codificar_rle`.
+
+    Args:
+        counts (np.ndarray): Conteos de cada tramo.
+        shape (tuple): Dimensiones (alto, ancho) de la máscara original.
+
+    Returns:
+        np.ndarray: La máscara binaria (bool) con forma `shape`.
+    """
+    valores = np.zeros(len(counts), dtype=bool)
+    valores[1::2] = True
+    return np.repeat(valores, counts.astype(np.int64)).reshape(shape)
+
+def _compactar(masks: List[dict]) -> dict:
+    """
+    Convierte la lista de máscaras de SAM en un registro compacto de arrays NumPy.
+
+    Los conteos RLE de todas las máscaras se concatenan en un único array, con
+    `offsets` indicando dónde empieza cada una.
+    """
+    shape = masks[0]['segmentation'].shape if masks else (0, 0)
+    counts = [codificar_rle(m['segmentation']) for m in masks]
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum([len(c) for c in counts], out=offsets[1:])
+    registro = {
+        'shape': np.array(shape, dtype=np.int64),
+        'counts': np.concatenate(counts) if counts else np.zeros(0, dtype=np.uint32),
+        'offsets': offsets,
+    }
+    for campo in CAMPOS_METADATOS:
+        if masks and all(campo in m for m in masks):
+            registro[campo] = np.array([m[campo] for m in masks], dtype=np.float64)
+    return registro
+
+def _expandir(registro: dict) -> List[dict]:
+    """
+    Reconstruye la lista de máscaras (formato de `SamAutomaticMaskGenerator.generate`)
+    a partir de un registro compacto.
+    """
+    shape = tuple(int(v) for v in registro['shape'])
+    offsets = registro['offsets']
+    masks = []
+    for i in range(len(offsets) - 1):
+        mascara = {'segmentation': decodificar_rle(registro['counts'][offsets[i]:offsets[i + 1]], shape)}
+        for campo in CAMPOS_METADATOS:
+            if campo in registro:
+                valor = registro[campo][i]
+                mascara[campo] = valor.tolist() if np.ndim(valor) else float(valor)
+        if 'area' in mascara:
+            mascara['area'] = int(mascara['area'])
+        masks.append(mascara)
+    return masks
+
+def _bytes_registro(registro: dict) -> int:
+    """Tamaño en bytes de los arrays de un registro compacto."""
+    return sum(v.nbytes for v in registro.values())
+
+class MaskCache:
+    """
+    Caché de dos niveles para las máscaras de SAM: LRU en memoria con presupuesto en
+    bytes y almacén persistente en disco.
+
+    Las claves deben identificar tanto el contenido de la imagen (huella) como la
+    configuración que produjo las máscaras (modelo, parámetros), ya que entradas con
+    la misma clave se consideran intercambiables. Es segura para uso desde varios hilos.
+    """
+    def __init__(self, directorio: Union[str, Path, None] = None, max_bytes_memoria: int = 256 * 1024 * 1024):
+        """
+        Inicializa la caché.
+
+        Args:
+            directorio (Union[str, Path, None], optional): Directorio del almacén en disco.
+                Si es None, la caché solo vive en memoria. Defaults to None.
+            max_bytes_memoria (int, optional): Presupuesto en bytes del nivel en memoria
+                (sobre los registros RLE compactos). Defaults to 256 MiB.
+        """
+        self.directorio = Path(directorio) if directorio else None
+        self.max_bytes_memoria = max_bytes_memoria
+        self._memoria: OrderedDict[str, dict] = OrderedDict()
+        self._bytes_memoria = 0
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(self.__class__.__name__)
+        if self.directorio is not None:
+            self.directorio.mkdir(parents=True, exist_ok=True)
+        self.logger.debug(
+            f"MaskCache inicializada (directorio: {self.directorio}, presupuesto en memoria: {max_bytes_memoria} bytes)."
+        )
+
+    def _ruta(self, clave: str) -> Path:
+        return self.directorio / f"{clave}.npz"
+
+    def _guardar_en_memoria(self, clave: str, registro: dict) -> None:
+        """Inserta un registro en el nivel en memoria y expulsa los menos usados si se excede el presupuesto."""
+        tamano = _bytes_registro(registro)
+        if tamano > self.max_bytes_memoria:
+            return # Un registro mayor que todo el presupuesto no se mantiene en memoria
+        with self._lock:
+            if clave in self._memoria:
+                self._bytes_memoria -= _bytes_registro(self._memoria.pop(clave))
+            self._memoria[clave] = registro
+            self._bytes_memoria += tamano
+            while self._bytes_memoria > self.max_bytes_memoria:
+                _, expulsado = self._memoria.popitem(last=False)
+                self._bytes_memoria -= _bytes_registro(expulsado)
+
+    def get(self, clave: str) -> List[dict] | None:
+        """
+        Busca las máscaras asociadas a una clave, primero en memoria y luego en disco.
+
+        Args:
+            clave (str): Clave de la imagen (huella de contenido + variante de configuración).
+
+        Returns:
+            List[dict] | None: Las máscaras reconstruidas, o None si no están en caché.
+        """
+        with self._lock:
+            registro = self._memoria.get(clave)
+            if registro is not None:
+                self._memoria.move_to_end(clave)
+        if registro is None and self.directorio is not None and self._ruta(clave).exists():
+            try:
+                with np.load(self._ruta(clave)) as datos:
+                    registro = {k: datos[k] for k in datos.files}
+                self._guardar_en_memoria(clave, registro)
+                self.logger.debug(f"Máscaras recuperadas del almacén en disco para la clave {clave}.")
+            except Exception as e:
+                self.logger.warning(f"No se pudo leer la entrada de caché {self._ruta(clave)}: {e}")
+                registro = None
+        return _expandir(registro) if registro is not None else None
+
+    def put(self, clave: str, masks: List[dict]) -> None:
+        """
+        Almacena las máscaras de una imagen en memoria y, si hay directorio, en disco.
+
+        Args:
+            clave (str): Clave de la imagen (huella de contenido + variante de configuración).
+            masks (List[dict]): Máscaras en el formato de `SamAutomaticMaskGenerator.generate`.
+        """
+        registro = _compactar(masks)
+        self._guardar_en_memoria(clave, registro)
+        if self.directorio is None:
+            return
+        ruta = self._ruta(clave)
+        tmp = ruta.with_name(ruta.name + '.tmp')
+        try:
+            with open(tmp, 'wb') as f:
+                np.savez_compressed(f, **registro)
+            os.replace(tmp, ruta)
+        except OSError as e:
+            self.logger.warning(f"No se pudo guardar la entrada de caché {ruta}: {e}")
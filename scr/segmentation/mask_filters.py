@@ -0,0 +1,219 @@
+#scr/segmentation/mask_filters.py
+"""
+Filtros geométricos y limpieza de máscaras comunes a los segmentadores.
+
+Solo depende de NumPy, OpenCV y PIL, de modo que los segmentadores que no usan torch
+(ej. `ContourSegmenter` u `OnnxSamSegmenter`) aplican los mismos criterios de área y
+relación de aspecto que `SamSegmenter` sin importar `segment_anything` ni torch.
+"""
+import cv2
+import numpy as np
+from PIL import Image
+from scr.segmentation.isegmenter import SegmentoDetectado
+
+# Criterios por defecto de un segmento plausible, en píxeles de la imagen original
+AR_RANGE = (0.5, 3.0)
+AREA_RANGE = (15000, 300000)
+
+def tamano_kernel(img_shape: tuple) -> tuple[int, int]:
+    """Tamaño del kernel morfológico adaptativo para una imagen de dimensiones (alto, ancho)."""
+    return (max(3, img_shape[0] // 50), max(3, img_shape[1] // 50))
+
+def filtrar_cajas(
+    cajas: np.ndarray,
+    tamano_original: tuple[int, int],
+    ar_range: tuple[float, float] = AR_RANGE,
+    area_range: tuple[int, int] = AREA_RANGE,
+    escala: float = 1.0
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Lleva un conjunto de bounding boxes a la imagen original y evalúa los filtros de área
+    y relación de aspecto sobre todos ellos en una sola pasada de NumPy.
+
+    Args:
+        cajas (np.ndarray): Array (N, 4) de bounding boxes (x, y, ancho, alto) en la
+            resolución de trabajo. Las filas con ancho o alto cero se descartan.
+        tamano_original (tuple[int, int]): (ancho, alto) de la imagen original.
+        ar_range (tuple[float, float], optional): Tupla (min_aspect_ratio, max_aspect_ratio).
+            Defaults to AR_RANGE.
+        area_range (tuple[int, int], optional): Tupla (min_area, max_area) en píxeles originales.
+            Defaults to AREA_RANGE.
+        escala (float, optional): Relación entre la resolución de trabajo y la original.
+            Defaults to 1.0.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Las cajas (x0, y0, x1, y1) en píxeles originales,
+            como enteros, y la máscara booleana de las que cumplen los filtros.
+    """
+    img_w, img_h = tamano_original
+    x, y, w, h = np.asarray(cajas, dtype=np.float64).reshape(-1, 4).T
+    if escala != 1.0:
+        # Cubrir los bordes al pasar a la resolución original
+        x0, y0 = np.floor(x / escala), np.floor(y / escala)
+        x1 = np.minimum(img_w, np.ceil((x + w) / escala))
+        y1 = np.minimum(img_h, np.ceil((y + h) / escala))
+    else:
+        x0, y0, x1, y1 = x, y, x + w, y + h
+    w, h = x1 - x0, y1 - y0
+    area = w * h
+    ar = np.where(h > 0, w / np.where(h > 0, h, 1), 0.0)
+    validas = ((w > 0) & (h > 0)
+               & (ar_range[0] < ar) & (ar < ar_range[1])
+               & (area_range[0] < area) & (area < area_range[1]))
+    return np.stack([x0, y0, x1, y1], axis=1).astype(np.int64), validas
+
+def limpiar_mascara(mask: np.ndarray, img_shape: tuple) -> np.ndarray:
+    """
+    Aplica operaciones morfológicas con un kernel de tamaño adaptativo para limpiar el ruido de una máscara binaria.
+
+    Args:
+        mask (np.ndarray): La máscara binaria (array de NumPy) a limpiar.
+        img_shape (tuple): Tupla con las dimensiones (alto, ancho) de la imagen original,
+                           usada para calcular el tamaño adaptativo del kernel.
+
+    Returns:
+        np.ndarray: La máscara binaria limpiada.
+    """
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, tamano_kernel(img_shape))
+    closed = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+    opened = cv2.morphologyEx(closed, cv2.MORPH_OPEN, kernel)
+    return opened
+
+def _bbox_limpio_en_roi(segmentacion: np.ndarray, bbox: np.ndarray, kernel: np.ndarray) -> tuple[tuple[int, int, int, int], int] | None:
+    """
+    Limpia una máscara solo dentro de su bounding box (con margen) y devuelve el bbox y el área de la máscara limpia.
+
+    Fuera del bbox la máscara es nula, y el cierre y la apertura con un kernel rectangular no
+    extienden la máscara más allá de su bbox; con un margen de dos veces el kernel, el
+    resultado es idéntico al de `limpiar_mascara` sobre la imagen completa.
+
+    Args:
+        segmentacion (np.ndarray): Máscara booleana de la imagen completa.
+        bbox (np.ndarray): Bounding box (x, y, ancho, alto) de la máscara sin limpiar.
+        kernel (np.ndarray): Elemento estructurante calculado para la imagen completa.
+
+    Returns:
+        tuple[tuple[int, int, int, int], int] | None: El bbox (x, y, ancho, alto) y los píxeles
+            de la máscara limpia, o None si la limpieza la deja vacía.
+    """
+    alto, ancho = segmentacion.shape[:2]
+    margen_y, margen_x = 2 * kernel.shape[0], 2 * kernel.shape[1]
+    x, y, w, h = (int(v) for v in bbox)
+    x0, y0 = max(0, x - margen_x), max(0, y - margen_y)
+    x1, y1 = min(ancho, x + w + 1 + margen_x), min(alto, y + h + 1 + margen_y)
+    roi = segmentacion[y0:y1, x0:x1].astype(np.uint8)
+    closed = cv2.morphologyEx(roi, cv2.MORPH_CLOSE, kernel)
+    opened = cv2.morphologyEx(closed, cv2.MORPH_OPEN, kernel)
+    rx, ry, rw, rh = cv2.boundingRect(opened)
+    if rw == 0 or rh == 0:
+        return None
+    return (x0 + rx, y0 + ry, rw, rh), cv2.countNonZero(opened)
+
+def reducir_imagen(img: Image.Image, max_lado: int | None) -> tuple[Image.Image, float]:
+    """
+    Devuelve la copia de trabajo de una imagen, con su lado mayor limitado a `max_lado`, y su escala respecto a la original.
+
+    Args:
+        img (Image.Image): La imagen original.
+        max_lado (int | None): Lado mayor máximo en píxeles (None = sin reducir).
+
+    Returns:
+        tuple[Image.Image, float]: La imagen de trabajo (la misma si no hace falta reducirla) y la escala.
+    """
+    lado_mayor = max(img.width, img.height)
+    if not max_lado or lado_mayor <= max_lado:
+        return img, 1.0
+    escala = max_lado / lado_mayor
+    tamano = (max(1, round(img.width * escala)), max(1, round(img.height * escala)))
+    # La escala efectiva por eje puede diferir ligeramente por el redondeo; se usa la del ancho
+    return img.resize(tamano, Image.BILINEAR, reducing_gap=2.0), tamano[0] / img.width
+
+def filtrar_mascaras(
+    masks: list[dict],
+    img_pil_original: Image.Image,
+    min_raw_count: int = 1000,
+    ar_range: tuple[float, float] = AR_RANGE,
+    area_range: tuple[int, int] = AREA_RANGE,
+    escala: float = 1.0,
+    origen: str | None = None
+) -> list[SegmentoDetectado]:
+    """
+    Limpia y filtra las máscaras de SAM y recorta de la imagen original los segmentos que cumplen los criterios.
+
+    El filtrado se hace en tres pasos:
+    1. Rechazo temprano con los campos `area` y `bbox` que SAM calcula para cada máscara:
+       máscaras con menos de `min_raw_count` píxeles o cuyo bbox (que contiene a la máscara
+       limpia) no alcanza el área mínima, sin tocar sus píxeles.
+    2. Limpieza morfológica de las candidatas, solo dentro de su bbox con margen
+       (ver `_bbox_limpio_en_roi`).
+    3. Evaluación de la relación de aspecto y del área de todos los bbox limpios en una sola
+       pasada de NumPy.
+
+    Si las máscaras se generaron sobre una copia reducida de la imagen (`escala` < 1), los
+    bbox se llevan a coordenadas de la imagen original, de modo que los filtros (expresados
+    en píxeles originales) y el recorte no dependen de la resolución de trabajo.
+
+    Args:
+        masks (list[dict]): Máscaras tal como las devuelve el generador de SAM
+                            (claves 'segmentation' y, si están, 'area' y 'bbox').
+        img_pil_original (Image.Image): La imagen original completa (en formato PIL)
+                                        de la cual se extraen los segmentos.
+        min_raw_count (int, optional): Número mínimo de píxeles (originales) de la máscara
+                                       sin limpiar para considerarla. Defaults to 1000.
+        ar_range (tuple[float, float], optional): Tupla (min_aspect_ratio, max_aspect_ratio)
+                                                  para filtrar los segmentos. Defaults to AR_RANGE.
+        area_range (tuple[int, int], optional): Tupla (min_area, max_area) en píxeles
+                                                para filtrar los segmentos. Defaults to AREA_RANGE.
+        escala (float, optional): Relación entre la resolución de las máscaras y la de
+                                  `img_pil_original`. Defaults to 1.0.
+        origen (str | None, optional): Nombre de la imagen de entrada, que se anota en cada
+                                       segmento. Defaults to None.
+
+    Returns:
+        list[SegmentoDetectado]: Los segmentos válidos, en el orden de `masks`, con su bbox
+            limpio en la imagen original, las puntuaciones de SAM de su máscara ('predicted_iou' y
+            'stability_score') y el área de la máscara limpia (la misma que define el bbox)
+            llevada a píxeles originales.
+    """
+    if not masks:
+        return []
+    img_h, img_w = img_pil_original.height, img_pil_original.width
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, tamano_kernel(masks[0]['segmentation'].shape[:2]))
+
+    # Paso 1: rechazo temprano con los metadatos de SAM (se calculan si faltan)
+    areas = np.array([
+        m['area'] if 'area' in m else np.count_nonzero(m['segmentation']) for m in masks
+    ], dtype=np.float64)
+    bboxes = np.array([
+        m['bbox'] if 'bbox' in m else cv2.boundingRect(m['segmentation'].astype(np.uint8)) for m in masks
+    ], dtype=np.float64).reshape(-1, 4)
+    # Cota superior del área del bbox limpio en píxeles originales (con margen por el redondeo)
+    area_bbox_max = ((bboxes[:, 2] + 1) / escala + 2) * ((bboxes[:, 3] + 1) / escala + 2)
+    candidatas = np.flatnonzero((areas >= min_raw_count * escala * escala) & (area_bbox_max > area_range[0]))
+    if candidatas.size == 0:
+        return []
+
+    # Paso 2: limpieza morfológica local de las candidatas
+    cajas = np.zeros((candidatas.size, 4), dtype=np.float64)
+    areas_limpias = np.zeros(candidatas.size, dtype=np.float64)
+    limpias = np.zeros(candidatas.size, dtype=bool)
+    for j, i in enumerate(candidatas):
+        limpia = _bbox_limpio_en_roi(masks[i]['segmentation'], bboxes[i], kernel)
+        if limpia is not None:
+            (cajas[j], areas_limpias[j]), limpias[j] = limpia, True
+
+    # Paso 3: predicados geométricos vectorizados, en píxeles de la imagen original
+    originales, validas = filtrar_cajas(cajas, (img_w, img_h), ar_range, area_range, escala)
+    segmentos = []
+    for j in np.flatnonzero(limpias & validas):
+        mascara = masks[candidatas[j]]
+        x0, y0, x1, y1 = (int(v) for v in originales[j])
+        segmentos.append(SegmentoDetectado(
+            imagen=img_pil_original.crop((x0, y0, x1, y1)),
+            bbox=(x0, y0, x1 - x0, y1 - y0),
+            predicted_iou=float(mascara['predicted_iou']) if 'predicted_iou' in mascara else None,
+            stability_score=float(mascara['stability_score']) if 'stability_score' in mascara else None,
+            area=int(round(areas_limpias[j] / (escala * escala))),
+            origen=origen,
+        ))
+    return segmentos
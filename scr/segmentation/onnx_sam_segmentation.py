@@ -0,0 +1,278 @@
+#scr/segmentation/onnx_sam_segmentation.py
+"""
+Segmentación con SAM ejecutado en ONNX Runtime (CPU), sin PyTorch.
+
+El encoder de imagen y el decoder de máscaras de SAM se exportan a ONNX (y,
+opcionalmente, se cuantizan a int8) con `python -m tools.export_sam_onnx exportar`.
+`OnnxSamSegmenter` sigue el mismo esquema que `SamBoxSegmenter`: un paso del encoder
+por imagen y una llamada al decoder por cada caja candidata propuesta por contornos.
+El preprocesado de SAM (redimensionado al lado mayor de 1024, normalización y relleno)
+se replica en NumPy, de modo que el nodo de inferencia no necesita torch ni
+`segment_anything`.
+"""
+from pathlib import Path
+from typing import List
+import logging
+import threading
+import importlib
+import cv2
+import numpy as np
+from PIL import Image
+from scr.segmentation.isegmenter import ISegmenter, SegmentoDetectado
+from scr.segmentation.contour_segmentation import ContourSegmenter
+from scr.segmentation.embedding_cache import EmbeddingCache
+from scr.segmentation.mask_filters import filtrar_mascaras, reducir_imagen
+from scr.utils.metrics import obtener_metricas
+
+# Parámetros de preprocesado de `segment_anything.modeling.Sam`
+LADO_ENTRADA_SAM = 1024
+MEDIA_PIXEL = np.array([123.675, 116.28, 103.53], dtype=np.float32)
+DESVIACION_PIXEL = np.array([58.395, 57.12, 57.375], dtype=np.float32)
+
+def tamano_preprocesado(alto: int, ancho: int, lado: int = LADO_ENTRADA_SAM) -> tuple[int, int]:
+    """Tamaño (alto, ancho) tras redimensionar el lado mayor a `lado` (`ResizeLongestSide.get_preprocess_shape`)."""
+    escala = lado / max(alto, ancho)
+    return int(alto * escala + 0.5), int(ancho * escala + 0.5)
+
+def preprocesar_imagen_sam(imagen: np.ndarray) -> np.ndarray:
+    """
+    Replica en NumPy el preprocesado de SAM: redimensionado del lado mayor a 1024,
+    normalización por canal y relleno inferior/derecho hasta 1024x1024.
+
+    Args:
+        imagen (np.ndarray): Imagen RGB (HWC, uint8).
+
+    Returns:
+        np.ndarray: Tensor de entrada del encoder (1, 3, 1024, 1024) en float32.
+    """
+    alto, ancho = tamano_preprocesado(*imagen.shape[:2])
+    redimensionada = np.asarray(Image.fromarray(imagen).resize((ancho, alto), Image.BICUBIC), dtype=np.float32)
+    normalizada = (redimensionada - MEDIA_PIXEL) / DESVIACION_PIXEL
+    entrada = np.zeros((LADO_ENTRADA_SAM, LADO_ENTRADA_SAM, 3), dtype=np.float32)
+    entrada[:alto, :ancho] = normalizada
+    return entrada.transpose(2, 0, 1)[None]
+
+def crear_sesion_onnx(ruta: str | Path, intra_op_threads: int | None = None):
+    """
+    Crea una sesión de ONNX Runtime en CPU con las optimizaciones de grafo activadas.
+
+    Args:
+        ruta (str | Path): Ruta del modelo ONNX.
+        intra_op_threads (int | None, optional): Hilos por operador (None = valor por defecto
+            de ONNX Runtime, uno por núcleo físico). Defaults to None.
+
+    Raises:
+        ImportError: Si `onnxruntime` no está instalado.
+    """
+    ort = importlib.import_module('onnxruntime')
+    opciones = ort.SessionOptions()
+    opciones.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    opciones.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    opciones.inter_op_num_threads = 1 # Los grafos de SAM son secuenciales
+    if intra_op_threads:
+        opciones.intra_op_num_threads = int(intra_op_threads)
+    return ort.InferenceSession(str(ruta), sess_options=opciones, providers=['CPUExecutionProvider'])
+
+class OnnxSamSegmenter(ISegmenter):
+    """
+    Implementación de `ISegmenter` con el encoder y el decoder de SAM en ONNX Runtime.
+
+    Las máscaras de las cajas propuestas pasan por los mismos filtros que las de
+    `SamSegmenter` (`filtrar_mascaras`) y los recortes se hacen sobre la imagen original.
+    """
+    def __init__(self, encoder_path: str, decoder_path: str, device=None,
+                 intra_op_threads: int | None = None, working_max_side: int | None = 1024,
+                 max_proposals: int = 16, min_score: float = 0.8, proposal_area_margin: float = 2.0,
+                 proposer: ContourSegmenter | None = None, embedding_cache: EmbeddingCache | None = None):
+        """
+        Inicializa el segmentador y carga las sesiones de ONNX Runtime.
+
+        Args:
+            encoder_path (str): Ruta del encoder de imagen exportado (ej. "encoder.int8.onnx").
+            decoder_path (str): Ruta del decoder de máscaras exportado.
+            device (torch.device | None, optional): No se usa (siempre CPU); se acepta por
+                compatibilidad con `SegmenterFactory`. Defaults to None.
+            intra_op_threads (int | None, optional): Hilos por operador de ONNX Runtime. Defaults to None.
+            working_max_side (int | None, optional): Lado mayor de la copia de la imagen que recibe
+                el encoder (None = resolución completa). Defaults to 1024.
+            max_proposals (int, optional): Máximo de cajas decodificadas por imagen. Defaults to 16.
+            min_score (float, optional): IoU predicho mínimo de una máscara. Defaults to 0.8.
+            proposal_area_margin (float, optional): Factor de ampliación del rango de área en la
+                propuesta. Defaults to 2.0.
+            proposer (ContourSegmenter | None, optional): Segmentador por contornos que propone
+                las cajas. Defaults to None (uno con la configuración por defecto).
+            embedding_cache (EmbeddingCache | None, optional): Caché de embeddings del encoder.
+                Defaults to None.
+
+        Raises:
+            ImportError: Si `onnxruntime` no está instalado.
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.encoder = crear_sesion_onnx(encoder_path, intra_op_threads)
+        self.decoder = crear_sesion_onnx(decoder_path, intra_op_threads)
+        self.proposer = proposer or ContourSegmenter()
+        self.working_max_side = working_max_side
+        self.max_proposals = max(1, int(max_proposals))
+        self.min_score = min_score
+        self.proposal_area_margin = max(1.0, float(proposal_area_margin))
+        self.embedding_cache = embedding_cache
+        self.variante_cache = f"onnx_{Path(encoder_path).stem}"
+        self._lock = threading.Lock() # Las sesiones admiten llamadas concurrentes, pero cada una ya usa todos los hilos
+        self.logger.info(
+            f"OnnxSamSegmenter inicializado (encoder: {encoder_path}, decoder: {decoder_path}, "
+            f"hilos por operador: {intra_op_threads or 'por defecto'})"
+        )
+
+    @classmethod
+    def from_config(cls, segmentation_config: dict, device=None) -> "OnnxSamSegmenter":
+        """
+        Construye el segmentador a partir de la sección `segmentation` de settings.yml.
+
+        Args:
+            segmentation_config (dict): Subsección 'onnx' ('encoder', 'decoder', 'intra_op_threads'),
+                y opcionalmente 'working_max_side', 'box_prompts', 'contour' y 'embedding_cache'
+                (como en "sam_box").
+            device (torch.device | None, optional): No se usa. Defaults to None.
+
+        Raises:
+            KeyError: Si faltan 'onnx.encoder' u 'onnx.decoder'.
+        """
+        onnx_config = segmentation_config.get('onnx', {}) or {}
+        box_config = segmentation_config.get('box_prompts', {}) or {}
+        embedding_cache_config = segmentation_config.get('embedding_cache', {}) or {}
+        embedding_cache = None
+        if embedding_cache_config.get('dir'):
+            embedding_cache = EmbeddingCache(embedding_cache_config['dir'],
+                                             embedding_cache_config.get('max_disk_mb', 2048) * 1024 * 1024)
+        return cls(
+            encoder_path=onnx_config['encoder'],
+            decoder_path=onnx_config['decoder'],
+            device=device,
+            intra_op_threads=onnx_config.get('intra_op_threads'),
+            working_max_side=segmentation_config.get('working_max_side', 1024),
+            max_proposals=box_config.get('max_proposals', 16),
+            min_score=box_config.get('min_score', 0.8),
+            proposal_area_margin=box_config.get('proposal_area_margin', 2.0),
+            proposer=ContourSegmenter.from_config(segmentation_config, device),
+            embedding_cache=embedding_cache,
+        )
+
+    def calcular_embedding(self, imagen: np.ndarray) -> np.ndarray:
+        """
+        Ejecuta el encoder (o recupera su resultado de la caché) para una imagen RGB.
+
+        Returns:
+            np.ndarray: Embedding (1, 256, 64, 64) en float32.
+        """
+        metricas = obtener_metricas()
+        clave = None
+        if self.embedding_cache is not None:
+            clave = self.embedding_cache.clave(imagen, self.variante_cache)
+            embedding = self.embedding_cache.get(clave)
+            if embedding is not None:
+                metricas.incrementar("embeddings_cache_aciertos")
+                return np.array(embedding, dtype=np.float32)
+            metricas.incrementar("embeddings_cache_fallos")
+        with metricas.medir("sam_set_image"):
+            embedding = self.encoder.run(None, {self.encoder.get_inputs()[0].name: preprocesar_imagen_sam(imagen)})[0]
+        if clave is not None:
+            self.embedding_cache.put(clave, embedding)
+        return embedding
+
+    def decodificar_cajas(self, embedding: np.ndarray, cajas: np.ndarray, tamano: tuple[int, int]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Decodifica una máscara por caja con el decoder ONNX (formato de `SamOnnxModel`).
+
+        Args:
+            embedding (np.ndarray): Embedding de la imagen.
+            cajas (np.ndarray): Cajas (N, 4) como (x0, y0, x1, y1) en píxeles de la imagen codificada.
+            tamano (tuple[int, int]): (alto, ancho) de la imagen codificada.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Máscaras booleanas (N, alto, ancho) y su IoU predicho (N,).
+        """
+        alto_pre, ancho_pre = tamano_preprocesado(*tamano)
+        factor = np.array([ancho_pre / tamano[1], alto_pre / tamano[0]], dtype=np.float32)
+        mascaras, puntuaciones = [], []
+        entradas_fijas = {
+            'image_embeddings': embedding.astype(np.float32),
+            'mask_input': np.zeros((1, 1, 256, 256), dtype=np.float32),
+            'has_mask_input': np.zeros(1, dtype=np.float32),
+            'orig_im_size': np.array(tamano, dtype=np.float32),
+        }
+        etiquetas = np.array([[2, 3, -1]], dtype=np.float32)
+        for caja in cajas:
+            # Una caja se codifica como dos puntos (esquinas) con etiquetas 2 y 3, más un punto de
+            # relleno (etiqueta -1) como en `SamPredictor`: sin él, `select_masks` del modelo
+            # exportado elige la mejor salida multimáscara en lugar del token 0
+            puntos = np.zeros((1, 3, 2), dtype=np.float32)
+            puntos[0, :2] = caja.reshape(2, 2).astype(np.float32) * factor
+            salida = self.decoder.run(None, dict(entradas_fijas, point_coords=puntos, point_labels=etiquetas))
+            mascaras.append(salida[0][0, 0] > 0.0) # Umbral de SAM sobre los logits
+            puntuaciones.append(float(salida[1][0, 0]))
+        return np.stack(mascaras), np.array(puntuaciones, dtype=np.float32)
+
+    def segment(self, image_path: Path) -> List[Image.Image]:
+        """
+        Segmenta la imagen con SAM en ONNX Runtime, guiado por las cajas propuestas por contornos.
+
+        Args:
+            image_path (Path): La ruta a la imagen a segmentar.
+
+        Returns:
+            List[Image.Image]: Los segmentos válidos (ver `segment_records`).
+        """
+        return [segmento.imagen for segmento in self.segment_records(image_path)]
+
+    def segment_records(self, image_path: Path) -> List[SegmentoDetectado]:
+        """
+        Segmenta la imagen con SAM en ONNX Runtime, guiado por las cajas propuestas por contornos.
+
+        Cada segmento conserva su bbox y el IoU predicho por SAM para su máscara.
+
+        Args:
+            image_path (Path): La ruta a la imagen a segmentar.
+
+        Returns:
+            List[SegmentoDetectado]: Los segmentos válidos, ordenados de arriba hacia abajo.
+
+        Raises:
+            FileNotFoundError: Si `image_path` no existe.
+            PIL.UnidentifiedImageError: Si `image_path` no es un archivo de imagen válido.
+        """
+        self.logger.info(f"Iniciando segmentación ONNX para imagen: {image_path.name}")
+        metricas = obtener_metricas()
+        with metricas.medir("decodificacion_imagen"):
+            img_pil_original = Image.open(image_path).convert("RGB")
+
+        area_min, area_max = self.proposer.area_range
+        cajas, _ = self.proposer.detectar_cajas(
+            img_pil_original, area_range=(area_min / self.proposal_area_margin, area_max * self.proposal_area_margin)
+        )
+        if not len(cajas):
+            self.logger.info(f"Sin regiones candidatas en {image_path.name}.")
+            return []
+        areas = (cajas[:, 2] - cajas[:, 0]) * (cajas[:, 3] - cajas[:, 1])
+        cajas = cajas[np.argsort(-areas, kind='stable')[:self.max_proposals]]
+
+        img_trabajo, escala = reducir_imagen(img_pil_original, self.working_max_side)
+        img_np = np.array(img_trabajo)
+        with self._lock:
+            embedding = self.calcular_embedding(img_np)
+            with metricas.medir("sam_decoder", items=len(cajas)):
+                masks, scores = self.decodificar_cajas(embedding, cajas * escala, img_np.shape[:2])
+        metricas.incrementar("mascaras_sam", len(masks))
+
+        mascaras = [
+            {'segmentation': m, 'area': int(np.count_nonzero(m)),
+             'bbox': cv2.boundingRect(m.astype(np.uint8)), 'predicted_iou': float(score)}
+            for m, score in zip(masks, scores) if score >= self.min_score
+        ]
+        with metricas.medir("filtrado_mascaras", items=len(mascaras)):
+            segmentos = filtrar_mascaras(
+                mascaras, img_pil_original, ar_range=self.proposer.ar_range,
+                area_range=self.proposer.area_range, escala=escala, origen=image_path.name
+            )
+        segmentos.sort(key=lambda s: s.bbox[1])
+        self.logger.info(f"Segmentación finalizada para {image_path.name}. Encontrados {len(segmentos)} segmentos válidos.")
+        return segmentos
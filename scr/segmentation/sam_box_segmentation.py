@@ -0,0 +1,201 @@
+#scr/segmentation/sam_box_segmentation.py
+"""
+Segmentación con SAM guiada por cajas candidatas (`SamPredictor`).
+
+`SamAutomaticMaskGenerator` decodifica máscaras para una rejilla densa de puntos, la
+mayoría sobre el fondo. `SamBoxSegmenter` calcula el embedding de la imagen una sola
+vez (`set_image`) y decodifica, en una única llamada por lotes, solo las máscaras de
+las pocas regiones que propone un paso barato de contornos (`ContourSegmenter`): el
+coste por escaneo pasa a ser una pasada del encoder más unas pocas del decoder.
+"""
+from pathlib import Path
+from typing import List
+import logging
+import threading
+import cv2
+import torch
+import numpy as np
+from PIL import Image
+from segment_anything import sam_model_registry, SamPredictor
+from scr.segmentation.isegmenter import ISegmenter, SegmentoDetectado
+from scr.segmentation.contour_segmentation import ContourSegmenter
+from scr.segmentation.embedding_cache import EmbeddingCache, envolver_predictor
+from scr.segmentation.cpu_fast import aplicar_cpu_fast, contexto_inferencia
+from scr.segmentation.mask_filters import filtrar_mascaras, reducir_imagen
+from scr.utils.device import resolver_dispositivo
+from scr.utils.metrics import obtener_metricas
+
+class SamBoxSegmenter(ISegmenter):
+    """
+    Implementación de `ISegmenter` que refina con SAM las regiones propuestas por contornos.
+
+    Las máscaras resultantes pasan por los mismos filtros que las de `SamSegmenter`
+    (`filtrar_mascaras`), y los recortes se hacen sobre la imagen original.
+    """
+    def __init__(self, model_name: str, checkpoint: str, device: str | torch.device,
+                 working_max_side: int | None = 1024, max_proposals: int = 16,
+                 min_score: float = 0.8, proposal_area_margin: float = 2.0,
+                 proposer: ContourSegmenter | None = None, embedding_cache: EmbeddingCache | None = None,
+                 cpu_fast: dict | None = None):
+        """
+        Inicializa el segmentador.
+
+        Args:
+            model_name (str): El nombre del tipo de modelo SAM a cargar (ej. "vit_b").
+            checkpoint (str): La ruta al archivo de checkpoint del modelo SAM.
+            device (str | torch.device): El dispositivo (CPU o CUDA) donde se cargará el modelo.
+            working_max_side (int | None, optional): Lado mayor de la copia de la imagen que se
+                pasa a `set_image` (None = resolución completa). Defaults to 1024.
+            max_proposals (int, optional): Máximo de cajas (las de mayor área) que se decodifican
+                por imagen. Defaults to 16.
+            min_score (float, optional): IoU predicho mínimo de una máscara para conservarla.
+                Defaults to 0.8.
+            proposal_area_margin (float, optional): Factor con el que se amplía el rango de área
+                en la propuesta, ya que SAM ajusta la caja al voucher. Defaults to 2.0.
+            proposer (ContourSegmenter | None, optional): Segmentador por contornos que propone
+                las cajas. Defaults to None (uno con la configuración por defecto).
+            embedding_cache (EmbeddingCache | None, optional): Caché de embeddings del encoder;
+                en un acierto solo se ejecuta el decoder. Defaults to None.
+            cpu_fast (dict | None, optional): Opciones de la ruta rápida de CPU, como en
+                `SamSegmenter`. Defaults to None (ruta por defecto).
+        """
+        self.device = resolver_dispositivo(device)
+        self.sam = sam_model_registry[model_name](checkpoint=checkpoint).to(self.device)
+        self.cpu_fast, sufijo_variante = aplicar_cpu_fast(self.sam, self.device, cpu_fast)
+        self.predictor = SamPredictor(self.sam)
+        if embedding_cache is not None:
+            envolver_predictor(self.predictor, embedding_cache, f"{model_name}_{Path(checkpoint).stem}{sufijo_variante}")
+        self.proposer = proposer or ContourSegmenter()
+        self.working_max_side = working_max_side
+        self.max_proposals = max(1, int(max_proposals))
+        self.min_score = min_score
+        self.proposal_area_margin = max(1.0, float(proposal_area_margin))
+        # SamPredictor guarda el embedding de la última imagen: set_image y la decodificación
+        # deben ser atómicas si varios hilos comparten la instancia (modo "concurrent").
+        self._lock = threading.Lock()
+
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.info(f"SamBoxSegmenter inicializado con modelo: {model_name}, checkpoint: {checkpoint}")
+        self.logger.debug(
+            f"Dispositivo: {self.device}, resolución de trabajo: {working_max_side or 'completa'}, "
+            f"propuestas máximas: {self.max_proposals}, puntuación mínima: {min_score}"
+        )
+
+    @classmethod
+    def from_config(cls, segmentation_config: dict, device: str | torch.device) -> "SamBoxSegmenter":
+        """
+        Construye el segmentador a partir de la sección `segmentation` de settings.yml.
+
+        Args:
+            segmentation_config (dict): Claves 'model_name', 'checkpoint', opcionalmente
+                'working_max_side', la subsección 'box_prompts' ('max_proposals', 'min_score',
+                'proposal_area_margin'), la subsección 'contour' para el paso de propuesta,
+                'embedding_cache' ({'dir', 'max_disk_mb'}) y 'cpu_fast'.
+            device (str | torch.device): Dispositivo donde cargar el modelo.
+
+        Raises:
+            KeyError: Si faltan 'model_name' o 'checkpoint'.
+        """
+        box_config = segmentation_config.get('box_prompts', {}) or {}
+        embedding_cache_config = segmentation_config.get('embedding_cache', {}) or {}
+        embedding_cache = None
+        if embedding_cache_config.get('dir'):
+            embedding_cache = EmbeddingCache(embedding_cache_config['dir'],
+                                             embedding_cache_config.get('max_disk_mb', 2048) * 1024 * 1024)
+        return cls(
+            model_name=segmentation_config['model_name'],
+            checkpoint=segmentation_config['checkpoint'],
+            device=device,
+            working_max_side=segmentation_config.get('working_max_side', 1024),
+            max_proposals=box_config.get('max_proposals', 16),
+            min_score=box_config.get('min_score', 0.8),
+            proposal_area_margin=box_config.get('proposal_area_margin', 2.0),
+            proposer=ContourSegmenter.from_config(segmentation_config, device),
+            embedding_cache=embedding_cache,
+            cpu_fast=segmentation_config.get('cpu_fast'),
+        )
+
+    def segment(self, image_path: Path) -> List[Image.Image]:
+        """
+        Segmenta la imagen decodificando con SAM las máscaras de las cajas propuestas.
+
+        Args:
+            image_path (Path): La ruta a la imagen a segmentar.
+
+        Returns:
+            List[Image.Image]: Los segmentos válidos (ver `segment_records`).
+        """
+        return [segmento.imagen for segmento in self.segment_records(image_path)]
+
+    def segment_records(self, image_path: Path) -> List[SegmentoDetectado]:
+        """
+        Segmenta la imagen decodificando con SAM las máscaras de las cajas propuestas.
+
+        Cada segmento conserva su bbox y el IoU predicho por SAM para su máscara.
+
+        Args:
+            image_path (Path): La ruta a la imagen a segmentar.
+
+        Returns:
+            List[SegmentoDetectado]: Los segmentos válidos, ordenados de arriba hacia abajo. Vacía si
+                el paso de propuesta no encuentra regiones candidatas.
+
+        Raises:
+            FileNotFoundError: Si `image_path` no existe.
+            PIL.UnidentifiedImageError: Si `image_path` no es un archivo de imagen válido.
+        """
+        self.logger.info(f"Iniciando segmentación guiada por cajas para imagen: {image_path.name}")
+        metricas = obtener_metricas()
+        try:
+            with metricas.medir("decodificacion_imagen"):
+                img_pil_original = Image.open(image_path).convert("RGB")
+        except FileNotFoundError:
+            self.logger.error(f"Archivo de imagen no encontrado en: {image_path}")
+            raise
+        except Image.UnidentifiedImageError:
+            self.logger.error(f"No se pudo identificar o abrir el archivo de imagen en: {image_path}")
+            raise
+
+        # Paso de propuesta: cajas de contornos con un rango de área más amplio
+        area_min, area_max = self.proposer.area_range
+        cajas, _ = self.proposer.detectar_cajas(
+            img_pil_original, area_range=(area_min / self.proposal_area_margin, area_max * self.proposal_area_margin)
+        )
+        if not len(cajas):
+            self.logger.info(f"Sin regiones candidatas en {image_path.name}.")
+            return []
+        areas = (cajas[:, 2] - cajas[:, 0]) * (cajas[:, 3] - cajas[:, 1])
+        cajas = cajas[np.argsort(-areas, kind='stable')[:self.max_proposals]]
+
+        img_trabajo, escala = reducir_imagen(img_pil_original, self.working_max_side)
+        img_np = np.array(img_trabajo)
+        with self._lock, contexto_inferencia(self.cpu_fast):
+            with metricas.medir("sam_set_image"):
+                self.predictor.set_image(img_np)
+            with metricas.medir("sam_decoder", items=len(cajas)):
+                boxes = self.predictor.transform.apply_boxes_torch(
+                    torch.as_tensor(cajas * escala, dtype=torch.float, device=self.predictor.device), img_np.shape[:2]
+                )
+                masks, scores, _ = self.predictor.predict_torch(
+                    point_coords=None, point_labels=None, boxes=boxes, multimask_output=False
+                )
+        masks = masks[:, 0].cpu().numpy()
+        scores = scores[:, 0].cpu().numpy()
+        metricas.incrementar("mascaras_sam", len(masks))
+
+        mascaras = [
+            {'segmentation': m, 'area': int(np.count_nonzero(m)),
+             'bbox': cv2.boundingRect(m.astype(np.uint8)), 'predicted_iou': float(score)}
+            for m, score in zip(masks, scores) if score >= self.min_score
+        ]
+        self.logger.debug(f"{len(mascaras)} de {len(masks)} máscaras con IoU predicho >= {self.min_score} en {image_path.name}")
+        with metricas.medir("filtrado_mascaras", items=len(mascaras)):
+            segmentos = filtrar_mascaras(
+                mascaras, img_pil_original, ar_range=self.proposer.ar_range,
+                area_range=self.proposer.area_range, escala=escala, origen=image_path.name
+            )
+
+        # Ordenar de arriba hacia abajo por la coordenada y
+        segmentos.sort(key=lambda s: s.bbox[1])
+        self.logger.info(f"Segmentación finalizada para {image_path.name}. Encontrados {len(segmentos)} segmentos válidos.")
+        return segmentos
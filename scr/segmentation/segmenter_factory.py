@@ -2,69 +2,69 @@
 """
 Módulo que define la factory para crear instancias de segmentadores de imágenes.
 """
-import torch
 import logging
+from typing import TYPE_CHECKING
 from scr.segmentation.isegmenter import ISegmenter
-from scr.segmentation.voucher_segmentation import SamSegmenter
+from scr.utils.registry import BackendRegistry
+
+if TYPE_CHECKING:
+    import torch # Solo para las anotaciones; el backend seleccionado lo importa si lo necesita
+
+# Segmentadores disponibles. El módulo de cada uno (y sus dependencias, ej. segment_anything)
+# solo se importa si la configuración lo selecciona.
+SEGMENTADORES = BackendRegistry("segmentador")
+SEGMENTADORES.registrar('sam', 'scr.segmentation.voucher_segmentation:SamSegmenter')
+SEGMENTADORES.registrar('sam_box', 'scr.segmentation.sam_box_segmentation:SamBoxSegmenter')
+SEGMENTADORES.registrar('sam_onnx', 'scr.segmentation.onnx_sam_segmentation:OnnxSamSegmenter')
+SEGMENTADORES.registrar('contour', 'scr.segmentation.contour_segmentation:ContourSegmenter')
+SEGMENTADORES.registrar('cascade', 'scr.segmentation.cascade_segmentation:CascadeSegmenter')
 
 class SegmenterFactory:
     """
     Factory encargada de crear instancias de componentes que implementan `ISegmenter`.
 
-    Actualmente, solo soporta la creación de `SamSegmenter`, pero está diseñada
-    para ser extendida y poder crear otros tipos de segmentadores en el futuro
-    basándose en la configuración proporcionada.
+    El segmentador se elige con la clave 'type' de la configuración (por defecto "sam"),
+    que puede ser un nombre registrado en `SEGMENTADORES` o una ruta "paquete.modulo:Clase"
+    de una implementación externa.
     """
     @staticmethod
-    def create_segmenter(segmentation_config: dict, device: torch.device) -> ISegmenter:
+    def create_segmenter(segmentation_config: dict, device: "str | torch.device") -> ISegmenter:
         """
         Crea y devuelve una instancia de un segmentador de imágenes.
 
-        La implementación específica del segmentador se determina (o podría determinarse en el futuro)
-        a partir de `segmentation_config`. Actualmente, siempre crea `SamSegmenter`.
+        La clase se resuelve en `SEGMENTADORES` a partir de `segmentation_config['type']`
+        y se construye con su método `from_config`.
 
         Args:
             segmentation_config (dict): Un diccionario con la configuración para el segmentador.
-                Debe contener claves como 'model_name' y 'checkpoint' para `SamSegmenter`.
-            device (torch.device): El dispositivo (CPU o CUDA) donde se cargará el modelo
-                                   del segmentador.
+                Para "sam" debe contener claves como 'model_name' y 'checkpoint', y
+                opcionalmente 'mask_cache' ({'dir', 'max_memory_mb'}). "contour" lee la
+                subsección 'contour' y "cascade" además la subsección 'cascade' (ver
+                `CascadeSegmenter.from_config`).
+            device (str | torch.device): El dispositivo donde se cargará el modelo del segmentador
+                ("auto", "cpu", "cuda"...). Solo lo resuelven los backends basados en torch
+                (`resolver_dispositivo`).
 
         Returns:
             ISegmenter: Una instancia de una clase que implementa la interfaz `ISegmenter`.
 
         Raises:
-            ValueError: Si se especifica un tipo de segmentador no soportado en `segmentation_config`
-                        (funcionalidad futura, no implementada actualmente).
+            ValueError: Si se especifica un tipo de segmentador no soportado en `segmentation_config`.
+            ImportError: Si las dependencias del segmentador seleccionado no están instaladas.
             KeyError: Si faltan claves esenciales en `segmentation_config` para el tipo de
                       segmentador seleccionado.
             # Otras excepciones pueden surgir de la creación de la instancia del segmentador
             # (ej. si el checkpoint del modelo no se encuentra).
         """
         logger = logging.getLogger(SegmenterFactory.__name__)
-        
-        logger.debug(
-            f"Creando SamSegmenter con configuración: "
-            f"model_name='{segmentation_config.get('model_name')}', "
-            f"checkpoint='{segmentation_config.get('checkpoint')}', "
-            f"device='{device}'"
-        )
-        
-        # Lógica actual: siempre crea SamSegmenter
-        # Ejemplo de cómo podría extenderse (comentado):
-        # segmenter_type = segmentation_config.get('type', 'sam')
-        # if segmenter_type == 'sam':
-        #     instance = SamSegmenter( # ... )
-        # elif segmenter_type == 'otro_tipo':
-        #     # instance = OtroSegmenter(...)
-        #     pass 
-        # else:
-        #     logger.error(f"Tipo de segmentador no soportado: {segmenter_type}")
-        #     raise ValueError(f"Tipo de segmentador no soportado: {segmenter_type}")
+        segmenter_type = segmentation_config.get('type', 'sam')
+        logger.debug(f"Creando segmentador '{segmenter_type}' con configuración: {segmentation_config}, device='{device}'")
 
-        instance = SamSegmenter(
-            model_name=segmentation_config['model_name'],
-            checkpoint=segmentation_config['checkpoint'],
-            device=device
-        )
+        try:
+            clase = SEGMENTADORES.obtener(segmenter_type)
+        except ValueError:
+            logger.error(f"Tipo de segmentador no soportado: {segmenter_type}")
+            raise
+        instance = clase.from_config(segmentation_config, device)
         logger.info(f"Instancia de {type(instance).__name__} creada exitosamente.")
         return instance
@@ -7,85 +7,20 @@ así como funciones de utilidad para el procesamiento y limpieza de máscaras de
 """
 from pathlib import Path
 from typing import List
-import cv2
 import torch
 import numpy as np
 from PIL import Image
 from segment_anything import sam_model_registry, SamAutomaticMaskGenerator
-from scr.segmentation.isegmenter import ISegmenter
+from scr.segmentation.isegmenter import ISegmenter, SegmentoDetectado
+from scr.segmentation.mask_cache import MaskCache
+from scr.segmentation.embedding_cache import EmbeddingCache, envolver_predictor
+from scr.segmentation.cpu_fast import aplicar_cpu_fast, contexto_inferencia
+from scr.segmentation.mask_filters import filtrar_mascaras, reducir_imagen
+from scr.utils.hashing import hash_archivo
+from scr.utils.device import resolver_dispositivo
+from scr.utils.metrics import obtener_metricas
 import logging
 
-def limpiar_mascara(mask: np.ndarray, img_shape: tuple) -> np.ndarray:
-    """
-    Aplica operaciones morfológicas con un kernel de tamaño adaptativo para limpiar el ruido de una máscara binaria.
-
-    Args:
-        mask (np.ndarray): La máscara binaria (array de NumPy) a limpiar.
-        img_shape (tuple): Tupla con las dimensiones (alto, ancho) de la imagen original,
-                           usada para calcular el tamaño adaptativo del kernel.
-
-    Returns:
-        np.ndarray: La máscara binaria limpiada.
-    """
-    kernel_size = (max(3, img_shape[0] // 50), max(3, img_shape[1] // 50))
-    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, kernel_size)
-    closed = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
-    opened = cv2.morphologyEx(closed, cv2.MORPH_OPEN, kernel)
-    return opened
-
-def _procesar_mascara_individual(
-    mascara_sam: dict, 
-    img_pil_original: Image.Image, # Pasar la imagen PIL original completa
-    min_raw_count: int = 1000, 
-    ar_range: tuple[float, float] = (0.5, 3.0),
-    area_range: tuple[int, int] = (15000, 300000)
-) -> tuple[int, Image.Image] | None: # Python 3.10+ para ' | None'
-    """
-    Procesa una única máscara generada por SAM, la limpia, y aplica filtros geométricos y de área.
-
-    Si la máscara procesada cumple con los criterios, recorta el segmento correspondiente
-    de la imagen original.
-
-    Args:
-        mascara_sam (dict): Un diccionario que representa una máscara individual, 
-                            tal como lo devuelve el generador de máscaras de SAM.
-                            Debe contener la clave 'segmentation'.
-        img_pil_original (Image.Image): La imagen original completa (en formato PIL)
-                                        de la cual se extraerá el segmento.
-        min_raw_count (int, optional): Número mínimo de píxeles no cero en la máscara 'raw' 
-                                       para considerarla inicialmente. Defaults to 1000.
-        ar_range (tuple[float, float], optional): Tupla (min_aspect_ratio, max_aspect_ratio) 
-                                                  para filtrar los segmentos. Defaults to (0.5, 3.0).
-        area_range (tuple[int, int], optional): Tupla (min_area, max_area) en píxeles 
-                                                para filtrar los segmentos. Defaults to (15000, 300000).
-
-    Returns:
-        tuple[int, Image.Image] | None: Una tupla `(coordenada_y, imagen_recortada_PIL)`
-                                        si la máscara es válida y el segmento se extrae.
-                                        `None` si la máscara no cumple los criterios de filtrado.
-    """
-    img_h, img_w = img_pil_original.height, img_pil_original.width
-
-    raw = (mascara_sam['segmentation'].astype(np.uint8)) * 255
-    if cv2.countNonZero(raw) < min_raw_count:
-        return None
-
-    clean = limpiar_mascara(raw, (img_h, img_w))
-    x, y, w, h = cv2.boundingRect(clean)
-
-    # Evitar segmentos de ancho o alto cero que causarían error en crop o división por cero
-    if w == 0 or h == 0:
-        return None
-            
-    area = w * h
-    ar = w / h
-
-    if not (ar_range[0] < ar < ar_range[1] and area_range[0] < area < area_range[1]):
-        return None
-
-    crop = img_pil_original.crop((x, y, x + w, y + h))
-    return (y, crop)
-
 class SamSegmenter(ISegmenter):
     """
     Implementación de `ISegmenter` que utiliza el modelo SAM (Segment Anything Model)
@@ -94,39 +29,116 @@ class SamSegmenter(ISegmenter):
     Esta clase carga un modelo SAM específico y lo utiliza para generar máscaras
     de segmentación, las cuales son luego procesadas y filtradas para extraer
     los segmentos relevantes (presumiblemente vouchers).
-    Incluye un mecanismo de caché para las máscaras generadas.
+    Incluye un mecanismo de caché (`MaskCache`) para las máscaras generadas, indexado
+    por la huella del contenido de la imagen, acotado en memoria y persistente en disco,
+    y, opcionalmente, una caché de los embeddings del encoder (`EmbeddingCache`).
     """
-    def __init__(self, model_name: str, checkpoint: str, device: torch.device):
+    def __init__(self, model_name: str, checkpoint: str, device: str | torch.device,
+                 mask_cache_dir: str | None = None, mask_cache_max_mb: int = 256,
+                 working_max_side: int | None = None,
+                 embedding_cache_dir: str | None = None, embedding_cache_max_mb: int = 2048,
+                 cpu_fast: dict | None = None):
         """
         Inicializa el segmentador SAM.
 
         Args:
             model_name (str): El nombre del tipo de modelo SAM a cargar (ej. "vit_b").
             checkpoint (str): La ruta al archivo de checkpoint del modelo SAM.
-            device (torch.device): El dispositivo (CPU o CUDA) donde se cargará el modelo.
+            device (str | torch.device): El dispositivo (CPU o CUDA) donde se cargará el modelo.
+            mask_cache_dir (str | None, optional): Directorio del almacén persistente de máscaras.
+                Si es None, la caché solo se mantiene en memoria durante la ejecución. Defaults to None.
+            mask_cache_max_mb (int, optional): Presupuesto en MiB de la caché de máscaras en memoria.
+                Defaults to 256.
+            working_max_side (int | None, optional): Lado mayor (en píxeles) de la copia reducida de
+                la imagen sobre la que se generan las máscaras. SAM redimensiona internamente a 1024
+                píxeles, pero el post-procesado de las máscaras y la limpieza morfológica trabajan a la
+                resolución de entrada; reducirla disminuye su memoria y su coste con el cuadrado de la
+                escala. Los recortes se siguen haciendo sobre la imagen original. Si es None, se usa la
+                resolución completa. Defaults to None.
+            embedding_cache_dir (str | None, optional): Directorio de la caché de embeddings del
+                encoder. Si es None, no se usa. Defaults to None.
+            embedding_cache_max_mb (int, optional): Tamaño máximo en MiB de la caché de embeddings.
+                Defaults to 2048.
+            cpu_fast (dict | None, optional): Opciones de la ruta rápida de CPU ('enabled', 'bfloat16',
+                'channels_last', 'compile', 'warmup', 'threads'); ver `scr/segmentation/cpu_fast.py`.
+                Defaults to None (ruta por defecto).
         """
-        self.device = device
-        self.sam = sam_model_registry[model_name](checkpoint=checkpoint).to(device)
+        self.device = resolver_dispositivo(device)
+        self.sam = sam_model_registry[model_name](checkpoint=checkpoint).to(self.device)
+        self.cpu_fast, sufijo_variante = aplicar_cpu_fast(self.sam, self.device, cpu_fast)
         self.mask_generator = SamAutomaticMaskGenerator(model=self.sam)
-        self.masks_cache = {}
+        self.masks_cache = MaskCache(mask_cache_dir, max_bytes_memoria=mask_cache_max_mb * 1024 * 1024)
+        self.working_max_side = working_max_side
+        # Identifica la configuración que produce las máscaras; forma parte de la clave de caché.
+        self.variante_cache = f"{model_name}_{Path(checkpoint).stem}{sufijo_variante}"
+        if embedding_cache_dir:
+            # En un acierto, el generador automático solo repite la decodificación de máscaras
+            envolver_predictor(self.mask_generator.predictor,
+                               EmbeddingCache(embedding_cache_dir, embedding_cache_max_mb * 1024 * 1024),
+                               self.variante_cache)
         
         self.logger = logging.getLogger(self.__class__.__name__)
         self.logger.info(f"SamSegmenter inicializado con modelo: {model_name}, checkpoint: {checkpoint}")
         self.logger.debug(f"Dispositivo para SamSegmenter: {self.device}")
+        self.logger.debug(f"Caché de máscaras: directorio={mask_cache_dir}, presupuesto={mask_cache_max_mb} MiB")
+        self.logger.debug(f"Resolución de trabajo de SAM: {working_max_side or 'completa'}")
+        self.logger.debug(f"Caché de embeddings: directorio={embedding_cache_dir}, presupuesto={embedding_cache_max_mb} MiB")
+        self.logger.debug(f"Ruta cpu_fast: {'activada' if self.cpu_fast else 'desactivada'}")
+
+    @classmethod
+    def from_config(cls, segmentation_config: dict, device: str | torch.device) -> "SamSegmenter":
+        """
+        Construye el segmentador a partir de la sección `segmentation` de settings.yml.
+
+        Args:
+            segmentation_config (dict): Claves 'model_name', 'checkpoint' y opcionalmente
+                'mask_cache' ({'dir', 'max_memory_mb'}), 'embedding_cache' ({'dir', 'max_disk_mb'}),
+                'working_max_side' y 'cpu_fast'.
+            device (str | torch.device): Dispositivo donde cargar el modelo.
+
+        Raises:
+            KeyError: Si faltan 'model_name' o 'checkpoint'.
+        """
+        mask_cache_config = segmentation_config.get('mask_cache', {}) or {}
+        embedding_cache_config = segmentation_config.get('embedding_cache', {}) or {}
+        return cls(
+            model_name=segmentation_config['model_name'],
+            checkpoint=segmentation_config['checkpoint'],
+            device=device,
+            mask_cache_dir=mask_cache_config.get('dir'),
+            mask_cache_max_mb=mask_cache_config.get('max_memory_mb', 256),
+            working_max_side=segmentation_config.get('working_max_side'),
+            embedding_cache_dir=embedding_cache_config.get('dir'),
+            embedding_cache_max_mb=embedding_cache_config.get('max_disk_mb', 2048),
+            cpu_fast=segmentation_config.get('cpu_fast')
+        )
+
 
     def segment(self, image_path: Path) -> List[Image.Image]:
         """
         Segmenta la imagen especificada utilizando el modelo SAM.
 
+        Args:
+            image_path (Path): La ruta a la imagen a segmentar.
+
+        Returns:
+            List[Image.Image]: Los segmentos válidos (ver `segment_records`).
+        """
+        return [segmento.imagen for segmento in self.segment_records(image_path)]
+
+    def segment_records(self, image_path: Path) -> List[SegmentoDetectado]:
+        """
+        Segmenta la imagen especificada utilizando el modelo SAM y conserva los metadatos de cada máscara.
+
         Carga la imagen, genera máscaras de segmentación (utilizando caché si está disponible),
-        procesa y filtra cada máscara individualmente, y devuelve una lista de los
-        segmentos válidos extraídos como objetos PIL.Image.
+        procesa y filtra cada máscara individualmente, y devuelve los segmentos válidos
+        con su bbox y las puntuaciones de calidad de SAM ('predicted_iou', 'stability_score').
 
         Args:
             image_path (Path): La ruta a la imagen a segmentar.
 
         Returns:
-            List[Image.Image]: Una lista de imágenes PIL representando los segmentos válidos.
+            List[SegmentoDetectado]: Los segmentos válidos, ordenados de arriba hacia abajo.
                                Puede estar vacía si no se encuentran segmentos o si la imagen
                                no se puede procesar.
         
@@ -140,8 +152,10 @@ class SamSegmenter(ISegmenter):
                        no detecta pero sí el procesamiento interno de SAM).
         """
         self.logger.info(f"Iniciando segmentación para imagen: {image_path.name}")
+        metricas = obtener_metricas()
         try:
-            img_pil_original = Image.open(image_path).convert("RGB")
+            with metricas.medir("decodificacion_imagen"):
+                img_pil_original = Image.open(image_path).convert("RGB")
         except FileNotFoundError:
             self.logger.error(f"Archivo de imagen no encontrado en: {image_path}")
             raise # Re-lanzar la excepción para que sea manejada más arriba si es necesario
@@ -149,36 +163,37 @@ class SamSegmenter(ISegmenter):
             self.logger.error(f"No se pudo identificar o abrir el archivo de imagen en: {image_path}")
             raise
 
-        # Generar o recuperar máscaras
-        if image_path in self.masks_cache:
+        img_trabajo, escala = reducir_imagen(img_pil_original, self.working_max_side)
+
+        # Generar o recuperar máscaras. La resolución de trabajo forma parte de la clave.
+        clave_cache = f"{hash_archivo(image_path)}_{self.variante_cache}_{img_trabajo.width}x{img_trabajo.height}"
+        masks = self.masks_cache.get(clave_cache)
+        if masks is not None:
             self.logger.debug(f"Usando máscaras de caché para: {image_path.name}")
-            masks = self.masks_cache[image_path]
         else:
             self.logger.debug(f"Generando nuevas máscaras para: {image_path.name}")
             # Nota: mask_generator.generate espera un array numpy
             try:
-                masks = self.mask_generator.generate(np.array(img_pil_original))
+                with metricas.medir("sam_generate"), contexto_inferencia(self.cpu_fast):
+                    masks = self.mask_generator.generate(np.array(img_trabajo))
                 self.logger.debug(f"Generadas {len(masks)} máscaras SAM (antes de filtrar) para {image_path.name}")
-                self.masks_cache[image_path] = masks
+                self.masks_cache.put(clave_cache, masks)
             except Exception as e: # Captura de errores durante la generación de máscaras
                 self.logger.error(f"Error durante la generación de máscaras SAM para {image_path.name}: {e}")
                 self.logger.exception("Detalles del error de generación de máscaras SAM:")
                 return [] # Devolver lista vacía si la generación de máscaras falla
 
-        # Usar la nueva función para procesar y filtrar las máscaras
         # Los parámetros de filtrado (min_raw_count, ar_range, area_range)
         # podrían ser parte de la configuración de SamSegmenter en el futuro
         # y pasados aquí desde self.alguna_configuracion si fuera necesario.
-        # Por ahora, usamos los valores por defecto de la firma de _procesar_mascara_individual.
+        # Por ahora, usamos los valores por defecto de la firma de filtrar_mascaras.
         
-        segmentos_con_y = [
-            resultado for m in masks
-            if (resultado := _procesar_mascara_individual(m, img_pil_original)) is not None
-        ]
+        with metricas.medir("filtrado_mascaras", items=len(masks)):
+            segmentos = filtrar_mascaras(masks, img_pil_original, escala=escala, origen=image_path.name)
+        metricas.incrementar("mascaras_sam", len(masks))
 
         # Ordenar de arriba hacia abajo por la coordenada y
-        segmentos_con_y.sort(key=lambda s: s[0])
+        segmentos.sort(key=lambda s: s.bbox[1])
         
-        self.logger.info(f"Segmentación finalizada para {image_path.name}. Encontrados {len(segmentos_con_y)} segmentos válidos.")
-        # Devolver solo las imágenes recortadas
-        return [seg_img for _, seg_img in segmentos_con_y]
+        self.logger.info(f"Segmentación finalizada para {image_path.name}. Encontrados {len(segmentos)} segmentos válidos.")
+        return segmentos
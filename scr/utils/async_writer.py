@@ -0,0 +1,74 @@
+#scr/utils/async_writer.py
+"""
+Módulo con un escritor asíncrono de imágenes.
+
+Permite delegar el guardado de imágenes PIL a un hilo en segundo plano para que
+la codificación PNG y la escritura a disco no bloqueen el flujo principal del pipeline.
+"""
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+from PIL import Image
+
+class AsyncImageWriter:
+    """
+    Guarda imágenes PIL en disco de forma asíncrona mediante un pool de hilos.
+
+    Los errores de escritura no se propagan al llamador en el momento del envío;
+    se registran en el log al finalizar cada tarea y se contabilizan en `errores`.
+    """
+    def __init__(self, max_workers: int = 1):
+        """
+        Inicializa el escritor asíncrono.
+
+        Args:
+            max_workers (int, optional): Número de hilos dedicados a la escritura. Defaults to 1.
+        """
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="escritor_img")
+        self.pendientes: List[Future] = []
+        self.errores = 0
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def _guardar(self, image: Image.Image, ruta: Path) -> None:
+        """Guarda la imagen en la ruta indicada (se ejecuta en un hilo del pool)."""
+        image.save(ruta)
+        self.logger.debug(f"Imagen guardada de forma asíncrona en: {ruta}")
+
+    def _al_finalizar(self, futuro: Future) -> None:
+        """Callback que registra los errores de una escritura finalizada."""
+        error = futuro.exception()
+        if error is not None:
+            self.errores += 1
+            self.logger.error(f"Error guardando imagen de forma asíncrona: {error}")
+
+    def submit(self, image: Image.Image, ruta: Path) -> Future:
+        """
+        Encola el guardado de una imagen.
+
+        La imagen no debe modificarse después de enviarla, ya que se guarda
+        desde otro hilo.
+
+        Args:
+            image (Image.Image): La imagen a guardar.
+            ruta (Path): Ruta de destino del archivo.
+
+        Returns:
+            Future: El futuro asociado a la escritura.
+        """
+        futuro = self.executor.submit(self._guardar, image, ruta)
+        futuro.add_done_callback(self._al_finalizar)
+        self.pendientes.append(futuro)
+        # Descartar referencias a escrituras ya completadas para no acumular memoria
+        if len(self.pendientes) > 256:
+            self.pendientes = [f for f in self.pendientes if not f.done()]
+        return futuro
+
+    def close(self) -> None:
+        """
+        Espera a que finalicen todas las escrituras pendientes y libera el pool de hilos.
+        """
+        self.executor.shutdown(wait=True)
+        self.pendientes.clear()
+        if self.errores:
+            self.logger.warning(f"Se produjeron {self.errores} errores durante las escrituras asíncronas.")
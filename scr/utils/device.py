@@ -0,0 +1,28 @@
+#scr/utils/device.py
+"""
+Resolución del dispositivo de los backends basados en torch.
+
+`main.py` y settings.yml manejan el dispositivo como texto ("auto", "cpu", "cuda",
+"cuda:1"); cada backend que usa torch lo resuelve en su constructor con
+`resolver_dispositivo`, de modo que una configuración sin backends de torch no lo importa.
+"""
+
+def resolver_dispositivo(device=None):
+    """
+    Convierte el dispositivo configurado en un `torch.device`.
+
+    Args:
+        device (str | torch.device | None, optional): "auto" (o None) para CUDA si está
+            disponible y CPU en caso contrario, cualquier nombre de dispositivo de torch
+            ("cpu", "cuda", "cuda:1"), o un `torch.device`, que se devuelve tal cual.
+            Defaults to None.
+
+    Returns:
+        torch.device: El dispositivo resuelto.
+    """
+    import torch # Local: este módulo se importa sin que torch esté cargado
+    if isinstance(device, torch.device):
+        return device
+    if device is None or str(device).lower() == 'auto':
+        return torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    return torch.device(str(device))
@@ -0,0 +1,33 @@
+#scr/utils/hashing.py
+"""
+Módulo con funciones de utilidad para calcular huellas (hashes) de contenido.
+
+Las huellas permiten identificar una imagen de entrada por su contenido y no por
+su nombre o ruta, de modo que las cachés y manifiestos sigan siendo válidos si un
+archivo se renombra y se invaliden si su contenido cambia.
+"""
+import hashlib
+from pathlib import Path
+from typing import Union
+
+TAMANO_BLOQUE = 1024 * 1024 # Lectura por bloques de 1 MiB
+
+def hash_archivo(ruta: Union[str, Path], algoritmo: str = 'sha256') -> str:
+    """
+    Calcula la huella hexadecimal del contenido de un archivo.
+
+    Args:
+        ruta (Union[str, Path]): Ruta al archivo.
+        algoritmo (str, optional): Algoritmo de `hashlib` a utilizar. Defaults to 'sha256'.
+
+    Returns:
+        str: La huella del contenido en hexadecimal.
+
+    Raises:
+        FileNotFoundError: Si el archivo no existe.
+    """
+    h = hashlib.new(algoritmo)
+    with open(ruta, 'rb') as f:
+        while bloque := f.read(TAMANO_BLOQUE):
+            h.update(bloque)
+    return h.hexdigest()
@@ -0,0 +1,258 @@
+#scr/utils/metrics.py
+"""
+Módulo de instrumentación del pipeline: latencias por etapa, throughput y contadores.
+
+Expone un registro global de métricas (`obtener_metricas`), análogo a
+`logging.getLogger`, para que cualquier componente (segmentador, validador,
+extractor de OCR, pipeline) pueda medir sus etapas sin recibir dependencias extra.
+Desactivado (por defecto), `medir` devuelve un context manager nulo compartido y
+el coste por llamada es prácticamente nulo.
+
+Al final de una ejecución las métricas se publican como un archivo de texto en
+formato Prometheus (compatible con el textfile collector de node_exporter) y como
+un resumen JSON.
+"""
+import os
+import json
+import math
+import time
+import logging
+import threading
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Union
+
+# Límites superiores (en segundos) de los buckets de los histogramas de latencia
+BUCKETS_SEGUNDOS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, math.inf)
+
+_CONTEXTO_NULO = nullcontext()
+
+class _Histograma:
+    """Histograma de latencias de una etapa, con conteo de elementos procesados."""
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS_SEGUNDOS)
+        self.count = 0
+        self.suma = 0.0
+        self.items = 0
+        self.minimo = math.inf
+        self.maximo = 0.0
+
+    def observar(self, segundos: float, items: int) -> None:
+        for i, limite in enumerate(BUCKETS_SEGUNDOS):
+            if segundos <= limite:
+                self.buckets[i] += 1
+                break
+        self.count += 1
+        self.suma += segundos
+        self.items += items
+        self.minimo = min(self.minimo, segundos)
+        self.maximo = max(self.maximo, segundos)
+
+    def percentil(self, q: float) -> float:
+        """Estimación del percentil `q` (0-1) como el límite del bucket que lo contiene."""
+        objetivo = q * self.count
+        acumulado = 0
+        for limite, n in zip(BUCKETS_SEGUNDOS, self.buckets):
+            acumulado += n
+            if acumulado >= objetivo:
+                return min(limite, self.maximo)
+        return self.maximo
+
+class _Temporizador:
+    """Context manager que mide la duración de un bloque y la registra en una etapa."""
+    __slots__ = ('metricas', 'etapa', 'items', 'inicio')
+
+    def __init__(self, metricas: "PipelineMetrics", etapa: str, items: int):
+        self.metricas = metricas
+        self.etapa = etapa
+        self.items = items
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metricas.observar(self.etapa, time.perf_counter() - self.inicio, self.items)
+        return False
+
+class PipelineMetrics:
+    """
+    Registro de métricas del pipeline, seguro para uso desde varios hilos.
+
+    - Etapas: histograma de latencias, número de elementos procesados y throughput.
+    - Contadores: eventos discretos (imágenes de entrada, segmentos, validados, etc.).
+    """
+    def __init__(self, enabled: bool = False,
+                 prometheus_path: Union[str, Path, None] = None,
+                 summary_path: Union[str, Path, None] = None):
+        """
+        Args:
+            enabled (bool, optional): Si es False, todas las operaciones son no-ops. Defaults to False.
+            prometheus_path (Union[str, Path, None], optional): Ruta del archivo de texto en formato
+                Prometheus generado por `publicar`. Defaults to None.
+            summary_path (Union[str, Path, None], optional): Ruta del resumen JSON generado por
+                `publicar`. Defaults to None.
+        """
+        self.enabled = enabled
+        self.prometheus_path = Path(prometheus_path) if prometheus_path else None
+        self.summary_path = Path(summary_path) if summary_path else None
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self) -> None:
+        """Descarta todas las mediciones y reinicia el reloj de la ejecución."""
+        with self._lock:
+            self._etapas: dict[str, _Histograma] = {}
+            self._contadores: dict[str, int] = {}
+            self._inicio = time.perf_counter()
+
+    def medir(self, etapa: str, items: int = 1):
+        """
+        Devuelve un context manager que mide la duración del bloque como una observación de `etapa`.
+
+        Args:
+            etapa (str): Nombre de la etapa (ej. "sam_generate").
+            items (int, optional): Elementos procesados en el bloque (para el throughput). Defaults to 1.
+        """
+        if not self.enabled:
+            return _CONTEXTO_NULO
+        return _Temporizador(self, etapa, items)
+
+    def observar(self, etapa: str, segundos: float, items: int = 1) -> None:
+        """Registra una duración ya medida para `etapa`."""
+        if not self.enabled:
+            return
+        with self._lock:
+            histograma = self._etapas.get(etapa)
+            if histograma is None:
+                histograma = self._etapas[etapa] = _Histograma()
+            histograma.observar(segundos, items)
+
+    def incrementar(self, contador: str, n: int = 1) -> None:
+        """Incrementa un contador de eventos."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._contadores[contador] = self._contadores.get(contador, 0) + n
+
+    def resumen(self) -> dict:
+        """
+        Construye el resumen de la ejecución.
+
+        Returns:
+            dict: Duración total, contadores y, por etapa: observaciones, elementos, tiempo total,
+                  latencias (media, p50, p95, mínimo, máximo en ms) y elementos por segundo.
+        """
+        with self._lock:
+            etapas = {}
+            for nombre, h in sorted(self._etapas.items()):
+                etapas[nombre] = {
+                    'observaciones': h.count,
+                    'items': h.items,
+                    'tiempo_total_s': round(h.suma, 6),
+                    'latencia_media_ms': round(h.suma / h.count * 1000, 3),
+                    'latencia_p50_ms': round(h.percentil(0.5) * 1000, 3),
+                    'latencia_p95_ms': round(h.percentil(0.95) * 1000, 3),
+                    'latencia_min_ms': round(h.minimo * 1000, 3),
+                    'latencia_max_ms': round(h.maximo * 1000, 3),
+                    'items_por_segundo': round(h.items / h.suma, 3) if h.suma > 0 else None,
+                }
+            return {
+                'duracion_total_s': round(time.perf_counter() - self._inicio, 3),
+                'contadores': dict(sorted(self._contadores.items())),
+                'etapas': etapas,
+            }
+
+    def a_prometheus(self) -> str:
+        """Serializa las métricas en el formato de exposición de texto de Prometheus."""
+        lineas = [
+            "# HELP voucher_pipeline_stage_seconds Latencia por etapa del pipeline de vouchers.",
+            "# TYPE voucher_pipeline_stage_seconds histogram",
+        ]
+        with self._lock:
+            etapas = sorted(self._etapas.items())
+            contadores = sorted(self._contadores.items())
+            for nombre, h in etapas:
+                acumulado = 0
+                for limite, n in zip(BUCKETS_SEGUNDOS, h.buckets):
+                    acumulado += n
+                    le = "+Inf" if math.isinf(limite) else repr(limite)
+                    lineas.append(f'voucher_pipeline_stage_seconds_bucket{{stage="{nombre}",le="{le}"}} {acumulado}')
+                lineas.append(f'voucher_pipeline_stage_seconds_sum{{stage="{nombre}"}} {h.suma}')
+                lineas.append(f'voucher_pipeline_stage_seconds_count{{stage="{nombre}"}} {h.count}')
+            lineas += [
+                "# HELP voucher_pipeline_stage_items_total Elementos procesados por etapa.",
+                "# TYPE voucher_pipeline_stage_items_total counter",
+            ]
+            lineas += [f'voucher_pipeline_stage_items_total{{stage="{nombre}"}} {h.items}' for nombre, h in etapas]
+            lineas += [
+                "# HELP voucher_pipeline_stage_items_per_second Throughput por etapa (elementos / tiempo en la etapa).",
+                "# TYPE voucher_pipeline_stage_items_per_second gauge",
+            ]
+            lineas += [
+                f'voucher_pipeline_stage_items_per_second{{stage="{nombre}"}} {h.items / h.suma if h.suma > 0 else 0.0}'
+                for nombre, h in etapas
+            ]
+            lineas += [
+                "# HELP voucher_pipeline_events_total Contadores de eventos del pipeline.",
+                "# TYPE voucher_pipeline_events_total counter",
+            ]
+            lineas += [f'voucher_pipeline_events_total{{event="{nombre}"}} {n}' for nombre, n in contadores]
+        return "\n".join(lineas) + "\n"
+
+    @staticmethod
+    def _escribir_atomico(ruta: Path, contenido: str) -> None:
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        tmp = ruta.with_name(ruta.name + '.tmp')
+        tmp.write_text(contenido, encoding='utf-8')
+        os.replace(tmp, ruta)
+
+    def publicar(self) -> None:
+        """
+        Escribe el archivo Prometheus y el resumen JSON (si sus rutas están configuradas)
+        y registra el resumen en el log. No hace nada si las métricas están desactivadas.
+        """
+        if not self.enabled:
+            return
+        resumen = self.resumen()
+        try:
+            if self.prometheus_path is not None:
+                self._escribir_atomico(self.prometheus_path, self.a_prometheus())
+                self.logger.info(f"Métricas en formato Prometheus guardadas en {self.prometheus_path}")
+            if self.summary_path is not None:
+                self._escribir_atomico(self.summary_path, json.dumps(resumen, ensure_ascii=False, indent=4))
+                self.logger.info(f"Resumen de la ejecución guardado en {self.summary_path}")
+        except OSError as e:
+            self.logger.error(f"No se pudieron guardar las métricas: {e}")
+
+        self.logger.info(f"Resumen de la ejecución: duración {resumen['duracion_total_s']}s, contadores {resumen['contadores']}")
+        for nombre, datos in resumen['etapas'].items():
+            self.logger.info(
+                f"  Etapa {nombre}: {datos['items']} elementos en {datos['tiempo_total_s']}s "
+                f"(media {datos['latencia_media_ms']} ms, p95 {datos['latencia_p95_ms']} ms, "
+                f"{datos['items_por_segundo']} elem/s)"
+            )
+
+_METRICAS = PipelineMetrics(enabled=False)
+
+def obtener_metricas() -> PipelineMetrics:
+    """Devuelve el registro global de métricas del pipeline."""
+    return _METRICAS
+
+def configurar_metricas(metrics_config: dict | None) -> PipelineMetrics:
+    """
+    Configura el registro global de métricas a partir de la sección `metrics` de settings.yml.
+
+    Args:
+        metrics_config (dict | None): Claves 'enabled', 'prometheus_path' y 'summary_path'.
+
+    Returns:
+        PipelineMetrics: El registro global, ya configurado y reiniciado.
+    """
+    metrics_config = metrics_config or {}
+    _METRICAS.enabled = bool(metrics_config.get('enabled', False))
+    _METRICAS.prometheus_path = Path(metrics_config['prometheus_path']) if metrics_config.get('prometheus_path') else None
+    _METRICAS.summary_path = Path(metrics_config['summary_path']) if metrics_config.get('summary_path') else None
+    _METRICAS.reiniciar()
+    return _METRICAS
@@ -0,0 +1,109 @@
+#scr/utils/registry.py
+"""
+Registro de backends con importación perezosa.
+
+Cada backend (segmentador, validador, extractor de OCR) se registra con un nombre
+corto y la ruta de su clase como texto ("paquete.modulo:Clase"). El módulo solo se
+importa cuando la configuración selecciona ese backend, de modo que una ejecución
+que usa Tesseract no paga el tiempo de importación ni la memoria de librerías como
+`transformers`, `segment_anything` o `boto3`.
+
+También se aceptan rutas "paquete.modulo:Clase" directamente como nombre, lo que
+permite usar implementaciones externas (plugins) sin modificar el registro.
+"""
+import logging
+import importlib
+import threading
+
+def importar_objeto(ruta: str):
+    """
+    Importa y devuelve el objeto indicado por una ruta "paquete.modulo:Objeto".
+
+    Args:
+        ruta (str): Ruta del objeto, con el módulo y el atributo separados por ':'.
+
+    Returns:
+        El objeto importado (normalmente una clase).
+
+    Raises:
+        ValueError: Si la ruta no tiene el formato "modulo:Objeto".
+        ImportError: Si el módulo (o alguna de sus dependencias) no se puede importar.
+        AttributeError: Si el módulo no define el objeto.
+    """
+    modulo, separador, atributo = ruta.partition(':')
+    if not separador or not modulo or not atributo:
+        raise ValueError(f"Ruta de backend inválida: '{ruta}'. Formato esperado: 'paquete.modulo:Clase'.")
+    objeto = importlib.import_module(modulo)
+    for parte in atributo.split('.'):
+        objeto = getattr(objeto, parte)
+    return objeto
+
+class BackendRegistry:
+    """
+    Registro de implementaciones de un tipo de componente, indexadas por nombre.
+
+    Las clases se resuelven (importan) en la primera llamada a `obtener` y se guardan
+    para las siguientes. Es seguro para uso desde varios hilos.
+    """
+    def __init__(self, componente: str):
+        """
+        Args:
+            componente (str): Nombre del tipo de componente (ej. "segmentador"), usado en los mensajes.
+        """
+        self.componente = componente
+        self._rutas: dict[str, str] = {}
+        self._resueltos: dict[str, type] = {}
+        self._lock = threading.RLock() # Reentrante: un backend puede consultar el registro al importarse
+        self.logger = logging.getLogger(f"{self.__class__.__name__}[{componente}]")
+
+    def registrar(self, nombre: str, ruta: str) -> None:
+        """
+        Registra un backend sin importarlo.
+
+        Args:
+            nombre (str): Nombre con el que se selecciona en la configuración (clave 'type').
+            ruta (str): Ruta de la clase, "paquete.modulo:Clase".
+        """
+        with self._lock:
+            self._rutas[nombre] = ruta
+            self._resueltos.pop(nombre, None)
+
+    def disponibles(self) -> list[str]:
+        """Nombres de los backends registrados."""
+        return sorted(self._rutas)
+
+    def obtener(self, nombre: str) -> type:
+        """
+        Devuelve la clase del backend `nombre`, importando su módulo si es necesario.
+
+        Args:
+            nombre (str): Nombre registrado, o una ruta "paquete.modulo:Clase".
+
+        Returns:
+            type: La clase del backend.
+
+        Raises:
+            ValueError: Si el nombre no está registrado y no es una ruta de clase.
+            ImportError: Si el backend o sus dependencias no están instalados.
+        """
+        with self._lock:
+            clase = self._resueltos.get(nombre)
+            if clase is not None:
+                return clase
+            ruta = self._rutas.get(nombre)
+            if ruta is None and ':' in nombre:
+                ruta = nombre
+            if ruta is None:
+                raise ValueError(
+                    f"Tipo de {self.componente} no soportado: '{nombre}'. Disponibles: {', '.join(self.disponibles())}."
+                )
+            try:
+                clase = importar_objeto(ruta)
+            except ImportError as e:
+                self.logger.error(f"No se pudo importar el {self.componente} '{nombre}' ({ruta}): {e}")
+                raise ImportError(
+                    f"El {self.componente} '{nombre}' requiere dependencias no instaladas: {e}"
+                ) from e
+            self.logger.debug(f"Backend '{nombre}' resuelto a {ruta}.")
+            self._resueltos[nombre] = clase
+            return clase
@@ -0,0 +1,223 @@
+#scr/validation/distilled_validation.py
+"""
+Validador destilado: una CNN pequeña entrenada con las decisiones de CLIP.
+
+El pipeline solo pregunta a CLIP "voucher" frente a "no voucher", pero paga un ViT-B/32
+completo por segmento. `VoucherNetPequena` es una CNN de cuatro capas (~60k parámetros)
+sobre el segmento reducido a 64x64 píxeles, entrenada por destilación con las
+probabilidades de CLIP (`tools/train_distilled_validator.py`); su coste por imagen es
+más de un orden de magnitud menor.
+
+`DistilledValidator` decide directamente cuando la probabilidad del modelo destilado
+queda fuera de una banda de incertidumbre y envía los casos dentro de la banda al
+validador de respaldo (por defecto `ClipValidator`).
+"""
+import logging
+import threading
+from typing import List, Optional, Tuple
+import numpy as np
+import torch
+from PIL import Image
+from scr.validation.ivalidator import IValidator
+from scr.utils.device import resolver_dispositivo
+from scr.utils.metrics import obtener_metricas
+
+TAMANO_ENTRADA = 64 # Lado de la imagen de entrada de VoucherNetPequena
+
+class VoucherNetPequena(torch.nn.Module):
+    """CNN binaria voucher / no voucher: cuatro convoluciones con paso 2, pooling global y una capa lineal."""
+    def __init__(self, canales_base: int = 16):
+        super().__init__()
+        capas = []
+        entrada = 3
+        for salida in (canales_base, canales_base * 2, canales_base * 4, canales_base * 4):
+            capas += [
+                torch.nn.Conv2d(entrada, salida, kernel_size=3, stride=2, padding=1, bias=False),
+                torch.nn.BatchNorm2d(salida),
+                torch.nn.ReLU(inplace=True),
+            ]
+            entrada = salida
+        self.features = torch.nn.Sequential(*capas)
+        self.clasificador = torch.nn.Linear(entrada, 1)
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        """Devuelve el logit de "voucher" de cada imagen del lote (N,)."""
+        return self.clasificador(self.features(x).mean(dim=(2, 3))).squeeze(1)
+
+def preparar_imagenes(images: List[Image.Image], tamano: int = TAMANO_ENTRADA) -> np.ndarray:
+    """
+    Reduce los segmentos a `tamano` x `tamano` píxeles RGB (sin conservar la relación de aspecto).
+
+    Returns:
+        np.ndarray: Array uint8 (N, tamano, tamano, 3).
+    """
+    reducidas = np.empty((len(images), tamano, tamano, 3), dtype=np.uint8)
+    for i, image in enumerate(images):
+        reducidas[i] = np.asarray(image.convert("RGB").resize((tamano, tamano), Image.BILINEAR, reducing_gap=2.0))
+    return reducidas
+
+def a_tensor(reducidas: np.ndarray) -> torch.Tensor:
+    """Convierte imágenes uint8 (N, H, W, 3) en el tensor normalizado (N, 3, H, W) que espera la red."""
+    return torch.from_numpy(reducidas).permute(0, 3, 1, 2).float().div_(255.0).sub_(0.5)
+
+class DistilledValidator(IValidator):
+    """
+    Implementación de `IValidator` con un modelo destilado y un validador de respaldo.
+
+    Las imágenes cuya probabilidad destilada cae en `uncertainty_band` se validan con el
+    respaldo; el resto se decide con `confidence_threshold`, igual que `ClipValidator`.
+    """
+    supports_batch = True
+
+    def __init__(self, model_path: str, device: str | torch.device, confidence_threshold: float = 0.8,
+                 uncertainty_band: tuple[float, float] = (0.2, 0.9), batch_size: int = 64,
+                 fallback: IValidator | None = None, fallback_factory=None):
+        """
+        Inicializa el validador destilado.
+
+        Args:
+            model_path (str): Ruta al modelo entrenado con `tools/train_distilled_validator.py`.
+            device (str | torch.device): Dispositivo donde ejecutar el modelo destilado.
+            confidence_threshold (float, optional): Umbral de probabilidad para considerar una
+                imagen como voucher. Defaults to 0.8.
+            uncertainty_band (tuple[float, float], optional): Rango [bajo, alto] de probabilidad
+                destilada en el que se consulta al respaldo. Debe contener el umbral. Defaults to (0.2, 0.9).
+            batch_size (int, optional): Máximo de imágenes por pasada del modelo destilado. Defaults to 64.
+            fallback (IValidator | None, optional): Validador de respaldo. Si es None, se construye
+                con `fallback_factory` la primera vez que se necesita. Defaults to None.
+            fallback_factory (Callable[[], IValidator] | None, optional): Construye el respaldo de
+                forma diferida. Defaults to None.
+
+        Raises:
+            ValueError: Si no se proporciona respaldo ni función que lo construya, o si la banda
+                no contiene el umbral.
+        """
+        if fallback is None and fallback_factory is None:
+            raise ValueError("DistilledValidator requiere un validador de respaldo o una función que lo construya.")
+        bajo, alto = (float(v) for v in uncertainty_band)
+        if not bajo <= confidence_threshold <= alto:
+            raise ValueError(f"La banda de incertidumbre {uncertainty_band} debe contener el umbral {confidence_threshold}.")
+        self.device = resolver_dispositivo(device)
+        self.threshold = confidence_threshold
+        self.uncertainty_band = (bajo, alto)
+        self.batch_size = max(1, batch_size)
+        self._fallback = fallback
+        self._fallback_factory = fallback_factory
+        self._lock_fallback = threading.Lock() # Los workers del modo "concurrent" comparten la instancia
+
+        datos = torch.load(model_path, map_location='cpu', weights_only=True)
+        self.tamano = datos.get('tamano', TAMANO_ENTRADA)
+        self.model = VoucherNetPequena(datos.get('canales_base', 16))
+        self.model.load_state_dict(datos['state_dict'])
+        self.model.to(self.device).eval()
+
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.info(
+            f"DistilledValidator inicializado con modelo: {model_path} (banda de incertidumbre: {self.uncertainty_band}, "
+            f"respaldo {'cargado' if fallback is not None else 'diferido'})."
+        )
+        self.logger.debug(f"Métricas de entrenamiento del modelo destilado: {datos.get('metricas')}")
+
+    @classmethod
+    def from_config(cls, validation_config: dict, device: str | torch.device) -> "DistilledValidator":
+        """
+        Construye el validador a partir de la sección `validation` de settings.yml.
+
+        Args:
+            validation_config (dict): 'confidence_threshold' y la subsección 'distilled'
+                ('model_path', 'uncertainty_band', 'batch_size', 'fallback' y 'lazy_fallback').
+                El respaldo (tipo registrado en `VALIDADORES`, por defecto "clip") se construye
+                con el resto de la sección.
+            device (str | torch.device): Dispositivo donde cargar los modelos.
+
+        Raises:
+            KeyError: Si falta 'distilled.model_path' o 'confidence_threshold'.
+            ValueError: Si el respaldo es "distilled" o la banda no contiene el umbral.
+        """
+        from scr.validation.validator_factory import VALIDADORES # Local: la factory importa este módulo de forma perezosa
+        distilled_config = validation_config.get('distilled', {}) or {}
+        tipo_respaldo = distilled_config.get('fallback', 'clip')
+        if tipo_respaldo == 'distilled':
+            raise ValueError("El validador de respaldo de 'distilled' no puede ser 'distilled'.")
+        def crear_respaldo() -> IValidator:
+            # El módulo del respaldo (y torch) se importa al construirlo, no antes: con lazy_fallback, al primer uso
+            return VALIDADORES.obtener(tipo_respaldo).from_config(validation_config, device)
+
+        lazy = distilled_config.get('lazy_fallback', False)
+        return cls(
+            model_path=distilled_config['model_path'],
+            device=device,
+            confidence_threshold=validation_config['confidence_threshold'],
+            uncertainty_band=tuple(distilled_config.get('uncertainty_band', (0.2, 0.9))),
+            batch_size=distilled_config.get('batch_size', 64),
+            fallback=None if lazy else crear_respaldo(),
+            fallback_factory=crear_respaldo,
+        )
+
+    @property
+    def fallback(self) -> IValidator:
+        """El validador de respaldo, construyéndolo si aún no existe."""
+        if self._fallback is None:
+            with self._lock_fallback:
+                if self._fallback is None:
+                    self.logger.info("Cargando el validador de respaldo...")
+                    self._fallback = self._fallback_factory()
+        return self._fallback
+
+    def probabilidades(self, images: List[Image.Image]) -> np.ndarray:
+        """
+        Calcula la probabilidad destilada de "voucher" de cada imagen.
+
+        Returns:
+            np.ndarray: Probabilidades (N,) en el orden de `images`.
+        """
+        resultado = np.empty(len(images), dtype=np.float64)
+        with obtener_metricas().medir("validacion_destilada", items=len(images)), torch.inference_mode():
+            for inicio in range(0, len(images), self.batch_size):
+                lote = a_tensor(preparar_imagenes(images[inicio:inicio + self.batch_size], self.tamano)).to(self.device)
+                resultado[inicio:inicio + len(lote)] = torch.sigmoid(self.model(lote)).cpu().numpy()
+        return resultado
+
+    def predict_batch(self, images: List[Image.Image]) -> Tuple[List[bool], List[Optional[float]]]:
+        """
+        Valida un lote de imágenes con el modelo destilado y, para los casos inciertos, con el respaldo.
+
+        Args:
+            images (List[Image.Image]): Las imágenes (en formato PIL) a validar.
+
+        Returns:
+            Tuple[List[bool], List[Optional[float]]]: Las decisiones y la probabilidad de
+                "voucher" de cada imagen (la del respaldo para los casos inciertos).
+        """
+        if not images:
+            return [], []
+        metricas = obtener_metricas()
+        probs = self.probabilidades(images)
+        decisiones: List[bool] = [bool(p >= self.threshold) for p in probs]
+        probabilidades: List[Optional[float]] = [float(p) for p in probs]
+
+        bajo, alto = self.uncertainty_band
+        inciertas = [i for i, p in enumerate(probs) if bajo <= p <= alto]
+        metricas.incrementar("validacion_via_destilada", len(images) - len(inciertas))
+        if inciertas:
+            metricas.incrementar("validacion_respaldo", len(inciertas))
+            self.logger.debug(f"{len(inciertas)} de {len(images)} imágenes en la banda de incertidumbre; se validan con el respaldo.")
+            decisiones_respaldo, probs_respaldo = self.fallback.predict_batch([images[i] for i in inciertas])
+            for i, decision, prob in zip(inciertas, decisiones_respaldo, probs_respaldo):
+                decisiones[i] = decision
+                probabilidades[i] = prob
+
+        self.logger.info(f"Validación por lotes completada: {sum(decisiones)} de {len(decisiones)} imágenes SON voucher.")
+        return decisiones, probabilidades
+
+    def is_voucher(self, image: Image.Image) -> bool:
+        """
+        Determina si la imagen proporcionada es un voucher.
+
+        Args:
+            image (Image.Image): La imagen (en formato PIL) a validar.
+
+        Returns:
+            bool: `True` si la imagen es clasificada como voucher, `False` en caso contrario.
+        """
+        return self.predict_batch([image])[0][0]
@@ -0,0 +1,244 @@
+#scr/validation/heuristic_validation.py
+"""
+Pre-validación barata por características de píxeles antes del validador de respaldo (CLIP).
+
+Muchos recortes de SAM que llegan a la validación son claramente no vouchers (parches
+de fondo, bordes de mesa, manos, logotipos) y cada uno cuesta una pasada completa de
+CLIP. `HeuristicValidator` reduce cada lote a una resolución fija y calcula en NumPy,
+para todo el lote a la vez:
+- la densidad de bordes (texto impreso),
+- la fracción de papel blanco (píxeles claros y poco saturados),
+- el número de líneas de texto (bandas horizontales de filas con píxeles oscuros),
+- la saturación media del color.
+
+Con ellas rechaza (o, si se permite, acepta) los casos evidentes y envía solo los
+ambiguos al respaldo.
+"""
+import logging
+import threading
+from typing import List, Optional, Tuple
+import numpy as np
+from PIL import Image
+from scr.validation.ivalidator import IValidator
+from scr.utils.metrics import obtener_metricas
+
+PESOS_GRIS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+def calcular_caracteristicas(images: List[Image.Image], tamano: int = 256, umbral_borde: float = 40.0,
+                             umbral_blanco: float = 190.0) -> dict[str, np.ndarray]:
+    """
+    Calcula las características de píxeles de un lote de recortes.
+
+    Args:
+        images (List[Image.Image]): Los recortes a analizar.
+        tamano (int, optional): Lado al que se reduce cada recorte. Defaults to 256.
+        umbral_borde (float, optional): Gradiente mínimo (en niveles de gris) de un píxel de borde.
+            Defaults to 40.0.
+        umbral_blanco (float, optional): Nivel de gris mínimo de un píxel de papel. Defaults to 190.0.
+
+    Returns:
+        dict[str, np.ndarray]: Arrays (N,) 'densidad_bordes', 'fraccion_blanco', 'lineas_texto'
+            y 'saturacion_media'.
+    """
+    lote = np.empty((len(images), tamano, tamano, 3), dtype=np.uint8)
+    for i, image in enumerate(images):
+        lote[i] = np.asarray(image.convert("RGB").resize((tamano, tamano), Image.BILINEAR, reducing_gap=2.0))
+
+    gris = lote.astype(np.float32) @ PESOS_GRIS
+    maximo = lote.max(axis=3).astype(np.float32)
+    saturacion = (maximo - lote.min(axis=3)) / np.maximum(maximo, 1.0) # Saturación de HSV
+
+    gradiente = np.abs(np.diff(gris, axis=2))[:, :-1, :] + np.abs(np.diff(gris, axis=1))[:, :, :-1]
+    densidad_bordes = (gradiente > umbral_borde).mean(axis=(1, 2))
+    fraccion_blanco = ((gris >= umbral_blanco) & (saturacion < 0.15)).mean(axis=(1, 2))
+
+    # Una línea de texto es una banda de filas consecutivas con algún píxel oscuro
+    filas_texto = (gris < 128).mean(axis=2) > 0.01
+    lineas_texto = filas_texto[:, 0].astype(np.int64) + np.count_nonzero(filas_texto[:, 1:] & ~filas_texto[:, :-1], axis=1)
+
+    return {
+        'densidad_bordes': densidad_bordes,
+        'fraccion_blanco': fraccion_blanco,
+        'lineas_texto': lineas_texto,
+        'saturacion_media': saturacion.mean(axis=(1, 2)),
+    }
+
+class HeuristicValidator(IValidator):
+    """
+    Implementación de `IValidator` que filtra con heurísticas de píxeles y delega los casos
+    ambiguos en un validador de respaldo.
+
+    Las decisiones tomadas por las heurísticas no tienen probabilidad asociada (None).
+    """
+    supports_batch = True
+
+    def __init__(self, device=None, fallback: IValidator | None = None, fallback_factory=None,
+                 size: int = 256,
+                 reject_min_white_ratio: float = 0.25, reject_min_edge_density: float = 0.004,
+                 reject_max_saturation: float = 0.35,
+                 accept: bool = True, accept_min_white_ratio: float = 0.6, accept_min_text_lines: int = 6,
+                 accept_edge_density: tuple[float, float] = (0.03, 0.25), accept_max_saturation: float = 0.12):
+        """
+        Inicializa el pre-validador.
+
+        Args:
+            device (torch.device | None, optional): No se usa (el respaldo recibe el suyo en
+                `from_config`). Defaults to None.
+            fallback (IValidator | None, optional): Validador de respaldo. Si es None, se construye
+                con `fallback_factory` la primera vez que se necesita. Defaults to None.
+            fallback_factory (Callable[[], IValidator] | None, optional): Construye el respaldo de
+                forma diferida. Defaults to None.
+            size (int, optional): Lado al que se reducen los recortes. Defaults to 256.
+            reject_min_white_ratio (float, optional): Por debajo de esta fracción de papel blanco
+                el recorte se rechaza. Defaults to 0.25.
+            reject_min_edge_density (float, optional): Por debajo de esta densidad de bordes (parche
+                liso) el recorte se rechaza. Defaults to 0.004.
+            reject_max_saturation (float, optional): Por encima de esta saturación media (manos,
+                logotipos, fotos) el recorte se rechaza. Defaults to 0.35.
+            accept (bool, optional): Si es False, solo se rechaza; todo lo demás va al respaldo.
+                Defaults to True.
+            accept_min_white_ratio (float, optional): Fracción mínima de papel para aceptar. Defaults to 0.6.
+            accept_min_text_lines (int, optional): Líneas de texto mínimas para aceptar. Defaults to 6.
+            accept_edge_density (tuple[float, float], optional): Rango de densidad de bordes para
+                aceptar. Defaults to (0.03, 0.25).
+            accept_max_saturation (float, optional): Saturación media máxima para aceptar. Defaults to 0.12.
+
+        Raises:
+            ValueError: Si no se proporciona ni `fallback` ni `fallback_factory`.
+        """
+        if fallback is None and fallback_factory is None:
+            raise ValueError("HeuristicValidator requiere un validador de respaldo o una función que lo construya.")
+        self._fallback = fallback
+        self._fallback_factory = fallback_factory
+        self._lock_fallback = threading.Lock() # Los workers del modo "concurrent" comparten la instancia
+        self.size = int(size)
+        self.reject_min_white_ratio = reject_min_white_ratio
+        self.reject_min_edge_density = reject_min_edge_density
+        self.reject_max_saturation = reject_max_saturation
+        self.accept = accept
+        self.accept_min_white_ratio = accept_min_white_ratio
+        self.accept_min_text_lines = accept_min_text_lines
+        self.accept_edge_density = tuple(accept_edge_density)
+        self.accept_max_saturation = accept_max_saturation
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.info(
+            f"HeuristicValidator inicializado (aceptación {'activada' if accept else 'desactivada'}, "
+            f"respaldo {'cargado' if fallback is not None else 'diferido'})."
+        )
+
+    @classmethod
+    def from_config(cls, validation_config: dict, device) -> "HeuristicValidator":
+        """
+        Construye el validador a partir de la sección `validation` de settings.yml.
+
+        Args:
+            validation_config (dict): La subsección 'heuristic' contiene 'fallback' (tipo registrado
+                en `VALIDADORES`, por defecto "clip", que se construye con el resto de la sección),
+                'lazy_fallback' y los umbrales del constructor.
+            device (torch.device): Dispositivo donde cargar el validador de respaldo.
+
+        Raises:
+            ValueError: Si el respaldo es "heuristic".
+        """
+        from scr.validation.validator_factory import VALIDADORES # Local: la factory importa este módulo de forma perezosa
+        heuristic_config = dict(validation_config.get('heuristic', {}) or {})
+        tipo_respaldo = heuristic_config.pop('fallback', 'clip')
+        if tipo_respaldo == 'heuristic':
+            raise ValueError("El validador de respaldo de 'heuristic' no puede ser 'heuristic'.")
+        def crear_respaldo() -> IValidator:
+            # El módulo del respaldo (y torch) se importa al construirlo, no antes: con lazy_fallback, al primer uso
+            return VALIDADORES.obtener(tipo_respaldo).from_config(validation_config, device)
+
+        lazy = heuristic_config.pop('lazy_fallback', False)
+        return cls(
+            device=device,
+            fallback=None if lazy else crear_respaldo(),
+            fallback_factory=crear_respaldo,
+            **heuristic_config,
+        )
+
+    @property
+    def fallback(self) -> IValidator:
+        """El validador de respaldo, construyéndolo si aún no existe."""
+        if self._fallback is None:
+            with self._lock_fallback:
+                if self._fallback is None:
+                    self.logger.info("Cargando el validador de respaldo...")
+                    self._fallback = self._fallback_factory()
+        return self._fallback
+
+    def clasificar(self, images: List[Image.Image]) -> np.ndarray:
+        """
+        Clasifica un lote con las heurísticas.
+
+        Returns:
+            np.ndarray: Por imagen, 0 (rechazada), 1 (aceptada) o -1 (ambigua, va al respaldo).
+        """
+        with obtener_metricas().medir("prevalidacion_heuristica", items=len(images)):
+            c = calcular_caracteristicas(images, self.size)
+            rechazar = (
+                (c['fraccion_blanco'] < self.reject_min_white_ratio)
+                | (c['densidad_bordes'] < self.reject_min_edge_density)
+                | (c['saturacion_media'] > self.reject_max_saturation)
+            )
+            aceptar = np.zeros(len(images), dtype=bool)
+            if self.accept:
+                borde_min, borde_max = self.accept_edge_density
+                aceptar = (
+                    (c['fraccion_blanco'] >= self.accept_min_white_ratio)
+                    & (c['lineas_texto'] >= self.accept_min_text_lines)
+                    & (c['densidad_bordes'] >= borde_min) & (c['densidad_bordes'] <= borde_max)
+                    & (c['saturacion_media'] <= self.accept_max_saturation)
+                    & ~rechazar
+                )
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(f"Características heurísticas: { {k: np.round(v, 4).tolist() for k, v in c.items()} }")
+        return np.where(rechazar, 0, np.where(aceptar, 1, -1))
+
+    def predict_batch(self, images: List[Image.Image]) -> Tuple[List[bool], List[Optional[float]]]:
+        """
+        Valida un lote: decide con las heurísticas los casos evidentes y con el respaldo los ambiguos.
+
+        Args:
+            images (List[Image.Image]): Las imágenes (en formato PIL) a validar.
+
+        Returns:
+            Tuple[List[bool], List[Optional[float]]]: Las decisiones y la probabilidad de
+                "voucher" de cada imagen (None para las decididas por las heurísticas).
+        """
+        if not images:
+            return [], []
+        metricas = obtener_metricas()
+        clases = self.clasificar(images)
+        decisiones: List[bool] = [bool(c == 1) for c in clases]
+        probabilidades: List[Optional[float]] = [None] * len(images)
+
+        ambiguas = np.flatnonzero(clases == -1).tolist()
+        rechazadas = int(np.count_nonzero(clases == 0))
+        metricas.incrementar("prevalidacion_rechazados", rechazadas)
+        metricas.incrementar("prevalidacion_aceptados", len(images) - rechazadas - len(ambiguas))
+        metricas.incrementar("llamadas_clip_evitadas", len(images) - len(ambiguas))
+        if ambiguas:
+            metricas.incrementar("validacion_respaldo", len(ambiguas))
+            decisiones_respaldo, probs_respaldo = self.fallback.predict_batch([images[i] for i in ambiguas])
+            for i, decision, prob in zip(ambiguas, decisiones_respaldo, probs_respaldo):
+                decisiones[i] = decision
+                probabilidades[i] = prob
+
+        self.logger.info(
+            f"Pre-validación: {len(images) - len(ambiguas)} de {len(images)} imágenes decididas sin el respaldo; "
+            f"{sum(decisiones)} SON voucher."
+        )
+        return decisiones, probabilidades
+
+    def is_voucher(self, image: Image.Image) -> bool:
+        """
+        Determina si la imagen proporcionada es un voucher.
+
+        Args:
+            image (Image.Image): La imagen (en formato PIL) a validar.
+
+        Returns:
+            bool: `True` si la imagen es clasificada como voucher, `False` en caso contrario.
+        """
+        return self.predict_batch([image])[0][0]
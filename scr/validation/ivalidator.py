@@ -3,7 +3,9 @@
 Define la interfaz abstracta para los componentes de validación de imágenes.
 """
 from abc import ABC, abstractmethod
+from typing import List, Optional, Tuple
 from PIL import Image
+from scr.segmentation.isegmenter import SegmentoDetectado
 
 class IValidator(ABC):
     """
@@ -12,7 +14,34 @@ class IValidator(ABC):
     Los validadores concretos deben implementar el método `is_voucher` para
     determinar si una imagen dada cumple con ciertos criterios de validación
     (en este contexto, si es o no un voucher).
+
+    Opcionalmente pueden sobrescribir `predict_batch` con una implementación por lotes
+    más eficiente y declarar `supports_batch = True` para que el pipeline la utilice.
+    Los validadores que usan los metadatos del segmentador (bbox, puntuaciones de SAM)
+    sobrescriben `predict_segments`, que el pipeline llama en lugar de `predict_batch`.
+    `ValidatorFactory` los construye con `from_config`.
     """
+    supports_batch: bool = False # True si `predict_batch` tiene una implementación por lotes nativa
+
+    @classmethod
+    def from_config(cls, validation_config: dict, device) -> "IValidator":
+        """
+        Construye el validador a partir de la sección `validation` de settings.yml.
+
+        La implementación por defecto pasa las claves de la configuración (excepto 'type')
+        como argumentos del constructor, junto con `device`. Las implementaciones cuya
+        configuración no se corresponde con su constructor deben sobrescribirlo.
+
+        Args:
+            validation_config (dict): Configuración del validador.
+            device (torch.device): Dispositivo donde cargar el modelo.
+
+        Returns:
+            IValidator: La instancia construida.
+        """
+        params = {k: v for k, v in validation_config.items() if k != 'type'}
+        return cls(device=device, **params)
+
     @abstractmethod
     def is_voucher(self, image: Image.Image) -> bool: # Usar Image.Image si PIL se importa solo como Image
         """
@@ -30,3 +59,46 @@ class IValidator(ABC):
             # o la validación fallan de manera irrecuperable.
         """
         pass
+
+    def predict_batch(self, images: List[Image.Image]) -> Tuple[List[bool], List[Optional[float]]]:
+        """
+        Valida un lote de imágenes y devuelve las decisiones junto con sus probabilidades.
+
+        La implementación por defecto llama a `is_voucher` para cada imagen y no
+        dispone de probabilidades (devuelve `None` para cada una).
+
+        Args:
+            images (List[Image.Image]): Las imágenes a validar.
+
+        Returns:
+            Tuple[List[bool], List[Optional[float]]]: Las decisiones (`True` si es voucher)
+                y la probabilidad de "voucher" de cada imagen, en el mismo orden que `images`.
+        """
+        decisiones = [self.is_voucher(image) for image in images]
+        return decisiones, [None] * len(decisiones)
+
+    def predict_segments(self, segmentos: List[SegmentoDetectado]) -> Tuple[List[bool], List[Optional[float]]]:
+        """
+        Valida un lote de segmentos disponiendo de sus metadatos.
+
+        La implementación por defecto ignora los metadatos y llama a `predict_batch`.
+
+        Args:
+            segmentos (List[SegmentoDetectado]): Los segmentos a validar.
+
+        Returns:
+            Tuple[List[bool], List[Optional[float]]]: Como en `predict_batch`, en el orden de `segmentos`.
+        """
+        return self.predict_batch([segmento.imagen for segmento in segmentos])
+
+    def is_voucher_batch(self, images: List[Image.Image]) -> List[bool]:
+        """
+        Valida un lote de imágenes.
+
+        Args:
+            images (List[Image.Image]): Las imágenes a validar.
+
+        Returns:
+            List[bool]: `True` para cada imagen considerada voucher, en el mismo orden que `images`.
+        """
+        return self.predict_batch(images)[0]
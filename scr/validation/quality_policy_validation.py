@@ -0,0 +1,225 @@
+#scr/validation/quality_policy_validation.py
+"""
+Política de validación basada en la calidad de las máscaras de SAM.
+
+Los segmentadores basados en SAM ya descartan las máscaras de baja calidad y de geometría
+implausible antes de la validación: `SamAutomaticMaskGenerator` (con sus valores por
+defecto) solo conserva máscaras con `predicted_iou` >= 0.88 y `stability_score` >= 0.95,
+"sam_box" y "sam_onnx" las de IoU predicho >= `box_prompts.min_score`, y todos aplican
+los rangos de área y relación de aspecto de `filtrar_mascaras`. Lo que los segmentos que
+llegan aquí todavía no tienen garantizado, y lo que decide esta política, es:
+
+- el IoU predicho por encima del mínimo del segmentador: una máscara muy segura
+  (`accept_min_predicted_iou`) que además rellena casi todo su bbox rectangular
+  (`accept_min_fill`) es un objeto plano de bordes rectos, y se acepta sin consultar a CLIP;
+- la fracción del bbox que cubre la máscara: una máscara que cubre menos de
+  `reject_min_fill` de su bbox no es un rectángulo, ni siquiera girado 45 grados (que cubre
+  entre 0.44 y 0.5 con las proporciones de un voucher), y se rechaza.
+
+El resto llega al validador de respaldo.
+
+`QualityPolicyValidator` sobrescribe `IValidator.predict_segments`, que todos los modos del
+pipeline usan con los metadatos del segmentador; con `predict_batch` (sin metadatos) todo va
+al respaldo.
+"""
+import logging
+import threading
+from typing import List, Optional, Tuple
+import numpy as np
+from PIL import Image
+from scr.segmentation.isegmenter import SegmentoDetectado
+from scr.validation.ivalidator import IValidator
+from scr.utils.metrics import obtener_metricas
+
+def calcular_metadatos(segmentos: List[SegmentoDetectado]) -> dict[str, np.ndarray]:
+    """
+    Reúne los metadatos de un lote de segmentos en arrays, con NaN donde faltan.
+
+    Returns:
+        dict[str, np.ndarray]: Arrays (N,) 'predicted_iou' y 'relleno' (área de la máscara /
+            área del bbox, acotado a 1: el redondeo al llevar ambos a píxeles originales puede
+            superarlo ligeramente).
+    """
+    iou = np.array([np.nan if s.predicted_iou is None else float(s.predicted_iou) for s in segmentos], dtype=np.float64)
+    area = np.array([np.nan if s.area is None else float(s.area) for s in segmentos], dtype=np.float64)
+    cajas = np.array([s.bbox if s.bbox is not None else (np.nan,) * 4 for s in segmentos], dtype=np.float64).reshape(-1, 4)
+    area_bbox = np.where((cajas[:, 2] > 0) & (cajas[:, 3] > 0), cajas[:, 2] * cajas[:, 3], np.nan)
+    return {'predicted_iou': iou, 'relleno': np.minimum(area / area_bbox, 1.0)}
+
+class QualityPolicyValidator(IValidator):
+    """
+    Implementación de `IValidator` que decide con el IoU predicho por SAM y el relleno del bbox
+    de cada segmento, y delega los casos intermedios en un validador de respaldo.
+
+    Los segmentos sin área de máscara o sin bbox (ej. los de `ContourSegmenter`) van siempre
+    al respaldo, y los que no tienen `predicted_iou` nunca se aceptan. Las decisiones de la
+    política no tienen probabilidad asociada (None).
+    """
+    supports_batch = True
+
+    def __init__(self, device=None, fallback: IValidator | None = None, fallback_factory=None,
+                 reject_min_fill: float = 0.4,
+                 accept: bool = True, accept_min_predicted_iou: float = 0.95, accept_min_fill: float = 0.9):
+        """
+        Inicializa la política de calidad.
+
+        Args:
+            device (torch.device | None, optional): No se usa (el respaldo recibe el suyo en
+                `from_config`). Defaults to None.
+            fallback (IValidator | None, optional): Validador de respaldo. Si es None, se construye
+                con `fallback_factory` la primera vez que se necesita. Defaults to None.
+            fallback_factory (Callable[[], IValidator] | None, optional): Construye el respaldo de
+                forma diferida. Defaults to None.
+            reject_min_fill (float, optional): Por debajo de esta fracción del bbox cubierta por la
+                máscara (objeto no rectangular) el segmento se rechaza. Defaults to 0.4.
+            accept (bool, optional): Si es False, solo se rechaza; todo lo demás va al respaldo.
+                Defaults to True.
+            accept_min_predicted_iou (float, optional): IoU predicho mínimo para aceptar. Debe
+                superar el mínimo del segmentador (0.88 en "sam", `box_prompts.min_score` en
+                "sam_box" y "sam_onnx") para que la política decida algo. Defaults to 0.95.
+            accept_min_fill (float, optional): Fracción del bbox cubierta mínima para aceptar. Defaults to 0.9.
+
+        Raises:
+            ValueError: Si no se proporciona ni `fallback` ni `fallback_factory`, o si los umbrales
+                de relleno se solapan.
+        """
+        if fallback is None and fallback_factory is None:
+            raise ValueError("QualityPolicyValidator requiere un validador de respaldo o una función que lo construya.")
+        if reject_min_fill >= accept_min_fill:
+            raise ValueError(f"reject_min_fill ({reject_min_fill}) debe ser menor que accept_min_fill ({accept_min_fill}).")
+        self._fallback = fallback
+        self._fallback_factory = fallback_factory
+        self._lock_fallback = threading.Lock() # Los workers del modo "concurrent" comparten la instancia
+        self.reject_min_fill = reject_min_fill
+        self.accept = accept
+        self.accept_min_predicted_iou = accept_min_predicted_iou
+        self.accept_min_fill = accept_min_fill
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.info(
+            f"QualityPolicyValidator inicializado (aceptación {'activada' if accept else 'desactivada'}, "
+            f"respaldo {'cargado' if fallback is not None else 'diferido'})."
+        )
+
+    @classmethod
+    def from_config(cls, validation_config: dict, device) -> "QualityPolicyValidator":
+        """
+        Construye el validador a partir de la sección `validation` de settings.yml.
+
+        Args:
+            validation_config (dict): La subsección 'quality_policy' contiene 'fallback' (tipo
+                registrado en `VALIDADORES`, por defecto "clip", que se construye con el resto de la
+                sección), 'lazy_fallback' y los umbrales del constructor.
+            device (torch.device): Dispositivo donde cargar el validador de respaldo.
+
+        Raises:
+            ValueError: Si el respaldo es "quality_policy".
+        """
+        from scr.validation.validator_factory import VALIDADORES # Local: la factory importa este módulo de forma perezosa
+        policy_config = dict(validation_config.get('quality_policy', {}) or {})
+        tipo_respaldo = policy_config.pop('fallback', 'clip')
+        if tipo_respaldo == 'quality_policy':
+            raise ValueError("El validador de respaldo de 'quality_policy' no puede ser 'quality_policy'.")
+        def crear_respaldo() -> IValidator:
+            # El módulo del respaldo (y torch) se importa al construirlo, no antes: con lazy_fallback, al primer uso
+            return VALIDADORES.obtener(tipo_respaldo).from_config(validation_config, device)
+
+        lazy = policy_config.pop('lazy_fallback', False)
+        return cls(
+            device=device,
+            fallback=None if lazy else crear_respaldo(),
+            fallback_factory=crear_respaldo,
+            **policy_config,
+        )
+
+    @property
+    def fallback(self) -> IValidator:
+        """El validador de respaldo, construyéndolo si aún no existe."""
+        if self._fallback is None:
+            with self._lock_fallback:
+                if self._fallback is None:
+                    self.logger.info("Cargando el validador de respaldo...")
+                    self._fallback = self._fallback_factory()
+        return self._fallback
+
+    def clasificar(self, segmentos: List[SegmentoDetectado]) -> np.ndarray:
+        """
+        Clasifica un lote de segmentos con la política.
+
+        Returns:
+            np.ndarray: Por segmento, 0 (rechazado), 1 (aceptado) o -1 (intermedio o sin
+                metadatos, va al respaldo).
+        """
+        m = calcular_metadatos(segmentos)
+        iou, relleno = m['predicted_iou'], m['relleno']
+        # Las comparaciones con NaN son False: un dato ausente nunca decide el segmento
+        with np.errstate(invalid='ignore'):
+            rechazar = relleno < self.reject_min_fill
+            aceptar = np.zeros(len(segmentos), dtype=bool)
+            if self.accept:
+                aceptar = (iou >= self.accept_min_predicted_iou) & (relleno >= self.accept_min_fill)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(f"Metadatos de los segmentos: { {k: np.round(v, 4).tolist() for k, v in m.items()} }")
+        return np.where(rechazar, 0, np.where(aceptar, 1, -1))
+
+    def predict_segments(self, segmentos: List[SegmentoDetectado]) -> Tuple[List[bool], List[Optional[float]]]:
+        """
+        Valida un lote: decide con la política los segmentos evidentes y con el respaldo los intermedios.
+
+        Args:
+            segmentos (List[SegmentoDetectado]): Los segmentos a validar, con sus metadatos.
+
+        Returns:
+            Tuple[List[bool], List[Optional[float]]]: Las decisiones y la probabilidad de
+                "voucher" de cada segmento (None para los decididos por la política).
+        """
+        if not segmentos:
+            return [], []
+        metricas = obtener_metricas()
+        clases = self.clasificar(segmentos)
+        decisiones: List[bool] = [bool(c == 1) for c in clases]
+        probabilidades: List[Optional[float]] = [None] * len(segmentos)
+
+        inciertos = np.flatnonzero(clases == -1).tolist()
+        rechazados = int(np.count_nonzero(clases == 0))
+        metricas.incrementar("politica_rechazados", rechazados)
+        metricas.incrementar("politica_aceptados", len(segmentos) - rechazados - len(inciertos))
+        metricas.incrementar("llamadas_clip_evitadas", len(segmentos) - len(inciertos))
+        if inciertos:
+            metricas.incrementar("validacion_respaldo", len(inciertos))
+            decisiones_respaldo, probs_respaldo = self.fallback.predict_segments([segmentos[i] for i in inciertos])
+            for i, decision, prob in zip(inciertos, decisiones_respaldo, probs_respaldo):
+                decisiones[i] = decision
+                probabilidades[i] = prob
+
+        self.logger.info(
+            f"Política de calidad: {len(segmentos) - len(inciertos)} de {len(segmentos)} segmentos decididos sin el respaldo; "
+            f"{sum(decisiones)} SON voucher."
+        )
+        return decisiones, probabilidades
+
+    def predict_batch(self, images: List[Image.Image]) -> Tuple[List[bool], List[Optional[float]]]:
+        """
+        Valida un lote de imágenes sin metadatos: todas se validan con el respaldo.
+
+        Args:
+            images (List[Image.Image]): Las imágenes (en formato PIL) a validar.
+
+        Returns:
+            Tuple[List[bool], List[Optional[float]]]: Las decisiones y probabilidades del respaldo.
+        """
+        if not images:
+            return [], []
+        obtener_metricas().incrementar("validacion_respaldo", len(images))
+        return self.fallback.predict_batch(images)
+
+    def is_voucher(self, image: Image.Image) -> bool:
+        """
+        Determina si la imagen proporcionada es un voucher.
+
+        Args:
+            image (Image.Image): La imagen (en formato PIL) a validar.
+
+        Returns:
+            bool: `True` si la imagen es clasificada como voucher, `False` en caso contrario.
+        """
+        return self.predict_batch([image])[0][0]
@@ -0,0 +1,181 @@
+#scr/validation/quantized_clip_validation.py
+"""
+Validador CLIP con la torre de visión cuantizada a int8 para nodos solo con CPU.
+
+Casi todo el tiempo de CPU de `ClipValidator` se va en las capas lineales del ViT de
+la torre de visión, que toleran bien la cuantización dinámica
+(`torch.ao.quantization.quantize_dynamic`): los pesos se guardan en int8 y las
+activaciones se cuantizan al vuelo en cada capa. Los embeddings de texto de las
+etiquetas se calculan una sola vez con el modelo en fp32.
+
+Opcionalmente, la torre cuantizada, los embeddings de texto y `logit_scale` se guardan
+en un artefacto junto al checkpoint: al recargarlo no se construye el modelo CLIP
+completo ni se repite la cuantización. `tools/clip_quantization_report.py` compara sus
+decisiones y probabilidades con las del modelo fp32.
+"""
+import json
+import time
+import hashlib
+import logging
+from pathlib import Path
+from typing import List
+import torch
+from transformers import CLIPModel, CLIPProcessor
+from scr.validation.voucher_validation import ClipValidator
+from scr.utils.device import resolver_dispositivo
+
+class TorreVision(torch.nn.Module):
+    """Torre de visión de CLIP con su proyección; equivale a `CLIPModel.get_image_features`."""
+    def __init__(self, vision_model: torch.nn.Module, visual_projection: torch.nn.Module):
+        super().__init__()
+        self.vision_model = vision_model
+        self.visual_projection = visual_projection
+
+    def forward(self, pixel_values: torch.Tensor) -> torch.Tensor:
+        return self.visual_projection(self.vision_model(pixel_values=pixel_values).pooler_output)
+
+class QuantizedClipValidator(ClipValidator):
+    """
+    Variante de `ClipValidator` con la torre de visión cuantizada dinámicamente a int8.
+
+    Mantiene la interfaz, el umbral y la lógica de decisión de `ClipValidator`; solo
+    cambia cómo se calculan los embeddings de imagen. Se ejecuta siempre en CPU (los
+    kernels de cuantización dinámica de PyTorch son de CPU).
+    """
+    def __init__(self, checkpoint: str, device: str | torch.device, labels: List[str], confidence_threshold: float = 0.8,
+                 batch_size: int = 8, persist_text_embeddings: bool = False,
+                 cache_artifact: bool = True, artifact_dir: str | None = None, threads: int | None = None):
+        """
+        Inicializa el validador CLIP cuantizado.
+
+        Args:
+            checkpoint (str): Nombre o ruta al checkpoint del modelo CLIP.
+            device (str | torch.device): Se ignora si no es CPU (se avisa en el log).
+            labels (List[str]): Etiquetas de texto para la clasificación.
+            confidence_threshold (float, optional): Umbral de confianza. Defaults to 0.8.
+            batch_size (int, optional): Máximo de imágenes por pasada. Defaults to 8.
+            persist_text_embeddings (bool, optional): Como en `ClipValidator`; solo se usa si hay
+                que construir el modelo fp32. Defaults to False.
+            cache_artifact (bool, optional): Guardar y reutilizar el artefacto cuantizado.
+                Defaults to True.
+            artifact_dir (str | None, optional): Directorio del artefacto. Si es None, se usa el
+                directorio del checkpoint (si es local). Defaults to None.
+            threads (int | None, optional): Hilos de torch (`torch.set_num_threads`). Si es None,
+                no se modifican. Defaults to None.
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        device = resolver_dispositivo(device)
+        if device.type != 'cpu':
+            self.logger.warning(f"La cuantización dinámica solo se ejecuta en CPU; se ignora el dispositivo {device}.")
+        self.device = torch.device('cpu')
+        if threads:
+            torch.set_num_threads(int(threads))
+        self.processor = CLIPProcessor.from_pretrained(checkpoint)
+        self.labels = labels
+        self.threshold = confidence_threshold
+        self.batch_size = max(1, batch_size)
+        self.model = None # Solo se carga el modelo fp32 si no hay artefacto
+
+        ruta_artefacto = self._ruta_artefacto(checkpoint, labels, artifact_dir) if cache_artifact else None
+        artefacto = self._cargar_artefacto(ruta_artefacto) if ruta_artefacto is not None else None
+        if artefacto is not None:
+            self.torre_vision = artefacto['torre_vision']
+            self.text_features = artefacto['text_features']
+            self.logit_scale = artefacto['logit_scale']
+        else:
+            self._cuantizar_desde_checkpoint(checkpoint, persist_text_embeddings)
+            if ruta_artefacto is not None:
+                self._guardar_artefacto(ruta_artefacto, checkpoint)
+        self.torre_vision.eval()
+
+        self.logger.info(f"QuantizedClipValidator inicializado con checkpoint: {checkpoint}")
+        self.logger.debug(f"Etiquetas: {self.labels}, umbral: {self.threshold}, tamaño de lote: {self.batch_size}, hilos: {torch.get_num_threads()}")
+
+    @classmethod
+    def from_config(cls, validation_config: dict, device: str | torch.device) -> "QuantizedClipValidator":
+        """
+        Construye el validador a partir de la sección `validation` de settings.yml.
+
+        Args:
+            validation_config (dict): Las claves de `ClipValidator` y, opcionalmente, la
+                subsección 'quantization' ('cache_artifact', 'artifact_dir', 'threads').
+            device (str | torch.device): Se ignora si no es CPU.
+
+        Raises:
+            KeyError: Si faltan claves obligatorias.
+        """
+        quantization_config = validation_config.get('quantization', {}) or {}
+        return cls(
+            checkpoint=validation_config['checkpoint'],
+            labels=validation_config['labels'],
+            confidence_threshold=validation_config['confidence_threshold'],
+            batch_size=validation_config.get('batch_size', 8),
+            persist_text_embeddings=validation_config.get('persist_text_embeddings', False),
+            cache_artifact=quantization_config.get('cache_artifact', True),
+            artifact_dir=quantization_config.get('artifact_dir'),
+            threads=quantization_config.get('threads'),
+            device=device
+        )
+
+    def _cuantizar_desde_checkpoint(self, checkpoint: str, persist_text_embeddings: bool) -> None:
+        """Carga el modelo fp32, calcula los embeddings de texto y cuantiza la torre de visión."""
+        inicio = time.perf_counter()
+        self.model = CLIPModel.from_pretrained(checkpoint).eval()
+        self.text_features = self._obtener_embeddings_texto(checkpoint, persist_text_embeddings)
+        with torch.inference_mode():
+            self.logit_scale = self.model.logit_scale.exp()
+        torre = TorreVision(self.model.vision_model, self.model.visual_projection).eval()
+        self.torre_vision = torch.ao.quantization.quantize_dynamic(torre, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model = None # La torre de texto no se vuelve a usar
+        self.logger.info(f"Torre de visión cuantizada a int8 en {time.perf_counter() - inicio:.2f}s.")
+
+    @staticmethod
+    def _ruta_artefacto(checkpoint: str, labels: List[str], artifact_dir: str | None) -> Path | None:
+        """
+        Devuelve la ruta del artefacto cuantizado, o None si no hay dónde guardarlo.
+
+        El nombre incluye una huella del checkpoint, las etiquetas y la versión de torch
+        (el formato de los módulos cuantizados no es estable entre versiones).
+        """
+        directorio = Path(artifact_dir) if artifact_dir else Path(checkpoint)
+        if not artifact_dir and not directorio.is_dir():
+            return None
+        datos = json.dumps([str(checkpoint), list(labels), torch.__version__], ensure_ascii=False)
+        huella = hashlib.sha1(datos.encode('utf-8')).hexdigest()[:16]
+        return directorio / f"clip_vision_int8_{huella}.pt"
+
+    def _cargar_artefacto(self, ruta: Path) -> dict | None:
+        """Carga el artefacto cuantizado si existe y corresponde a las etiquetas actuales."""
+        if not ruta.exists():
+            return None
+        inicio = time.perf_counter()
+        try:
+            # El artefacto contiene módulos serializados (no solo pesos): lo genera este mismo validador
+            artefacto = torch.load(ruta, map_location='cpu', weights_only=False)
+        except Exception as e:
+            self.logger.warning(f"No se pudo leer el artefacto cuantizado {ruta}: {e}. Se regenera.")
+            return None
+        if artefacto.get('labels') != list(self.labels):
+            self.logger.warning(f"El artefacto cuantizado {ruta} no corresponde a las etiquetas actuales. Se regenera.")
+            return None
+        self.logger.info(f"Artefacto cuantizado cargado desde {ruta} en {time.perf_counter() - inicio:.2f}s.")
+        return artefacto
+
+    def _guardar_artefacto(self, ruta: Path, checkpoint: str) -> None:
+        """Guarda la torre cuantizada, los embeddings de texto y `logit_scale`."""
+        try:
+            ruta.parent.mkdir(parents=True, exist_ok=True)
+            torch.save({
+                'checkpoint': str(checkpoint),
+                'labels': list(self.labels),
+                'torch': torch.__version__,
+                'torre_vision': self.torre_vision,
+                'text_features': self.text_features.cpu(),
+                'logit_scale': self.logit_scale.cpu(),
+            }, ruta)
+            self.logger.info(f"Artefacto cuantizado guardado en: {ruta}")
+        except OSError as e:
+            self.logger.warning(f"No se pudo guardar el artefacto cuantizado en {ruta}: {e}")
+
+    def _features_imagen(self, pixel_values: torch.Tensor) -> torch.Tensor:
+        return self.torre_vision(pixel_values)
@@ -2,59 +2,65 @@
 """
 Módulo que define la factoría para crear instancias de validadores de imágenes.
 """
-import torch
 import logging
+from typing import TYPE_CHECKING
 from scr.validation.ivalidator import IValidator
-from scr.validation.voucher_validation import ClipValidator
+from scr.utils.registry import BackendRegistry
+
+if TYPE_CHECKING:
+    import torch # Solo para las anotaciones; el backend seleccionado lo importa si lo necesita
+
+# Validadores disponibles. El módulo de cada uno (y sus dependencias, ej. transformers)
+# solo se importa si la configuración lo selecciona.
+VALIDADORES = BackendRegistry("validador")
+VALIDADORES.registrar('clip', 'scr.validation.voucher_validation:ClipValidator')
+VALIDADORES.registrar('clip_int8', 'scr.validation.quantized_clip_validation:QuantizedClipValidator')
+VALIDADORES.registrar('distilled', 'scr.validation.distilled_validation:DistilledValidator')
+VALIDADORES.registrar('heuristic', 'scr.validation.heuristic_validation:HeuristicValidator')
+VALIDADORES.registrar('quality_policy', 'scr.validation.quality_policy_validation:QualityPolicyValidator')
 
 class ValidatorFactory:
     """
     Factory encargada de crear instancias de componentes que implementan `IValidator`.
 
-    Actualmente, solo soporta la creación de `ClipValidator`, pero está diseñada
-    para ser extendida y poder crear otros tipos de validadores en el futuro
-    basándose en la configuración proporcionada.
+    El validador se elige con la clave 'type' de la configuración (por defecto "clip"),
+    que puede ser un nombre registrado en `VALIDADORES` o una ruta "paquete.modulo:Clase"
+    de una implementación externa.
     """
     @staticmethod
-    def create_validator(validation_config: dict, device: torch.device) -> IValidator:
+    def create_validator(validation_config: dict, device: "str | torch.device") -> IValidator:
         """
         Crea y devuelve una instancia de un validador de imágenes.
 
-        La implementación específica del validador se determina (o podría determinarse en el futuro)
-        a partir de `validation_config`. Actualmente, siempre crea `ClipValidator`.
+        La clase se resuelve en `VALIDADORES` a partir de `validation_config['type']`
+        y se construye con su método `from_config`.
 
         Args:
             validation_config (dict): Un diccionario con la configuración para el validador.
-                Debe contener claves como 'checkpoint', 'labels', 'confidence_threshold'
-                para `ClipValidator`.
-            device (torch.device): El dispositivo (CPU o CUDA) donde se cargará el modelo
-                                   del validador.
+                Para "clip" debe contener claves como 'checkpoint', 'labels', 'confidence_threshold'.
+            device (str | torch.device): El dispositivo donde se cargará el modelo del validador
+                ("auto", "cpu", "cuda"...). Solo lo resuelven los backends basados en torch
+                (`resolver_dispositivo`).
 
         Returns:
             IValidator: Una instancia de una clase que implementa la interfaz `IValidator`.
 
         Raises:
-            ValueError: Si se especifica un tipo de validador no soportado en `validation_config`
-                        (funcionalidad futura, no implementada actualmente).
+            ValueError: Si se especifica un tipo de validador no soportado en `validation_config`.
+            ImportError: Si las dependencias del validador seleccionado no están instaladas.
             KeyError: Si faltan claves esenciales en `validation_config` para el tipo de
                       validador seleccionado.
             # Otras excepciones pueden surgir de la creación de la instancia del validador.
         """
         logger = logging.getLogger(ValidatorFactory.__name__)
-        
-        logger.debug(
-            f"Creando ClipValidator con configuración: "
-            f"checkpoint='{validation_config.get('checkpoint')}', "
-            f"labels='{validation_config.get('labels')}', "
-            f"confidence_threshold='{validation_config.get('confidence_threshold')}', "
-            f"device='{device}'"
-        )
-        
-        instance = ClipValidator(
-            checkpoint=validation_config['checkpoint'],
-            labels=validation_config['labels'],
-            confidence_threshold=validation_config['confidence_threshold'],
-            device=device
-        )
+        validator_type = validation_config.get('type', 'clip')
+        logger.debug(f"Creando validador '{validator_type}' con configuración: {validation_config}, device='{device}'")
+
+        try:
+            clase = VALIDADORES.obtener(validator_type)
+        except ValueError:
+            logger.error(f"Tipo de validador no soportado: {validator_type}")
+            raise
+        instance = clase.from_config(validation_config, device)
         logger.info(f"Instancia de {type(instance).__name__} creada exitosamente.")
         return instance
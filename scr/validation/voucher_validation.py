@@ -4,12 +4,17 @@ Implementación de un validador de imágenes (`IValidator`) que utiliza un model
 CLIP (Contrastive Language-Image Pre-Training) para determinar si una imagen
 corresponde a un voucher.
 """
+import json
 import torch
-from typing import List
+import hashlib
+from pathlib import Path
+from typing import List, Optional, Tuple
 from PIL import Image
 from transformers import CLIPModel, CLIPProcessor
 import logging
 from scr.validation.ivalidator import IValidator
+from scr.utils.device import resolver_dispositivo
+from scr.utils.metrics import obtener_metricas
 
 class ClipValidator(IValidator):
     """
@@ -18,32 +23,100 @@ class ClipValidator(IValidator):
     Esta clase carga un modelo CLIP pre-entrenado y su procesador asociado para
     calcular la similitud entre una imagen dada y una serie de etiquetas de texto
     (ej. "voucher", "no voucher") y así clasificar la imagen.
+    Soporta validación por lotes mediante `predict_batch`.
+
+    Como las etiquetas no cambian durante la ejecución, sus embeddings de texto
+    normalizados se calculan una sola vez al construir el validador (y opcionalmente
+    se persisten junto al checkpoint); cada validación ejecuta solo la torre de visión.
     """
-    def __init__(self, checkpoint: str, device: torch.device, labels: List[str], confidence_threshold: float = 0.8):
+    supports_batch = True
+
+    def __init__(self, checkpoint: str, device: str | torch.device, labels: List[str], confidence_threshold: float = 0.8,
+                 batch_size: int = 8, persist_text_embeddings: bool = False):
         """
         Inicializa el validador CLIP.
 
         Args:
             checkpoint (str): Nombre o ruta al checkpoint del modelo CLIP 
                               (ej. "openai/clip-vit-base-patch32").
-            device (torch.device): Dispositivo (CPU o CUDA) donde se cargará el modelo.
+            device (str | torch.device): Dispositivo (CPU o CUDA) donde se cargará el modelo.
             labels (List[str]): Lista de etiquetas de texto que se usarán para la clasificación
                                 (ej. ["voucher", "no voucher"]).
             confidence_threshold (float, optional): Umbral de confianza para considerar una imagen 
                                                   como voucher. Defaults to 0.8.
+            batch_size (int, optional): Número máximo de imágenes por pasada del modelo
+                                        en `predict_batch`. Defaults to 8.
+            persist_text_embeddings (bool, optional): Si es True, los embeddings de texto de las
+                etiquetas se guardan en (y se cargan desde) un archivo dentro del directorio del
+                checkpoint. Defaults to False.
         """
-        self.device = device
-        self.model  = CLIPModel.from_pretrained(checkpoint).to(device)
+        self.device = resolver_dispositivo(device)
+        self.model  = CLIPModel.from_pretrained(checkpoint).to(self.device)
+        self.model.eval()
         self.processor  = CLIPProcessor.from_pretrained(checkpoint)
         self.labels = labels
         self.threshold = confidence_threshold
+        self.batch_size = max(1, batch_size)
         
         self.logger = logging.getLogger(self.__class__.__name__)
+        self.text_features = self._obtener_embeddings_texto(checkpoint, persist_text_embeddings)
+        with torch.inference_mode():
+            self.logit_scale = self.model.logit_scale.exp()
         self.logger.info(f"ClipValidator inicializado con checkpoint: {checkpoint}")
         self.logger.debug(f"Etiquetas para ClipValidator: {self.labels}")
         self.logger.debug(f"Umbral de confianza para ClipValidator: {self.threshold}")
+        self.logger.debug(f"Tamaño de lote para ClipValidator: {self.batch_size}")
         self.logger.debug(f"Dispositivo para ClipValidator: {self.device}")
 
+    @classmethod
+    def from_config(cls, validation_config: dict, device: str | torch.device) -> "ClipValidator":
+        """
+        Construye el validador a partir de la sección `validation` de settings.yml.
+
+        Args:
+            validation_config (dict): Claves 'checkpoint', 'labels', 'confidence_threshold' y
+                opcionalmente 'batch_size' y 'persist_text_embeddings'.
+            device (str | torch.device): Dispositivo donde cargar el modelo.
+
+        Raises:
+            KeyError: Si faltan claves obligatorias.
+        """
+        return cls(
+            checkpoint=validation_config['checkpoint'],
+            labels=validation_config['labels'],
+            confidence_threshold=validation_config['confidence_threshold'],
+            batch_size=validation_config.get('batch_size', 8),
+            persist_text_embeddings=validation_config.get('persist_text_embeddings', False),
+            device=device
+        )
+
+    @staticmethod
+    def _probabilidad_objetivo(probs: List[float], labels: List[str], etiqueta_objetivo: str) -> float:
+        """
+        Obtiene la probabilidad de la etiqueta objetivo dentro de `probs`.
+
+        Si `etiqueta_objetivo` no se encuentra en `labels`, se utiliza la probabilidad máxima
+        en `probs` como fallback (este comportamiento es heredado de la lógica original).
+
+        Args:
+            probs (List[float]): Lista de probabilidades calculadas por el modelo,
+                                 correspondientes al orden de `labels`.
+            labels (List[str]): Lista de etiquetas de texto usadas para generar las `probs`.
+            etiqueta_objetivo (str): La etiqueta específica cuya probabilidad nos interesa.
+
+        Returns:
+            float: La probabilidad de `etiqueta_objetivo` (o el máximo si hay fallback).
+                   Devuelve 0.0 si `probs` está vacía.
+        """
+        if not probs:
+            return 0.0
+        try:
+            # Intenta encontrar el índice de la etiqueta objetivo específica.
+            return probs[labels.index(etiqueta_objetivo)]
+        except ValueError:
+            # Si la etiqueta objetivo no está en la lista, tomar la probabilidad máxima.
+            return max(probs)
+
     @staticmethod
     def _evaluar_probabilidades(
         probs: List[float], 
@@ -70,20 +143,129 @@ class ClipValidator(IValidator):
                   es mayor o igual al `umbral`, False en caso contrario. 
                   Devuelve False si `probs` está vacía.
         """
-        final_prob = 0.0
         if not probs: # Manejar el caso de lista de probabilidades vacía si es posible
              return False
+        return ClipValidator._probabilidad_objetivo(probs, labels, etiqueta_objetivo) >= umbral
 
+    @staticmethod
+    def _ruta_cache_embeddings(checkpoint: str, labels: List[str]) -> Path | None:
+        """
+        Devuelve la ruta del archivo de caché de embeddings de texto para un checkpoint local.
+
+        El nombre del archivo incluye un hash de las etiquetas, de modo que un cambio en
+        `validation.labels` invalida la caché. Devuelve `None` si `checkpoint` no es un
+        directorio local (ej. un nombre de modelo del Hub).
+        """
+        directorio = Path(checkpoint)
+        if not directorio.is_dir():
+            return None
+        huella = hashlib.sha1(json.dumps(labels, ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+        return directorio / f"label_text_embeddings_{huella}.pt"
+
+    def _obtener_embeddings_texto(self, checkpoint: str, persistir: bool) -> torch.Tensor:
+        """
+        Calcula (o carga desde la caché en disco) los embeddings de texto normalizados de `self.labels`.
+
+        Args:
+            checkpoint (str): Nombre o ruta al checkpoint del modelo CLIP.
+            persistir (bool): Si es True, se intenta cargar/guardar la caché junto al checkpoint.
+
+        Returns:
+            torch.Tensor: Matriz (num_etiquetas, dim) con los embeddings normalizados, en `self.device`.
+        """
+        ruta_cache = ClipValidator._ruta_cache_embeddings(checkpoint, self.labels) if persistir else None
+        if ruta_cache is not None and ruta_cache.exists():
+            try:
+                datos = torch.load(ruta_cache, map_location='cpu', weights_only=True)
+                if datos.get('labels') == list(self.labels):
+                    self.logger.info(f"Embeddings de texto de las etiquetas cargados desde caché: {ruta_cache}")
+                    return datos['features'].to(self.device)
+                self.logger.warning(f"La caché de embeddings {ruta_cache} no corresponde a las etiquetas actuales. Se recalcula.")
+            except Exception as e:
+                self.logger.warning(f"No se pudo leer la caché de embeddings {ruta_cache}: {e}. Se recalcula.")
+
+        with torch.inference_mode():
+            text_inputs = self.processor(text=self.labels, return_tensors="pt", padding=True).to(self.device)
+            text_features = self.model.get_text_features(**text_inputs)
+            text_features = text_features / text_features.norm(dim=-1, keepdim=True)
+        self.logger.debug(f"Embeddings de texto calculados para {len(self.labels)} etiquetas.")
+
+        if ruta_cache is not None:
+            try:
+                torch.save({'labels': list(self.labels), 'features': text_features.cpu()}, ruta_cache)
+                self.logger.info(f"Embeddings de texto de las etiquetas guardados en: {ruta_cache}")
+            except OSError as e:
+                self.logger.warning(f"No se pudo guardar la caché de embeddings en {ruta_cache}: {e}")
+        elif persistir:
+            self.logger.debug(f"El checkpoint '{checkpoint}' no es un directorio local; no se persisten los embeddings de texto.")
+        return text_features
+
+    def _features_imagen(self, pixel_values: torch.Tensor) -> torch.Tensor:
+        """Ejecuta la torre de visión (y su proyección) sobre un lote ya preprocesado."""
+        return self.model.get_image_features(pixel_values=pixel_values)
+
+    def _calcular_probabilidades(self, images: List[Image.Image]) -> List[List[float]]:
+        """
+        Calcula, con una única pasada de la torre de visión, las probabilidades de cada etiqueta para un lote de imágenes.
+
+        Los logits se obtienen como el producto escalar entre los embeddings de imagen
+        normalizados y la matriz precalculada de embeddings de texto, escalado por
+        `logit_scale`, lo que equivale a `logits_per_image` del modelo CLIP completo.
+
+        Args:
+            images (List[Image.Image]): Las imágenes (en formato PIL) del lote.
+
+        Returns:
+            List[List[float]]: Para cada imagen, la lista de probabilidades en el orden de `self.labels`.
+        """
+        with obtener_metricas().medir("clip", items=len(images)), torch.inference_mode():
+            pixel_values = self.processor(images=images, return_tensors="pt").pixel_values.to(self.device)
+            image_features = self._features_imagen(pixel_values)
+            image_features = image_features / image_features.norm(dim=-1, keepdim=True)
+            logits_per_image = self.logit_scale * image_features @ self.text_features.T
+            return logits_per_image.softmax(dim=1).tolist()
+
+    def predict_batch(self, images: List[Image.Image]) -> Tuple[List[bool], List[Optional[float]]]:
+        """
+        Valida un lote de imágenes con el modelo CLIP.
+
+        Las imágenes se procesan en sub-lotes de hasta `batch_size` elementos bajo
+        `torch.inference_mode`, y cada decisión se toma con `_evaluar_probabilidades`.
+
+        Args:
+            images (List[Image.Image]): Las imágenes (en formato PIL) a validar.
+
+        Returns:
+            Tuple[List[bool], List[Optional[float]]]: Las decisiones y la probabilidad de
+                la etiqueta 'voucher' (o la máxima, si no existe) para cada imagen.
+
+        Raises:
+            Exception: Si ocurre un error durante el procesamiento con el modelo CLIP.
+        """
+        if 'voucher' not in self.labels:
+            self.logger.warning(f"La etiqueta 'voucher' no se encuentra en self.labels ({self.labels}). ClipValidator usará max(probs) como alternativa.")
+
+        decisiones: List[bool] = []
+        probabilidades: List[Optional[float]] = []
         try:
-            # Intenta encontrar el índice de la etiqueta objetivo específica.
-            idx = labels.index(etiqueta_objetivo)
-            final_prob = probs[idx]
-        except ValueError:
-            # Si la etiqueta objetivo no está en la lista, tomar la probabilidad máxima.
-            final_prob = max(probs) if probs else 0.0 
-            # (Añadido 'if probs else 0.0' para evitar error en max() con lista vacía)
-        
-        return final_prob >= umbral
+            for inicio in range(0, len(images), self.batch_size):
+                lote = images[inicio:inicio + self.batch_size]
+                for image_probs in self._calcular_probabilidades(lote):
+                    self.logger.debug(f"Probabilidades obtenidas: {image_probs}")
+                    decisiones.append(ClipValidator._evaluar_probabilidades(
+                        probs=image_probs,
+                        labels=self.labels,
+                        etiqueta_objetivo='voucher',
+                        umbral=self.threshold
+                    ))
+                    probabilidades.append(ClipValidator._probabilidad_objetivo(image_probs, self.labels, 'voucher'))
+        except Exception as e:
+            self.logger.error(f"Error durante la validación por lotes con CLIP: {e}")
+            self.logger.exception("Detalles del error de validación CLIP:")
+            raise
+
+        self.logger.info(f"Validación por lotes completada: {sum(decisiones)} de {len(decisiones)} imágenes SON voucher.")
+        return decisiones, probabilidades
 
     def is_voucher(self, image: Image.Image) -> bool:
         """
@@ -107,10 +289,7 @@ class ClipValidator(IValidator):
                        o PyTorch podrían ocurrir).
         """
         try:
-            inputs = self.processor(text=self.labels, images=image, return_tensors="pt", padding=True).to(self.device)
-            outputs = self.model(**inputs)
-            
-            image_probs: List[float] = outputs.logits_per_image.softmax(dim=1).squeeze().tolist()
+            image_probs = self._calcular_probabilidades([image])[0]
             self.logger.debug(f"Probabilidades obtenidas: {image_probs}")
             
             if 'voucher' not in self.labels:
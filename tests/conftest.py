@@ -0,0 +1,9 @@
+#tests/conftest.py
+"""
+Configuración común de las pruebas: permite importar `scr` ejecutando `pytest` desde
+la raíz del repositorio sin instalar el proyecto.
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,22 @@
+#tests/test_device.py
+"""
+Pruebas de `resolver_dispositivo`.
+"""
+import pytest
+from scr.utils.device import resolver_dispositivo
+
+torch = pytest.importorskip("torch")
+
+def test_auto_y_none_eligen_cuda_solo_si_esta_disponible():
+    esperado = "cuda" if torch.cuda.is_available() else "cpu"
+    assert resolver_dispositivo("auto").type == esperado
+    assert resolver_dispositivo("AUTO").type == esperado
+    assert resolver_dispositivo(None).type == esperado
+
+def test_nombre_de_dispositivo():
+    assert resolver_dispositivo("cpu") == torch.device("cpu")
+    assert resolver_dispositivo("cuda:1") == torch.device("cuda", 1)
+
+def test_torch_device_se_devuelve_tal_cual():
+    dispositivo = torch.device("cpu")
+    assert resolver_dispositivo(dispositivo) is dispositivo
@@ -0,0 +1,81 @@
+#tests/test_embedding_cache.py
+"""
+Pruebas de `EmbeddingCache` y de su instalación en un predictor (`envolver_predictor`).
+"""
+import os
+import types
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from scr.segmentation.embedding_cache import EmbeddingCache, envolver_predictor
+
+def _embedding(valor: float = 0.5) -> np.ndarray:
+    return np.full((1, 4, 2, 2), valor, dtype=np.float32)
+
+def test_clave_depende_del_contenido_las_dimensiones_y_la_variante():
+    imagen = np.zeros((4, 6, 3), dtype=np.uint8)
+    otra = imagen.copy()
+    otra[0, 0, 0] = 1
+    clave = EmbeddingCache.clave(imagen, "vit_b")
+    assert clave == EmbeddingCache.clave(imagen.copy(), "vit_b")
+    assert clave.endswith("_6x4_vit_b")
+    assert clave != EmbeddingCache.clave(otra, "vit_b")
+    assert clave != EmbeddingCache.clave(imagen, "vit_h")
+    assert clave != EmbeddingCache.clave(imagen.reshape(6, 4, 3), "vit_b")
+
+def test_put_y_get_en_float16_de_solo_lectura(tmp_path):
+    cache = EmbeddingCache(tmp_path)
+    assert cache.get("clave") is None
+    cache.put("clave", _embedding())
+    recuperado = cache.get("clave")
+    assert recuperado.dtype == np.float16
+    np.testing.assert_array_equal(recuperado, _embedding().astype(np.float16))
+    assert not recuperado.flags.writeable
+    assert not list(tmp_path.glob("*.tmp"))
+
+def test_entrada_corrupta_es_un_fallo_de_cache(tmp_path):
+    (tmp_path / "clave.npy").write_bytes(b"no es un npy")
+    assert EmbeddingCache(tmp_path).get("clave") is None
+
+def test_expulsa_las_entradas_usadas_hace_mas_tiempo(tmp_path):
+    cache = EmbeddingCache(tmp_path, max_bytes=10 ** 9)
+    for i, clave in enumerate(("a", "b", "c")):
+        cache.put(clave, _embedding())
+        os.utime(tmp_path / f"{clave}.npy", (1000 + i, 1000 + i))
+    tamano = (tmp_path / "a.npy").stat().st_size
+    assert cache.get("a") is not None # El uso actualiza la fecha de "a"
+    cache.max_bytes = 3 * tamano
+    cache.put("d", _embedding()) # Supera el presupuesto: se expulsa "b", la menos usada
+    assert sorted(p.stem for p in tmp_path.glob("*.npy")) == ["a", "c", "d"]
+
+def test_envolver_predictor_omite_el_encoder_en_un_acierto(tmp_path):
+    torch = pytest.importorskip("torch")
+    llamadas = []
+
+    class PredictorFalso:
+        device = torch.device("cpu")
+        model = types.SimpleNamespace(image_encoder=types.SimpleNamespace(img_size=1024))
+        transform = types.SimpleNamespace(get_preprocess_shape=lambda alto, ancho, lado: (lado, lado * ancho // alto))
+
+        def set_image(self, image, image_format="RGB"):
+            llamadas.append(image_format)
+            self.features = torch.from_numpy(_embedding(0.25))
+            self.original_size = image.shape[:2]
+            self.is_image_set = True
+
+        def reset_image(self):
+            self.features, self.is_image_set = None, False
+
+    predictor = PredictorFalso()
+    envolver_predictor(predictor, EmbeddingCache(tmp_path), "vit_b")
+    imagen = np.zeros((4, 8, 3), dtype=np.uint8)
+    predictor.set_image(imagen)
+    predictor.set_image(imagen)
+    assert llamadas == ["RGB"] # El segundo set_image no ejecuta el encoder
+    assert predictor.is_image_set and predictor.original_size == (4, 8)
+    assert predictor.input_size == (1024, 2048)
+    assert predictor.features.dtype == torch.float32
+    torch.testing.assert_close(predictor.features, torch.from_numpy(_embedding(0.25)))
+    predictor.set_image(imagen, "BGR") # El formato forma parte de la clave
+    assert llamadas == ["RGB", "BGR"]
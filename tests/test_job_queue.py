@@ -0,0 +1,110 @@
+#tests/test_job_queue.py
+"""
+Pruebas de `SQLiteJobQueue`: encolado por huella, prioridad de etapas, leases,
+reintentos y renovación de leases.
+"""
+import time
+import pytest
+from scr.pipeline.job_queue import SQLiteJobQueue
+
+LIMITES = {'segmentacion': 1, 'validacion': 8, 'ocr': 8}
+
+@pytest.fixture
+def cola(tmp_path):
+    cola = SQLiteJobQueue(tmp_path / "jobs.sqlite3", lease_seconds=60, max_intentos=2)
+    yield cola
+    cola.close()
+
+def _lease(cola, trabajo) -> float:
+    return cola._conectar().execute("SELECT lease_hasta FROM trabajos WHERE id = ?", (trabajo.id,)).fetchone()[0]
+
+def test_encolar_omite_las_huellas_ya_encoladas(cola):
+    assert cola.encolar_imagenes({'h1': '/in/a.png', 'h2': '/in/b.png'}) == 2
+    assert cola.encolar_imagenes({'h1': '/in/a_renombrada.png', 'h3': '/in/c.png'}) == 1
+    assert cola.resumen()['segmentacion'] == {'pendiente': 3}
+
+def test_reclamar_prioriza_las_etapas_finales_y_respeta_los_limites(cola):
+    cola.encolar_imagenes({'h1': '/in/a.png', 'h2': '/in/b.png'})
+    [seg] = cola.reclamar('w1', LIMITES) # Segmentación: de una en una
+    assert (seg.etapa, seg.huella, seg.indice, seg.datos, seg.intentos) == ('segmentacion', 'h1', -1, {'imagen': '/in/a.png'}, 1)
+    assert cola.completar(seg, 'w1', [('validacion', i, {'nombre': f"a_voucher_{i}"}) for i in range(3)])
+    lote = cola.reclamar('w1', {'validacion': 2})
+    assert [(t.etapa, t.indice) for t in lote] == [('validacion', 0), ('validacion', 1)]
+    assert lote[0].datos == {'nombre': "a_voucher_0"}
+    [ultimo] = cola.reclamar('w2', LIMITES)
+    assert (ultimo.etapa, ultimo.indice) == ('validacion', 2)
+    assert cola.completar(ultimo, 'w2', [('ocr', 2, {})])
+    [ocr] = cola.reclamar('w2', LIMITES)
+    assert ocr.etapa == 'ocr'
+
+def test_completar_no_duplica_los_trabajos_siguientes(cola):
+    cola.encolar_imagenes({'h1': '/in/a.png'})
+    [seg] = cola.reclamar('w1', LIMITES)
+    cola.completar(seg, 'w1', [('validacion', 0, {})])
+    assert not cola.completar(seg, 'w1', [('validacion', 0, {})]) # Ya no está en curso
+    assert cola.resumen()['validacion'] == {'pendiente': 1}
+
+def test_fallar_reintenta_hasta_agotar_los_intentos(cola):
+    cola.encolar_imagenes({'h1': '/in/a.png'})
+    [primero] = cola.reclamar('w1', LIMITES)
+    cola.fallar(primero, 'w1', "error transitorio")
+    assert cola.resumen()['segmentacion'] == {'pendiente': 1}
+    [segundo] = cola.reclamar('w1', LIMITES)
+    assert segundo.intentos == 2
+    cola.fallar(segundo, 'w1', "error permanente")
+    assert cola.resumen()['segmentacion'] == {'fallido': 1}
+    assert cola.reclamar('w1', LIMITES) == []
+    assert not cola.hay_trabajo_activo()
+
+def test_lease_expirado_se_retoma_y_el_worker_original_pierde_el_trabajo(tmp_path):
+    cola = SQLiteJobQueue(tmp_path / "jobs.sqlite3", lease_seconds=0.05, max_intentos=3)
+    cola.encolar_imagenes({'h1': '/in/a.png'})
+    [original] = cola.reclamar('w1', LIMITES)
+    assert cola.reclamar('w2', LIMITES) == []
+    assert cola.hay_trabajo_activo()
+    time.sleep(0.1)
+    [retomado] = cola.reclamar('w2', LIMITES)
+    assert retomado.id == original.id and retomado.intentos == 2
+    assert not cola.completar(original, 'w1', [('validacion', 0, {})])
+    assert cola.completar(retomado, 'w2', [('validacion', 0, {})])
+    assert cola.resumen()['validacion'] == {'pendiente': 1}
+    cola.close()
+
+def test_lease_expirado_sin_intentos_restantes_queda_fallido(tmp_path):
+    cola = SQLiteJobQueue(tmp_path / "jobs.sqlite3", lease_seconds=0.05, max_intentos=1)
+    cola.encolar_imagenes({'h1': '/in/a.png'})
+    cola.reclamar('w1', LIMITES)
+    time.sleep(0.1)
+    assert cola.reclamar('w2', LIMITES) == []
+    assert cola.resumen()['segmentacion'] == {'fallido': 1}
+    cola.close()
+
+def test_renovar_solo_extiende_los_leases_propios(cola):
+    cola.encolar_imagenes({'h1': '/in/a.png'})
+    [trabajo] = cola.reclamar('w1', LIMITES)
+    antes = _lease(cola, trabajo)
+    time.sleep(0.01)
+    cola.renovar([trabajo], 'otro')
+    assert _lease(cola, trabajo) == antes
+    cola.renovar([trabajo], 'w1')
+    assert _lease(cola, trabajo) > antes
+
+def test_mantener_leases_evita_que_un_lote_lento_se_reclame(tmp_path):
+    cola = SQLiteJobQueue(tmp_path / "jobs.sqlite3", lease_seconds=0.3, max_intentos=3)
+    cola.encolar_imagenes({'h1': '/in/a.png'})
+    [trabajo] = cola.reclamar('w1', LIMITES)
+    with cola.mantener_leases([trabajo], 'w1'):
+        time.sleep(0.8) # Más del doble del lease
+        assert cola.reclamar('w2', LIMITES) == []
+    assert cola.completar(trabajo, 'w1')
+    cola.close()
+
+def test_la_cola_persiste_entre_instancias(tmp_path):
+    ruta = tmp_path / "jobs.sqlite3"
+    primera = SQLiteJobQueue(ruta)
+    primera.encolar_imagenes({'h1': '/in/a.png'})
+    primera.close()
+    segunda = SQLiteJobQueue(ruta)
+    assert segunda.encolar_imagenes({'h1': '/in/a.png'}) == 0
+    assert segunda.resumen()['segmentacion'] == {'pendiente': 1}
+    segunda.close()
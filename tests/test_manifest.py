@@ -0,0 +1,125 @@
+#tests/test_manifest.py
+"""
+Pruebas de `ProcessingManifest`: estados de los segmentos, persistencia y lectura
+incremental de los resultados en JSONL.
+"""
+import json
+from scr.pipeline.manifest import ProcessingManifest
+
+HUELLA = "a" * 64
+
+def _escribir_lineas(ruta, registros, terminar=True):
+    with open(ruta, 'a', encoding='utf-8') as f:
+        texto = "\n".join(json.dumps(r) for r in registros)
+        f.write(texto + ("\n" if terminar else ""))
+
+def _manifiesto_con_validados(tmp_path, resultados):
+    manifiesto = ProcessingManifest(tmp_path / "manifest.json")
+    manifiesto.registrar_segmentacion(HUELLA, "scan.png", 2)
+    for idx in range(2):
+        manifiesto.registrar_validacion(HUELLA, idx, f"scan_voucher_{idx}", True, 0.9, None)
+        manifiesto.registrar_ocr(HUELLA, idx, resultados)
+    return manifiesto
+
+def test_entrada_desconocida_no_esta_completa(tmp_path):
+    manifiesto = ProcessingManifest(tmp_path / "manifest.json")
+    assert not manifiesto.esta_completa(HUELLA)
+    assert manifiesto.estado_segmento(HUELLA, 0) == "validacion"
+    assert manifiesto.pendientes_sin_segmentar(HUELLA) is None
+
+def test_estados_de_los_segmentos(tmp_path):
+    manifiesto = ProcessingManifest(tmp_path / "manifest.json")
+    manifiesto.registrar_segmentacion(HUELLA, "scan.png", 2)
+    manifiesto.registrar_validacion(HUELLA, 0, "scan_voucher_0", False, 0.1, None)
+    manifiesto.registrar_validacion(HUELLA, 1, "scan_voucher_1", True, 0.95, None, bbox=(1, 2, 3, 4))
+    assert manifiesto.estado_segmento(HUELLA, 0) == "completo"
+    assert manifiesto.estado_segmento(HUELLA, 1) == "ocr"
+    assert manifiesto.probabilidad_segmento(HUELLA, 1) == 0.95
+    assert not manifiesto.esta_completa(HUELLA)
+
+    resultado = tmp_path / "scan_voucher_1_v.json"
+    manifiesto.registrar_ocr(HUELLA, 1, resultado)
+    assert not manifiesto.esta_completa(HUELLA) # El JSON del resultado aún no existe
+    resultado.write_text("{}", encoding='utf-8')
+    assert manifiesto.esta_completa(HUELLA)
+
+def test_pendientes_sin_segmentar_requiere_la_imagen_guardada(tmp_path):
+    manifiesto = ProcessingManifest(tmp_path / "manifest.json")
+    manifiesto.registrar_segmentacion(HUELLA, "scan.png", 1)
+    imagen = tmp_path / "scan_voucher_0_v.png"
+    manifiesto.registrar_validacion(HUELLA, 0, "scan_voucher_0", True, 0.9, imagen)
+    assert manifiesto.pendientes_sin_segmentar(HUELLA) is None
+    imagen.write_bytes(b"png")
+    pendientes = manifiesto.pendientes_sin_segmentar(HUELLA)
+    assert [idx for idx, _ in pendientes] == [0]
+    assert pendientes[0][1]['nombre'] == "scan_voucher_0"
+
+def test_cambio_en_el_numero_de_segmentos_descarta_los_estados(tmp_path):
+    manifiesto = ProcessingManifest(tmp_path / "manifest.json")
+    manifiesto.registrar_segmentacion(HUELLA, "scan.png", 1)
+    manifiesto.registrar_validacion(HUELLA, 0, "scan_voucher_0", False, None, None)
+    manifiesto.registrar_segmentacion(HUELLA, "scan.png", 2)
+    assert manifiesto.estado_segmento(HUELLA, 0) == "validacion"
+
+def test_guardar_y_recargar(tmp_path):
+    ruta = tmp_path / "sub" / "manifest.json"
+    manifiesto = ProcessingManifest(ruta)
+    manifiesto.registrar_segmentacion(HUELLA, "scan.png", 1)
+    manifiesto.registrar_validacion(HUELLA, 0, "scan_voucher_0", False, None, None, bbox=(1, 2, 3, 4))
+    manifiesto.guardar()
+    recargado = ProcessingManifest(ruta)
+    assert recargado.esta_completa(HUELLA)
+    assert recargado.entradas[HUELLA]['segmentos']['0']['bbox'] == [1, 2, 3, 4]
+
+def test_guardado_no_forzado_respeta_el_intervalo(tmp_path):
+    ruta = tmp_path / "manifest.json"
+    manifiesto = ProcessingManifest(ruta, intervalo_guardado=3600)
+    manifiesto.registrar_segmentacion(HUELLA, "scan.png", 0)
+    manifiesto.guardar()
+    manifiesto.registrar_segmentacion("b" * 64, "otro.png", 0)
+    manifiesto.guardar(forzar=False)
+    assert "b" * 64 not in json.loads(ruta.read_text(encoding='utf-8'))['entradas']
+
+def test_manifiesto_invalido_o_de_otra_version_se_ignora(tmp_path):
+    ruta = tmp_path / "manifest.json"
+    ruta.write_text("{no es json", encoding='utf-8')
+    assert ProcessingManifest(ruta).entradas == {}
+    ruta.write_text(json.dumps({'version': 0, 'entradas': {HUELLA: {}}}), encoding='utf-8')
+    assert ProcessingManifest(ruta).entradas == {}
+
+def test_resultados_jsonl_se_leen_de_forma_incremental(tmp_path):
+    resultados = tmp_path / "results.jsonl"
+    _escribir_lineas(resultados, [{'input_hash': HUELLA, 'segment_index': 0}])
+    manifiesto = _manifiesto_con_validados(tmp_path, resultados)
+    assert manifiesto.estado_segmento(HUELLA, 0) == "completo"
+    assert manifiesto.estado_segmento(HUELLA, 1) == "ocr"
+    leidos = manifiesto._resultados_jsonl[str(resultados)][0]
+    assert leidos == resultados.stat().st_size
+
+    _escribir_lineas(resultados, [{'input_hash': HUELLA, 'segment_index': 1}])
+    assert manifiesto.esta_completa(HUELLA)
+    assert manifiesto._resultados_jsonl[str(resultados)][0] == resultados.stat().st_size
+
+def test_resultados_jsonl_linea_sin_terminar_se_lee_despues(tmp_path):
+    resultados = tmp_path / "results.jsonl"
+    _escribir_lineas(resultados, [{'input_hash': HUELLA, 'segment_index': 0}])
+    manifiesto = _manifiesto_con_validados(tmp_path, resultados)
+    with open(resultados, 'a', encoding='utf-8') as f:
+        f.write('{"input_hash": "' + HUELLA + '", "segm') # Escritura en curso de otro proceso
+    assert manifiesto.estado_segmento(HUELLA, 1) == "ocr"
+    with open(resultados, 'a', encoding='utf-8') as f:
+        f.write('ent_index": 1}\n')
+    assert manifiesto.estado_segmento(HUELLA, 1) == "completo"
+
+def test_resultados_jsonl_truncado_se_relee(tmp_path):
+    resultados = tmp_path / "results.jsonl"
+    _escribir_lineas(resultados, [{'input_hash': HUELLA, 'segment_index': 0},
+                                  {'input_hash': HUELLA, 'segment_index': 1},
+                                  {'input_hash': None, 'segment_index': None}])
+    manifiesto = _manifiesto_con_validados(tmp_path, resultados)
+    assert manifiesto.esta_completa(HUELLA)
+    resultados.write_text(json.dumps({'input_hash': HUELLA, 'segment_index': 0}) + "\n", encoding='utf-8')
+    assert manifiesto.estado_segmento(HUELLA, 0) == "completo"
+    assert manifiesto.estado_segmento(HUELLA, 1) == "ocr"
+    resultados.unlink()
+    assert manifiesto.estado_segmento(HUELLA, 0) == "ocr"
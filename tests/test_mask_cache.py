@@ -0,0 +1,86 @@
+#tests/test_mask_cache.py
+"""
+Pruebas de `MaskCache`: codificación RLE, reconstrucción de metadatos, política LRU
+con presupuesto en bytes y almacén en disco.
+"""
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from scr.segmentation.mask_cache import MaskCache, _bytes_registro, _compactar, codificar_rle, decodificar_rle
+
+def _mascara(forma=(8, 10), y0=2, y1=5, x0=3, x1=7, iou=0.97) -> dict:
+    segmentacion = np.zeros(forma, dtype=bool)
+    segmentacion[y0:y1, x0:x1] = True
+    return {
+        'segmentation': segmentacion,
+        'bbox': [x0, y0, x1 - x0, y1 - y0],
+        'area': int(segmentacion.sum()),
+        'predicted_iou': iou,
+        'stability_score': 0.96,
+        'crop_box': [0, 0, forma[1], forma[0]],
+    }
+
+@pytest.mark.parametrize("mascara", [
+    np.zeros((4, 5), dtype=bool),
+    np.ones((4, 5), dtype=bool),
+    np.eye(5, dtype=bool),
+    np.array([[True, False, True], [False, False, True]]),
+])
+def test_rle_ida_y_vuelta(mascara):
+    counts = codificar_rle(mascara)
+    assert counts.dtype == np.uint32
+    assert int(counts.sum()) == mascara.size
+    np.testing.assert_array_equal(decodificar_rle(counts, mascara.shape), mascara)
+
+def test_rle_empieza_por_un_tramo_de_ceros():
+    assert codificar_rle(np.array([[True, True, False]])).tolist() == [0, 2, 1]
+
+def test_get_reconstruye_mascaras_y_metadatos():
+    cache = MaskCache()
+    mascaras = [_mascara(), _mascara(y0=0, y1=8, x0=0, x1=2, iou=0.9)]
+    cache.put("clave", mascaras)
+    recuperadas = cache.get("clave")
+    assert len(recuperadas) == 2
+    for original, recuperada in zip(mascaras, recuperadas):
+        np.testing.assert_array_equal(recuperada['segmentation'], original['segmentation'])
+        assert recuperada['bbox'] == original['bbox']
+        assert recuperada['area'] == original['area'] and isinstance(recuperada['area'], int)
+        assert recuperada['predicted_iou'] == pytest.approx(original['predicted_iou'])
+        assert recuperada['crop_box'] == original['crop_box']
+
+def test_lista_vacia_y_clave_ausente():
+    cache = MaskCache()
+    assert cache.get("ausente") is None
+    cache.put("vacia", [])
+    assert cache.get("vacia") == []
+
+def test_lru_expulsa_la_entrada_menos_usada():
+    tamano = _bytes_registro(_compactar([_mascara()]))
+    cache = MaskCache(max_bytes_memoria=2 * tamano)
+    cache.put("a", [_mascara()])
+    cache.put("b", [_mascara()])
+    assert cache.get("a") is not None # "a" pasa a ser la más reciente
+    cache.put("c", [_mascara()])
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache._bytes_memoria <= cache.max_bytes_memoria
+
+def test_registro_mayor_que_el_presupuesto_no_se_guarda_en_memoria():
+    cache = MaskCache(max_bytes_memoria=1)
+    cache.put("a", [_mascara()])
+    assert cache.get("a") is None
+    assert cache._bytes_memoria == 0
+
+def test_almacen_en_disco_sobrevive_a_la_instancia(tmp_path):
+    MaskCache(tmp_path).put("clave", [_mascara()])
+    assert (tmp_path / "clave.npz").exists()
+    assert not list(tmp_path.glob("*.tmp"))
+    nueva = MaskCache(tmp_path)
+    recuperadas = nueva.get("clave")
+    np.testing.assert_array_equal(recuperadas[0]['segmentation'], _mascara()['segmentation'])
+    assert "clave" in nueva._memoria # El acierto en disco se promueve a memoria
+
+def test_entrada_corrupta_en_disco_es_un_fallo_de_cache(tmp_path):
+    (tmp_path / "clave.npz").write_bytes(b"no es un npz")
+    assert MaskCache(tmp_path).get("clave") is None
@@ -0,0 +1,74 @@
+#tests/test_registry.py
+"""
+Pruebas de `BackendRegistry` e `importar_objeto`: resolución perezosa, rutas de
+plugins y rutas de error.
+"""
+import sys
+import textwrap
+import pytest
+from scr.utils.registry import BackendRegistry, importar_objeto
+
+@pytest.fixture
+def modulo_plugin(tmp_path, monkeypatch):
+    """Crea un módulo importable con un backend, y devuelve su nombre."""
+    nombre = "plugin_de_prueba"
+    (tmp_path / f"{nombre}.py").write_text(textwrap.dedent("""
+        class Backend:
+            class Anidado:
+                pass
+    """), encoding='utf-8')
+    (tmp_path / "plugin_roto.py").write_text("import modulo_que_no_existe\nclass Backend:\n    pass\n", encoding='utf-8')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield nombre
+    for modulo in (nombre, "plugin_roto"):
+        sys.modules.pop(modulo, None)
+
+def test_registrar_no_importa_el_modulo(modulo_plugin):
+    registro = BackendRegistry("segmentador")
+    registro.registrar('prueba', f"{modulo_plugin}:Backend")
+    assert modulo_plugin not in sys.modules
+    assert registro.disponibles() == ['prueba']
+    clase = registro.obtener('prueba')
+    assert clase.__name__ == 'Backend'
+    assert registro.obtener('prueba') is clase
+
+def test_ruta_de_plugin_como_nombre(modulo_plugin):
+    registro = BackendRegistry("validador")
+    assert registro.obtener(f"{modulo_plugin}:Backend.Anidado").__name__ == 'Anidado'
+
+def test_volver_a_registrar_descarta_la_clase_resuelta(modulo_plugin):
+    registro = BackendRegistry("segmentador")
+    registro.registrar('prueba', f"{modulo_plugin}:Backend")
+    registro.obtener('prueba')
+    registro.registrar('prueba', f"{modulo_plugin}:Backend.Anidado")
+    assert registro.obtener('prueba').__name__ == 'Anidado'
+
+def test_nombre_no_registrado_lista_los_disponibles():
+    registro = BackendRegistry("segmentador")
+    registro.registrar('sam', 'no.importa:Clase')
+    registro.registrar('contour', 'no.importa:Clase')
+    with pytest.raises(ValueError, match="Tipo de segmentador no soportado: 'desconocido'. Disponibles: contour, sam"):
+        registro.obtener('desconocido')
+
+@pytest.mark.parametrize("ruta", ["modulo", ":Clase", "modulo:", "modulo.Clase"])
+def test_ruta_con_formato_invalido(ruta):
+    with pytest.raises(ValueError):
+        importar_objeto(ruta)
+
+def test_dependencia_no_instalada(modulo_plugin):
+    registro = BackendRegistry("extractor de OCR")
+    registro.registrar('roto', 'plugin_roto:Backend')
+    with pytest.raises(ImportError, match="El extractor de OCR 'roto' requiere dependencias no instaladas"):
+        registro.obtener('roto')
+    with pytest.raises(ImportError):
+        registro.obtener('modulo_que_no_existe_tampoco:Clase')
+
+def test_atributo_inexistente(modulo_plugin):
+    with pytest.raises(AttributeError):
+        BackendRegistry("segmentador").obtener(f"{modulo_plugin}:NoExiste")
+
+def test_factory_rechaza_un_tipo_desconocido():
+    pytest.importorskip("PIL")
+    from scr.segmentation.segmenter_factory import SegmenterFactory
+    with pytest.raises(ValueError, match="no soportado"):
+        SegmenterFactory.create_segmenter({'type': 'desconocido'}, 'cpu')
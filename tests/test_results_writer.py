@@ -0,0 +1,129 @@
+#tests/test_results_writer.py
+"""
+Pruebas de los escritores de resultados, su lectura y su exportación.
+"""
+import os
+import csv
+import json
+import threading
+import pytest
+from scr.pipeline.results_writer import (
+    CAMPOS_RESULTADO, JsonlResultsWriter, JsonPerSegmentWriter, crear_escritor_resultados,
+    crear_registro, exportar_resultados, leer_resultados,
+)
+
+def _registro(i: int) -> dict:
+    return crear_registro(f"scan_voucher_{i}_v", f"texto {i} ñ", source_image="scan.png", segment_index=i,
+                          bbox=(1.0, 2, 3, 4), validation_score=0.5, input_hash="h")
+
+def test_crear_registro_normaliza_los_campos():
+    registro = _registro(0)
+    assert tuple(registro) == CAMPOS_RESULTADO
+    assert registro['bbox'] == [1, 2, 3, 4] and all(isinstance(v, int) for v in registro['bbox'])
+    assert crear_registro("s", "t")['bbox'] is None
+
+def test_json_por_segmento(tmp_path):
+    escritor = JsonPerSegmentWriter(tmp_path / "outputs")
+    ruta = escritor.write(_registro(3))
+    assert ruta == tmp_path / "outputs" / "scan_voucher_3_v.json"
+    assert json.loads(ruta.read_text(encoding='utf-8')) == _registro(3)
+
+def test_jsonl_acumula_en_el_buffer_hasta_flush(tmp_path):
+    ruta = tmp_path / "results.jsonl"
+    escritor = JsonlResultsWriter(ruta, buffer_size=3)
+    assert escritor.write(_registro(0)) == ruta
+    escritor.write(_registro(1))
+    assert ruta.read_text(encoding='utf-8') == ""
+    escritor.write(_registro(2)) # Se alcanza buffer_size
+    assert len(list(leer_resultados(ruta))) == 3
+    escritor.write(_registro(3))
+    escritor.flush()
+    assert [r['segment_index'] for r in leer_resultados(ruta)] == [0, 1, 2, 3]
+    escritor.close()
+    escritor.close() # Idempotente
+
+def test_jsonl_anade_a_un_archivo_existente_y_corta_una_linea_incompleta(tmp_path):
+    ruta = tmp_path / "results.jsonl"
+    ruta.write_text(json.dumps(_registro(0)) + "\n" + '{"source_image": "interrump', encoding='utf-8')
+    escritor = JsonlResultsWriter(ruta)
+    escritor.write(_registro(1))
+    escritor.close()
+    lineas = ruta.read_text(encoding='utf-8').splitlines()
+    assert len(lineas) == 3
+    assert json.loads(lineas[2]) == _registro(1)
+    assert [r['segment_index'] for r in leer_resultados(ruta)] == [0, 1] # La línea incompleta se ignora
+
+def test_jsonl_escrituras_desde_varios_hilos(tmp_path):
+    ruta = tmp_path / "results.jsonl"
+    escritor = JsonlResultsWriter(ruta, buffer_size=7)
+
+    def escribir(inicio):
+        for i in range(inicio, inicio + 100):
+            escritor.write(_registro(i))
+
+    hilos = [threading.Thread(target=escribir, args=(100 * k,)) for k in range(4)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    escritor.close()
+    assert sorted(r['segment_index'] for r in leer_resultados(ruta)) == list(range(400))
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="Requiere fork")
+def test_jsonl_tras_fork_el_hijo_no_reescribe_el_buffer_del_padre(tmp_path):
+    ruta = tmp_path / "results.jsonl"
+    escritor = JsonlResultsWriter(ruta)
+    escritor.write(_registro(0)) # Queda en el buffer del padre
+    pid = os.fork()
+    if pid == 0:
+        try:
+            escritor.write(_registro(1))
+            escritor.close()
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+    escritor.close()
+    assert sorted(r['segment_index'] for r in leer_resultados(ruta)) == [0, 1]
+
+def test_crear_escritor_resultados(tmp_path):
+    assert isinstance(crear_escritor_resultados(None, tmp_path), JsonPerSegmentWriter)
+    jsonl = crear_escritor_resultados({'format': 'jsonl', 'buffer_size': 4}, tmp_path)
+    assert isinstance(jsonl, JsonlResultsWriter)
+    assert jsonl.ruta == tmp_path / "results.jsonl" and jsonl.buffer_size == 4
+    ruta = tmp_path / "otro" / "r.jsonl"
+    assert crear_escritor_resultados({'format': 'jsonl', 'path': str(ruta)}, tmp_path).ruta == ruta
+    with pytest.raises(ValueError):
+        crear_escritor_resultados({'format': 'xml'}, tmp_path)
+
+def test_exportar_a_csv_por_bloques(tmp_path):
+    origen = tmp_path / "results.jsonl"
+    escritor = JsonlResultsWriter(origen)
+    for i in range(5):
+        escritor.write(_registro(i))
+    escritor.close()
+    destino = tmp_path / "export" / "results.csv"
+    assert exportar_resultados(origen, destino, filas_por_bloque=2) == 5
+    with open(destino, encoding='utf-8', newline='') as f:
+        filas = list(csv.DictReader(f))
+    assert [int(fila['segment_index']) for fila in filas] == list(range(5))
+    assert json.loads(filas[0]['bbox']) == [1, 2, 3, 4]
+    assert filas[0]['raw_text'] == "texto 0 ñ"
+
+def test_exportar_formato_no_soportado(tmp_path):
+    origen = tmp_path / "results.jsonl"
+    origen.write_text("", encoding='utf-8')
+    with pytest.raises(ValueError):
+        exportar_resultados(origen, tmp_path / "results.xlsx")
+
+def test_exportar_a_parquet(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    origen = tmp_path / "results.jsonl"
+    escritor = JsonlResultsWriter(origen)
+    for i in range(3):
+        escritor.write(_registro(i))
+    escritor.close()
+    destino = tmp_path / "results.parquet"
+    assert exportar_resultados(origen, destino) == 3
+    tabla = pq.read_table(destino)
+    assert tabla.column_names == list(CAMPOS_RESULTADO)
+    assert tabla.column('segment_index').to_pylist() == [0, 1, 2]
@@ -0,0 +1,104 @@
+#tools/clip_quantization_report.py
+"""
+Informe de calibración del validador CLIP cuantizado ("clip_int8") frente al fp32 ("clip").
+
+Valida las imágenes de una carpeta con ambos validadores, construidos desde la misma
+sección `validation` de la configuración, y reporta:
+- el acuerdo entre las decisiones voucher/no voucher al umbral configurado y la lista
+  de imágenes en las que difieren,
+- la diferencia absoluta de la probabilidad de "voucher" (media, p95, máxima),
+- cuántas imágenes quedan a menos de `--margen` del umbral en el modelo fp32 (las más
+  sensibles a la cuantización),
+- el tiempo de carga de cada validador y su latencia media por imagen.
+
+Termina con código de salida 1 si el acuerdo queda por debajo de `--min-acuerdo`.
+
+Uso (desde la raíz del repositorio):
+    python -m tools.clip_quantization_report --imagenes data/validated_voucher --salida calibracion.json
+"""
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+import numpy as np
+import torch
+from PIL import Image
+from scr.utils.config_loader import load_config
+from scr.validation.voucher_validation import ClipValidator
+from scr.validation.quantized_clip_validation import QuantizedClipValidator
+
+EXTENSIONES = (".jpg", ".jpeg", ".png")
+
+def validar(validator, imagenes: list[Image.Image]) -> tuple[list[bool], np.ndarray, float]:
+    """Valida las imágenes por lotes y devuelve decisiones, probabilidades y segundos por imagen."""
+    validator.predict_batch(imagenes[:1]) # Calentamiento, fuera de la medición
+    inicio = time.perf_counter()
+    decisiones, probabilidades = validator.predict_batch(imagenes)
+    segundos = (time.perf_counter() - inicio) / len(imagenes)
+    return decisiones, np.array(probabilidades, dtype=np.float64), segundos
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara el validador CLIP int8 con el fp32 sobre una carpeta de muestra.")
+    parser.add_argument('--config', default='config/settings.yml', help="Configuración (sección 'validation').")
+    parser.add_argument('--imagenes', required=True, help="Carpeta con segmentos de muestra (vouchers y no vouchers).")
+    parser.add_argument('--margen', type=float, default=0.05, help="Distancia al umbral considerada 'frontera'.")
+    parser.add_argument('--min-acuerdo', type=float, default=0.98, help="Fracción mínima de decisiones coincidentes.")
+    parser.add_argument('--salida', help="Archivo JSON donde guardar el informe (por defecto, solo stdout).")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    validation_config = config['validation']
+    rutas = sorted(p for p in Path(args.imagenes).iterdir() if p.suffix.lower() in EXTENSIONES)
+    if not rutas:
+        raise SystemExit(f"No hay imágenes en {args.imagenes}")
+    imagenes = [Image.open(ruta).convert("RGB") for ruta in rutas]
+    device = torch.device("cpu")
+
+    inicio = time.perf_counter()
+    fp32 = ClipValidator.from_config(validation_config, device)
+    carga_fp32 = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    int8 = QuantizedClipValidator.from_config(validation_config, device)
+    carga_int8 = time.perf_counter() - inicio
+
+    decisiones_fp32, probs_fp32, latencia_fp32 = validar(fp32, imagenes)
+    decisiones_int8, probs_int8, latencia_int8 = validar(int8, imagenes)
+
+    diferencias = np.abs(probs_fp32 - probs_int8)
+    acuerdo = float(np.mean(np.array(decisiones_fp32) == np.array(decisiones_int8)))
+    discrepancias = [
+        {'imagen': ruta.name, 'prob_fp32': round(float(p32), 4), 'prob_int8': round(float(p8), 4),
+         'decision_fp32': d32, 'decision_int8': d8}
+        for ruta, p32, p8, d32, d8 in zip(rutas, probs_fp32, probs_int8, decisiones_fp32, decisiones_int8)
+        if d32 != d8
+    ]
+    umbral = validation_config['confidence_threshold']
+    informe = {
+        'checkpoint': validation_config['checkpoint'],
+        'umbral': umbral,
+        'imagenes': len(rutas),
+        'vouchers_fp32': int(sum(decisiones_fp32)),
+        'vouchers_int8': int(sum(decisiones_int8)),
+        'acuerdo': round(acuerdo, 4),
+        'min_acuerdo': args.min_acuerdo,
+        'diferencia_probabilidad': {
+            'media': round(float(diferencias.mean()), 4),
+            'p95': round(float(np.percentile(diferencias, 95)), 4),
+            'maxima': round(float(diferencias.max()), 4),
+        },
+        'en_frontera_fp32': int(np.count_nonzero(np.abs(probs_fp32 - umbral) < args.margen)),
+        'carga_s': {'fp32': round(carga_fp32, 3), 'int8': round(carga_int8, 3)},
+        'latencia_por_imagen_s': {'fp32': round(latencia_fp32, 4), 'int8': round(latencia_int8, 4)},
+        'aceleracion': round(latencia_fp32 / latencia_int8, 3) if latencia_int8 else None,
+        'hilos_torch': torch.get_num_threads(),
+        'discrepancias': discrepancias,
+    }
+    texto = json.dumps(informe, ensure_ascii=False, indent=4)
+    print(texto)
+    if args.salida:
+        Path(args.salida).write_text(texto, encoding='utf-8')
+    sys.exit(0 if acuerdo >= args.min_acuerdo else 1)
+
+if __name__ == "__main__":
+    main()
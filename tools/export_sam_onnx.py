@@ -0,0 +1,208 @@
+#tools/export_sam_onnx.py
+"""
+Exporta SAM a ONNX para el segmentador "sam_onnx" y verifica su paridad con PyTorch.
+
+Subcomandos:
+- `exportar`: exporta el encoder de imagen y el decoder de máscaras
+  (`segment_anything.utils.onnx.SamOnnxModel`) del modelo configurado en
+  `segmentation` y, con `--cuantizar`, genera además versiones con cuantización
+  dinámica int8 (`onnxruntime.quantization.quantize_dynamic`).
+- `paridad`: segmenta cada imagen con el segmentador de PyTorch de referencia
+  (`--referencia`, por defecto "sam") y con "sam_onnx", ambos mediante
+  `segment_records` y sin cachés, empareja sus segmentos por el IoU de sus bbox y
+  reporta ese IoU, los segmentos sin pareja, la mayor diferencia del IoU predicho
+  por SAM y el tiempo de cada backend. Termina con código de salida 1 si algún
+  segmento queda sin pareja o con un IoU por debajo de `--min-iou`.
+
+Requiere torch, segment_anything, onnx y onnxruntime.
+
+Uso (desde la raíz del repositorio):
+    python -m tools.export_sam_onnx exportar --cuantizar
+    python -m tools.export_sam_onnx paridad --imagenes data/vouchers_a_segmentar --min-iou 0.9
+"""
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+import numpy as np
+import torch
+from PIL import Image
+from segment_anything import sam_model_registry
+from scr.utils.config_loader import load_config
+from scr.segmentation.segmenter_factory import SEGMENTADORES
+
+EXTENSIONES = (".jpg", ".jpeg", ".png")
+
+def exportar_encoder(sam, ruta: Path, opset: int) -> None:
+    """Exporta el encoder de imagen; la entrada es la imagen ya preprocesada (1, 3, 1024, 1024)."""
+    entrada = torch.randn(1, 3, sam.image_encoder.img_size, sam.image_encoder.img_size)
+    with torch.no_grad():
+        torch.onnx.export(
+            sam.image_encoder, entrada, str(ruta),
+            input_names=['image'], output_names=['image_embeddings'],
+            opset_version=opset, do_constant_folding=True,
+        )
+
+def exportar_decoder(sam, ruta: Path, opset: int) -> None:
+    """Exporta el decoder de máscaras con un número dinámico de puntos de entrada."""
+    from segment_anything.utils.onnx import SamOnnxModel
+
+    modelo = SamOnnxModel(sam, return_single_mask=True)
+    forma_embedding = (1, sam.prompt_encoder.embed_dim, *sam.prompt_encoder.image_embedding_size)
+    forma_mascara = [4 * x for x in sam.prompt_encoder.image_embedding_size]
+    entradas = {
+        'image_embeddings': torch.randn(forma_embedding),
+        'point_coords': torch.randint(0, 1024, (1, 5, 2), dtype=torch.float),
+        'point_labels': torch.randint(0, 4, (1, 5), dtype=torch.float),
+        'mask_input': torch.randn(1, 1, *forma_mascara),
+        'has_mask_input': torch.tensor([1], dtype=torch.float),
+        'orig_im_size': torch.tensor([1500, 2250], dtype=torch.float),
+    }
+    with torch.no_grad():
+        torch.onnx.export(
+            modelo, tuple(entradas.values()), str(ruta),
+            input_names=list(entradas), output_names=['masks', 'iou_predictions', 'low_res_masks'],
+            dynamic_axes={'point_coords': {1: 'num_points'}, 'point_labels': {1: 'num_points'}},
+            opset_version=opset, do_constant_folding=True,
+        )
+
+def cuantizar(ruta: Path, tipo_peso: str) -> Path:
+    """Aplica cuantización dinámica int8 a un modelo ONNX y devuelve la ruta del modelo cuantizado."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    destino = ruta.with_name(f"{ruta.stem}.int8.onnx")
+    quantize_dynamic(
+        model_input=str(ruta), model_output=str(destino),
+        per_channel=False, reduce_range=False, weight_type=getattr(QuantType, tipo_peso),
+    )
+    return destino
+
+def comando_exportar(args, config: dict) -> None:
+    seg_config = config['segmentation']
+    salida = Path(args.salida or Path(seg_config['checkpoint']).parent / 'onnx')
+    salida.mkdir(parents=True, exist_ok=True)
+    modelo = seg_config['model_name']
+    print(f"Cargando SAM '{modelo}' desde {seg_config['checkpoint']}...")
+    sam = sam_model_registry[modelo](checkpoint=seg_config['checkpoint']).eval()
+
+    encoder, decoder = salida / f"{modelo}_encoder.onnx", salida / f"{modelo}_decoder.onnx"
+    exportar_encoder(sam, encoder, args.opset)
+    print(f"Encoder exportado a {encoder}")
+    exportar_decoder(sam, decoder, args.opset)
+    print(f"Decoder exportado a {decoder}")
+    if args.cuantizar:
+        # QInt8 para las capas del ViT del encoder; QUInt8 para el decoder, como en el ejemplo oficial de SAM
+        encoder, decoder = cuantizar(encoder, 'QInt8'), cuantizar(decoder, 'QUInt8')
+        print(f"Modelos cuantizados: {encoder}, {decoder}")
+    print("Configuración sugerida para settings.yml:")
+    print(f"  onnx:\n    encoder: \"{encoder.as_posix()}\"\n    decoder: \"{decoder.as_posix()}\"")
+
+def _iou_cajas(a, b) -> float:
+    """IoU de dos bbox (x, y, ancho, alto)."""
+    ancho = min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0])
+    alto = min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1])
+    interseccion = max(0, ancho) * max(0, alto)
+    union = a[2] * a[3] + b[2] * b[3] - interseccion
+    return float(interseccion / union) if union > 0 else 0.0
+
+def emparejar(referencia: list, candidatos: list) -> list[tuple[int, int, float]]:
+    """
+    Empareja dos listas de segmentos por el IoU de sus bbox, de mayor a menor IoU.
+
+    Returns:
+        list[tuple[int, int, float]]: (índice en `referencia`, índice en `candidatos`, IoU)
+            de cada pareja con IoU > 0.
+    """
+    pares = sorted(
+        ((_iou_cajas(r.bbox, c.bbox), i, j) for i, r in enumerate(referencia) for j, c in enumerate(candidatos)),
+        reverse=True,
+    )
+    usados_r, usados_c, parejas = set(), set(), []
+    for iou, i, j in pares:
+        if iou <= 0:
+            break
+        if i not in usados_r and j not in usados_c:
+            usados_r.add(i)
+            usados_c.add(j)
+            parejas.append((i, j, iou))
+    return parejas
+
+def comando_paridad(args, config: dict) -> int:
+    rutas = sorted(p for p in Path(args.imagenes).iterdir() if p.suffix.lower() in EXTENSIONES)
+    if not rutas:
+        raise SystemExit(f"No hay imágenes en {args.imagenes}")
+
+    # Sin cachés: cada backend segmenta desde cero
+    seg_config = dict(config['segmentation'], mask_cache={'dir': None}, embedding_cache={'dir': None})
+    referencia = SEGMENTADORES.obtener(args.referencia).from_config(seg_config, args.device)
+    onnx_seg = SEGMENTADORES.obtener('sam_onnx').from_config(seg_config)
+
+    informe, todos, diferencias_score, sin_pareja = [], [], [], 0
+    for ruta in rutas:
+        inicio = time.perf_counter()
+        registros_ref = referencia.segment_records(ruta)
+        t_ref = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        registros_onnx = onnx_seg.segment_records(ruta)
+        t_onnx = time.perf_counter() - inicio
+
+        parejas = emparejar(registros_ref, registros_onnx)
+        # Un segmento de la referencia sin pareja cuenta con IoU 0
+        ious = [0.0] * len(registros_ref)
+        for i, _, iou in parejas:
+            ious[i] = iou
+        diferencias = [abs(registros_ref[i].predicted_iou - registros_onnx[j].predicted_iou) for i, j, _ in parejas
+                       if registros_ref[i].predicted_iou is not None and registros_onnx[j].predicted_iou is not None]
+        extra_onnx = len(registros_onnx) - len(parejas)
+        sin_pareja += len(registros_ref) - len(parejas) + extra_onnx
+        todos.extend(ious)
+        diferencias_score.extend(diferencias)
+        informe.append({
+            'imagen': ruta.name, f'segmentos_{args.referencia}': len(registros_ref), 'segmentos_onnx': len(registros_onnx),
+            'sin_pareja': len(registros_ref) - len(parejas) + extra_onnx,
+            'iou_bbox_medio': round(float(np.mean(ious)), 4) if ious else None,
+            'iou_bbox_minimo': round(min(ious), 4) if ious else None,
+            'diferencia_iou_predicho_max': round(max(diferencias), 4) if diferencias else None,
+            f'{args.referencia}_s': round(t_ref, 3), 'onnx_s': round(t_onnx, 3),
+        })
+
+    resumen = {
+        'referencia': args.referencia,
+        'encoder': str(seg_config['onnx']['encoder']),
+        'iou_bbox_medio': round(float(np.mean(todos)), 4) if todos else None,
+        'iou_bbox_minimo': round(min(todos), 4) if todos else None,
+        'segmentos_sin_pareja': sin_pareja,
+        'diferencia_iou_predicho_max': round(max(diferencias_score), 4) if diferencias_score else None,
+        'min_iou_requerido': args.min_iou,
+        'imagenes': informe,
+    }
+    print(json.dumps(resumen, ensure_ascii=False, indent=4))
+    return 0 if sin_pareja == 0 and (not todos or min(todos) >= args.min_iou) else 1
+
+def main():
+    parser = argparse.ArgumentParser(description="Exportación de SAM a ONNX y verificación de paridad.")
+    parser.add_argument('--config', default='config/settings.yml', help="Configuración (sección 'segmentation').")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    exportar = subparsers.add_parser('exportar', help="Exporta el encoder y el decoder a ONNX.")
+    exportar.add_argument('--salida', help="Directorio de salida (por defecto, 'onnx' junto al checkpoint).")
+    exportar.add_argument('--opset', type=int, default=17, help="Versión de opset de ONNX.")
+    exportar.add_argument('--cuantizar', action='store_true', help="Generar también modelos con cuantización dinámica int8.")
+
+    paridad = subparsers.add_parser('paridad', help="Compara los segmentos de ONNX Runtime con los de PyTorch.")
+    paridad.add_argument('--imagenes', required=True, help="Directorio con las imágenes de prueba.")
+    paridad.add_argument('--referencia', default='sam', choices=('sam', 'sam_box'),
+                         help="Segmentador de PyTorch de referencia ('sam_box' usa las mismas cajas propuestas que 'sam_onnx').")
+    paridad.add_argument('--device', default='cpu', help="Dispositivo del segmentador de referencia.")
+    paridad.add_argument('--min-iou', type=float, default=0.9, help="IoU mínimo aceptado entre los bbox de cada pareja.")
+
+    args = parser.parse_args()
+    config = load_config(args.config)
+    if args.comando == 'exportar':
+        comando_exportar(args, config)
+    else:
+        sys.exit(comando_paridad(args, config))
+
+if __name__ == "__main__":
+    main()
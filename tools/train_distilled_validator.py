@@ -0,0 +1,176 @@
+#tools/train_distilled_validator.py
+"""
+Entrena el modelo del validador destilado ("distilled") a partir de las decisiones de CLIP.
+
+Subcomandos:
+- `cosechar`: valida con `ClipValidator` los segmentos de las carpetas de salida del
+  pipeline (`paths.validated_voucher_dir` y `paths.output_no_voucher_dir`) y guarda en un
+  `.npz` los segmentos reducidos a 64x64, la probabilidad y la decisión de CLIP y la
+  carpeta de origen de cada uno.
+- `entrenar`: entrena `VoucherNetPequena` por destilación (entropía cruzada binaria con la
+  probabilidad de CLIP como objetivo suave, o con la carpeta de origen) y reporta, sobre
+  una partición de validación, el acuerdo con CLIP al umbral configurado, la fracción de
+  imágenes que caerían en la banda de incertidumbre (y se enviarían a CLIP), el acuerdo
+  fuera de ella y la latencia por imagen del modelo destilado.
+
+Uso (desde la raíz del repositorio):
+    python -m tools.train_distilled_validator cosechar --salida checkpoints/distilled/cosecha.npz
+    python -m tools.train_distilled_validator entrenar --datos checkpoints/distilled/cosecha.npz
+"""
+import json
+import time
+import argparse
+from pathlib import Path
+import numpy as np
+import torch
+from PIL import Image
+from scr.utils.config_loader import load_config
+from scr.validation.voucher_validation import ClipValidator
+from scr.validation.distilled_validation import TAMANO_ENTRADA, VoucherNetPequena, a_tensor, preparar_imagenes
+
+EXTENSIONES = (".jpg", ".jpeg", ".png")
+
+def comando_cosechar(args, config: dict) -> None:
+    carpetas = {
+        1: Path(args.voucher_dir or config['paths']['validated_voucher_dir']),
+        0: Path(args.no_voucher_dir or config['paths']['output_no_voucher_dir']),
+    }
+    rutas, etiquetas = [], []
+    for etiqueta, carpeta in carpetas.items():
+        encontradas = sorted(p for p in carpeta.iterdir() if p.suffix.lower() in EXTENSIONES)
+        print(f"{len(encontradas)} segmentos en {carpeta}")
+        rutas.extend(encontradas)
+        etiquetas.extend([etiqueta] * len(encontradas))
+    if not rutas:
+        raise SystemExit("No hay segmentos que cosechar.")
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    clip = ClipValidator.from_config(config['validation'], device)
+    imagenes = np.empty((len(rutas), args.tamano, args.tamano, 3), dtype=np.uint8)
+    probs = np.empty(len(rutas), dtype=np.float32)
+    decisiones = np.empty(len(rutas), dtype=bool)
+    lote = config['validation'].get('batch_size', 8)
+    for inicio in range(0, len(rutas), lote):
+        segmentos = [Image.open(ruta).convert("RGB") for ruta in rutas[inicio:inicio + lote]]
+        decisiones_lote, probs_lote = clip.predict_batch(segmentos)
+        fin = inicio + len(segmentos)
+        imagenes[inicio:fin] = preparar_imagenes(segmentos, args.tamano)
+        probs[inicio:fin] = probs_lote
+        decisiones[inicio:fin] = decisiones_lote
+
+    salida = Path(args.salida)
+    salida.parent.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(
+        salida, imagenes=imagenes, prob_clip=probs, decision_clip=decisiones,
+        etiqueta_carpeta=np.array(etiquetas, dtype=np.int8), rutas=np.array([str(r) for r in rutas]),
+    )
+    acuerdo = float(np.mean(decisiones == np.array(etiquetas, dtype=bool)))
+    print(f"{len(rutas)} segmentos cosechados en {salida} (acuerdo CLIP/carpeta: {acuerdo:.3f})")
+
+def _evaluar(modelo: VoucherNetPequena, imagenes: np.ndarray, lote: int) -> tuple[np.ndarray, float]:
+    """Devuelve las probabilidades del modelo y su latencia media por imagen."""
+    modelo.eval()
+    probs = np.empty(len(imagenes), dtype=np.float64)
+    inicio = time.perf_counter()
+    with torch.inference_mode():
+        for i in range(0, len(imagenes), lote):
+            probs[i:i + lote] = torch.sigmoid(modelo(a_tensor(imagenes[i:i + lote]))).numpy()
+    return probs, (time.perf_counter() - inicio) / max(1, len(imagenes))
+
+def comando_entrenar(args, config: dict) -> None:
+    datos = np.load(args.datos)
+    imagenes = datos['imagenes']
+    prob_clip = datos['prob_clip'].astype(np.float32)
+    decision_clip = datos['decision_clip']
+    objetivo = prob_clip if args.objetivo == 'clip' else datos['etiqueta_carpeta'].astype(np.float32)
+
+    rng = np.random.default_rng(args.semilla)
+    torch.manual_seed(args.semilla)
+    orden = rng.permutation(len(imagenes))
+    num_validacion = max(1, int(len(imagenes) * args.validacion))
+    idx_validacion, idx_entrenamiento = orden[:num_validacion], orden[num_validacion:]
+    if not len(idx_entrenamiento):
+        raise SystemExit("No hay suficientes segmentos para entrenar.")
+
+    modelo = VoucherNetPequena(args.canales)
+    optimizador = torch.optim.AdamW(modelo.parameters(), lr=args.lr, weight_decay=1e-4)
+    perdida = torch.nn.BCEWithLogitsLoss()
+    for epoca in range(args.epocas):
+        modelo.train()
+        rng.shuffle(idx_entrenamiento)
+        total = 0.0
+        for i in range(0, len(idx_entrenamiento), args.lote):
+            idx = idx_entrenamiento[i:i + args.lote]
+            x = a_tensor(imagenes[idx])
+            voltear = torch.from_numpy(rng.random(len(idx)) < 0.5)
+            x[voltear] = x[voltear].flip(3) # Aumento: volteo horizontal
+            y = torch.from_numpy(objetivo[idx])
+            optimizador.zero_grad()
+            valor = perdida(modelo(x), y)
+            valor.backward()
+            optimizador.step()
+            total += float(valor) * len(idx)
+        print(f"Época {epoca + 1}/{args.epocas}: pérdida {total / len(idx_entrenamiento):.4f}")
+
+    umbral = config['validation']['confidence_threshold']
+    bajo, alto = (config['validation'].get('distilled', {}) or {}).get('uncertainty_band', (0.2, 0.9))
+    probs, latencia = _evaluar(modelo, imagenes[idx_validacion], args.lote)
+    decision = probs >= umbral
+    referencia = decision_clip[idx_validacion]
+    fuera = (probs < bajo) | (probs > alto)
+    metricas = {
+        'segmentos_entrenamiento': int(len(idx_entrenamiento)),
+        'segmentos_validacion': int(num_validacion),
+        'objetivo': args.objetivo,
+        'acuerdo_clip': round(float(np.mean(decision == referencia)), 4),
+        'error_absoluto_medio_prob': round(float(np.mean(np.abs(probs - prob_clip[idx_validacion]))), 4),
+        'banda_incertidumbre': [bajo, alto],
+        'fraccion_a_clip': round(float(1.0 - fuera.mean()), 4),
+        'acuerdo_clip_fuera_de_banda': round(float(np.mean(decision[fuera] == referencia[fuera])), 4) if fuera.any() else None,
+        'latencia_por_imagen_ms': round(latencia * 1000, 3),
+        'parametros': sum(p.numel() for p in modelo.parameters()),
+    }
+
+    salida = Path(args.salida)
+    salida.parent.mkdir(parents=True, exist_ok=True)
+    torch.save({
+        'state_dict': modelo.state_dict(),
+        'tamano': int(imagenes.shape[1]),
+        'canales_base': args.canales,
+        'metricas': metricas,
+    }, salida)
+    print(json.dumps(metricas, ensure_ascii=False, indent=4))
+    print(f"Modelo guardado en {salida}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Cosecha de decisiones de CLIP y entrenamiento del validador destilado.")
+    parser.add_argument('--config', default='config/settings.yml', help="Configuración (secciones 'validation' y 'paths').")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    cosechar = subparsers.add_parser('cosechar', help="Valida con CLIP los segmentos de las carpetas de salida.")
+    cosechar.add_argument('--voucher-dir', help="Carpeta de vouchers (por defecto, paths.validated_voucher_dir).")
+    cosechar.add_argument('--no-voucher-dir', help="Carpeta de no vouchers (por defecto, paths.output_no_voucher_dir).")
+    cosechar.add_argument('--tamano', type=int, default=TAMANO_ENTRADA, help="Lado de los segmentos reducidos.")
+    cosechar.add_argument('--salida', default='checkpoints/distilled/cosecha.npz', help="Archivo .npz de salida.")
+
+    entrenar = subparsers.add_parser('entrenar', help="Entrena VoucherNetPequena con los datos cosechados.")
+    entrenar.add_argument('--datos', default='checkpoints/distilled/cosecha.npz', help="Archivo .npz de `cosechar`.")
+    entrenar.add_argument('--salida', default='checkpoints/distilled/voucher_net.pt', help="Ruta del modelo entrenado.")
+    entrenar.add_argument('--objetivo', choices=('clip', 'carpeta'), default='clip',
+                          help="Probabilidad de CLIP (destilación) o carpeta de origen como objetivo.")
+    entrenar.add_argument('--epocas', type=int, default=30)
+    entrenar.add_argument('--lote', type=int, default=64)
+    entrenar.add_argument('--lr', type=float, default=1e-3)
+    entrenar.add_argument('--canales', type=int, default=16, help="Canales de la primera convolución.")
+    entrenar.add_argument('--validacion', type=float, default=0.2, help="Fracción de segmentos reservada para validación.")
+    entrenar.add_argument('--semilla', type=int, default=0)
+
+    args = parser.parse_args()
+    config = load_config(args.config)
+    if args.comando == 'cosechar':
+        comando_cosechar(args, config)
+    else:
+        comando_entrenar(args, config)
+
+if __name__ == "__main__":
+    main()